@@ -0,0 +1,78 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Measures compile time of deeply nested models. Blocks are nested into each
+# other, so the depth of the model tree grows with the number of blocks. The
+# recursion limit is kept low to make sure flattening and traversal of the
+# logical model do not recurse through submodels.
+
+import sys
+import time
+
+import mithril as ml
+from mithril.framework.common import Table
+from mithril.models import Add, Linear, Model, Relu
+
+num_blocks = [50, 100, 150]
+dims = 32
+recursion_limit = 300
+
+
+def mlp_block(dims: int) -> Model:
+    block = Model()
+    block |= Linear(4 * dims).connect(input="input", output="hidden")
+    block |= Relu().connect(input="hidden", output="activation")
+    block |= Linear(dims).connect(input="activation", output=ml.IOKey("output"))
+    return block
+
+
+def nested_blocks(num_blocks: int, dims: int) -> Model:
+    # Each block wraps the previous one with a residual MLP:
+    # output = inner(input) + mlp(inner(input)).
+    model = Model()
+    model |= Relu().connect(input="input", output=ml.IOKey("output"))
+    for _ in range(num_blocks):
+        block = Model()
+        block |= model.connect(input="input", output="inner")
+        block |= mlp_block(dims).connect(input="inner", output="mlp")
+        block |= Add().connect(left="inner", right="mlp", output=ml.IOKey("output"))
+        model = block
+    return model
+
+
+table = Table()
+table.add_header(["# of blocks", "Build Time (s)", "Compile Time (s)"])
+
+default_limit = sys.getrecursionlimit()
+sys.setrecursionlimit(recursion_limit)
+try:
+    for n in num_blocks:
+        start = time.perf_counter()
+        model = nested_blocks(n, dims)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ml.compile(
+            model,
+            ml.NumpyBackend(),
+            shapes={"input": [8, dims]},
+            jit=False,
+        )
+        compile_time = time.perf_counter() - start
+        table.add_row([[str(n)], [f"{build_time:.3f}"], [f"{compile_time:.3f}"]])
+finally:
+    sys.setrecursionlimit(default_limit)
+
+table.compile()
+table.display()
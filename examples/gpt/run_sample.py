@@ -13,7 +13,6 @@
 # limitations under the License.
 
 import argparse
-import sys
 import warnings
 from collections.abc import Callable
 from typing import Any
@@ -46,12 +45,6 @@ def run_sample(
     seed: int = 42,
     temperature: float = 0.8,
 ):
-    # TODO: This recursion limit is minimum we can have for now.
-    # We may further improve this limit in the future.
-    # NOTE: Recursion limit is set according to the pytest function call
-    # limit. If you run this script without pytesr, most probably you can
-    # lower this limit.
-    sys.setrecursionlimit(739)
     # Model Configuration
     block_size = 100
     gpt = create_gpt(
@@ -14,12 +14,14 @@
 
 import builtins
 import platform
-from collections.abc import Iterable
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any, Literal
 
 from .backends.backend import Backend, UnavailableBackend
 from .framework.codegen import code_gen_map
+from .framework.codegen.c_style_codegen.c_export import CExport, export_c
 from .framework.common import TBD, Tensor
-from .framework.logical import Connection, IOKey
+from .framework.logical import BaseModel, Connection, IOKey
 from .framework.physical.model import PhysicalConstantType, PhysicalShapeType
 from .models import Model, PhysicalModel
 from .models.train_model import TrainModel
@@ -40,6 +42,9 @@ from .types import (
     int64,
     short,
 )
+from .utils.compile_cache import CompileCache, compile_memo, fingerprint
+from .utils.polymorphic import BucketingType, PolymorphicModel
+from .utils.profiler import CompileProfiler
 
 __all__ = [
     "JaxBackend",
@@ -49,6 +54,11 @@ __all__ = [
     "GGMLBackend",
     "NumpyBackend",
     "compile",
+    "compile_polymorphic",
+    "export_c",
+    "CExport",
+    "PolymorphicModel",
+    "CompileProfiler",
     "DataType",
     "bool",
     "float",
@@ -119,6 +129,15 @@ def compile(
     safe_shapes: builtins.bool = True,
     safe_names: builtins.bool = True,
     use_short_namings: builtins.bool = True,
+    cache_dir: str | None = None,
+    memoize: builtins.bool | Literal["template"] = False,
+    recompilable: builtins.bool = False,
+    plan_memory: builtins.bool = False,
+    fuse_elementwise: builtins.bool = False,
+    checkpoint: builtins.bool | Sequence[BaseModel] = False,
+    rewrite: builtins.bool = True,
+    quantized_keys: Mapping[str, str] | None = None,
+    profile: builtins.bool | CompileProfiler = False,
 ) -> PhysicalModel[DataType]:
     """Compilation of Logical Model.
 
@@ -130,8 +149,96 @@ def compile(
         _description_, by default None
     discard_keys : set[str] | None, optional
         _description_, by default None
+    cache_dir : str | None, optional
+        Directory of the on-disk compile cache. If given, compiled models are
+        stored in and reloaded from this directory, by default None
+    memoize : bool, optional
+        If True, compiled models are memoized in the process wide LRU cache
+        (`compile_memo`). Compiling an equal model again only copies the
+        memoized model, compiling a structurally equal model which differs
+        only in constant values or shapes skips flattening. If "template",
+        only the flattened model is shared between structurally equal models
+        and compiled models are not kept, by default False
+    recompilable : bool, optional
+        If True, the model is kept in its state before shape and value
+        dependent inference so that `PhysicalModel.recompile` can be used. It
+        is implied by `memoize`, by default False
+    plan_memory : bool, optional
+        If True, lifetimes of intermediate tensors are planned and generated
+        code of NumPy and Torch backends writes them into reused preallocated
+        buffers instead of allocating new arrays. Generated code of C backend
+        places them into overlapping regions of its static arena. Only
+        available with `inference=True`. Inputs are expected to have the
+        backend's dtype and evaluate function must not be called concurrently.
+        Note that C backend keeps intermediate values in static arenas even
+        without memory planning, hence evaluate functions of a model compiled
+        with C backend are never thread-safe.
+        Planned buffers are reported in `PhysicalModel.memory_plan`, by
+        default False
+    fuse_elementwise : bool, optional
+        If True, chains of elementwise operations whose intermediate values
+        are not used elsewhere are evaluated by a single fused function in the
+        generated code of Python based backends. NumPy writes intermediate
+        values of a fused chain in place and JAX compiles each fused function
+        with jit. Requires `inference=True` for NumPy, by default False
+    checkpoint : bool | Sequence[BaseModel], optional
+        Enables gradient checkpointing, which trades compute for memory in
+        training. Intermediate values of checkpointed segments are not kept by
+        the forward pass and are computed again by the backward pass. Segments
+        are either the given submodels (e.g. each block of a network) or, if
+        True, about sqrt(N) consecutive segments of the N operations, which are
+        balanced by their estimated activation sizes for Torch and JAX. Torch
+        and JAX segments are wrapped with a recomputing function and
+        `jax.checkpoint` respectively. Supported by NumPy, Torch and JAX
+        backends, by default False
+    rewrite : bool, optional
+        If True, the flattened graph is simplified by the registered rewrite
+        rules (e.g. cancelling transposes, identity arithmetic, matmul and
+        bias fusion), by default True
+    quantized_keys : Mapping[str, str] | None, optional
+        Quantization types ("q8_0" or "q4_0") of the weights which are given
+        as quantized arrays (see `GGMLBackend.quantize`). Quantized weights
+        can only be used as `input @ weight.T`, e.g. weights of `Linear`.
+        Only supported by GGML backend with `inference=True`, by default None
+    profile : bool | CompileProfiler, optional
+        If True, wall times and call counts of compile phases and constraints
+        are recorded and the top offenders are printed. If a CompileProfiler
+        is given, records are collected in it instead of being printed, by
+        default False
     """
 
+    if profile is not False:
+        profiler = (
+            profile if isinstance(profile, CompileProfiler) else CompileProfiler()
+        )
+        with profiler:
+            pm = compile(
+                model,
+                backend,
+                constant_keys=constant_keys,
+                data_keys=data_keys,
+                discard_keys=discard_keys,
+                trainable_keys=trainable_keys,
+                shapes=shapes,
+                inference=inference,
+                jit=jit,
+                file_path=file_path,
+                safe_shapes=safe_shapes,
+                safe_names=safe_names,
+                use_short_namings=use_short_namings,
+                cache_dir=cache_dir,
+                memoize=memoize,
+                recompilable=recompilable,
+                plan_memory=plan_memory,
+                fuse_elementwise=fuse_elementwise,
+                checkpoint=checkpoint,
+                rewrite=rewrite,
+                quantized_keys=quantized_keys,
+            )
+        if profile is True:
+            profiler.display()
+        return pm
+
     # TrainModel model requires to be finalized before compilation.
     if isinstance(model, TrainModel):
         model.finalize()
@@ -146,21 +253,86 @@ def compile(
     shapes = shapes if shapes is not None else dict()
     trainable_keys = set(trainable_keys) if trainable_keys is not None else set()
 
-    # Initialize Physical Model.
-    pm = PhysicalModel[DataType](
-        model=model,
-        backend=backend,
-        data_keys=data_keys,
-        constant_keys=constant_keys,
-        trainable_keys=trainable_keys,
-        discard_keys=discard_keys,
-        shapes=shapes,
-        inference=inference,
-        safe_shapes=safe_shapes,
-        safe_names=safe_names,
-        use_short_namings=use_short_namings,
-        jit=jit,
-    )
+    request = {
+        "constant_keys": constant_keys,
+        "data_keys": data_keys,
+        "discard_keys": discard_keys,
+        "trainable_keys": trainable_keys,
+        "shapes": shapes,
+        "inference": inference,
+        "jit": jit,
+        "safe_shapes": safe_shapes,
+        "safe_names": safe_names,
+        "use_short_namings": use_short_namings,
+        "recompilable": recompilable,
+        "plan_memory": plan_memory,
+        "fuse_elementwise": fuse_elementwise,
+        "checkpoint": checkpoint,
+        "rewrite": rewrite,
+        "quantized_keys": quantized_keys,
+    }
+    key: str | None = None
+    structural_key: str | None = None
+    if memoize or cache_dir is not None:
+        key = fingerprint(model, backend, **request)  # type: ignore
+
+    # Try to reuse an equivalent compiled model of this process.
+    if memoize and key is not None:
+        if memoize is True and (
+            memo_pm := compile_memo.load(
+                key, model, backend, jit=jit, file_path=file_path
+            )
+        ):
+            return memo_pm
+        structural_key = fingerprint(model, backend, structural=True, **request)  # type: ignore
+
+    # Try to load an equivalent compiled model from the compile cache.
+    cache: CompileCache | None = None
+    if cache_dir is not None:
+        cache = CompileCache(cache_dir)
+        if key is not None and (
+            cached_pm := cache.load(key, model, backend, jit=jit, file_path=file_path)
+        ):
+            return cached_pm
+
+    pm: PhysicalModel[DataType] | None = None
+    if structural_key is not None:
+        # Only shape and value dependent inference is required for
+        # structurally equal models.
+        pm = compile_memo.specialize(
+            structural_key,
+            model,
+            backend,
+            constant_keys=constant_keys,
+            data_keys=data_keys,
+            shapes=shapes,
+            safe_names=safe_names,
+        )
+
+    if pm is None:
+        # Initialize Physical Model.
+        pm = PhysicalModel[DataType](
+            model=model,
+            backend=backend,
+            data_keys=data_keys,
+            constant_keys=constant_keys,
+            trainable_keys=trainable_keys,
+            discard_keys=discard_keys,
+            shapes=shapes,
+            inference=inference,
+            safe_shapes=safe_shapes,
+            safe_names=safe_names,
+            use_short_namings=use_short_namings,
+            jit=jit,
+            keep_template=recompilable or structural_key is not None,
+            plan_memory=plan_memory,
+            fuse_elementwise=fuse_elementwise,
+            checkpoint=checkpoint,
+            rewrite=rewrite,
+            quantized_keys=quantized_keys,
+        )
+        if structural_key is not None:
+            compile_memo.store_template(structural_key, model, pm)
 
     # Pick code generator based on backend and generate code.
     CodeGen_Cls = code_gen_map[backend.__class__]
@@ -168,5 +340,51 @@ def compile(
     codegen.generate_code(file_path=file_path)
     evaluate, evaluate_all = codegen.compile_code(jit=jit)
 
+    if key is not None:
+        if cache is not None:
+            cache.save(key, model, pm, codegen)
+        if memoize is True:
+            compile_memo.store(key, model, pm, codegen)
+
     pm.generate_functions(evaluate, evaluate_all)
     return pm
+
+
+def compile_polymorphic(
+    model: Model,
+    backend: Backend[DataType],
+    *,
+    dynamic_axes: Mapping[str, Sequence[builtins.int]],
+    shapes: PhysicalShapeType,
+    bucketing: BucketingType = "exact",
+    max_specializations: builtins.int = 8,
+    **kwargs: Any,
+) -> PolymorphicModel[DataType]:
+    """Compilation of Logical Model with dynamic input dimensions.
+
+    Parameters
+    ----------
+    dynamic_axes : Mapping[str, Sequence[int]]
+        Axes of inputs whose sizes may change between evaluations, e.g.
+        {"input": [0]} for a dynamic batch size.
+    shapes : PhysicalShapeType
+        Shapes of inputs. Sizes given for dynamic axes are ignored.
+    bucketing : "exact" | "pow2" | Callable[[int], int], optional
+        Policy mapping sizes of dynamic axes to compiled specializations. Any
+        policy other than "exact" pads inputs up to bucket sizes, by default
+        "exact"
+    max_specializations : int, optional
+        Maximum number of specializations kept, by default 8
+    kwargs
+        Remaining arguments of `compile`.
+    """
+    return PolymorphicModel(
+        compile,
+        model,
+        backend,
+        dynamic_axes,
+        bucketing=bucketing,
+        max_specializations=max_specializations,
+        shapes=shapes,
+        **kwargs,
+    )
@@ -94,10 +94,13 @@ class CBackend(Backend[PyArray]):
         return utils.to_numpy(array)
 
     def array(
-        self, input: np.ndarray[Any, Any], *, dtype: types.Dtype | None = None
+        self,
+        input: np.ndarray[Any, Any] | int | float,
+        *,
+        dtype: types.Dtype | None = None,
     ) -> PyArray:
         assert dtype is None, "dtype is not supported in CBackend"
-        input = input.astype(np.float32)
+        # Scalar values (e.g. constants of the models) are converted to 0-d arrays.
         return utils.from_numpy(input)
 
     def get_struct_cls(self) -> type[ctypes.Structure]:
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import ctypes
+import math
 from typing import Any
 
 import numpy as np
@@ -22,7 +24,7 @@ from ....cores.c.raw_c.array import (
     to_c_float_array,
     to_c_int_array,
 )
-from ....cores.c.raw_c.definitions import Array, lib
+from ....cores.c.raw_c.definitions import Array
 
 CODEGEN_CONFIG = CGenConfig()
 
@@ -41,14 +43,35 @@ CODEGEN_CONFIG.ALLOCATE_INTERNALS = True
 
 
 def to_numpy(array: PyArray) -> np.ndarray[Any, Any]:
-    return np.ctypeslib.as_array(array.arr.data, shape=(array.shape))
+    # Returned array is a view of the data of given array.
+    return np.asarray(array)
 
 
-def from_numpy(array: np.ndarray[Any, Any]) -> PyArray:
+def as_float_array(input: np.ndarray[Any, Any] | int | float) -> np.ndarray[Any, Any]:
+    """Converts given values to a writable C-contiguous float32 array, which is
+    the input itself if it is already such an array."""
+    array = np.asarray(input, dtype=np.float32, order="C")
+    if not array.flags.writeable:
+        array = array.copy()
+    return array
+
+
+def from_numpy(input: np.ndarray[Any, Any] | int | float) -> PyArray:
+    """Creates an array of given values. Data of writable C-contiguous float32
+    arrays is used without copying, so changes are visible from both sides and
+    the NumPy array is kept alive by the created array.
+    """
+    array = as_float_array(input)
     shape = array.shape
     ndim = len(shape)
 
     c_shape = to_c_int_array(shape)
-    c_data = to_c_float_array(array)  # type: ignore
-    arr: Array = lib.create_struct(c_data, ndim, c_shape)
-    return PyArray(arr.contents, shape)
+    c_strides = to_c_int_array([math.prod(shape[idx + 1 :]) for idx in range(ndim)])
+    arr = Array(
+        data=to_c_float_array(array),
+        shape=ctypes.cast(c_shape, ctypes.POINTER(ctypes.c_int)),
+        strides=ctypes.cast(c_strides, ctypes.POINTER(ctypes.c_int)),
+        ndim=ndim,
+        size=array.size,
+    )
+    return PyArray(arr, shape, base=(array, c_shape, c_strides))
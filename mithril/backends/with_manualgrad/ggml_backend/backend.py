@@ -21,12 +21,13 @@ import numpy as np
 from .... import types
 from ....cores.c.array import PyArray
 from ....cores.c.ggml import ops
+from ....cores.c.ggml import quantization as quantization_module
 from ....cores.c.ggml.ggml_core import ggml_struct
 from ....cores.c.ggml.utils import dtype_map
 from ....cores.c.raw_c import array
 from ...backend import Backend
 from ...utils import process_shape
-from ..c_backend.utils import from_numpy
+from ..c_backend.utils import as_float_array
 from . import utils
 
 __all__ = ["GGMLBackend"]
@@ -39,13 +40,24 @@ class GGMLBackend(Backend[PyArray]):
     )
     CODEGEN_CONFIG = utils.CODEGEN_CONFIG
 
-    def __init__(self) -> None:
+    def __init__(self, n_threads: int | None = None) -> None:
+        if n_threads is None:
+            n_threads = os.cpu_count() or 1
+        if n_threads < 1:
+            raise ValueError(f"n_threads must be positive, got {n_threads}")
+
         self._device = "cpu"
+        self._n_threads = n_threads
         self.op_function_dict = ops.primitive_func_dict
         self.dtype_map = dtype_map
         self.registered_primitives = {}
         self.array_creation_funcs: list[str] = []
 
+    @property
+    def n_threads(self) -> int:
+        # Number of threads used by GGML to compute the graphs of the models.
+        return self._n_threads
+
     @property
     def is_manualgrad(self) -> bool:
         return True
@@ -64,18 +76,32 @@ class GGMLBackend(Backend[PyArray]):
         return ggml_struct
 
     def to_numpy(self, array: PyArray) -> np.ndarray[Any, Any]:
-        return np.ctypeslib.as_array(
-            ctypes.cast(array.arr.data, ctypes.POINTER(ctypes.c_float)),
-            shape=(array.shape),
-        )
+        # Returned array is a view of the data of given array.
+        return np.asarray(array)
 
     def array(
         self, input: np.ndarray[Any, Any], *, dtype: types.Dtype | None = None
     ) -> PyArray:
         assert dtype is None, "dtype is not supported in CBackend"
-        input = input.astype(np.float32)
-        data_ptr = ctypes.cast(from_numpy(input).arr.data, ctypes.c_void_p)
-        return PyArray(ggml_struct(data=data_ptr), input.shape)
+        # Data of writable C-contiguous float32 arrays is used without copying.
+        input = as_float_array(input)
+        data_ptr = ctypes.c_void_p(input.ctypes.data)
+        return PyArray(ggml_struct(data=data_ptr), input.shape, base=input)
+
+    def quantize(self, input: np.ndarray[Any, Any], type: str) -> PyArray:
+        """Converts a float array to a block quantized array of the given type.
+
+        Quantized arrays can only be used for the keys compiled with the same
+        quantization type (see `quantized_keys` of `compile`), as the weights
+        of matrix multiplications.
+        """
+        # Quantized blocks are used without copying, the array keeps them alive.
+        data = np.ascontiguousarray(quantization_module.quantize(input, type))
+        data_ptr = ctypes.c_void_p(data.ctypes.data)
+        ggml_type = quantization_module.GGML_TYPE_IDS[type]
+        return PyArray(
+            ggml_struct(data=data_ptr, type=ggml_type), input.shape, base=data
+        )
 
     def ones(
         self,
@@ -37,6 +37,9 @@ class NumpyBackend(Backend[np.ndarray[Any, Any]]):
         The device on which to perform computations, default is "cpu".
     precision: int, optional
         The precision of the arrays, either 32 or 64, default is 32.
+    n_threads: int, optional
+        Number of threads evaluating the independent operations of the compiled
+        models concurrently, default is 1 (operations are evaluated serially).
     """
 
     backend_type = "numpy"
@@ -48,8 +51,14 @@ class NumpyBackend(Backend[np.ndarray[Any, Any]]):
     registered_primitives_grad_fn: dict[str, Callable[..., np.ndarray[Any, Any]]] = {}
     CODEGEN_CONFIG = utils.CODEGEN_CONFIG
 
-    def __init__(self, device: str = "cpu", dtype: Dtype = Dtype.float32) -> None:
+    def __init__(
+        self, device: str = "cpu", dtype: Dtype = Dtype.float32, n_threads: int = 1
+    ) -> None:
+        if n_threads < 1:
+            raise ValueError(f"n_threads must be positive, got {n_threads}")
+
         self._dtype = dtype
+        self._n_threads = n_threads
 
         if device != "cpu":
             raise RuntimeError(
@@ -69,6 +78,10 @@ class NumpyBackend(Backend[np.ndarray[Any, Any]]):
         for key, value in core_utils.dtype_map.items():
             setattr(self, key, value)
 
+    @property
+    def n_threads(self) -> int:
+        return self._n_threads
+
     @property
     def is_manualgrad(self) -> bool:
         return True
@@ -16,13 +16,19 @@ import ctypes
 import math
 from collections.abc import Sequence
 from numbers import Real
+from typing import Any
 
 from .ggml.ggml_core import ggml_struct
 from .raw_c.definitions import Array, lib
 
 
 class PyArray:
-    def __init__(self, arr: ctypes.Structure, shape: tuple[int, ...] | list[int]):
+    def __init__(
+        self,
+        arr: ctypes.Structure,
+        shape: tuple[int, ...] | list[int],
+        base: Any = None,
+    ):
         # TODO: PyArray need to store strides
 
         self.arr = arr
@@ -31,6 +37,9 @@ class PyArray:
         self.shape = shape
         self.ndim = len(shape)
         self.name = self.arr.__class__.__name__
+        # Owner of the memory of the data (e.g. a NumPy array whose buffer is
+        # wrapped without copying), which is kept alive with the array.
+        self.base = base
 
     # TODO: Implement __del__ method for deleting the struct
     # def __del__(self):
@@ -40,6 +49,20 @@ class PyArray:
     def dtype(self) -> type:
         return ctypes.c_float
 
+    @property
+    def __array_interface__(self) -> dict[str, Any]:
+        # NumPy arrays created from the array are views of its data, which
+        # keep the array alive.
+        data = self.arr.data
+        if not isinstance(data, int):
+            data = ctypes.cast(data, ctypes.c_void_p).value
+        return {
+            "shape": self.shape,
+            "typestr": "<f4",
+            "data": (data, False),
+            "version": 3,
+        }
+
     @property
     def data(self) -> Sequence[int | Sequence[int | Sequence[int]]]:
         total_elements = math.prod(self.shape)
@@ -31,11 +31,17 @@ class PyArray:
     arr: ctypes.Structure
     shape: tuple[int, ...]
     ndim: int
+    base: Any
 
     def data(self) -> NestedList: ...
     def __init__(
-        self, arr: ctypes.Structure, shape: tuple[int, ...] | list[int]
+        self,
+        arr: ctypes.Structure,
+        shape: tuple[int, ...] | list[int],
+        base: Any = None,
     ) -> None: ...
+    @property
+    def __array_interface__(self) -> dict[str, Any]: ...
     def __gt__(self, other: PyArray) -> PyArray: ...
     def __ge__(self, other: PyArray) -> PyArray: ...
     def __lt__(self, other: PyArray) -> PyArray: ...
@@ -21,8 +21,19 @@ GGML_DIR="${SCRIPT_DIR}/ggml"
 
 # Check if we need to download GGML
 if [ ! -d "${GGML_DIR}" ]; then
-    echo "GGML not found. Cloning from repository..."
-    git clone --depth 1 "${GGML_REPO}" "${GGML_DIR}"
+    # Use the revision pinned by the ggml submodule unless GGML_REF is given.
+    if [ -z "${GGML_REF}" ]; then
+        GGML_REF=$(git -C "${SCRIPT_DIR}" ls-tree HEAD ggml 2>/dev/null | awk '$2 == "commit" {print $3}')
+    fi
+    if [ -n "${GGML_REF}" ]; then
+        echo "GGML not found. Fetching ${GGML_REF} from repository..."
+        git init -q "${GGML_DIR}"
+        git -C "${GGML_DIR}" fetch --depth 1 "${GGML_REPO}" "${GGML_REF}"
+        git -C "${GGML_DIR}" checkout -q FETCH_HEAD
+    else
+        echo "GGML not found. Cloning from repository..."
+        git clone --depth 1 "${GGML_REPO}" "${GGML_DIR}"
+    fi
 else
     echo "GGML directory exists. Using existing files."
 fi
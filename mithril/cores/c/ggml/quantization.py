@@ -0,0 +1,127 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any
+
+import numpy as np
+
+__all__ = ["QUANTIZATION_TYPES", "BLOCK_SIZE", "quantize", "dequantize"]
+
+# Number of consecutive elements of the last dimension sharing a scale.
+BLOCK_SIZE = 32
+
+# Block layouts are the same as block_q8_0 and block_q4_0 of GGML, a float16
+# scale followed by the quantized values.
+_BLOCK_DTYPES = {
+    "q8_0": np.dtype([("d", "<f2"), ("qs", "i1", BLOCK_SIZE)]),
+    "q4_0": np.dtype([("d", "<f2"), ("qs", "u1", BLOCK_SIZE // 2)]),
+}
+
+# Quantization types and their ggml_type enum names.
+QUANTIZATION_TYPES = {
+    "q8_0": "GGML_TYPE_Q8_0",
+    "q4_0": "GGML_TYPE_Q4_0",
+}
+
+# Values of the ggml_type enum.
+GGML_TYPE_IDS = {
+    "q8_0": 8,
+    "q4_0": 2,
+}
+
+
+def _check_type(type: str) -> None:
+    if type not in _BLOCK_DTYPES:
+        raise ValueError(
+            f"Unsupported quantization type '{type}', "
+            f"expected one of {list(_BLOCK_DTYPES)}."
+        )
+
+
+def quantize(array: np.ndarray[Any, Any], type: str) -> np.ndarray[Any, Any]:
+    """Quantizes the array into blocks of the given type along its last axis.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        Float array whose last dimension is a multiple of BLOCK_SIZE.
+    type : str
+        Quantization type, "q8_0" or "q4_0".
+
+    Returns
+    -------
+    np.ndarray
+        Bytes of the quantized blocks in the memory layout of GGML.
+    """
+    _check_type(type)
+    if array.ndim == 0 or array.shape[-1] % BLOCK_SIZE != 0:
+        raise ValueError(
+            f"Last dimension of quantized arrays must be a multiple of "
+            f"{BLOCK_SIZE}, got shape {array.shape}."
+        )
+
+    blocks = np.asarray(array, dtype=np.float32).reshape(-1, BLOCK_SIZE)
+    result = np.zeros(len(blocks), dtype=_BLOCK_DTYPES[type])
+
+    if type == "q8_0":
+        scale = np.abs(blocks).max(axis=1) / 127
+        inv_scale = np.divide(1, scale, out=np.zeros_like(scale), where=scale != 0)
+        # Rounds half away from zero as roundf in C.
+        values = blocks * inv_scale[:, None]
+        result["qs"] = np.sign(values) * np.floor(np.abs(values) + 0.5)
+    else:
+        # Scale is chosen such that the element with the largest magnitude is
+        # mapped to -8.
+        amax_idx = np.abs(blocks).argmax(axis=1)
+        scale = blocks[np.arange(len(blocks)), amax_idx] / -8
+        inv_scale = np.divide(1, scale, out=np.zeros_like(scale), where=scale != 0)
+        values = np.minimum(15, np.trunc(blocks * inv_scale[:, None] + 8.5))
+        values = values.astype(np.uint8)
+        half = BLOCK_SIZE // 2
+        result["qs"] = values[:, :half] | (values[:, half:] << 4)
+
+    result["d"] = scale
+    return result.view(np.uint8)
+
+
+def dequantize(
+    data: np.ndarray[Any, Any], type: str, shape: tuple[int, ...]
+) -> np.ndarray[Any, Any]:
+    """Converts the quantized blocks back to a float32 array of the given shape.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Bytes of the quantized blocks, as returned by quantize.
+    type : str
+        Quantization type, "q8_0" or "q4_0".
+    shape : tuple[int, ...]
+        Shape of the original array.
+
+    Returns
+    -------
+    np.ndarray
+        Dequantized array.
+    """
+    _check_type(type)
+    blocks = np.ascontiguousarray(data).view(_BLOCK_DTYPES[type])
+    scale = blocks["d"].astype(np.float32)[:, None]
+
+    if type == "q8_0":
+        values = blocks["qs"].astype(np.float32)
+    else:
+        qs = blocks["qs"]
+        values = np.concatenate([qs & 0x0F, qs >> 4], axis=1).astype(np.float32) - 8
+
+    return (values * scale).reshape(shape)
@@ -18,6 +18,12 @@
 #include <stdlib.h>
 #include <string.h>
 
+/* Linkage of the runtime functions. Exported models compile the runtime into
+ * their own translation unit with MITHRIL_API defined as static. */
+#ifndef MITHRIL_API
+#define MITHRIL_API
+#endif
+
 typedef struct {
   float *data;
   int *shape;
@@ -27,10 +33,10 @@ typedef struct {
   int size;
 } Array;
 
-Array *create_struct(float *data, int ndim, int *shape);
-Array *create_empty_struct(int ndim, int *shape);
-Array *create_full_struct(float value, int ndim, int *shape);
+MITHRIL_API Array *create_struct(float *data, int ndim, int *shape);
+MITHRIL_API Array *create_empty_struct(int ndim, int *shape);
+MITHRIL_API Array *create_full_struct(float value, int ndim, int *shape);
 
-void delete_struct(Array *s);
+MITHRIL_API void delete_struct(Array *s);
 
 #endif
@@ -1,2 +1,8 @@
 #!/bin/bash
-cc ops.c array.c utils.c -shared -fPIC -g -o libmithrilc.so
+# OpenMP is used if the compiler supports it, otherwise only its SIMD
+# directives are taken into account.
+OPENMP_FLAGS="-fopenmp"
+if ! echo "int main(void) { return 0; }" | cc -fopenmp -x c - -o /dev/null 2>/dev/null; then
+  OPENMP_FLAGS="-fopenmp-simd"
+fi
+cc ops.c array.c utils.c -shared -fPIC -g -O3 $OPENMP_FLAGS -lm -o libmithrilc.so
@@ -14,53 +14,142 @@
 
 #include "ops.h"
 
+#include <float.h>
+#include <math.h>
+
 #include "stdio.h"
 
 #define MAX(a, b) ((a) > (b) ? (a) : (b))
+#define MIN(a, b) ((a) < (b) ? (a) : (b))
 
-float add_lambda(float x, float y) { return x + y; }
-
-float multiply_lambda(float x, float y) { return x * y; }
-
-float subtract_lambda(float x, float y) { return x - y; }
-
-static float squared_diff(float x, float y) {
-  float diff = x - y;
-  return diff * diff;
-}
+// Tile sizes of the matrix multiplication kernel. A tile of the output and the
+// packed panels of the operands it reads are aimed to stay in the cache, MR x NR
+// blocks of the output are accumulated in registers.
+#define TILE_M 64
+#define TILE_N 256
+#define TILE_K 256
+#define MR 4
+#define NR 16
+// Block size of the 2D transpose.
+#define TILE_T 32
 
 void add(Array *output, Array *left, Array *right) {
-  binary_array_iterator(left, right, output, add_lambda);
+  BINARY_ITERATE(left, right, output, x + y);
 }
 
 void multiplication(Array *output, Array *left, Array *right) {
-  binary_array_iterator(left, right, output, multiply_lambda);
+  BINARY_ITERATE(left, right, output, x * y);
 }
 
 void subtract(Array *output, Array *left, Array *right) {
-  binary_array_iterator(left, right, output, subtract_lambda);
+  BINARY_ITERATE(left, right, output, x - y);
+}
+
+/* Accumulates A[rows x K_block] @ Bp into C[rows x NR] where Bp is a packed
+ * contiguous (K_block x NR) panel of B. Rows are processed MR at a time by
+ * keeping their MR x NR block of C in registers. */
+static void gemm_panel(const float *restrict A, const float *restrict Bp,
+                       float *restrict C, int rows, int lda, int ldc,
+                       int k_len) {
+  int i = 0;
+  for (; i + MR <= rows; i += MR) {
+    float acc[MR][NR] = {{0.0f}};
+    for (int k = 0; k < k_len; k++) {
+      const float *b = Bp + (size_t)k * NR;
+      for (int r = 0; r < MR; r++) {
+        const float a = A[(size_t)(i + r) * lda + k];
+#pragma omp simd
+        for (int c = 0; c < NR; c++) acc[r][c] += a * b[c];
+      }
+    }
+    for (int r = 0; r < MR; r++) {
+      float *c_row = C + (size_t)(i + r) * ldc;
+#pragma omp simd
+      for (int c = 0; c < NR; c++) c_row[c] += acc[r][c];
+    }
+  }
+  for (; i < rows; i++) {
+    float acc[NR] = {0.0f};
+    for (int k = 0; k < k_len; k++) {
+      const float a = A[(size_t)i * lda + k];
+      const float *b = Bp + (size_t)k * NR;
+#pragma omp simd
+      for (int c = 0; c < NR; c++) acc[c] += a * b[c];
+    }
+    float *c_row = C + (size_t)i * ldc;
+#pragma omp simd
+    for (int c = 0; c < NR; c++) c_row[c] += acc[c];
+  }
+}
+
+/* C = A @ B for contiguous row-major A (M x K), B (K x N) and C (M x N).
+ * Tiles of C are distributed over threads. Within a tile, NR wide column
+ * panels of B are packed into contiguous buffers and multiplied by register
+ * blocked, vectorized micro kernels. */
+static void gemm(const float *restrict A, const float *restrict B,
+                 float *restrict C, int M, int N, int K) {
+  int m_tiles = (M + TILE_M - 1) / TILE_M;
+  int n_tiles = (N + TILE_N - 1) / TILE_N;
+
+#pragma omp parallel for collapse(2) schedule(static)
+  for (int mt = 0; mt < m_tiles; mt++) {
+    for (int nt = 0; nt < n_tiles; nt++) {
+      int i_start = mt * TILE_M, i_end = MIN(i_start + TILE_M, M);
+      int j_start = nt * TILE_N, j_end = MIN(j_start + TILE_N, N);
+      float packed[TILE_K * NR];
+
+      for (int i = i_start; i < i_end; i++) {
+        for (int j = j_start; j < j_end; j++) C[(size_t)i * N + j] = 0.0f;
+      }
+      for (int k_start = 0; k_start < K; k_start += TILE_K) {
+        int k_len = MIN(TILE_K, K - k_start);
+        int j = j_start;
+        for (; j + NR <= j_end; j += NR) {
+          for (int k = 0; k < k_len; k++) {
+            memcpy(packed + k * NR, B + (size_t)(k_start + k) * N + j,
+                   NR * sizeof(float));
+          }
+          gemm_panel(A + (size_t)i_start * K + k_start, packed,
+                     C + (size_t)i_start * N + j, i_end - i_start, K, N,
+                     k_len);
+        }
+        // Remaining columns narrower than a panel.
+        for (int i = i_start; j < j_end && i < i_end; i++) {
+          float *c_row = C + (size_t)i * N;
+          for (int k = k_start; k < k_start + k_len; k++) {
+            const float a = A[(size_t)i * K + k];
+            const float *b_row = B + (size_t)k * N;
+            for (int jj = j; jj < j_end; jj++) c_row[jj] += a * b_row[jj];
+          }
+        }
+      }
+    }
+  }
 }
 
 void transpose(Array *output, const Array *input, const c_tuple *axes) {
   if (!axes) {
     // Default 2D transpose
     // TODO: Currently only support 2D, ND support should be added.
+    // Blocks are copied at once so that both reads and writes stay in cache.
     int m = input->shape[0], n = input->shape[1];
-    for (int i = 0; i < m; i++) {
-      for (int j = 0; j < n; j++) {
-        size_t input_idx = i * input->strides[0] + j * input->strides[1];
-        size_t output_idx = j * output->strides[0] + i * output->strides[1];
-        output->data[output_idx] = input->data[input_idx];
+#pragma omp parallel for collapse(2) schedule(static)
+    for (int ib = 0; ib < m; ib += TILE_T) {
+      for (int jb = 0; jb < n; jb += TILE_T) {
+        for (int i = ib; i < MIN(ib + TILE_T, m); i++) {
+          for (int j = jb; j < MIN(jb + TILE_T, n); j++) {
+            size_t input_idx = i * input->strides[0] + j * input->strides[1];
+            size_t output_idx = j * output->strides[0] + i * output->strides[1];
+            output->data[output_idx] = input->data[input_idx];
+          }
+        }
       }
     }
   } else {
-    // General N-D transpose
-    int *inv_axes = malloc(input->ndim * sizeof(int));
+    // General N-D transpose, output is expected to be contiguous.
+    int inv_axes[input->ndim];
     invert_permutation(axes->data, inv_axes, input->ndim);
 
-    // Recompute output strides based on transposed axes
-    output->strides = compute_strides(output->shape, output->ndim);
-
     // Copy data using inverse axes
     for (size_t i = 0; i < input->size; i++) {
       size_t out_idx = 0;
@@ -72,17 +161,19 @@ void transpose(Array *output, const Array *input, const c_tuple *axes) {
       }
       output->data[out_idx] = input->data[i];
     }
-    free(inv_axes);
   }
 }
 
 void matrix_multiplication(Array *output, const Array *left,
                            const Array *right) {
+  // Shapes and strides are kept on the stack to avoid allocations in each
+  // call, output is expected to be contiguous.
   int max_ndim = MAX(left->ndim, right->ndim);
-  int *lshape = pad_shape(left, max_ndim);
-  int *rshape = pad_shape(right, max_ndim);
+  int lshape[max_ndim], rshape[max_ndim], out_shape[max_ndim];
+  int lstrides[max_ndim], rstrides[max_ndim];
+  pad_shape_into(left, max_ndim, lshape);
+  pad_shape_into(right, max_ndim, rshape);
 
-  int *out_shape = (int *)malloc(max_ndim * sizeof(int));
   for (int i = 0; i < max_ndim - 2; i++)
     out_shape[i] = MAX(lshape[i], rshape[i]);
   out_shape[max_ndim - 2] = lshape[max_ndim - 2];  // M
@@ -91,9 +182,8 @@ void matrix_multiplication(Array *output, const Array *left,
   const int N = out_shape[max_ndim - 1];
   const int K = lshape[max_ndim - 1];  // Inner dimension
 
-  output->strides = compute_strides(out_shape, max_ndim);
-  int *lstrides = compute_strides(lshape, max_ndim);
-  int *rstrides = compute_strides(rshape, max_ndim);
+  compute_strides_into(lshape, max_ndim, lstrides);
+  compute_strides_into(rshape, max_ndim, rstrides);
 
   if (K != rshape[max_ndim - 2]) {
     printf("Dimension mismatch: %d vs %d\n", K, rshape[max_ndim - 2]);
@@ -104,73 +194,60 @@ void matrix_multiplication(Array *output, const Array *left,
   for (int i = 0; i < max_ndim - 2; i++)
     batch_size *= MAX(lshape[i], rshape[i]);
 
-#pragma omp parallel for
+  // Each matrix of the batch is multiplied by the parallel kernel.
   for (size_t b = 0; b < batch_size; b++) {
     size_t l_offset = loc(b, lshape, lstrides, max_ndim - 2);
     size_t r_offset = loc(b, rshape, rstrides, max_ndim - 2);
-
-    for (int i = 0; i < M; i++) {
-      for (int j = 0; j < N; j++) {
-        float sum = 0.0f;
-        for (int k = 0; k < K; k++) {
-          size_t left_idx = l_offset + i * lstrides[max_ndim - 2] +
-                            k * lstrides[max_ndim - 1];
-          size_t right_idx = r_offset + k * rstrides[max_ndim - 2] +
-                             j * rstrides[max_ndim - 1];
-          sum += left->data[left_idx] * right->data[right_idx];
-        }
-        output->data[b * M * N + i * N + j] = sum;
-      }
-    }
+    gemm(left->data + l_offset, right->data + r_offset,
+         output->data + b * M * N, M, N, K);
   }
-  free(lshape);
-  free(rshape);
-  free(out_shape);
-  free(lstrides);
-  free(rstrides);
 }
 
 void reduce_sum(const Array *input, Array *output, const c_tuple *axes) {
+  int ndim = input->ndim;
+  // Reduction mask (1=reduce, 0=keep)
+  int reduce_mask[MAX(ndim, 1)];
+  reduction_mask(axes, ndim, reduce_mask);
+
   // Initialize output to zero
   for (size_t i = 0; i < output->size; i++) {
     output->data[i] = 0.0f;
   }
-  // Create reduction mask (1=reduce, 0=keep)
-  int *reduce_mask = (int *)calloc(input->ndim, sizeof(int));
-  if (axes == NULL) {
-    // Reduce all dimensions when axes is NULL
-    for (int d = 0; d < input->ndim; d++) {
-      reduce_mask[d] = 1;
-    }
-  } else {
-    // Mark specified axes for reduction
-    for (int i = 0; i < axes->size; i++) {
-      if (axes->data[i] >= 0 && axes->data[i] < input->ndim) {
-        reduce_mask[axes->data[i]] = 1;
+
+  // If reduced axes are consecutive, input is viewed as (outer, reduced,
+  // inner) and contiguous inner rows are accumulated.
+  int first = -1, last = -1;
+  bool consecutive = true;
+  for (int d = 0; d < ndim; d++) {
+    if (!reduce_mask[d]) continue;
+    if (first >= 0 && last != d - 1) consecutive = false;
+    if (first < 0) first = d;
+    last = d;
+  }
+
+  if (first < 0 || consecutive) {
+    if (first < 0) first = last = ndim;
+    size_t outer = prod(input->shape, first);
+    size_t reduced = prod(input->shape + first, MAX(last - first + 1, 0));
+    size_t inner = prod(input->shape + last + 1, MAX(ndim - last - 1, 0));
+
+#pragma omp parallel for if (outer > 1)
+    for (size_t o = 0; o < outer; o++) {
+      float *out_row = output->data + o * inner;
+      for (size_t r = 0; r < reduced; r++) {
+        const float *in_row = input->data + (o * reduced + r) * inner;
+#pragma omp simd
+        for (size_t i = 0; i < inner; i++) out_row[i] += in_row[i];
       }
     }
+    return;
   }
 
   // Iterate through input and accumulate sums
   for (size_t i = 0; i < input->size; i++) {
-    // Compute output index
-    size_t out_idx = 0;
-    int temp = i;
-    int out_stride = 1;
-
-    for (int d = input->ndim - 1; d >= 0; d--) {
-      int dim_size = input->shape[d];
-      int idx = temp % dim_size;
-      temp /= dim_size;
-      if (!reduce_mask[d]) {
-        out_idx += idx * out_stride;
-        out_stride *= output->shape[d];
-      }
-    }
-    output->data[out_idx] += input->data[i];
+    output->data[reduced_index(i, input->shape, reduce_mask, ndim)] +=
+        input->data[i];
   }
-
-  free(reduce_mask);
 }
 
 void relu(Array *output, const Array *input) {
@@ -183,20 +260,24 @@ void relu(Array *output, const Array *input) {
 }
 
 void squared_error(Array *output, Array *input, Array *target) {
-  binary_array_iterator(input, target, output, squared_diff);
+  BINARY_ITERATE(input, target, output, (x - y) * (x - y));
 }
 
-void reduce_mean(Array *output, Array *input, const c_tuple *axes,
-                 bool keepdim) {
+/* Returns the number of elements reduced into each element of the output */
+static size_t reduction_size(const Array *input, const c_tuple *axes) {
+  int mask[MAX(input->ndim, 1)];
+  reduction_mask(axes, input->ndim, mask);
   size_t N = 1;
-  if (axes == NULL) {
-    N = input->size;
-  } else {
-    for (int i = 0; i < axes->size; i++) {
-      N *= input->shape[axes->data[i]];
-    }
+  for (int d = 0; d < input->ndim; d++) {
+    if (mask[d]) N *= input->shape[d];
   }
-  // TODO: Keepdim
+  return N;
+}
+
+void reduce_mean(Array *output, Array *input, const c_tuple *axes,
+                 bool keepdim) {
+  // Reduced dimensions kept with size 1 do not change the layout of output.
+  size_t N = reduction_size(input, axes);
   reduce_sum(input, output, axes);
   for (size_t i = 0; i < output->size; i++) {
     output->data[i] /= N;
@@ -205,90 +286,20 @@ void reduce_mean(Array *output, Array *input, const c_tuple *axes,
 
 void add_grad(Array *gradient, int idx, Array *output, Array *left,
               Array *right, Array *leftGradient, Array *rightGradient) {
-  if (idx == 0) {
-    // Determine broadcasted dimensions for left
-    int ndim_diff = gradient->ndim - left->ndim;
-    if (ndim_diff == 0) {
-      add(leftGradient, gradient, leftGradient);
-    } else {
-      int *reduce_axes = (int *)malloc(ndim_diff * sizeof(int));
-      for (int i = 0; i < ndim_diff; i++) {
-        reduce_axes[i] = i;
-      }
-      c_tuple *axes = (c_tuple *)malloc(ndim_diff * sizeof(c_tuple));
-      axes->size = ndim_diff;
-      axes->data = reduce_axes;
-      reduce_sum(gradient, leftGradient, axes);
-      free(reduce_axes);
-      free(axes);
-    }
-  } else {
-    // Determine broadcasted dimensions for right
-    int ndim_diff = gradient->ndim - right->ndim;
-    if (ndim_diff == 0) {
-      add(rightGradient, gradient, rightGradient);
-    } else {
-      int *reduce_axes = (int *)malloc(ndim_diff * sizeof(int));
-      for (int i = 0; i < ndim_diff; i++) {
-        reduce_axes[i] = i;
-      }
-      c_tuple *axes = (c_tuple *)malloc(ndim_diff * sizeof(c_tuple));
-      axes->size = ndim_diff;
-      axes->data = reduce_axes;
-      reduce_sum(gradient, rightGradient, axes);
-      free(reduce_axes);
-      free(axes);
-    }
-  }
+  accumulate_grad(gradient, idx == 0 ? leftGradient : rightGradient);
 }
 
 void multiplication_grad(Array *gradient, int idx, Array *output, Array *left,
                          Array *right, Array *leftGradient,
                          Array *rightGradient) {
-  Array *temp;
-  if (idx == 0) {
-    temp = create_full_struct(0.0f, gradient->ndim, gradient->shape);
-    // Determine broadcasted dimensions for left
-    int ndim_diff = gradient->ndim - left->ndim;
-    if (ndim_diff == 0) {
-      multiplication(temp, gradient, right);
-      add(leftGradient, temp, leftGradient);
-    } else {
-      binary_array_iterator(gradient, right, temp, multiply_lambda);
-      int *reduce_axes = (int *)malloc(ndim_diff * sizeof(int));
-      for (int i = 0; i < ndim_diff; i++) reduce_axes[i] = i;
-
-      c_tuple *axes = (c_tuple *)malloc(ndim_diff * sizeof(c_tuple));
-      axes->size = ndim_diff;
-      axes->data = reduce_axes;
-      reduce_sum(temp, leftGradient, axes);
-      free(reduce_axes);
-      free(axes);
-    }
-  } else {
-    temp = create_full_struct(0.0f, gradient->ndim, gradient->shape);
-    int ndim_diff = gradient->ndim - right->ndim;
-    if (ndim_diff == 0) {
-      multiplication(temp, gradient, left);
-      add(rightGradient, temp, rightGradient);
-    } else {
-      binary_array_iterator(gradient, left, temp, multiply_lambda);
-      // Determine broadcasted dimensions for right
-      int *reduce_axes = malloc(ndim_diff * sizeof(int));
-      for (int i = 0; i < ndim_diff; i++) reduce_axes[i] = i;
-
-      c_tuple *axes = (c_tuple *)malloc(ndim_diff * sizeof(c_tuple));
-      axes->size = ndim_diff;
-      axes->data = reduce_axes;
-      reduce_sum(temp, rightGradient, axes);
-      free(reduce_axes);
-      free(axes);
-    }
-  }
-  free(temp->data);
-  free(temp->shape);
-  free(temp->strides);
-  free(temp);
+  // Gradient of the operand is the gradient multiplied by the other operand,
+  // summed along the broadcasted dimensions.
+  float *buffer = (float *)malloc(gradient->size * sizeof(float));
+  Array temp = {buffer, gradient->shape, gradient->strides, gradient->ndim,
+                gradient->size};
+  BINARY_ITERATE(gradient, idx == 0 ? right : left, &temp, x * y);
+  accumulate_grad(&temp, idx == 0 ? leftGradient : rightGradient);
+  free(buffer);
 }
 
 void transpose_grad(const Array *gradient, int idx, Array *output,
@@ -385,29 +396,14 @@ void reduce_mean_grad(Array *outputGradient, int idx, Array *output,
                       Array *inputGradient) {
   if (idx != 0) return;
 
-  size_t N = 1;
-  if (axes == NULL) {
-    N = input->size;
-  } else {
-    for (int i = 0; i < axes->size; i++) {
-      // Ensure axes are valid before accessing shape
-      if (axes->data[i] < 0 || axes->data[i] >= input->ndim) {
-        return;
-      }
-      N *= input->shape[axes->data[i]];
-    }
-  }
-
-  int *bcast_strides =
-      broadcastStride(outputGradient, input->shape, input->ndim);
+  int mask[MAX(input->ndim, 1)];
+  reduction_mask(axes, input->ndim, mask);
+  float N = (float)reduction_size(input, axes);
 
   for (size_t i = 0; i < input->size; i++) {
-    size_t grad_idx = loc(i, input->shape, bcast_strides, input->ndim);
-    inputGradient->data[i] +=
-        outputGradient->data[grad_idx] /
-        (float)N;  // Explicit cast to float for clarity if data is float
+    size_t grad_idx = reduced_index(i, input->shape, mask, input->ndim);
+    inputGradient->data[i] += outputGradient->data[grad_idx] / N;
   }
-  free(bcast_strides);
 }
 
 void matrix_multiplication_grad(const Array *gradient, int idx, Array *output,
@@ -431,22 +427,12 @@ void matrix_multiplication_grad(const Array *gradient, int idx, Array *output,
     exit(EXIT_FAILURE);
   }
 
-  // Zero out gradients leftGradient and rightGradient.
-  if (idx == 0) {
-    for (size_t i = 0; i < leftGradient->size; i++) {
-      leftGradient->data[i] = 0.0f;
-    }
-  } else {
-    for (size_t i = 0; i < rightGradient->size; i++) {
-      rightGradient->data[i] = 0.0f;
-    }
-  }
-
   // Total number of broadcasted batches in gradient.
   int batch_size = prod(gradient->shape, gradient_batch_ndim);
 
-#pragma omp parallel for
-  // Iterate over each broadcasted batch.
+  // Batches are iterated in order since gradients of broadcasted operands
+  // are accumulated over batches, rows of the gradients are computed in
+  // parallel. Operands are contiguous, so innermost loops run over rows.
   for (int b = 0; b < batch_size; b++) {
     size_t left_base_offset =
         loc(b, left->shape, left->strides, left_batch_ndim);
@@ -454,50 +440,774 @@ void matrix_multiplication_grad(const Array *gradient, int idx, Array *output,
         loc(b, right->shape, right->strides, right_batch_ndim);
     size_t gradient_base_offset =
         loc(b, gradient->shape, gradient->strides, gradient_batch_ndim);
+    const float *G = gradient->data + gradient_base_offset;
 
     if (idx == 0) {
       // --- Compute gradient for Left ---
       // leftGradient[i, k] += sum_j gradient[i, j] * right[k, j]
+      const float *B = right->data + right_base_offset;
+      float *dA = leftGradient->data + left_base_offset;
+#pragma omp parallel for
       for (int i = 0; i < M; i++) {
         for (int k = 0; k < K; k++) {
           float grad = 0.0f;
+#pragma omp simd reduction(+ : grad)
           for (int j = 0; j < N; j++) {
-            size_t gradient_idx = gradient_base_offset +
-                                  i * gradient->strides[gradient->ndim - 2] +
-                                  j * gradient->strides[gradient->ndim - 1];
-            size_t right_idx = right_base_offset +
-                               k * right->strides[right->ndim - 2] +
-                               j * right->strides[right->ndim - 1];
-            grad += gradient->data[gradient_idx] * right->data[right_idx];
+            grad += G[(size_t)i * N + j] * B[(size_t)k * N + j];
           }
-          size_t leftGradient_idx = left_base_offset +
-                                    i * left->strides[left->ndim - 2] +
-                                    k * left->strides[left->ndim - 1];
-          leftGradient->data[leftGradient_idx] += grad;
+          dA[(size_t)i * K + k] += grad;
         }
       }
     } else {
       // --- Compute gradient for Right ---
-      // dB[k, j] += sum_i left[i, k] * gradient[i, j]
-      for (int j = 0; j < N; j++) {
-        for (int k = 0; k < K; k++) {
-          float grad = 0.0f;
-          for (int i = 0; i < M; i++) {
-            size_t gradient_idx = gradient_base_offset +
-                                  i * gradient->strides[gradient->ndim - 2] +
-                                  j * gradient->strides[gradient->ndim - 1];
-            size_t A_idx = left_base_offset +
-                           i * left->strides[left->ndim - 2] +
-                           k * left->strides[left->ndim - 1];
-            grad += left->data[A_idx] * gradient->data[gradient_idx];
+      // rightGradient[k, j] += sum_i left[i, k] * gradient[i, j]
+      const float *A = left->data + left_base_offset;
+      float *dB = rightGradient->data + right_base_offset;
+#pragma omp parallel for
+      for (int k = 0; k < K; k++) {
+        float *dB_row = dB + (size_t)k * N;
+        for (int i = 0; i < M; i++) {
+          const float a = A[(size_t)i * K + k];
+          const float *g_row = G + (size_t)i * N;
+#pragma omp simd
+          for (int j = 0; j < N; j++) dB_row[j] += a * g_row[j];
+        }
+      }
+    }
+  }
+}
+/* Element-wise functions. Their gradients are computed from the input or the
+ * output of the forward pass, which have the shape of the output. */
+#define UNARY_ITERATE(output, input, expr)        \
+  do {                                            \
+    const float *_in = (input)->data;             \
+    float *_out = (output)->data;                 \
+    _Pragma("omp simd") for (size_t _i = 0; _i < (output)->size; _i++) { \
+      float x = _in[_i];                          \
+      _out[_i] = (expr);                          \
+    }                                             \
+  } while (0)
+
+#define UNARY_GRAD_ITERATE(inputGradient, gradient, output, input, expr) \
+  do {                                                                  \
+    const float *_g = (gradient)->data, *_out = (output)->data;         \
+    const float *_in = (input)->data;                                   \
+    float *_ig = (inputGradient)->data;                                 \
+    _Pragma("omp simd") for (size_t _i = 0; _i < (gradient)->size; _i++) { \
+      float g = _g[_i], y = _out[_i], x = _in[_i];                      \
+      (void)y;                                                          \
+      (void)x;                                                          \
+      _ig[_i] += (expr);                                                \
+    }                                                                   \
+  } while (0)
+
+void sigmoid(Array *output, const Array *input) {
+  // Computed with respect to the sign of input for numerical stability.
+  UNARY_ITERATE(output, input,
+                x >= 0.0f ? 1.0f / (1.0f + expf(-x))
+                          : expf(x) / (1.0f + expf(x)));
+}
+
+void sigmoid_grad(const Array *gradient, int idx, Array *output,
+                  const Array *input, Array *inputGradient) {
+  UNARY_GRAD_ITERATE(inputGradient, gradient, output, input,
+                     g * y * (1.0f - y));
+}
+
+void array_tanh(Array *output, const Array *input) {
+  UNARY_ITERATE(output, input, tanhf(x));
+}
+
+void tanh_grad(const Array *gradient, int idx, Array *output,
+               const Array *input, Array *inputGradient) {
+  UNARY_GRAD_ITERATE(inputGradient, gradient, output, input,
+                     g * (1.0f - y * y));
+}
+
+void array_exp(Array *output, const Array *input) {
+  UNARY_ITERATE(output, input, expf(x));
+}
+
+void exp_grad(const Array *gradient, int idx, Array *output,
+              const Array *input, Array *inputGradient) {
+  UNARY_GRAD_ITERATE(inputGradient, gradient, output, input, g * y);
+}
+
+void array_log(Array *output, const Array *input) {
+  UNARY_ITERATE(output, input, logf(x));
+}
+
+void log_grad(const Array *gradient, int idx, Array *output,
+              const Array *input, Array *inputGradient) {
+  UNARY_GRAD_ITERATE(inputGradient, gradient, output, input, g / x);
+}
+
+void array_sqrt(Array *output, const Array *input) {
+  UNARY_ITERATE(output, input, sqrtf(x));
+}
+
+void sqrt_grad(const Array *gradient, int idx, Array *output,
+               const Array *input, Array *inputGradient) {
+  UNARY_GRAD_ITERATE(inputGradient, gradient, output, input,
+                     g / (2.0f * y));
+}
+
+void subtract_grad(Array *gradient, int idx, Array *output, Array *left,
+                   Array *right, Array *leftGradient, Array *rightGradient) {
+  if (idx == 0) {
+    accumulate_grad(gradient, leftGradient);
+    return;
+  }
+  float *buffer = (float *)malloc(gradient->size * sizeof(float));
+  Array temp = {buffer, gradient->shape, gradient->strides, gradient->ndim,
+                gradient->size};
+  UNARY_ITERATE(&temp, gradient, -x);
+  accumulate_grad(&temp, rightGradient);
+  free(buffer);
+}
+
+void divide(Array *output, Array *numerator, Array *denominator) {
+  BINARY_ITERATE(numerator, denominator, output, x / y);
+}
+
+void divide_grad(Array *gradient, int idx, Array *output, Array *numerator,
+                 Array *denominator, Array *numeratorGradient,
+                 Array *denominatorGradient) {
+  float *buffer = (float *)malloc(gradient->size * sizeof(float));
+  Array temp = {buffer, gradient->shape, gradient->strides, gradient->ndim,
+                gradient->size};
+  if (idx == 0) {
+    // d(x / y) / dx = 1 / y
+    BINARY_ITERATE(gradient, denominator, &temp, x / y);
+    accumulate_grad(&temp, numeratorGradient);
+  } else {
+    // d(x / y) / dy = -(x / y) / y
+    BINARY_ITERATE(gradient, output, &temp, x * y);
+    BINARY_ITERATE(&temp, denominator, &temp, -x / y);
+    accumulate_grad(&temp, denominatorGradient);
+  }
+  free(buffer);
+}
+
+void variance(Array *output, Array *input, const c_tuple *axes, bool keepdim,
+              float correction) {
+  int mask[MAX(input->ndim, 1)];
+  reduction_mask(axes, input->ndim, mask);
+  size_t N = reduction_size(input, axes);
+
+  float *mean = (float *)calloc(output->size, sizeof(float));
+  for (size_t i = 0; i < input->size; i++) {
+    mean[reduced_index(i, input->shape, mask, input->ndim)] += input->data[i];
+  }
+  for (size_t i = 0; i < output->size; i++) {
+    mean[i] /= N;
+    output->data[i] = 0.0f;
+  }
+  for (size_t i = 0; i < input->size; i++) {
+    size_t j = reduced_index(i, input->shape, mask, input->ndim);
+    float diff = input->data[i] - mean[j];
+    output->data[j] += diff * diff;
+  }
+  for (size_t i = 0; i < output->size; i++) {
+    output->data[i] /= (N - correction);
+  }
+  free(mean);
+}
+
+void variance_grad(Array *gradient, int idx, Array *output, Array *input,
+                   const c_tuple *axes, bool keepdim, float correction,
+                   Array *inputGradient) {
+  int mask[MAX(input->ndim, 1)];
+  reduction_mask(axes, input->ndim, mask);
+  size_t N = reduction_size(input, axes);
+
+  float *mean = (float *)calloc(output->size, sizeof(float));
+  for (size_t i = 0; i < input->size; i++) {
+    mean[reduced_index(i, input->shape, mask, input->ndim)] += input->data[i];
+  }
+  for (size_t i = 0; i < output->size; i++) mean[i] /= N;
+
+  float scale = 2.0f / (N - correction);
+  for (size_t i = 0; i < input->size; i++) {
+    size_t j = reduced_index(i, input->shape, mask, input->ndim);
+    inputGradient->data[i] +=
+        scale * (input->data[i] - mean[j]) * gradient->data[j];
+  }
+  free(mean);
+}
+
+/* Views the contiguous array as (outer, shape[axis], inner) */
+static void axis_view(const Array *arr, int axis, size_t *outer, size_t *len,
+                      size_t *inner) {
+  *outer = prod(arr->shape, axis);
+  *len = arr->shape[axis];
+  *inner = prod(arr->shape + axis + 1, arr->ndim - axis - 1);
+}
+
+void softmax(Array *output, const Array *input, int axis) {
+  size_t outer, len, inner;
+  axis_view(input, normalize_axis(axis, input->ndim), &outer, &len, &inner);
+
+#pragma omp parallel for collapse(2) if (outer * inner > 1)
+  for (size_t o = 0; o < outer; o++) {
+    for (size_t i = 0; i < inner; i++) {
+      const float *x = input->data + o * len * inner + i;
+      float *y = output->data + o * len * inner + i;
+      float max = -INFINITY, sum = 0.0f;
+      for (size_t k = 0; k < len; k++) max = fmaxf(max, x[k * inner]);
+      for (size_t k = 0; k < len; k++) {
+        y[k * inner] = expf(x[k * inner] - max);
+        sum += y[k * inner];
+      }
+      for (size_t k = 0; k < len; k++) y[k * inner] /= sum;
+    }
+  }
+}
+
+void softmax_grad(const Array *gradient, int idx, Array *output,
+                  const Array *input, int axis, Array *inputGradient) {
+  // dx = y * (g - sum(g * y)) along the axis
+  size_t outer, len, inner;
+  axis_view(input, normalize_axis(axis, input->ndim), &outer, &len, &inner);
+
+#pragma omp parallel for collapse(2) if (outer * inner > 1)
+  for (size_t o = 0; o < outer; o++) {
+    for (size_t i = 0; i < inner; i++) {
+      size_t base = o * len * inner + i;
+      const float *g = gradient->data + base, *y = output->data + base;
+      float *dx = inputGradient->data + base;
+      float dot = 0.0f;
+      for (size_t k = 0; k < len; k++) dot += g[k * inner] * y[k * inner];
+      for (size_t k = 0; k < len; k++) {
+        dx[k * inner] += y[k * inner] * (g[k * inner] - dot);
+      }
+    }
+  }
+}
+
+/* Fills the weights of the classes (the second dimension of input). If
+ * weights are requested, classes are weighted inversely proportional to
+ * their frequencies in target, otherwise all weights are 1 */
+static void class_weights(const Array *input, const Array *target,
+                          bool weights, bool categorical, float *result) {
+  size_t C = input->shape[1];
+  for (size_t c = 0; c < C; c++) result[c] = weights ? 0.0f : 1.0f;
+  if (!weights) return;
+
+  float total = 0.0f;
+  if (categorical) {
+    for (size_t i = 0; i < target->size; i++) result[(int)target->data[i]]++;
+    total = target->size;
+  } else {
+    size_t outer, len, inner;
+    axis_view(target, 1, &outer, &len, &inner);
+    for (size_t o = 0; o < outer; o++) {
+      for (size_t c = 0; c < len; c++) {
+        for (size_t i = 0; i < inner; i++) {
+          float value = target->data[(o * len + c) * inner + i];
+          result[c] += value;
+          total += value;
+        }
+      }
+    }
+  }
+  for (size_t c = 0; c < C; c++) result[c] = total / (result[c] * C);
+}
+
+/* Logarithm which is linearized below the threshold to stay finite */
+static inline float robust_logf(float x, float threshold) {
+  x = fabsf(x);
+  return x < threshold ? logf(threshold) + x / threshold - 1.0f : logf(x);
+}
+
+static inline float robust_log_gradf(float x, float threshold) {
+  return fabsf(x) < threshold ? copysignf(1.0f / threshold, x) : 1.0f / x;
+}
+
+/* Cross entropy of the class probabilities in the second dimension of input.
+ * Target holds either class indices (categorical) or probabilities of the
+ * shape of input */
+void cross_entropy(Array *output, const Array *input, const Array *target,
+                   bool weights, bool categorical, const Array *threshold,
+                   bool robust) {
+  size_t outer, C, inner;
+  axis_view(input, 1, &outer, &C, &inner);
+  float w[C];
+  class_weights(input, target, weights, categorical, w);
+  float eps = threshold->data[0];
+
+  for (size_t o = 0; o < outer; o++) {
+    for (size_t i = 0; i < inner; i++) {
+      const float *x = input->data + o * C * inner + i;
+      float loss = 0.0f;
+      if (categorical) {
+        int t = (int)target->data[o * inner + i];
+        float p = x[t * inner];
+        loss = -(robust ? robust_logf(p, eps) : logf(p)) * w[t];
+      } else {
+        const float *y = target->data + o * C * inner + i;
+        for (size_t c = 0; c < C; c++) {
+          float p = x[c * inner];
+          loss -= y[c * inner] * (robust ? robust_logf(p, eps) : logf(p)) * w[c];
+        }
+      }
+      output->data[o * inner + i] = loss;
+    }
+  }
+}
+
+void cross_entropy_grad(const Array *gradient, int idx, Array *output,
+                        const Array *input, const Array *target, bool weights,
+                        bool categorical, const Array *threshold, bool robust,
+                        Array *inputGradient, Array *targetGradient,
+                        Array *thresholdGradient) {
+  if (idx != 0) return;
+  size_t outer, C, inner;
+  axis_view(input, 1, &outer, &C, &inner);
+  float w[C];
+  class_weights(input, target, weights, categorical, w);
+  float eps = threshold->data[0];
+
+  for (size_t o = 0; o < outer; o++) {
+    for (size_t i = 0; i < inner; i++) {
+      size_t base = o * C * inner + i;
+      float g = gradient->data[o * inner + i];
+      for (size_t c = 0; c < C; c++) {
+        float p = input->data[base + c * inner];
+        float y = categorical ? (size_t)target->data[o * inner + i] == c
+                              : target->data[base + c * inner];
+        float log_grad = robust ? robust_log_gradf(p, eps) : 1.0f / p;
+        inputGradient->data[base + c * inner] -= g * y * w[c] * log_grad;
+      }
+    }
+  }
+}
+
+/* Cross entropy of the logits in the second dimension of input, see
+ * cross_entropy for the target. Logits are normalized by the log-sum-exp of
+ * the logits shifted by their maximum, so robust logarithm is not needed */
+void cross_entropy_with_logits(Array *output, const Array *input,
+                               const Array *target, bool weights,
+                               bool categorical, const Array *threshold,
+                               bool robust) {
+  size_t outer, C, inner;
+  axis_view(input, 1, &outer, &C, &inner);
+  float w[C];
+  class_weights(input, target, weights, categorical, w);
+
+  for (size_t o = 0; o < outer; o++) {
+    for (size_t i = 0; i < inner; i++) {
+      const float *x = input->data + o * C * inner + i;
+      float max = -INFINITY, sum = 0.0f;
+      for (size_t c = 0; c < C; c++) max = fmaxf(max, x[c * inner]);
+      for (size_t c = 0; c < C; c++) sum += expf(x[c * inner] - max);
+      float log_norm = max + logf(sum);
+
+      float loss = 0.0f;
+      if (categorical) {
+        int t = (int)target->data[o * inner + i];
+        loss = (log_norm - x[t * inner]) * w[t];
+      } else {
+        const float *y = target->data + o * C * inner + i;
+        for (size_t c = 0; c < C; c++) {
+          loss -= y[c * inner] * (x[c * inner] - log_norm) * w[c];
+        }
+      }
+      output->data[o * inner + i] = loss;
+    }
+  }
+}
+
+void cross_entropy_with_logits_grad(const Array *gradient, int idx,
+                                    Array *output, const Array *input,
+                                    const Array *target, bool weights,
+                                    bool categorical, const Array *threshold,
+                                    bool robust, Array *inputGradient,
+                                    Array *targetGradient,
+                                    Array *thresholdGradient) {
+  // dx_c = g * (softmax(x)_c * sum_k(y_k * w_k) - y_c * w_c)
+  if (idx != 0) return;
+  size_t outer, C, inner;
+  axis_view(input, 1, &outer, &C, &inner);
+  float w[C];
+  class_weights(input, target, weights, categorical, w);
+
+  for (size_t o = 0; o < outer; o++) {
+    for (size_t i = 0; i < inner; i++) {
+      size_t base = o * C * inner + i;
+      const float *x = input->data + base;
+      float g = gradient->data[o * inner + i];
+      float max = -INFINITY, sum = 0.0f, target_sum = 0.0f;
+      for (size_t c = 0; c < C; c++) max = fmaxf(max, x[c * inner]);
+      for (size_t c = 0; c < C; c++) sum += expf(x[c * inner] - max);
+
+      float y[C];
+      for (size_t c = 0; c < C; c++) {
+        y[c] = categorical ? (size_t)target->data[o * inner + i] == c
+                           : target->data[base + c * inner];
+        target_sum += y[c] * w[c];
+      }
+      for (size_t c = 0; c < C; c++) {
+        float p = expf(x[c * inner] - max) / sum;
+        inputGradient->data[base + c * inner] +=
+            g * (p * target_sum - y[c] * w[c]);
+      }
+    }
+  }
+}
+
+/* Parameters of 2D windowed operations. Padding is either symmetric (pad_h,
+ * pad_w) or given for both sides ((top, bottom), (left, right)) */
+typedef struct {
+  int N, C, H, W, out_h, out_w, k_h, k_w, s_h, s_w, p_t, p_l, d_h, d_w;
+} Window2D;
+
+static Window2D window_2d(const Array *input, const Array *output, int k_h,
+                          int k_w, const c_tuple *stride,
+                          const c_tuple *padding, const c_tuple *dilation) {
+  Window2D win;
+  win.N = prod(input->shape, input->ndim - 3);
+  win.C = input->shape[input->ndim - 3];
+  win.H = input->shape[input->ndim - 2];
+  win.W = input->shape[input->ndim - 1];
+  win.out_h = output->shape[output->ndim - 2];
+  win.out_w = output->shape[output->ndim - 1];
+  win.k_h = k_h;
+  win.k_w = k_w;
+  win.s_h = stride->data[0];
+  win.s_w = stride->data[1];
+  win.p_t = padding->data[0];
+  win.p_l = padding->size == 4 ? padding->data[2] : padding->data[1];
+  win.d_h = dilation->data[0];
+  win.d_w = dilation->data[1];
+  return win;
+}
+
+/* Range of output columns [lo, hi) whose kw'th kernel column falls into the
+ * input, so that inner loops do not need bound checks */
+static void valid_columns(const Window2D *w, int kw, int *lo, int *hi) {
+  int offset = kw * w->d_w - w->p_l;
+  *lo = offset < 0 ? (-offset + w->s_w - 1) / w->s_w : 0;
+  *hi = w->W - offset <= 0 ? 0 : (w->W - offset + w->s_w - 1) / w->s_w;
+  *hi = MIN(*hi, w->out_w);
+}
+
+/* Accumulates the convolution of input with weight into output (or the
+ * gradient of input if transposed) */
+static void conv2d_accumulate(Window2D w, const float *input,
+                              const float *weight, float *output, int out_c,
+                              int groups) {
+  int in_per_group = w.C / groups, out_per_group = out_c / groups;
+
+#pragma omp parallel for collapse(2)
+  for (int n = 0; n < w.N; n++) {
+    for (int oc = 0; oc < out_c; oc++) {
+      int g = oc / out_per_group;
+      float *out = output + ((size_t)n * out_c + oc) * w.out_h * w.out_w;
+      for (int ic = 0; ic < in_per_group; ic++) {
+        const float *in =
+            input + ((size_t)n * w.C + g * in_per_group + ic) * w.H * w.W;
+        const float *k =
+            weight + ((size_t)oc * in_per_group + ic) * w.k_h * w.k_w;
+        for (int kh = 0; kh < w.k_h; kh++) {
+          for (int kw = 0; kw < w.k_w; kw++) {
+            float kv = k[kh * w.k_w + kw];
+            int lo, hi;
+            valid_columns(&w, kw, &lo, &hi);
+            for (int oh = 0; oh < w.out_h; oh++) {
+              int ih = oh * w.s_h + kh * w.d_h - w.p_t;
+              if (ih < 0 || ih >= w.H) continue;
+              const float *in_row = in + (size_t)ih * w.W + kw * w.d_w - w.p_l;
+              float *out_row = out + (size_t)oh * w.out_w;
+#pragma omp simd
+              for (int ow = lo; ow < hi; ow++) {
+                out_row[ow] += kv * in_row[ow * w.s_w];
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+
+void conv2d(Array *output, const Array *input, const Array *weight,
+            const c_tuple *stride, const c_tuple *padding,
+            const c_tuple *dilation, int groups) {
+  Window2D w = window_2d(input, output, weight->shape[2], weight->shape[3],
+                         stride, padding, dilation);
+  memset(output->data, 0, output->size * sizeof(float));
+  conv2d_accumulate(w, input->data, weight->data, output->data,
+                    weight->shape[0], groups);
+}
+
+void conv2d_bias(Array *output, const Array *input, const Array *weight,
+                 const Array *bias, const c_tuple *stride,
+                 const c_tuple *padding, const c_tuple *dilation, int groups) {
+  conv2d(output, input, weight, stride, padding, dilation, groups);
+  BINARY_ITERATE(output, bias, output, x + y);
+}
+
+void conv2d_grad(const Array *gradient, int idx, Array *output,
+                 const Array *input, const Array *weight,
+                 const c_tuple *stride, const c_tuple *padding,
+                 const c_tuple *dilation, int groups, Array *inputGradient,
+                 Array *weightGradient) {
+  Window2D w = window_2d(input, output, weight->shape[2], weight->shape[3],
+                         stride, padding, dilation);
+  int out_c = weight->shape[0];
+  int in_per_group = w.C / groups, out_per_group = out_c / groups;
+
+  if (idx == 0) {
+    // Gradient of each input element is scattered from the outputs it
+    // contributes to, parallelized over samples to avoid races.
+#pragma omp parallel for
+    for (int n = 0; n < w.N; n++) {
+      for (int oc = 0; oc < out_c; oc++) {
+        int g = oc / out_per_group;
+        const float *go =
+            gradient->data + ((size_t)n * out_c + oc) * w.out_h * w.out_w;
+        for (int ic = 0; ic < in_per_group; ic++) {
+          float *gi = inputGradient->data +
+                      ((size_t)n * w.C + g * in_per_group + ic) * w.H * w.W;
+          const float *k =
+              weight->data + ((size_t)oc * in_per_group + ic) * w.k_h * w.k_w;
+          for (int kh = 0; kh < w.k_h; kh++) {
+            for (int kw = 0; kw < w.k_w; kw++) {
+              float kv = k[kh * w.k_w + kw];
+              int lo, hi;
+              valid_columns(&w, kw, &lo, &hi);
+              for (int oh = 0; oh < w.out_h; oh++) {
+                int ih = oh * w.s_h + kh * w.d_h - w.p_t;
+                if (ih < 0 || ih >= w.H) continue;
+                float *gi_row = gi + (size_t)ih * w.W + kw * w.d_w - w.p_l;
+                const float *go_row = go + (size_t)oh * w.out_w;
+                for (int ow = lo; ow < hi; ow++) {
+                  gi_row[ow * w.s_w] += kv * go_row[ow];
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  } else if (idx == 1) {
+    // Each weight element accumulates over samples and output positions.
+#pragma omp parallel for collapse(2)
+    for (int oc = 0; oc < out_c; oc++) {
+      for (int ic = 0; ic < in_per_group; ic++) {
+        int g = oc / out_per_group;
+        float *gk =
+            weightGradient->data + ((size_t)oc * in_per_group + ic) * w.k_h * w.k_w;
+        for (int kh = 0; kh < w.k_h; kh++) {
+          for (int kw = 0; kw < w.k_w; kw++) {
+            int lo, hi;
+            valid_columns(&w, kw, &lo, &hi);
+            float sum = 0.0f;
+            for (int n = 0; n < w.N; n++) {
+              const float *in = input->data +
+                                ((size_t)n * w.C + g * in_per_group + ic) * w.H * w.W;
+              const float *go =
+                  gradient->data + ((size_t)n * out_c + oc) * w.out_h * w.out_w;
+              for (int oh = 0; oh < w.out_h; oh++) {
+                int ih = oh * w.s_h + kh * w.d_h - w.p_t;
+                if (ih < 0 || ih >= w.H) continue;
+                const float *in_row =
+                    in + (size_t)ih * w.W + kw * w.d_w - w.p_l;
+                const float *go_row = go + (size_t)oh * w.out_w;
+#pragma omp simd reduction(+ : sum)
+                for (int ow = lo; ow < hi; ow++) {
+                  sum += in_row[ow * w.s_w] * go_row[ow];
+                }
+              }
+            }
+            gk[kh * w.k_w + kw] += sum;
           }
-          // Here, we treat B as if its shape is [N, K]
-          size_t rightGradient_idx = right_base_offset +
-                                     k * right->strides[right->ndim - 2] +
-                                     j * right->strides[right->ndim - 1];
-          rightGradient->data[rightGradient_idx] += grad;
         }
       }
     }
   }
-}
\ No newline at end of file
+}
+
+void conv2d_bias_grad(const Array *gradient, int idx, Array *output,
+                      const Array *input, const Array *weight,
+                      const Array *bias, const c_tuple *stride,
+                      const c_tuple *padding, const c_tuple *dilation,
+                      int groups, Array *inputGradient, Array *weightGradient,
+                      Array *biasGradient) {
+  if (idx == 2) {
+    accumulate_grad(gradient, biasGradient);
+  } else {
+    conv2d_grad(gradient, idx, output, input, weight, stride, padding,
+                dilation, groups, inputGradient, weightGradient);
+  }
+}
+
+/* Iterates over the windows of 2D pooling, `body` is evaluated for each
+ * output element with `in` pointing to its input channel and `out_idx` to
+ * its index. Padded elements of windows are skipped */
+#define POOL2D_ITERATE(w, input, body)                                     \
+  _Pragma("omp parallel for collapse(2)") for (int nc = 0;                 \
+                                               nc < (w).N * (w).C; nc++) { \
+    for (int oh = 0; oh < (w).out_h; oh++) {                               \
+      for (int ow = 0; ow < (w).out_w; ow++) {                             \
+        const float *in = (input) + (size_t)nc * (w).H * (w).W;            \
+        int h_start = oh * (w).s_h - (w).p_t;                              \
+        int w_start = ow * (w).s_w - (w).p_l;                              \
+        size_t out_idx = ((size_t)nc * (w).out_h + oh) * (w).out_w + ow;   \
+        body                                                               \
+      }                                                                    \
+    }                                                                      \
+  }
+
+#define WINDOW_ITERATE(w, body)                               \
+  for (int kh = 0; kh < (w).k_h; kh++) {                      \
+    int ih = h_start + kh * (w).d_h;                          \
+    if (ih < 0 || ih >= (w).H) continue;                      \
+    for (int kw = 0; kw < (w).k_w; kw++) {                    \
+      int iw = w_start + kw * (w).d_w;                        \
+      if (iw < 0 || iw >= (w).W) continue;                    \
+      size_t in_idx = (size_t)ih * (w).W + iw;                \
+      body                                                    \
+    }                                                         \
+  }
+
+void max_pool2d(Array *output, const Array *input, const c_tuple *kernel_size,
+                const c_tuple *stride, const c_tuple *padding,
+                const c_tuple *dilation) {
+  Window2D w = window_2d(input, output, kernel_size->data[0],
+                         kernel_size->data[1], stride, padding, dilation);
+  POOL2D_ITERATE(w, input->data, {
+    float max = -INFINITY;
+    WINDOW_ITERATE(w, { max = fmaxf(max, in[in_idx]); });
+    output->data[out_idx] = max;
+  })
+}
+
+void max_pool2d_grad(const Array *gradient, int idx, Array *output,
+                     const Array *input, const c_tuple *kernel_size,
+                     const c_tuple *stride, const c_tuple *padding,
+                     const c_tuple *dilation, Array *inputGradient) {
+  // Gradient is routed to the first maximum of each window. Windows may
+  // overlap, so gradients are accumulated atomically.
+  Window2D w = window_2d(input, output, kernel_size->data[0],
+                         kernel_size->data[1], stride, padding, dilation);
+  POOL2D_ITERATE(w, input->data, {
+    float max = -INFINITY;
+    size_t max_idx = 0;
+    WINDOW_ITERATE(w, {
+      if (in[in_idx] > max) {
+        max = in[in_idx];
+        max_idx = in_idx;
+      }
+    });
+    float *gi = inputGradient->data + (size_t)nc * w.H * w.W;
+    _Pragma("omp atomic") gi[max_idx] += gradient->data[out_idx];
+  })
+}
+
+void avg_pool2d(Array *output, const Array *input, const c_tuple *kernel_size,
+                const c_tuple *stride, const c_tuple *padding,
+                const c_tuple *dilation) {
+  // Padded elements are not counted.
+  Window2D w = window_2d(input, output, kernel_size->data[0],
+                         kernel_size->data[1], stride, padding, dilation);
+  POOL2D_ITERATE(w, input->data, {
+    float sum = 0.0f;
+    int count = 0;
+    WINDOW_ITERATE(w, {
+      sum += in[in_idx];
+      count++;
+    });
+    output->data[out_idx] = sum / count;
+  })
+}
+
+void avg_pool2d_grad(const Array *gradient, int idx, Array *output,
+                     const Array *input, const c_tuple *kernel_size,
+                     const c_tuple *stride, const c_tuple *padding,
+                     const c_tuple *dilation, Array *inputGradient) {
+  Window2D w = window_2d(input, output, kernel_size->data[0],
+                         kernel_size->data[1], stride, padding, dilation);
+  POOL2D_ITERATE(w, input->data, {
+    int count = 0;
+    WINDOW_ITERATE(w, { count++; });
+    float g = gradient->data[out_idx] / count;
+    float *gi = inputGradient->data + (size_t)nc * w.H * w.W;
+    WINDOW_ITERATE(w, { _Pragma("omp atomic") gi[in_idx] += g; });
+  })
+}
+
+void broadcast_to(Array *output, const Array *input, const c_tuple *shape) {
+  size_t m = trailing_broadcast_size(input, output);
+  if (m > 0) {
+    for (size_t i = 0; i < output->size; i += m) {
+      memcpy(output->data + i, input->data, m * sizeof(float));
+    }
+    return;
+  }
+  int strides[output->ndim];
+  broadcast_strides_into(input, output->shape, output->ndim, strides);
+  for (size_t i = 0; i < output->size; i++) {
+    output->data[i] = input->data[loc(i, output->shape, strides, output->ndim)];
+  }
+}
+
+void broadcast_to_grad(const Array *gradient, int idx, Array *output,
+                       const Array *input, const c_tuple *shape,
+                       Array *inputGradient) {
+  accumulate_grad(gradient, inputGradient);
+}
+
+void reshape(Array *output, const Array *input, const c_tuple *shape) {
+  // Arrays are contiguous, so only the data is copied.
+  if (output->data != input->data) {
+    memcpy(output->data, input->data, input->size * sizeof(float));
+  }
+}
+
+void reshape_grad(const Array *gradient, int idx, Array *output,
+                  const Array *input, const c_tuple *shape,
+                  Array *inputGradient) {
+#pragma omp simd
+  for (size_t i = 0; i < gradient->size; i++) {
+    inputGradient->data[i] += gradient->data[i];
+  }
+}
+
+void concat(Array *output, const Array **inputs, int num_inputs, int axis) {
+  // Inputs are copied as blocks of their (outer, shape[axis] * inner) views.
+  size_t outer, len, inner;
+  axis = normalize_axis(axis, output->ndim);
+  axis_view(output, axis, &outer, &len, &inner);
+  size_t offset = 0;
+  for (int k = 0; k < num_inputs; k++) {
+    size_t block = inputs[k]->shape[axis] * inner;
+    for (size_t o = 0; o < outer; o++) {
+      memcpy(output->data + o * len * inner + offset,
+             inputs[k]->data + o * block, block * sizeof(float));
+    }
+    offset += block;
+  }
+}
+
+void concat_grad(const Array *gradient, int idx, Array *output,
+                 const Array **inputs, int num_inputs, int axis,
+                 Array **inputGradients) {
+  size_t outer, len, inner;
+  axis = normalize_axis(axis, output->ndim);
+  axis_view(output, axis, &outer, &len, &inner);
+  size_t offset = 0;
+  for (int k = 0; k < num_inputs; k++) {
+    size_t block = inputs[k]->shape[axis] * inner;
+    if (inputGradients[k] != NULL) {
+      for (size_t o = 0; o < outer; o++) {
+        const float *g = gradient->data + o * len * inner + offset;
+        float *gi = inputGradients[k]->data + o * block;
+#pragma omp simd
+        for (size_t i = 0; i < block; i++) gi[i] += g[i];
+      }
+    }
+    offset += block;
+  }
+}
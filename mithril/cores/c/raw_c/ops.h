@@ -22,35 +22,141 @@
 
 #define MAX(a, b) ((a) > (b) ? (a) : (b))
 
-void add(Array *output, Array *left, Array *right);
-void multiplication(Array *output, Array *left, Array *right);
-void subtract(Array *output, Array *left, Array *right);
-void matrix_multiplication(Array *output, const Array *left,
-                           const Array *right);
-void transpose(Array *output, const Array *input, const c_tuple *axes);
-void transpose_grad(const Array *gradient, int idx, Array *output,
-                    const Array *input, const c_tuple *axes,
-                    Array *inputGradient);
-void matrix_multiplication_grad(const Array *gradient, int idx, Array *output,
-                                const Array *left, const Array *right,
-                                Array *leftGradient, Array *rightGradient);
-void add_grad(Array *gradient, int idx, Array *output, Array *left,
-              Array *right, Array *leftGradient, Array *rightGradient);
-void multiplication_grad(Array *gradient, int idx, Array *output, Array *left,
-                         Array *right, Array *leftGradient,
-                         Array *rightGradient);
-void reduce_sum(const Array *input, Array *output, const c_tuple *axes);
-void relu(Array *output, const Array *input);
-void relu_grad(const Array *outputGradient, int idx, Array *output,
-               Array *input, Array *inputGradient);
-void squared_error(Array *output, Array *input, Array *target);
-void squared_error_grad(Array *outputGradient, int idx, Array *output,
-                        Array *input, Array *target, Array *inputGradient,
-                        Array *targetGradient);
-void reduce_mean(Array *output, Array *input, const c_tuple *axes,
-                 bool keepdim);
-void reduce_mean_grad(Array *outputGradient, int idx, Array *output,
-                      Array *input, const c_tuple *axes, bool keepdim,
-                      Array *inputGradient);
+MITHRIL_API void add(Array *output, Array *left, Array *right);
+MITHRIL_API void multiplication(Array *output, Array *left, Array *right);
+MITHRIL_API void subtract(Array *output, Array *left, Array *right);
+MITHRIL_API void matrix_multiplication(Array *output, const Array *left,
+                                       const Array *right);
+MITHRIL_API void transpose(Array *output, const Array *input,
+                           const c_tuple *axes);
+MITHRIL_API void transpose_grad(const Array *gradient, int idx, Array *output,
+                                const Array *input, const c_tuple *axes,
+                                Array *inputGradient);
+MITHRIL_API void matrix_multiplication_grad(const Array *gradient, int idx,
+                                            Array *output, const Array *left,
+                                            const Array *right,
+                                            Array *leftGradient,
+                                            Array *rightGradient);
+MITHRIL_API void add_grad(Array *gradient, int idx, Array *output, Array *left,
+                          Array *right, Array *leftGradient,
+                          Array *rightGradient);
+MITHRIL_API void multiplication_grad(Array *gradient, int idx, Array *output,
+                                     Array *left, Array *right,
+                                     Array *leftGradient, Array *rightGradient);
+MITHRIL_API void reduce_sum(const Array *input, Array *output,
+                            const c_tuple *axes);
+MITHRIL_API void relu(Array *output, const Array *input);
+MITHRIL_API void relu_grad(const Array *outputGradient, int idx, Array *output,
+                           Array *input, Array *inputGradient);
+MITHRIL_API void squared_error(Array *output, Array *input, Array *target);
+MITHRIL_API void squared_error_grad(Array *outputGradient, int idx,
+                                    Array *output, Array *input, Array *target,
+                                    Array *inputGradient,
+                                    Array *targetGradient);
+MITHRIL_API void reduce_mean(Array *output, Array *input, const c_tuple *axes,
+                             bool keepdim);
+MITHRIL_API void reduce_mean_grad(Array *outputGradient, int idx, Array *output,
+                                  Array *input, const c_tuple *axes,
+                                  bool keepdim, Array *inputGradient);
+MITHRIL_API void subtract_grad(Array *gradient, int idx, Array *output,
+                               Array *left, Array *right, Array *leftGradient,
+                               Array *rightGradient);
+MITHRIL_API void divide(Array *output, Array *numerator, Array *denominator);
+MITHRIL_API void divide_grad(Array *gradient, int idx, Array *output,
+                             Array *numerator, Array *denominator,
+                             Array *numeratorGradient,
+                             Array *denominatorGradient);
+MITHRIL_API void sigmoid(Array *output, const Array *input);
+MITHRIL_API void sigmoid_grad(const Array *gradient, int idx, Array *output,
+                              const Array *input, Array *inputGradient);
+MITHRIL_API void array_tanh(Array *output, const Array *input);
+MITHRIL_API void tanh_grad(const Array *gradient, int idx, Array *output,
+                           const Array *input, Array *inputGradient);
+MITHRIL_API void array_exp(Array *output, const Array *input);
+MITHRIL_API void exp_grad(const Array *gradient, int idx, Array *output,
+                          const Array *input, Array *inputGradient);
+MITHRIL_API void array_log(Array *output, const Array *input);
+MITHRIL_API void log_grad(const Array *gradient, int idx, Array *output,
+                          const Array *input, Array *inputGradient);
+MITHRIL_API void array_sqrt(Array *output, const Array *input);
+MITHRIL_API void sqrt_grad(const Array *gradient, int idx, Array *output,
+                           const Array *input, Array *inputGradient);
+MITHRIL_API void variance(Array *output, Array *input, const c_tuple *axes,
+                          bool keepdim, float correction);
+MITHRIL_API void variance_grad(Array *gradient, int idx, Array *output,
+                               Array *input, const c_tuple *axes, bool keepdim,
+                               float correction, Array *inputGradient);
+MITHRIL_API void softmax(Array *output, const Array *input, int axis);
+MITHRIL_API void softmax_grad(const Array *gradient, int idx, Array *output,
+                              const Array *input, int axis,
+                              Array *inputGradient);
+MITHRIL_API void cross_entropy(Array *output, const Array *input,
+                               const Array *target, bool weights,
+                               bool categorical, const Array *threshold,
+                               bool robust);
+MITHRIL_API void cross_entropy_grad(const Array *gradient, int idx,
+                                    Array *output, const Array *input,
+                                    const Array *target, bool weights,
+                                    bool categorical, const Array *threshold,
+                                    bool robust, Array *inputGradient,
+                                    Array *targetGradient,
+                                    Array *thresholdGradient);
+MITHRIL_API void cross_entropy_with_logits(Array *output, const Array *input,
+                                           const Array *target, bool weights,
+                                           bool categorical,
+                                           const Array *threshold, bool robust);
+MITHRIL_API void cross_entropy_with_logits_grad(
+    const Array *gradient, int idx, Array *output, const Array *input,
+    const Array *target, bool weights, bool categorical, const Array *threshold,
+    bool robust, Array *inputGradient, Array *targetGradient,
+    Array *thresholdGradient);
+MITHRIL_API void conv2d(Array *output, const Array *input, const Array *weight,
+                        const c_tuple *stride, const c_tuple *padding,
+                        const c_tuple *dilation, int groups);
+MITHRIL_API void conv2d_grad(const Array *gradient, int idx, Array *output,
+                             const Array *input, const Array *weight,
+                             const c_tuple *stride, const c_tuple *padding,
+                             const c_tuple *dilation, int groups,
+                             Array *inputGradient, Array *weightGradient);
+MITHRIL_API void conv2d_bias(Array *output, const Array *input,
+                             const Array *weight, const Array *bias,
+                             const c_tuple *stride, const c_tuple *padding,
+                             const c_tuple *dilation, int groups);
+MITHRIL_API void conv2d_bias_grad(const Array *gradient, int idx, Array *output,
+                                  const Array *input, const Array *weight,
+                                  const Array *bias, const c_tuple *stride,
+                                  const c_tuple *padding,
+                                  const c_tuple *dilation, int groups,
+                                  Array *inputGradient, Array *weightGradient,
+                                  Array *biasGradient);
+MITHRIL_API void max_pool2d(Array *output, const Array *input,
+                            const c_tuple *kernel_size, const c_tuple *stride,
+                            const c_tuple *padding, const c_tuple *dilation);
+MITHRIL_API void max_pool2d_grad(const Array *gradient, int idx, Array *output,
+                                 const Array *input, const c_tuple *kernel_size,
+                                 const c_tuple *stride, const c_tuple *padding,
+                                 const c_tuple *dilation, Array *inputGradient);
+MITHRIL_API void avg_pool2d(Array *output, const Array *input,
+                            const c_tuple *kernel_size, const c_tuple *stride,
+                            const c_tuple *padding, const c_tuple *dilation);
+MITHRIL_API void avg_pool2d_grad(const Array *gradient, int idx, Array *output,
+                                 const Array *input, const c_tuple *kernel_size,
+                                 const c_tuple *stride, const c_tuple *padding,
+                                 const c_tuple *dilation, Array *inputGradient);
+MITHRIL_API void broadcast_to(Array *output, const Array *input,
+                              const c_tuple *shape);
+MITHRIL_API void broadcast_to_grad(const Array *gradient, int idx,
+                                   Array *output, const Array *input,
+                                   const c_tuple *shape, Array *inputGradient);
+MITHRIL_API void reshape(Array *output, const Array *input,
+                         const c_tuple *shape);
+MITHRIL_API void reshape_grad(const Array *gradient, int idx, Array *output,
+                              const Array *input, const c_tuple *shape,
+                              Array *inputGradient);
+MITHRIL_API void concat(Array *output, const Array **inputs, int num_inputs,
+                        int axis);
+MITHRIL_API void concat_grad(const Array *gradient, int idx, Array *output,
+                             const Array **inputs, int num_inputs, int axis,
+                             Array **inputGradients);
 
 #endif
\ No newline at end of file
@@ -23,20 +23,25 @@
 #include <stdio.h>
 
 int *broadcastStride(const Array *t1, const int *shape, const int ndim) {
+  int *newStrides = (int *)malloc(ndim * sizeof(int));
+  broadcast_strides_into(t1, shape, ndim, newStrides);
+  return newStrides;
+}
+
+/* Writes broadcasted strides of the array into the given buffer */
+void broadcast_strides_into(const Array *t1, const int *shape, const int ndim,
+                            int *strides) {
   int diff = ndim - t1->ndim;
   int *oldStrides = t1->strides;
-  int *newStrides = (int *)malloc(ndim * sizeof(int));
 
-  for (size_t i = 0; i < ndim; i++) newStrides[i] = 0;
+  for (size_t i = 0; i < ndim; i++) strides[i] = 0;
 
   for (size_t i = diff; i < ndim; i++) {
     if (shape[i] == 1 || t1->shape[i - diff] == 1)
-      newStrides[i] = 0;
+      strides[i] = 0;
     else
-      newStrides[i] = oldStrides[i - diff];
+      strides[i] = oldStrides[i - diff];
   }
-
-  return newStrides;
 }
 
 size_t loc(size_t idx, const int *shapes, const int *strides, const int ndim) {
@@ -50,24 +55,25 @@ size_t loc(size_t idx, const int *shapes, const int *strides, const int ndim) {
   return loc;
 }
 
-/* Handles binary operations on two arrays */
-void binary_array_iterator(const Array *left, const Array *right, Array *out,
-                           float (*op)(float, float)) {
-  const float *left_data = left->data;
-  const float *right_data = right->data;
+/* Returns the size of the array if it is broadcasted only along the leading
+ * dimensions of out (i.e. its elements repeat contiguously in out), returns 0
+ * otherwise */
+size_t trailing_broadcast_size(const Array *arr, const Array *out) {
+  int start = 0;
+  while (start < arr->ndim && arr->shape[start] == 1) start++;
 
-  int *left_b_strides = broadcastStride(left, out->shape, out->ndim);
-  int *right_b_strides = broadcastStride(right, out->shape, out->ndim);
-
-  for (size_t i = 0; i < out->size; i++) {
-    // TODO: Use loc only when the Tensor is not contiguous
-    size_t left_idx = loc(i, out->shape, left_b_strides, out->ndim);
-    size_t right_idx = loc(i, out->shape, right_b_strides, out->ndim);
-    out->data[i] = op(left_data[left_idx], right_data[right_idx]);
+  int diff = out->ndim - arr->ndim;
+  if (diff < 0) return 0;
+  for (int i = start; i < arr->ndim; i++) {
+    if (arr->shape[i] != out->shape[diff + i]) return 0;
   }
+  return arr->size;
+}
 
-  free(left_b_strides);
-  free(right_b_strides);
+/* Handles binary operations on two arrays */
+void binary_array_iterator(const Array *left, const Array *right, Array *out,
+                           float (*op)(float, float)) {
+  BINARY_ITERATE(left, right, out, op(x, y));
 }
 
 /* If the input Array  is contiguous, and the reduction type is all, reduce the
@@ -137,6 +143,13 @@ void reduce_contiguous(const Array *input, Array *out, const int *axes,
 
 int *pad_shape(const Array *arr, int target_ndim) {
   int *shape = (int *)malloc(target_ndim * sizeof(int));
+  pad_shape_into(arr, target_ndim, shape);
+  return shape;
+}
+
+/* Writes the shape of the array padded with leading ones into the given
+ * buffer */
+void pad_shape_into(const Array *arr, int target_ndim, int *shape) {
   int offset = target_ndim - arr->ndim;
 
   // Initialize leading dimensions to 1 for broadcasting
@@ -148,17 +161,21 @@ int *pad_shape(const Array *arr, int target_ndim) {
   for (int i = 0; i < arr->ndim; i++) {
     shape[offset + i] = arr->shape[i];
   }
-  return shape;
 }
 
 /* Compute row-major strides for a given shape */
 int *compute_strides(const int *shape, int ndim) {
   int *strides = (int *)malloc(ndim * sizeof(int));
+  compute_strides_into(shape, ndim, strides);
+  return strides;
+}
+
+/* Writes row-major strides for a given shape into the given buffer */
+void compute_strides_into(const int *shape, int ndim, int *strides) {
   strides[ndim - 1] = 1;
   for (int i = ndim - 2; i >= 0; i--) {
     strides[i] = strides[i + 1] * shape[i + 1];
   }
-  return strides;
 }
 
 int prod(const int *arr, int len) {
@@ -175,6 +192,63 @@ void invert_permutation(const int *axes, int *inv_axes, int ndim) {
   }
 }
 
+/* Returns the non-negative counterpart of the axis counted from the end */
+int normalize_axis(int axis, int ndim) { return axis < 0 ? axis + ndim : axis; }
+
+/* Marks the dimensions to be reduced (1=reduce, 0=keep), all dimensions are
+ * reduced if axes is NULL */
+void reduction_mask(const c_tuple *axes, int ndim, int *mask) {
+  for (int d = 0; d < ndim; d++) mask[d] = axes == NULL;
+  if (axes == NULL) return;
+  for (size_t i = 0; i < axes->size; i++) {
+    int axis = normalize_axis(axes->data[i], ndim);
+    if (axis >= 0 && axis < ndim) mask[axis] = 1;
+  }
+}
+
+/* Returns the index of the reduced array which the idx'th element of the
+ * contiguous input is reduced into, kept and reduced dimensions (whether they
+ * are kept with size 1 or not) share the same layout */
+size_t reduced_index(size_t idx, const int *shape, const int *mask, int ndim) {
+  size_t out_idx = 0, out_stride = 1;
+  for (int d = ndim - 1; d >= 0; d--) {
+    size_t coord = idx % shape[d];
+    idx /= shape[d];
+    if (!mask[d]) {
+      out_idx += coord * out_stride;
+      out_stride *= shape[d];
+    }
+  }
+  return out_idx;
+}
+
+/* Accumulates the gradient of a broadcasted operation into the gradient of
+ * an operand, broadcasted dimensions of the operand are summed */
+void accumulate_grad(const Array *gradient, Array *operandGradient) {
+  if (operandGradient == NULL) return;
+  const float *g = gradient->data;
+  float *o = operandGradient->data;
+  size_t n = gradient->size;
+  size_t m = trailing_broadcast_size(operandGradient, gradient);
+
+  if (m == n) {
+#pragma omp simd
+    for (size_t i = 0; i < n; i++) o[i] += g[i];
+  } else if (m > 0) {
+    for (size_t i = 0; i < n; i += m) {
+#pragma omp simd
+      for (size_t j = 0; j < m; j++) o[j] += g[i + j];
+    }
+  } else {
+    int strides[gradient->ndim];
+    broadcast_strides_into(operandGradient, gradient->shape, gradient->ndim,
+                           strides);
+    for (size_t i = 0; i < n; i++) {
+      o[loc(i, gradient->shape, strides, gradient->ndim)] += g[i];
+    }
+  }
+}
+
 void scalar_add(Array *output, Array *input, float scalar) {
   for (int i = 0; i < input->size; i++) {
     output->data[i] = input->data[i] + scalar;
@@ -26,29 +26,86 @@
 
 typedef void (*Op)(float *output, float input);
 
+/* Evaluates `expr` of the floats x and y for each element of out. Operands of
+ * the size of out and operands broadcasted along its leading dimensions (e.g.
+ * biases and scalars) are iterated by contiguous loops which can be
+ * vectorized, other operands fall back to broadcasted index computation. */
+#define BINARY_ITERATE(left, right, out, expr)                               \
+  do {                                                                       \
+    const float *_l = (left)->data, *_r = (right)->data;                     \
+    float *_o = (out)->data;                                                 \
+    size_t _n = (out)->size;                                                 \
+    size_t _lm = trailing_broadcast_size((left), (out));                     \
+    size_t _rm = trailing_broadcast_size((right), (out));                    \
+    if (_lm == _n && _rm == _n) {                                            \
+      for (size_t _i = 0; _i < _n; _i++) {                                   \
+        float x = _l[_i], y = _r[_i];                                        \
+        _o[_i] = (expr);                                                     \
+      }                                                                      \
+    } else if (_lm == _n && _rm > 0) {                                       \
+      for (size_t _i = 0; _i < _n; _i += _rm) {                              \
+        for (size_t _j = 0; _j < _rm; _j++) {                                \
+          float x = _l[_i + _j], y = _r[_j];                                 \
+          _o[_i + _j] = (expr);                                              \
+        }                                                                    \
+      }                                                                      \
+    } else if (_rm == _n && _lm > 0) {                                       \
+      for (size_t _i = 0; _i < _n; _i += _lm) {                              \
+        for (size_t _j = 0; _j < _lm; _j++) {                                \
+          float x = _l[_j], y = _r[_i + _j];                                 \
+          _o[_i + _j] = (expr);                                              \
+        }                                                                    \
+      }                                                                      \
+    } else {                                                                 \
+      int _ls[(out)->ndim], _rs[(out)->ndim];                                \
+      broadcast_strides_into((left), (out)->shape, (out)->ndim, _ls);        \
+      broadcast_strides_into((right), (out)->shape, (out)->ndim, _rs);       \
+      for (size_t _i = 0; _i < _n; _i++) {                                   \
+        float x = _l[loc(_i, (out)->shape, _ls, (out)->ndim)];               \
+        float y = _r[loc(_i, (out)->shape, _rs, (out)->ndim)];               \
+        _o[_i] = (expr);                                                     \
+      }                                                                      \
+    }                                                                        \
+  } while (0)
+
 typedef struct {
   size_t size;
   int *data;
 } c_tuple;
 
-int *broadcastStride(const Array *t1, const int *shape, const int ndim);
-size_t loc(size_t idx, const int *shapes, const int *strides, const int ndim);
-void binary_array_iterator(const Array *left, const Array *right, Array *out,
-                           float (*op)(float, float));
-void reduce_contiguous_all(const Array *input, Array *out, float init_val,
-                           Op op);
-void reduce_contiguous_dim(const float *input_data, float *output_data,
-                           const int *reduction_size,
-                           const int *reduction_strides, size_t offset,
-                           size_t dim, size_t max_dim, Op op);
-void reduce_contiguous(const Array *input, Array *out, const int *axes,
-                       size_t num_axes, float init_val, Op op);
-int *pad_shape(const Array *arr, int target_ndim);
-int *compute_strides(const int *shape, int ndim);
-int prod(const int *arr, int len);
-void invert_permutation(const int *axes, int *inv_axes, int ndim);
-void scalar_add(Array *output, Array *input, float scalar);
-void scalar_multiply(Array *output, Array *input, float scalar);
-void scalar_subtract(Array *output, Array *input, float scalar);
+MITHRIL_API int *broadcastStride(const Array *t1, const int *shape,
+                                 const int ndim);
+MITHRIL_API void broadcast_strides_into(const Array *t1, const int *shape,
+                                        const int ndim, int *strides);
+MITHRIL_API size_t loc(size_t idx, const int *shapes, const int *strides,
+                       const int ndim);
+MITHRIL_API size_t trailing_broadcast_size(const Array *arr, const Array *out);
+MITHRIL_API void binary_array_iterator(const Array *left, const Array *right,
+                                       Array *out, float (*op)(float, float));
+MITHRIL_API void reduce_contiguous_all(const Array *input, Array *out,
+                                       float init_val, Op op);
+MITHRIL_API void reduce_contiguous_dim(const float *input_data,
+                                       float *output_data,
+                                       const int *reduction_size,
+                                       const int *reduction_strides,
+                                       size_t offset, size_t dim,
+                                       size_t max_dim, Op op);
+MITHRIL_API void reduce_contiguous(const Array *input, Array *out,
+                                   const int *axes, size_t num_axes,
+                                   float init_val, Op op);
+MITHRIL_API int *pad_shape(const Array *arr, int target_ndim);
+MITHRIL_API void pad_shape_into(const Array *arr, int target_ndim, int *shape);
+MITHRIL_API int *compute_strides(const int *shape, int ndim);
+MITHRIL_API void compute_strides_into(const int *shape, int ndim, int *strides);
+MITHRIL_API int prod(const int *arr, int len);
+MITHRIL_API void invert_permutation(const int *axes, int *inv_axes, int ndim);
+MITHRIL_API int normalize_axis(int axis, int ndim);
+MITHRIL_API void reduction_mask(const c_tuple *axes, int ndim, int *mask);
+MITHRIL_API size_t reduced_index(size_t idx, const int *shape, const int *mask,
+                                 int ndim);
+MITHRIL_API void accumulate_grad(const Array *gradient, Array *operandGradient);
+MITHRIL_API void scalar_add(Array *output, Array *input, float scalar);
+MITHRIL_API void scalar_multiply(Array *output, Array *input, float scalar);
+MITHRIL_API void scalar_subtract(Array *output, Array *input, float scalar);
 
 #endif
\ No newline at end of file
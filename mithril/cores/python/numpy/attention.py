@@ -0,0 +1,180 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memory efficient scaled dot product attention of the NumPy backend.
+
+Queries and keys are processed in blocks and softmax is computed online, so the
+(L, S) attention matrix is never materialized. Forward pass only keeps the
+logsumexp of each query row, backward pass recomputes attention probabilities
+of each block from it.
+"""
+
+from collections.abc import Container
+from typing import Any
+
+import numpy as np
+
+__all__ = [
+    "ATTENTION_KEY_BLOCK_SIZE",
+    "ATTENTION_QUERY_BLOCK_SIZE",
+    "attention_backward",
+    "attention_forward",
+]
+
+Array = np.ndarray[Any, Any]
+
+# Number of query rows and key columns of a single attention block, memory used
+# by the intermediate scores is bounded by their product.
+ATTENTION_QUERY_BLOCK_SIZE = 256
+ATTENTION_KEY_BLOCK_SIZE = 256
+
+
+def _blocks(length: int, block_size: int) -> list[slice]:
+    return [
+        slice(start, min(start + block_size, length))
+        for start in range(0, length, block_size)
+    ]
+
+
+def _mask_block(attn_mask: Array, rows: slice, cols: slice) -> Array:
+    # Broadcasted dimensions of the mask are kept as they are.
+    index = tuple(
+        slice(None) if size == 1 else block
+        for size, block in zip(
+            attn_mask.shape[-2:], (rows, cols)[-attn_mask.ndim :], strict=True
+        )
+    )
+    return attn_mask[(..., *index)]
+
+
+def _scores(
+    query: Array,
+    key: Array,
+    scale: float,
+    attn_mask: Array | None,
+    is_causal: bool,
+    rows: slice,
+    cols: slice,
+) -> Array:
+    """Scaled and masked attention scores of the (rows, cols) block."""
+    scores = (query[..., rows, :] @ np.swapaxes(key[..., cols, :], -2, -1)) * scale
+    if is_causal:
+        causal = np.arange(rows.start, rows.stop)[:, None] >= np.arange(
+            cols.start, cols.stop
+        )
+        scores = np.where(causal, scores, -np.inf)
+    if attn_mask is not None:
+        mask = _mask_block(attn_mask, rows, cols)
+        if mask.dtype == bool:
+            scores = np.where(mask, scores, -np.inf)
+        else:
+            scores = scores + mask
+    return scores
+
+
+def _key_blocks(
+    rows: slice, length: int, is_causal: bool, block_size: int
+) -> list[slice]:
+    # Blocks on the right of the diagonal are fully masked for causal attention.
+    if is_causal:
+        length = min(length, rows.stop)
+    return _blocks(length, block_size)
+
+
+def attention_forward(
+    query: Array,
+    key: Array,
+    value: Array,
+    scale: float,
+    attn_mask: Array | None = None,
+    is_causal: bool = False,
+) -> tuple[Array, Array]:
+    """Computes the attention output together with the logsumexp of the scores
+    of each query row, which has the shape of the output without its last axis.
+    """
+    L, S = query.shape[-2], key.shape[-2]
+    batch = np.broadcast_shapes(query.shape[:-2], key.shape[:-2], value.shape[:-2])
+    if attn_mask is not None:
+        batch = np.broadcast_shapes(batch, attn_mask.shape[:-2])
+    dtype = np.result_type(query, key, value)
+    output = np.empty((*batch, L, value.shape[-1]), dtype=dtype)
+    logsumexp = np.empty((*batch, L), dtype=dtype)
+
+    for rows in _blocks(L, ATTENTION_QUERY_BLOCK_SIZE):
+        n_rows = rows.stop - rows.start
+        row_max = np.full((*batch, n_rows, 1), -np.inf, dtype=dtype)
+        row_sum = np.zeros((*batch, n_rows, 1), dtype=dtype)
+        acc = np.zeros((*batch, n_rows, value.shape[-1]), dtype=dtype)
+        for cols in _key_blocks(rows, S, is_causal, ATTENTION_KEY_BLOCK_SIZE):
+            scores = _scores(query, key, scale, attn_mask, is_causal, rows, cols)
+            new_max = np.maximum(row_max, scores.max(axis=-1, keepdims=True))
+            # Rows without any unmasked score so far are shifted by 0 instead
+            # of -inf to avoid nan values.
+            safe_max = np.where(np.isneginf(new_max), 0, new_max)
+            probs = np.exp(scores - safe_max)
+            correction = np.exp(row_max - safe_max)
+            row_sum = row_sum * correction + probs.sum(axis=-1, keepdims=True)
+            acc = acc * correction + probs @ value[..., cols, :]
+            row_max = new_max
+        output[..., rows, :] = acc / row_sum
+        logsumexp[..., rows] = (row_max + np.log(row_sum))[..., 0]
+    return output, logsumexp
+
+
+def attention_backward(
+    output_gradient: Array,
+    output: Array,
+    logsumexp: Array,
+    query: Array,
+    key: Array,
+    value: Array,
+    scale: float,
+    attn_mask: Array | None = None,
+    is_causal: bool = False,
+    grad_idxs: Container[int] = (0, 1, 2),
+) -> dict[int, Array]:
+    """Gradients of attention with respect to query (0), key (1) and value (2),
+    in the broadcasted batch shape of the output. Only gradients of grad_idxs
+    are computed."""
+    L, S = query.shape[-2], key.shape[-2]
+    batch = output.shape[:-2]
+    grads: dict[int, Array] = {
+        idx: np.zeros((*batch, *input.shape[-2:]), dtype=output_gradient.dtype)
+        for idx, input in enumerate((query, key, value))
+        if idx in grad_idxs
+    }
+    query_grad, key_grad, value_grad = (grads.get(idx) for idx in range(3))
+    # Derivative of softmax reduces to the difference of the probability
+    # gradients from their probability weighted row sums, which are these.
+    delta = np.sum(output_gradient * output, axis=-1, keepdims=True)
+
+    for rows in _blocks(L, ATTENTION_QUERY_BLOCK_SIZE):
+        grad_rows = output_gradient[..., rows, :]
+        lse_rows = logsumexp[..., rows, None]
+        for cols in _key_blocks(rows, S, is_causal, ATTENTION_KEY_BLOCK_SIZE):
+            scores = _scores(query, key, scale, attn_mask, is_causal, rows, cols)
+            probs = np.exp(scores - lse_rows)
+            if value_grad is not None:
+                value_grad[..., cols, :] += np.swapaxes(probs, -2, -1) @ grad_rows
+            if query_grad is None and key_grad is None:
+                continue
+            probs_grad = grad_rows @ np.swapaxes(value[..., cols, :], -2, -1)
+            scores_grad = probs * (probs_grad - delta[..., rows, :]) * scale
+            if query_grad is not None:
+                query_grad[..., rows, :] += scores_grad @ key[..., cols, :]
+            if key_grad is not None:
+                key_grad[..., cols, :] += (
+                    np.swapaxes(scores_grad, -2, -1) @ query[..., rows, :]
+                )
+    return grads
@@ -0,0 +1,391 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Convolution engines of the NumPy backend.
+
+All engines compute the cross-correlation of an already padded input of shape
+(N, C, *spatial) with a weight of shape (O, C // groups, *kernel), for one or
+two spatial dimensions. Engines are registered in CONV_ENGINES and chosen by
+select_conv_engine unless an engine is given explicitly.
+"""
+
+import math
+from collections.abc import Callable
+from itertools import product
+from typing import Any
+
+import numpy as np
+
+__all__ = [
+    "CONV_ENGINES",
+    "FFT_MIN_KERNEL_SIZE",
+    "WINOGRAD_MIN_CHANNELS",
+    "WINOGRAD_MIN_TILES",
+    "conv",
+    "conv_input_grad",
+    "conv_weight_grad",
+    "select_conv_engine",
+]
+
+Array = np.ndarray[Any, Any]
+ConvEngine = Callable[[Array, Array, tuple[int, ...], tuple[int, ...], int], Array]
+
+# FFT is used for stride 1 convolutions whose kernels have at least this many
+# elements, its cost does not depend on the kernel size.
+FFT_MIN_KERNEL_SIZE = 49
+# Winograd is used for 3x3 convolutions with at least this many input channels
+# and 2x2 output tiles, below them the cost of the transforms dominates.
+WINOGRAD_MIN_CHANNELS = 16
+WINOGRAD_MIN_TILES = 1024
+
+
+def _output_shape(
+    spatial: tuple[int, ...],
+    kernel: tuple[int, ...],
+    stride: tuple[int, ...],
+    dilation: tuple[int, ...],
+) -> tuple[int, ...]:
+    return tuple(
+        (s - (k - 1) * d - 1) // st + 1
+        for s, k, st, d in zip(spatial, kernel, stride, dilation, strict=True)
+    )
+
+
+def _windows(
+    input: Array,
+    kernel: tuple[int, ...],
+    stride: tuple[int, ...],
+    dilation: tuple[int, ...],
+) -> Array:
+    # Strided view of shape (N, C, *out, *kernel) without copying the input.
+    n, c, *spatial = input.shape
+    out = _output_shape(tuple(spatial), kernel, stride, dilation)
+    s_n, s_c, *s_spatial = input.strides
+    return np.lib.stride_tricks.as_strided(
+        input,
+        (n, c, *out, *kernel),
+        (
+            s_n,
+            s_c,
+            *(s * st for s, st in zip(s_spatial, stride, strict=True)),
+            *(s * d for s, d in zip(s_spatial, dilation, strict=True)),
+        ),
+        writeable=False,
+    )
+
+
+def _im2col(
+    input: Array,
+    kernel: tuple[int, ...],
+    stride: tuple[int, ...],
+    dilation: tuple[int, ...],
+    groups: int,
+) -> Array:
+    # Columns of shape (G, N * prod(out), C // G * prod(kernel)).
+    windows = _windows(input, kernel, stride, dilation)
+    n, c, *out_kernel = windows.shape
+    nd = len(kernel)
+    windows = windows.reshape(n, groups, c // groups, *out_kernel)
+    # (G, N, *out, C // G, *kernel)
+    axes = (1, 0, *range(3, 3 + nd), 2, *range(3 + nd, 3 + 2 * nd))
+    return windows.transpose(axes).reshape(groups, n * math.prod(out_kernel[:nd]), -1)
+
+
+def im2col_conv(
+    input: Array,
+    weight: Array,
+    stride: tuple[int, ...],
+    dilation: tuple[int, ...],
+    groups: int,
+) -> Array:
+    """Lowers the convolution to a matrix multiplication of the input windows
+    and the flattened kernels of each group."""
+    n = input.shape[0]
+    o, _, *kernel = weight.shape
+    out = _output_shape(input.shape[2:], tuple(kernel), stride, dilation)
+    cols = _im2col(input, tuple(kernel), stride, dilation, groups)
+    # (G, N * prod(out), O // G)
+    result = cols @ weight.reshape(groups, o // groups, -1).transpose(0, 2, 1)
+    result = result.reshape(groups, n, *out, o // groups)
+    # (N, G, O // G, *out)
+    axes = (1, 0, 2 + len(out), *range(2, 2 + len(out)))
+    return result.transpose(axes).reshape(n, o, *out)
+
+
+def fft_conv(
+    input: Array,
+    weight: Array,
+    stride: tuple[int, ...],
+    dilation: tuple[int, ...],
+    groups: int,
+) -> Array:
+    """Computes the correlation as a product of the spectrums of the input and
+    the (dilated) kernels, outputs of larger strides are subsampled."""
+    n, c, *spatial = input.shape
+    o, _, *kernel = weight.shape
+    nd = len(kernel)
+    axes = tuple(range(2, 2 + nd))
+    out = _output_shape(tuple(spatial), tuple(kernel), stride, dilation)
+
+    dilated = np.zeros(
+        (
+            o,
+            c // groups,
+            *((k - 1) * d + 1 for k, d in zip(kernel, dilation, strict=True)),
+        ),
+        dtype=weight.dtype,
+    )
+    dilated[(slice(None), slice(None), *(slice(None, None, d) for d in dilation))] = (
+        weight
+    )
+
+    # Correlation is circular, but none of the valid outputs wraps around.
+    input_f = np.fft.rfftn(input, s=spatial, axes=axes)
+    weight_f = np.conj(np.fft.rfftn(dilated, s=spatial, axes=axes))
+    freq = input_f.shape[2:]
+    # (G, F, N, C // G) @ (G, F, C // G, O // G) -> (G, F, N, O // G)
+    input_f = input_f.reshape(n, groups, c // groups, -1).transpose(1, 3, 0, 2)
+    weight_f = weight_f.reshape(groups, o // groups, c // groups, -1)
+    result_f = input_f @ weight_f.transpose(0, 3, 2, 1)
+    result_f = result_f.transpose(2, 0, 3, 1).reshape(n, o, *freq)
+    result = np.fft.irfftn(result_f, s=spatial, axes=axes)
+    result = result[
+        (
+            slice(None),
+            slice(None),
+            *(
+                slice(None, (size - 1) * st + 1, st)
+                for size, st in zip(out, stride, strict=True)
+            ),
+        )
+    ]
+    return result.astype(input.dtype, copy=False)
+
+
+# Transforms of Winograd's F(2x2, 3x3) algorithm, each of them only adds and
+# subtracts rows so they are applied by slicing.
+def _winograd_kernel_transform(g: list[Array]) -> list[Array]:
+    # Rows of G g for the rows g of a kernel.
+    return [g[0], (g[0] + g[1] + g[2]) / 2, (g[0] - g[1] + g[2]) / 2, g[2]]
+
+
+def _winograd_input_transform(d: list[Array]) -> list[Array]:
+    # Rows of B^T d for the rows d of a tile.
+    return [d[0] - d[2], d[1] + d[2], d[2] - d[1], d[1] - d[3]]
+
+
+def _winograd_output_transform(m: list[Array]) -> list[Array]:
+    # Rows of A^T m for the rows m of a transformed tile.
+    return [m[0] + m[1] + m[2], m[1] - m[2] - m[3]]
+
+
+def winograd_conv(
+    input: Array,
+    weight: Array,
+    stride: tuple[int, ...],
+    dilation: tuple[int, ...],
+    groups: int,
+) -> Array:
+    """Computes 3x3 convolutions of stride 1 in 2x2 output tiles with 16
+    multiplications per tile instead of 36."""
+    if (
+        weight.shape[2:] != (3, 3)
+        or stride != (1, 1)
+        or dilation != (1, 1)
+        or groups != 1
+    ):
+        raise ValueError(
+            "Winograd convolution only supports 3x3 kernels with stride 1, "
+            "dilation 1 and a single group."
+        )
+    n, c, h, w = input.shape
+    o = weight.shape[0]
+    out_h, out_w = h - 2, w - 2
+    tiles_h, tiles_w = -(-out_h // 2), -(-out_w // 2)
+    # (C, N, H, W) so that the transformed tiles are contiguous for each channel.
+    input = np.pad(
+        input.transpose(1, 0, 2, 3),
+        ((0, 0), (0, 0), (0, 2 * tiles_h + 2 - h), (0, 2 * tiles_w + 2 - w)),
+    )
+
+    # Element (i, j) of all tiles, (C, N, tiles_h, tiles_w).
+    def tile(i: int, j: int) -> Array:
+        return input[:, :, i : i + 2 * tiles_h : 2, j : j + 2 * tiles_w : 2]
+
+    rows = _winograd_input_transform(
+        [np.stack([tile(i, j) for j in range(4)]) for i in range(4)]
+    )
+    # (16, C, N * tiles_h * tiles_w)
+    v = np.stack(
+        [
+            col.reshape(c, -1)
+            for row in rows
+            for col in _winograd_input_transform(list(row))
+        ]
+    )
+    # (16, O, C)
+    weight = weight.astype(input.dtype, copy=False).transpose(2, 3, 0, 1)
+    u = np.stack(
+        [
+            col
+            for row in _winograd_kernel_transform(list(weight))
+            for col in _winograd_kernel_transform(list(row))
+        ]
+    )
+    m = u @ v
+    m = m.reshape(4, 4, o, n, tiles_h, tiles_w)
+
+    result = np.empty((n, o, 2 * tiles_h, 2 * tiles_w), dtype=input.dtype)
+    rows = _winograd_output_transform(list(m))
+    for i, row in enumerate(rows):
+        for j, col in enumerate(_winograd_output_transform(list(row))):
+            result[:, :, i::2, j::2] = col.transpose(1, 0, 2, 3)
+    return result[:, :, :out_h, :out_w]
+
+
+CONV_ENGINES: dict[str, ConvEngine] = {
+    "im2col": im2col_conv,
+    "fft": fft_conv,
+    "winograd": winograd_conv,
+}
+
+
+def select_conv_engine(
+    input_shape: tuple[int, ...],
+    weight_shape: tuple[int, ...],
+    stride: tuple[int, ...],
+    dilation: tuple[int, ...],
+    groups: int,
+) -> str:
+    """Chooses the convolution engine by the shapes and parameters.
+
+    Parameters
+    ----------
+    input_shape : tuple[int, ...]
+        Shape of the padded input.
+    weight_shape : tuple[int, ...]
+        Shape of the weight.
+    stride : tuple[int, ...]
+        Stride of each spatial dimension.
+    dilation : tuple[int, ...]
+        Dilation of each spatial dimension.
+    groups : int
+        Number of groups.
+
+    Returns
+    -------
+    str
+        Name of the engine in CONV_ENGINES.
+    """
+    kernel = weight_shape[2:]
+    unit_stride = all(st == 1 for st in stride)
+    if (
+        kernel == (3, 3)
+        and unit_stride
+        and all(d == 1 for d in dilation)
+        and groups == 1
+        and input_shape[1] >= WINOGRAD_MIN_CHANNELS
+        and input_shape[0] * math.prod((s - 1) // 2 for s in input_shape[2:])
+        >= WINOGRAD_MIN_TILES
+    ):
+        return "winograd"
+    if unit_stride and math.prod(kernel) >= FFT_MIN_KERNEL_SIZE:
+        return "fft"
+    return "im2col"
+
+
+def conv(
+    input: Array,
+    weight: Array,
+    stride: tuple[int, ...],
+    padding: tuple[tuple[int, int], ...],
+    dilation: tuple[int, ...],
+    groups: int = 1,
+    engine: str | None = None,
+) -> Array:
+    """Pads the input and computes its cross-correlation with the weight using
+    the given engine, or the one chosen by select_conv_engine."""
+    input = np.pad(input, ((0, 0), (0, 0), *padding))
+    if engine is None:
+        engine = select_conv_engine(input.shape, weight.shape, stride, dilation, groups)
+    return CONV_ENGINES[engine](input, weight, stride, dilation, groups)
+
+
+def conv_input_grad(
+    output_gradient: Array,
+    weight: Array,
+    input_shape: tuple[int, ...],
+    stride: tuple[int, ...],
+    padding: tuple[tuple[int, int], ...],
+    dilation: tuple[int, ...],
+    groups: int = 1,
+) -> Array:
+    """Gradient of conv with respect to its input."""
+    n, c, *spatial = input_shape
+    o, c_g, *kernel = weight.shape
+    nd = len(kernel)
+    padded_shape = tuple(s + sum(p) for s, p in zip(spatial, padding, strict=True))
+    out = output_gradient.shape[2:]
+
+    if all(st == 1 for st in stride):
+        # Transposed convolution is the correlation of the output gradient with
+        # the flipped kernels whose input and output channels are swapped.
+        flipped = np.flip(weight, axis=tuple(range(2, 2 + nd)))
+        flipped = flipped.reshape(groups, o // groups, c_g, *kernel)
+        flipped = flipped.swapaxes(1, 2).reshape(c, o // groups, *kernel)
+        grad_padding = tuple(
+            ((k - 1) * d, p_s - o_s)
+            for k, d, p_s, o_s in zip(kernel, dilation, padded_shape, out, strict=True)
+        )
+        padded_grad = conv(
+            output_gradient, flipped, stride, grad_padding, dilation, groups
+        )
+    else:
+        # Gradients of the windows are accumulated into the padded input for
+        # each kernel position.
+        grad_out = output_gradient.reshape(n, groups, o // groups, -1)
+        cols = weight.reshape(groups, o // groups, -1).transpose(0, 2, 1) @ grad_out
+        cols = cols.reshape(n, c, *kernel, *out)
+        padded_grad = np.zeros((n, c, *padded_shape), dtype=output_gradient.dtype)
+        for position in product(*(range(k) for k in kernel)):
+            region = tuple(
+                slice(pos * d, pos * d + (o_s - 1) * st + 1, st)
+                for pos, d, o_s, st in zip(position, dilation, out, stride, strict=True)
+            )
+            padded_grad[(slice(None), slice(None), *region)] += cols[
+                (slice(None), slice(None), *position)
+            ]
+
+    crop = tuple(slice(p[0], p[0] + s) for p, s in zip(padding, spatial, strict=True))
+    return padded_grad[(slice(None), slice(None), *crop)]
+
+
+def conv_weight_grad(
+    output_gradient: Array,
+    input: Array,
+    weight_shape: tuple[int, ...],
+    stride: tuple[int, ...],
+    padding: tuple[tuple[int, int], ...],
+    dilation: tuple[int, ...],
+    groups: int = 1,
+) -> Array:
+    """Gradient of conv with respect to its weight."""
+    o, c_g, *kernel = weight_shape
+    input = np.pad(input, ((0, 0), (0, 0), *padding))
+    # (G, N * prod(out), C // G * prod(kernel))
+    cols = _im2col(input, tuple(kernel), stride, dilation, groups)
+    n = output_gradient.shape[0]
+    grad_out = output_gradient.reshape(n, groups, o // groups, -1)
+    grad_out = grad_out.transpose(1, 2, 0, 3).reshape(groups, o // groups, -1)
+    return (grad_out @ cols).reshape(weight_shape)
@@ -28,6 +28,8 @@ from scipy.special import erf
 
 from ....common import PaddingType, find_dominant_type
 from ...utils import NestedFloatOrIntOrBoolList, is_tuple_int
+from .attention import attention_forward
+from .conv import conv
 from .utils import (
     CacheType,
     calc_prob_matrix,
@@ -469,16 +471,7 @@ def conv1d(
     dilation: int = 1,
     cache: CacheType | None = None,
 ) -> np.ndarray[Any, Any]:
-    if dilation != 1:
-        raise NotImplementedError(
-            f"Dilation of {dilation} is not supported. "
-            f"Currently, the Numpy backend for conv2d only supports a dilation of 1."
-        )
-    n, c, w = input.shape
-    *_, w_k = weight.shape
-    out_w = (w - w_k + sum(padding)) // stride + 1
-    submatrices = get_submatrices1d(input, (n, c, out_w), w_k, padding, stride)
-    return np.einsum("niwl,oil->now", submatrices, weight)
+    return conv(input, weight, (stride,), (padding,), (dilation,))
 
 
 def conv1d_bias(
@@ -511,28 +504,16 @@ def conv2d(
     stride: tuple[int, int] = (1, 1),
     padding: tuple[int, int] | tuple[tuple[int, int], tuple[int, int]] = (1, 1),
     dilation: tuple[int, int] = (1, 1),
+    groups: int = 1,
     cache: CacheType | None = None,
 ) -> np.ndarray[Any, Any]:
-    if dilation != (1, 1):
-        raise NotImplementedError(
-            f"Dilation of {dilation} is not supported. "
-            f"Numpy backend for conv2d only supports a dilation of (1, 1)."
-        )
-
     _padding: tuple[tuple[int, int], tuple[int, int]]
     if is_tuple_int(padding):
         _padding = ((padding[0], padding[0]), (padding[1], padding[1]))
     else:
         _padding = padding  # type: ignore
 
-    *b, h, w = input.shape
-    _, _, h_k, w_k = weight.shape
-    out_h = (h - h_k + sum(_padding[0])) // stride[0] + 1
-    out_w = (w - w_k + sum(_padding[1])) // stride[1] + 1
-    submatrices = get_submatrices2d(
-        input, (*b, out_h, out_w), h_k, w_k, _padding, stride[0]
-    )
-    return np.einsum("nihwkl,oikl->nohw", submatrices, weight)
+    return conv(input, weight, stride, _padding, dilation, groups)
 
 
 def conv2d_bias(
@@ -543,6 +524,7 @@ def conv2d_bias(
     stride: tuple[int, int] = (1, 1),
     padding: tuple[int, int] | tuple[tuple[int, int], tuple[int, int]] = (1, 1),
     dilation: tuple[int, int] = (1, 1),
+    groups: int = 1,
     cache: CacheType | None = None,
 ) -> np.ndarray[Any, Any]:
     return (
@@ -552,6 +534,7 @@ def conv2d_bias(
             stride=stride,
             padding=padding,
             dilation=dilation,
+            groups=groups,
             cache=cache,
         )
         + bias
@@ -669,27 +652,15 @@ def scaled_dot_product_attention(
             "Currently Numpy scaled_dot_product_attention only support dropout_p 0"
         )
 
-    L, S = query.shape[-2], key.shape[-2]
     scale_factor = 1 / math.sqrt(query.shape[-1]) if scale is None else scale
     write_into_cache(cache, "scale_factor", scale_factor)
-    attn_bias = np.zeros((L, S), dtype=query.dtype)
     if is_causal:
         assert attn_mask is None
-        temp_mask = np.tril(np.ones((L, S), dtype=bool))
-        attn_bias = np.where(temp_mask, attn_bias, float("-inf"))
-        attn_bias.astype(query.dtype)
-
-    if attn_mask is not None:
-        if attn_mask.dtype == bool:
-            attn_bias = np.where(attn_mask, attn_bias, float("-inf"))
-        else:
-            attn_bias += attn_mask
-    attn_weight = query @ np.swapaxes(key, -2, -1) * scale_factor
-    write_into_cache(cache, "attn_weight_soft_out", attn_weight)
-    attn_weight += attn_bias
-    attn_weight = softmax(attn_weight, axis=-1)
-    write_into_cache(cache, "attn_weight_soft_out", attn_weight)
-    return attn_weight @ value
+    output, logsumexp = attention_forward(
+        query, key, value, scale_factor, attn_mask, is_causal
+    )
+    write_into_cache(cache, "logsumexp", logsumexp)
+    return output
 
 
 # Loss funcs
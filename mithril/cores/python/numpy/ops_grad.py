@@ -23,20 +23,21 @@ import scipy.linalg as slin
 from scipy.special import erf
 
 from ...utils import is_tuple_int
+from .attention import attention_backward
+from .conv import conv_input_grad, conv_weight_grad
 from .ops import hinge_loss, sigmoid, softmax
 from .utils import (
     CacheType,
     accumulate_grads,
     calc_input_slices,
     fill_zeros_like,
-    get_submatrices1d,
-    get_submatrices2d,
     verify_shapes,
     write_into_cache,
 )
 
 __all__ = [
     "accumulate_grads",
+    "fill_zeros_like",
     "write_into_cache",
     "matrix_multiplication_grad",
     "multiplication_grad",
@@ -948,42 +949,14 @@ def conv1d_grad(
 ) -> np.ndarray[Any, Any]:
     verify_shapes(inputs, idx, non_differentiables=[2, 3, 4])
     input1, input2 = inputs
-    n, c, w = input1.shape
-    _, _, w_k = input2.shape
-    out_w = (w - w_k + sum(padding)) // stride + 1
     if idx == 0:
-        _output_gradient: np.ndarray[Any, Any] = np.zeros(
-            (
-                output_gradient.shape[0],
-                output_gradient.shape[1],
-                (output_gradient.shape[2] - 1) * stride + 1,
-            ),
-            dtype=output_gradient.dtype,
-        )
-        _output_gradient[:, :, ::stride] = output_gradient
-        _output_gradient = np.pad(
-            _output_gradient,
-            pad_width=((0,), (0,), (w_k - 1,)),
-            mode="constant",
-            constant_values=(0.0,),
-        )
-        submatrices_in1 = get_submatrices1d(
-            _output_gradient,
-            (n, c, _output_gradient.shape[2] - (w_k // 2) * 2),
-            w_k,
-            (0, 0),
-            1,
+        return conv_input_grad(
+            output_gradient, input2, input1.shape, (stride,), (padding,), (dilation,)
         )
-        rot_kernel = np.flip(input2, 2)
-        grad = np.einsum("nowl,oil->niw", submatrices_in1, rot_kernel)
-        input_grad = np.zeros_like(input1)
-        grad = grad[:, :, padding[0] : padding[0] + w]
-        input_grad[:, :, : grad.shape[2]] = grad
-        return input_grad
     elif idx == 1:
-        submatrices_in2 = get_submatrices1d(input1, (n, c, out_w), w_k, padding, stride)
-        return np.einsum("niwl,now->oil", submatrices_in2, output_gradient)
-
+        return conv_weight_grad(
+            output_gradient, input1, input2.shape, (stride,), (padding,), (dilation,)
+        )
     else:
         raise ValueError("Invalid index for conv1d gradient.")
 
@@ -1022,8 +995,9 @@ def conv2d_grad(
     stride: tuple[int, int] = (1, 1),
     padding: tuple[int, int] | tuple[tuple[int, int], tuple[int, int]] = (1, 1),
     dilation: tuple[int, int] = (1, 1),
+    groups: int = 1,
 ) -> np.ndarray[Any, Any]:
-    verify_shapes(inputs, idx, non_differentiables=[2, 3, 4])
+    verify_shapes(inputs, idx, non_differentiables=[2, 3, 4, 5])
     input1, input2 = inputs
 
     _padding: tuple[tuple[int, int], tuple[int, int]]
@@ -1032,58 +1006,14 @@ def conv2d_grad(
     else:
         _padding = padding  # type: ignore
 
-    n, c, h, w = input1.shape
-    _, _, h_k, w_k = input2.shape
-    out_h = (h - h_k + sum(_padding[0])) // stride[0] + 1
-    out_w = (w - w_k + sum(_padding[1])) // stride[1] + 1
-
     if idx == 0:
-        _output_gradient = np.zeros(
-            (
-                output_gradient.shape[0],
-                output_gradient.shape[1],
-                (output_gradient.shape[2] - 1) * stride[0] + 1,
-                (output_gradient.shape[3] - 1) * stride[1] + 1,
-            ),
-            dtype=output_gradient.dtype,
-        )
-        _output_gradient[:, :, :: stride[0], :: stride[1]] = output_gradient
-        _output_gradient = np.pad(
-            _output_gradient,
-            pad_width=((0,), (0,), (h_k - 1,), (w_k - 1,)),
-            mode="constant",
-            constant_values=(0.0,),
+        return conv_input_grad(
+            output_gradient, input2, input1.shape, stride, _padding, dilation, groups
         )
-        submatrices_in1 = get_submatrices2d(
-            _output_gradient,
-            (
-                n,
-                c,
-                _output_gradient.shape[2] - (h_k // 2) * 2,
-                _output_gradient.shape[3] - (w_k // 2) * 2,
-            ),
-            h_k,
-            w_k,
-            ((0, 0), (0, 0)),
-            1,
-        )
-        rot_kernel = np.rot90(input2, 2, axes=(2, 3))
-        grad = np.einsum("nohwkl,oikl->nihw", submatrices_in1, rot_kernel)
-        input_grad = np.zeros_like(input1)
-        grad = grad[
-            :,
-            :,
-            _padding[0][0] : _padding[0][0] + h,
-            _padding[1][0] : _padding[1][0] + w,
-        ]
-        input_grad[:, :, : grad.shape[2], : grad.shape[3]] = grad
-        return input_grad
     elif idx == 1:
-        submatrices_in2 = get_submatrices2d(
-            input1, (n, c, out_h, out_w), h_k, w_k, _padding, stride[0]
+        return conv_weight_grad(
+            output_gradient, input1, input2.shape, stride, _padding, dilation, groups
         )
-        return np.einsum("nihwkl,nohw->oikl", submatrices_in2, output_gradient)
-
     else:
         raise ValueError("Invalid index for conv2d gradient.")
 
@@ -1096,8 +1026,9 @@ def conv2d_bias_grad(
     stride: tuple[int, int] = (1, 1),
     padding: tuple[int, int] | tuple[tuple[int, int], tuple[int, int]] = (1, 1),
     dilation: tuple[int, int] = (1, 1),
+    groups: int = 1,
 ) -> np.ndarray[Any, Any]:
-    verify_shapes(inputs, idx, non_differentiables=[3, 4, 5])
+    verify_shapes(inputs, idx, non_differentiables=[3, 4, 5, 6])
     if idx < 2:
         return conv2d_grad(
             output_gradient,
@@ -1107,6 +1038,7 @@ def conv2d_bias_grad(
             stride=stride,
             padding=padding,
             dilation=dilation,
+            groups=groups,
         )
     elif idx == 2:
         return output_gradient.sum((0,), keepdims=True)
@@ -1648,49 +1580,44 @@ def scaled_dot_product_attention_grad(
     dropout_p: float = 0.0,
     is_causal: bool = False,
     scale: float | int | None = None,
+    grad_idxs: tuple[int, ...] = (0, 1, 2),
 ) -> np.ndarray[Any, Any]:
     verify_shapes(inputs, idx, non_differentiables=[3, 4, 5, 6])
-    if idx == 2:
-        return matrix_multiplication_grad(
-            output_gradient, None, 1, cache["attn_weight_soft_out"], inputs[2]
-        )
-    elif idx == 1:
-        query, key, value, *_ = inputs
-        attn_grad_1 = matrix_multiplication_grad(
-            output_gradient, None, 0, cache["attn_weight_soft_out"], value
-        )
-        attn_grad_soft = softmax_grad(
-            attn_grad_1,
-            {"output": cache["attn_weight_soft_out"], "axis": -1},
-            0,
-            cache["attn_weight_soft_out"],
-        )
-        key_grad = matrix_multiplication_grad(
-            attn_grad_soft, None, 1, query, np.swapaxes(key, -2, -1)
-        )
-        key_grad = np.swapaxes(key_grad, -2, -1) * cache["scale_factor"]
-        return key_grad
-    elif idx == 0:
-        query, key, value, *_ = inputs
-        attn_grad_1 = matrix_multiplication_grad(
-            output_gradient, None, 0, cache["attn_weight_soft_out"], value
-        )
-        attn_grad_soft = softmax_grad(
-            attn_grad_1,
-            {"output": cache["attn_weight_soft_out"], "axis": -1},
-            0,
-            cache["attn_weight_soft_out"],
-        )
-        query_grad = matrix_multiplication_grad(
-            attn_grad_soft,
-            None,
-            0,
-            query,
-            (np.swapaxes(key, -2, -1) * cache["scale_factor"]),
-        )
-        return query_grad
-    else:
+    if idx not in (0, 1, 2):
         raise RuntimeError("Something went wrong!")
+    query, key, value, attn_mask, *_ = inputs
+    # Gradients of the requested inputs (grad_idxs) are computed in a single
+    # blockwise pass. Each gradient is kept until it is requested for the same
+    # forward and output gradient, the entry is removed once all of them are
+    # served.
+    entry = cache.get("input_grads")
+    if (
+        entry is None
+        or entry[0] is not cache["logsumexp"]
+        or entry[1] is not output_gradient
+        or idx not in entry[2]
+    ):
+        entry = (
+            cache["logsumexp"],
+            output_gradient,
+            attention_backward(
+                output_gradient,
+                cache["output"],
+                cache["logsumexp"],
+                query,
+                key,
+                value,
+                cache["scale_factor"],
+                attn_mask,
+                is_causal,
+                grad_idxs=(*grad_idxs, idx),
+            ),
+        )
+        cache["input_grads"] = entry
+    grad = entry[2].pop(idx)
+    if not entry[2]:
+        del cache["input_grads"]
+    return grad
 
 
 def isnan_grad(
@@ -13,7 +13,10 @@
 # limitations under the License.
 
 
+import atexit
+import threading
 from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from typing import Any
 
@@ -37,6 +40,20 @@ dtype_map: BiMap[str, Any] = BiMap(
 )
 
 
+# Thread pools of the models evaluated concurrently, keyed by their number of
+# workers. They are shared by all models and shut down at exit.
+_executors: dict[int, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(max_workers: int) -> ThreadPoolExecutor:
+    with _executors_lock:
+        if (executor := _executors.get(max_workers)) is None:
+            executor = _executors[max_workers] = ThreadPoolExecutor(max_workers)
+            atexit.register(executor.shutdown)
+        return executor
+
+
 def get_submatrices1d(
     input: np.ndarray[Any, Any],
     output_size: tuple[int, ...],
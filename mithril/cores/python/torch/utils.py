@@ -14,6 +14,7 @@
 
 from collections.abc import Callable
 from functools import partial
+from typing import Any
 
 import torch
 
@@ -239,3 +240,52 @@ def calculate_tpr_fpr(
     fpr = false_positives / n_negative
     tpr = true_positives / n_positive
     return tpr, fpr
+
+
+class _Checkpoint(torch.autograd.Function):
+    """Evaluates a function without keeping its intermediate values for the
+    backward pass, which evaluates the function again to compute gradients.
+    Unlike torch.utils.checkpoint, it can be differentiated by torch.func
+    transforms.
+    """
+
+    @staticmethod
+    def forward(  # type: ignore[override]
+        fn: Callable[..., tuple[torch.Tensor, ...]], *args: torch.Tensor
+    ) -> tuple[torch.Tensor, ...]:
+        return fn(*args)
+
+    @staticmethod
+    def setup_context(ctx: Any, inputs: tuple[Any, ...], output: Any) -> None:
+        fn, *args = inputs
+        ctx.fn = fn
+        ctx.save_for_backward(*args)
+
+    @staticmethod
+    def backward(  # type: ignore[override]
+        ctx: Any, *grads: torch.Tensor
+    ) -> tuple[torch.Tensor | None, ...]:
+        args = list(ctx.saved_tensors)
+        # Only float arguments are differentiated.
+        indices = [idx for idx, arg in enumerate(args) if arg.is_floating_point()]
+
+        def fn(*float_args: torch.Tensor) -> tuple[torch.Tensor, ...]:
+            _args = list(args)
+            for idx, arg in zip(indices, float_args, strict=True):
+                _args[idx] = arg
+            return ctx.fn(*_args)
+
+        with torch.enable_grad():
+            _, fn_vjp = torch.func.vjp(fn, *[args[idx] for idx in indices])
+        arg_grads: list[torch.Tensor | None] = [None] * len(args)
+        for idx, grad in zip(indices, fn_vjp(grads), strict=True):
+            arg_grads[idx] = grad
+        return (None, *arg_grads)
+
+
+def checkpoint(
+    fn: Callable[..., tuple[torch.Tensor, ...]],
+) -> Callable[..., tuple[torch.Tensor, ...]]:
+    """Wraps given function to be evaluated again in backward pass. All float
+    tensors the function depends on must be passed as its arguments."""
+    return partial(_Checkpoint.apply, fn)
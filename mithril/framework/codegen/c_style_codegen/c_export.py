@@ -0,0 +1,564 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import os
+import shutil
+import subprocess
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any, Literal, override
+
+import numpy as np
+
+from ....backends.with_manualgrad.c_backend import CBackend
+from ....cores.c.array import PyArray
+from ...common import FinalCost
+from ...physical.model import PhysicalModel
+from . import c_ast, utils
+from .c_gen import ast_block_type
+from .raw_c_gen import RawCGen
+
+__all__ = ["CExport", "export_c", "OPTIMIZATION_PRESETS"]
+
+OPTIMIZATION_PRESETS: dict[str, list[str]] = {
+    "debug": ["-O0", "-g"],
+    "release": ["-O3"],
+    "native": ["-O3", "-march=native"],
+}
+
+# Files of the raw C runtime which are copied next to the exported code.
+RUNTIME_SOURCES = ["array.c", "ops.c", "utils.c"]
+RUNTIME_HEADERS = ["array.h", "cbackend.h", "ops.h", "utils.h"]
+
+
+@dataclass
+class CExport:
+    source_path: str
+    header_path: str
+    library_path: str | None
+    weights_path: str | None
+
+
+def export_c(
+    pm: PhysicalModel[PyArray],
+    directory: str,
+    params: Mapping[str, PyArray | np.ndarray[Any, Any]],
+    *,
+    name: str = "model",
+    weights: Literal["embedded", "sidecar"] = "embedded",
+    library: Literal["shared", "static"] | None = "shared",
+    optimization: str | Sequence[str] = "release",
+    openmp: bool = False,
+    compiler: str = "cc",
+) -> CExport:
+    """Exports a model compiled with CBackend as standalone C code and library.
+
+    Exported code does not depend on Python. Its header declares
+    `<name>_evaluate` (and `<name>_evaluate_gradients` if the model is not
+    compiled for inference) taking float buffers of the data inputs and
+    outputs in sorted key order, and `<name>_load_weights` if weights are
+    stored in a sidecar file. These are the only global symbols of
+    `<name>.c`, which includes the C runtime with internal linkage, so that
+    exported models can be linked together.
+
+    Parameters
+    ----------
+    pm : PhysicalModel
+        Model compiled with CBackend.
+    directory : str
+        Directory to write the exported files into.
+    params : Mapping[str, PyArray | np.ndarray]
+        Values of the trainable inputs of the model.
+    name : str
+        Name of the exported files and prefix of the functions.
+    weights : {"embedded", "sidecar"}
+        Whether the parameters are embedded into the code as constants or
+        written to `<name>.bin` which is read by `<name>_load_weights`.
+    library : {"shared", "static"} | None
+        Type of the library to build, no library is built if None.
+    optimization : str | Sequence[str]
+        Name of an optimization preset ("debug", "release" or "native") or
+        compiler flags.
+    openmp : bool
+        Whether to parallelize the kernels with OpenMP.
+    compiler : str
+        C compiler used to build the library.
+
+    Returns
+    -------
+    CExport
+        Paths of the exported files.
+    """
+    if not isinstance(pm.backend, CBackend):
+        raise NotImplementedError("Only models compiled with CBackend are exported.")
+    if not name.isidentifier():
+        raise ValueError(f"Name '{name}' is not a valid C identifier.")
+    if weights not in ("embedded", "sidecar"):
+        raise ValueError(f"Unknown weight storage '{weights}'.")
+    if isinstance(optimization, str):
+        if optimization not in OPTIMIZATION_PRESETS:
+            raise ValueError(
+                f"Unknown optimization preset '{optimization}', expected one "
+                f"of {list(OPTIMIZATION_PRESETS)}."
+            )
+        flags = list(OPTIMIZATION_PRESETS[optimization])
+    else:
+        flags = list(optimization)
+    if openmp:
+        flags.append("-fopenmp")
+
+    os.makedirs(directory, exist_ok=True)
+    for file_name in RUNTIME_SOURCES + RUNTIME_HEADERS:
+        shutil.copyfile(
+            os.path.join(pm.backend.SRC_PATH, file_name),
+            os.path.join(directory, file_name),
+        )
+
+    exporter = _CExporter(pm, name, params, weights)
+    source_path = os.path.join(directory, f"{name}.c")
+    header_path = os.path.join(directory, f"{name}.h")
+    weights_path = None
+    exporter.write_source(source_path)
+    with open(header_path, "w") as f:
+        f.write(exporter.generate_header())
+    if weights == "sidecar":
+        weights_path = os.path.join(directory, f"{name}.bin")
+        exporter.write_weights(weights_path)
+
+    library_path = None
+    if library is not None:
+        library_path = _build_library(
+            [source_path], directory, name, library, flags, compiler
+        )
+
+    return CExport(source_path, header_path, library_path, weights_path)
+
+
+def _build_library(
+    sources: list[str],
+    directory: str,
+    name: str,
+    library: str,
+    flags: list[str],
+    compiler: str,
+) -> str:
+    if library == "shared":
+        library_path = os.path.join(directory, f"lib{name}.so")
+        subprocess.check_output(
+            [compiler, *sources, "-shared", "-fPIC", *flags, "-lm", "-o", library_path]
+        )
+    elif library == "static":
+        library_path = os.path.join(directory, f"lib{name}.a")
+        objects = []
+        for source in sources:
+            obj = os.path.splitext(source)[0] + ".o"
+            subprocess.check_output(
+                [compiler, "-c", source, "-fPIC", *flags, "-o", obj]
+            )
+            objects.append(obj)
+        subprocess.check_output(["ar", "rcs", library_path, *objects])
+        for obj in objects:
+            os.remove(obj)
+    else:
+        raise ValueError(f"Unknown library type '{library}'.")
+    return library_path
+
+
+class _ExportCGen(RawCGen):
+    # Generated functions are only called by the exported entry points.
+    @override
+    def define_function(
+        self,
+        return_type: str,
+        name: str,
+        params: list[c_ast.Parameter],
+        pre_process: ast_block_type,
+        operations: ast_block_type,
+        post_process: ast_block_type,
+    ) -> c_ast.FunctionDef:
+        return super().define_function(
+            f"static {return_type}", name, params, pre_process, operations, post_process
+        )
+
+
+class _CExporter:
+    def __init__(
+        self,
+        pm: PhysicalModel[PyArray],
+        name: str,
+        params: Mapping[str, PyArray | np.ndarray[Any, Any]],
+        weights: str,
+    ) -> None:
+        self.pm = pm
+        self.name = name
+        self.weights = weights
+
+        self.codegen = _ExportCGen(pm)
+        # Runtime headers are copied next to the exported code.
+        self.codegen.header_path = self.codegen.configs.HEADER_NAME
+        self.codegen.generate_code()
+
+        flat_graph = pm.flat_graph
+        self.output_keys = sorted(key for key in pm.output_keys if key != FinalCost)
+        self.data_keys = sorted(pm.input_keys & flat_graph.runtime_static_keys)
+        param_keys = pm.input_keys - flat_graph.all_static_keys - flat_graph.unused_keys
+        if missing := param_keys - set(params):
+            raise KeyError(f"Values of the parameters {sorted(missing)} are missing.")
+        self.params = {key: self._to_numpy(params[key]) for key in sorted(param_keys)}
+        # Static tensors of the model are always embedded.
+        self.constants = {
+            key: self._to_numpy(value)
+            for key, value in flat_graph.cached_data.items()
+            if isinstance(value, PyArray)
+        }
+
+        self.gradients = not pm.inference
+        if self.gradients and FinalCost in pm.output_keys:
+            raise NotImplementedError(
+                "Gradients of models with final cost are not exported."
+            )
+        self.param_grad_keys = [
+            key + utils.BACKWARD_FN_SUFFIX
+            for key in self.params
+            if self.gradients and self.codegen._has_grad(key)
+        ]
+        self.output_grad_keys = [
+            key + utils.BACKWARD_FN_SUFFIX for key in self.output_keys
+        ]
+
+    def _to_numpy(self, value: PyArray | np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+        if isinstance(value, PyArray):
+            value = self.pm.backend.to_numpy(value)
+        return np.ascontiguousarray(value, dtype=np.float32)
+
+    def _size(self, key: str) -> int:
+        return math.prod(self.codegen.get_tensor_shape(key))
+
+    def _struct_keys(self, keys: list[str], arena: dict[str, str]) -> list[str]:
+        # Keys of the arrays given to the generated functions, arrays of the
+        # arenas and non-tensor values are handled by the generated code.
+        return [
+            key
+            for key in keys
+            if key != FinalCost
+            and key not in arena
+            and self.codegen.get_tensor_shape(key) is not None
+        ]
+
+    def write_source(self, path: str) -> None:
+        codegen = self.codegen
+        forward_keys = self._struct_keys(
+            codegen.struct_keys.eval_input_keys, codegen.arena_arrays
+        )
+        grad_input_keys: list[str] = []
+        if self.gradients:
+            grad_input_keys = self._struct_keys(
+                codegen.struct_keys.eval_grad_input_keys,
+                codegen.arena_arrays | codegen.grad_arena_arrays,
+            )
+        array_keys = sorted(set(forward_keys) | set(grad_input_keys))
+
+        stmts: list[c_ast.Stmt] = [c_ast.Comment("Arrays of the exported functions")]
+        for key in array_keys:
+            stmts += self.generate_array(key)
+
+        stmts.append(self.generate_inputs_struct("eval_inputs", forward_keys))
+        functions: list[c_ast.FunctionDef] = [self.generate_evaluate()]
+        if self.gradients:
+            stmts.append(
+                self.generate_inputs_struct("eval_grad_inputs", grad_input_keys)
+            )
+            functions.append(self.generate_evaluate_gradients(array_keys))
+        if self.weights == "sidecar":
+            functions.append(self.generate_load_weights())
+
+        exported_code = c_ast.FILE(
+            [
+                c_ast.Include("math.h", system=True),
+                c_ast.Include("stdio.h", system=True),
+                c_ast.Include(f"{self.name}.h"),
+            ],
+            stmts,  # type: ignore
+            functions,  # type: ignore
+        ).accept(c_ast.CStyleCodeGenerator())
+
+        # Runtime functions are declared with MITHRIL_API, defining it as
+        # static keeps them private to this translation unit.
+        runtime = "\n".join(
+            ["#define MITHRIL_API static"]
+            + [f'#include "{file_name}"' for file_name in RUNTIME_SOURCES]
+        )
+        assert codegen.code is not None
+        with open(path, "w") as f:
+            f.write(runtime + "\n\n" + codegen.code + "\n\n" + exported_code + "\n")
+
+    def generate_array(self, key: str) -> list[c_ast.Stmt]:
+        # static float weight_data[6] = {...};
+        # static int weight_shape[] = {2, 3};
+        # static int weight_strides[] = {3, 1};
+        # static Array weight_array = {.data = weight_data, ...};
+        shape = list(self.codegen.get_tensor_shape(key))
+        size = self._size(key)
+        stmts: list[c_ast.Stmt] = []
+
+        # Buffers of data inputs, outputs and their gradients are given by
+        # the caller.
+        data: c_ast.Expr = c_ast.Constant(None)
+        user_keys = self.data_keys + self.output_keys + self.output_grad_keys
+        if key not in user_keys and key not in self.param_grad_keys:
+            values = self.constants.get(key, self.params.get(key))
+            initial_value = None
+            if values is not None and (
+                key in self.constants or self.weights == "embedded"
+            ):
+                initial_value = c_ast.Variable(_float_initializer(values))
+            stmts.append(
+                c_ast.StaticVariable("float", f"{key}_data[{size}]", initial_value)
+            )
+            data = c_ast.Variable(f"{key}_data")
+
+        shape_ref: c_ast.Expr = c_ast.Constant(None)
+        strides_ref: c_ast.Expr = c_ast.Constant(None)
+        if shape:
+            strides = [math.prod(shape[idx + 1 :]) for idx in range(len(shape))]
+            stmts += [
+                c_ast.StaticVariable(
+                    "int",
+                    f"{key}_shape[]",
+                    c_ast.InitializerList(tuple(c_ast.Constant(s) for s in shape)),
+                ),
+                c_ast.StaticVariable(
+                    "int",
+                    f"{key}_strides[]",
+                    c_ast.InitializerList(tuple(c_ast.Constant(s) for s in strides)),
+                ),
+            ]
+            shape_ref = c_ast.Variable(f"{key}_shape")
+            strides_ref = c_ast.Variable(f"{key}_strides")
+
+        stmts.append(
+            c_ast.StaticVariable(
+                self.codegen.configs.ARRAY_NAME,
+                f"{key}_array",
+                c_ast.InitializerDict(
+                    ("data", "shape", "strides", "ndim", "size"),
+                    (
+                        data,
+                        shape_ref,
+                        strides_ref,
+                        c_ast.Constant(len(shape)),
+                        c_ast.Constant(size),
+                    ),
+                ),
+            )
+        )
+        return stmts
+
+    def generate_inputs_struct(self, struct_name: str, keys: list[str]) -> c_ast.Stmt:
+        # static struct eval_inputs model_eval_inputs = {.weight = &weight_array};
+        return c_ast.StaticVariable(
+            f"struct {struct_name}",
+            f"{self.name}_{struct_name}",
+            c_ast.InitializerDict(
+                tuple(keys),
+                tuple(c_ast.AddressOf(c_ast.Variable(f"{key}_array")) for key in keys),
+            ),
+        )
+
+    def _set_buffers(self, keys: list[str], const: bool) -> list[c_ast.Stmt]:
+        cast = "(float *) " if const else ""
+        return [
+            c_ast.Assign(
+                c_ast.Dot(c_ast.Variable(f"{key}_array"), "data"),
+                c_ast.Variable(f"{cast}{key}"),
+            )
+            for key in keys
+        ]
+
+    def _parameters(self, keys: list[str], const: bool) -> list[c_ast.Parameter]:
+        return [
+            c_ast.Parameter("const float *" if const else "float *", key)
+            for key in keys
+        ]
+
+    def evaluate_signature(self) -> list[c_ast.Parameter]:
+        return self._parameters(self.data_keys, True) + self._parameters(
+            self.output_keys, False
+        )
+
+    def evaluate_gradients_signature(self) -> list[c_ast.Parameter]:
+        return (
+            self._parameters(self.data_keys, True)
+            + self._parameters(self.output_grad_keys, True)
+            + self._parameters(self.output_keys, False)
+            + self._parameters(self.param_grad_keys, False)
+        )
+
+    def generate_evaluate(self) -> c_ast.FunctionDef:
+        body: list[c_ast.Stmt] = [
+            *self._set_buffers(self.data_keys, True),
+            *self._set_buffers(self.output_keys, False),
+            c_ast.MakeStmt(
+                c_ast.Call(
+                    "evaluate",
+                    [c_ast.AddressOf(c_ast.Variable(f"{self.name}_eval_inputs"))],
+                )
+            ),
+        ]
+        return c_ast.FunctionDef(
+            "void", f"{self.name}_evaluate", self.evaluate_signature(), body
+        )
+
+    def generate_evaluate_gradients(self, array_keys: list[str]) -> c_ast.FunctionDef:
+        body: list[c_ast.Stmt] = [
+            *self._set_buffers(self.data_keys, True),
+            *self._set_buffers(self.output_grad_keys, True),
+            *self._set_buffers(self.output_keys, False),
+            *self._set_buffers(self.param_grad_keys, False),
+        ]
+
+        # Gradients are accumulated by the generated code, so they are
+        # cleared before each call.
+        for key in array_keys:
+            if key.endswith(utils.BACKWARD_FN_SUFFIX) and key not in (
+                self.output_grad_keys
+            ):
+                buffer = key if key in self.param_grad_keys else f"{key}_data"
+                body.append(
+                    c_ast.MakeStmt(
+                        c_ast.Call(
+                            "memset",
+                            [buffer, "0", f"{self._size(key)} * sizeof(float)"],
+                        )
+                    )
+                )
+
+        body += [
+            c_ast.MakeStmt(
+                c_ast.Call(
+                    "evaluate",
+                    [c_ast.AddressOf(c_ast.Variable(f"{self.name}_eval_inputs"))],
+                )
+            ),
+            c_ast.MakeStmt(
+                c_ast.Call(
+                    "evaluate_gradients",
+                    [c_ast.AddressOf(c_ast.Variable(f"{self.name}_eval_grad_inputs"))],
+                )
+            ),
+        ]
+        return c_ast.FunctionDef(
+            "void",
+            f"{self.name}_evaluate_gradients",
+            self.evaluate_gradients_signature(),
+            body,
+        )
+
+    def generate_load_weights(self) -> c_ast.FunctionDef:
+        # Parameters are read in sorted key order, see write_weights.
+        body: list[c_ast.Stmt] = [
+            c_ast.Assign(
+                c_ast.Variable("FILE * file"),
+                c_ast.Call("fopen", ["path", '"rb"']),
+            ),
+            c_ast.If(
+                c_ast.Variable("file == NULL"), [c_ast.Return(c_ast.Constant(-1))]
+            ),
+            c_ast.Assign(c_ast.Variable("size_t count"), c_ast.Constant(0)),
+        ]
+        total = 0
+        for key, value in self.params.items():
+            body.append(
+                c_ast.Assign(
+                    c_ast.Variable("count"),
+                    c_ast.Variable(
+                        f"count + fread({key}_data, sizeof(float), {value.size}, file)"
+                    ),
+                )
+            )
+            total += value.size
+        body += [
+            c_ast.MakeStmt(c_ast.Call("fclose", ["file"])),
+            c_ast.Return(c_ast.Variable(f"count == {total} ? 0 : -1")),
+        ]
+        return c_ast.FunctionDef(
+            "int",
+            f"{self.name}_load_weights",
+            [c_ast.Parameter("const char *", "path")],
+            body,
+        )
+
+    def write_weights(self, path: str) -> None:
+        with open(path, "wb") as f:
+            for value in self.params.values():
+                f.write(value.tobytes())
+
+    def generate_header(self) -> str:
+        guard = f"{self.name.upper()}_H"
+        lines = [f"#ifndef {guard}", f"#define {guard}", ""]
+        lines += ["#ifdef __cplusplus", 'extern "C" {', "#endif", ""]
+
+        # Sizes of the buffers given to the functions.
+        for key in self.data_keys + self.output_keys + self.param_grad_keys:
+            shape = list(self.codegen.get_tensor_shape(key))
+            lines.append(f"/* {key}: {shape} */")
+            lines.append(
+                f"#define {self.name.upper()}_{key.upper()}_SIZE {self._size(key)}"
+            )
+        lines.append("")
+
+        lines.append(self._declaration("void", "evaluate", self.evaluate_signature()))
+        if self.gradients:
+            lines.append(
+                self._declaration(
+                    "void", "evaluate_gradients", self.evaluate_gradients_signature()
+                )
+            )
+        if self.weights == "sidecar":
+            lines.append(
+                f"/* Reads parameters from {self.name}.bin, returns 0 on success. */"
+            )
+            lines.append(f"int {self.name}_load_weights(const char *path);")
+
+        lines += [
+            "",
+            "#ifdef __cplusplus",
+            "}",
+            "#endif",
+            "",
+            f"#endif /* {guard} */",
+            "",
+        ]
+        return "\n".join(lines)
+
+    def _declaration(
+        self, return_type: str, name: str, params: list[c_ast.Parameter]
+    ) -> str:
+        generator = c_ast.CStyleCodeGenerator()
+        params_str = ", ".join(generator.visit(param) for param in params)
+        return f"{return_type} {self.name}_{name}({params_str or 'void'});"
+
+
+def _float_initializer(values: np.ndarray[Any, Any]) -> str:
+    # Shortest representations of the values which are read back exactly.
+    items = []
+    for value in values.ravel().tolist():
+        if math.isfinite(value):
+            items.append(repr(value))
+        elif math.isnan(value):
+            items.append("NAN")
+        else:
+            items.append("INFINITY" if value > 0 else "-INFINITY")
+    return "{" + ", ".join(items) + "}"
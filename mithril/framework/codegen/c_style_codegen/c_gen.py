@@ -13,16 +13,19 @@
 # limitations under the License.
 
 import ctypes
+import math
 import os
 import subprocess
 import tempfile
 from collections.abc import Callable, Sequence
 from functools import partial
+from itertools import accumulate
 
 from ....backends.with_manualgrad.c_backend import CBackend
 from ....backends.with_manualgrad.ggml_backend import GGMLBackend
 from ....common import CGenConfig
 from ....cores.c.array import PyArray
+from ....utils.type_utils import is_list_int
 from ...common import (
     EvaluateAllType,
     EvaluateType,
@@ -30,6 +33,7 @@ from ...common import (
     Tensor,
 )
 from ...logical.operator import Operator
+from ...physical.memory_planner import BufferSpec, MemoryPlan, plan_memory
 from ...physical.model import PhysicalModel
 from ..code_gen import CodeGen
 from ..utils import check_repr_inequality
@@ -37,6 +41,9 @@ from . import c_ast, utils
 
 ast_block_type = list[c_ast.Stmt] | list[c_ast.Expr] | list[c_ast.Stmt | c_ast.Expr]
 
+ARENA_NAME = "arena"
+GRAD_ARENA_NAME = "grad_arena"
+
 
 class CGen(CodeGen[PyArray]):
     dynamic_links: list[str] = []
@@ -58,9 +65,19 @@ class CGen(CodeGen[PyArray]):
         self.backend: CBackend | GGMLBackend = self.pm.backend
         self.configs: CGenConfig = self.backend.CODEGEN_CONFIG
 
+        # Header of the backend included by the generated code, exported code
+        # includes it relative to its own directory.
+        self.header_path = os.path.join(self.backend.SRC_PATH, self.configs.HEADER_NAME)
+
         # Determine struct keys
         self.struct_keys: utils.StructKeys = self.determine_struct_keys()
 
+        # Names of the statically allocated arrays of intermediate values and
+        # their gradients. They are not allocated by the wrapper functions,
+        # yet gradients given by the caller are used instead of their arrays.
+        self.arena_arrays: dict[str, str] = {}
+        self.grad_arena_arrays: dict[str, str] = {}
+
         # Pre-processors for customizing operator code generation
         # Maps operator keys to functions that transform (op, inputs, context)
         self.pre_processors: dict[
@@ -84,6 +101,8 @@ class CGen(CodeGen[PyArray]):
         self.file_path = file_path
 
         self.imports.extend(self.generate_imports())
+        if self.configs.ALLOCATE_INTERNALS:
+            self.globals.extend(self.generate_arenas())
         self.functions.append(self.generate_evaluate())
         if not self.pm.inference:
             self.functions.append(self.generate_evaluate_gradients())
@@ -111,14 +130,32 @@ class CGen(CodeGen[PyArray]):
 
         self.code = generated_code
 
+    def load_code(self, code: str, file_path: str | None = None) -> None:
+        if file_path is None:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".c") as tmp_file:
+                file_path = tmp_file.name
+        super().load_code(code, file_path)
+        # Arrays placed into arenas by the loaded code must not be allocated
+        # by the wrapper functions, their layout is determined again.
+        if self.configs.ALLOCATE_INTERNALS:
+            self.generate_arenas()
+
+    @property
+    def so_file_path(self) -> str:
+        assert self.file_path is not None, "Code has not been generated yet!"
+        # For now we are only supporting .so files
+        return self.file_path.replace(".c", ".so")
+
     def compile_code(
         self, jit: bool = False, compile_flags: list[str] | None = None
     ) -> tuple[EvaluateType[PyArray], EvaluateAllType[PyArray] | None]:
         assert not jit, "JIT is not yet supported for CBackend"
-        assert self.file_path is not None, "Code has not been generated yet!"
+        so_file_path = self.build_shared_library(compile_flags)
+        return self.load_shared_library(so_file_path)
 
-        # For now we are only supporting .so files
-        so_file_path = self.file_path.replace(".c", ".so")
+    def build_shared_library(self, compile_flags: list[str] | None = None) -> str:
+        assert self.file_path is not None, "Code has not been generated yet!"
+        so_file_path = self.so_file_path
 
         default_compile_flags = ["cc", self.file_path, "-shared", "-fPIC", "-g"]
         if compile_flags:
@@ -135,7 +172,11 @@ class CGen(CodeGen[PyArray]):
                 so_file_path,
             ]
         )
+        return so_file_path
 
+    def load_shared_library(
+        self, so_file_path: str
+    ) -> tuple[EvaluateType[PyArray], EvaluateAllType[PyArray] | None]:
         # If the given file path is not absolute, make it relative to the current
         # working directory
         if so_file_path[0] != "/":
@@ -208,7 +249,7 @@ class CGen(CodeGen[PyArray]):
             if self.configs.ALLOCATE_INTERNALS:
                 # Allocate output arrays
                 for arg_key in self.struct_keys.eval_input_keys:
-                    if arg_key in inputs:
+                    if arg_key in inputs or arg_key in self.arena_arrays:
                         continue
                     if self.get_tensor_shape(arg_key) is None:
                         continue
@@ -223,6 +264,7 @@ class CGen(CodeGen[PyArray]):
                     for key in self.struct_keys.eval_input_keys
                     if key != FinalCost
                     if self.get_tensor_shape(key) is not None
+                    if key not in self.arena_arrays
                 }
             )
             inputs_struct_ptr = ctypes.pointer(inputs_struct)
@@ -242,15 +284,17 @@ class CGen(CodeGen[PyArray]):
                     continue
                 array_ptr = getattr(output_struct, key)
 
+                # Outputs written into given arrays keep them alive.
+                base = inputs.get(key)
                 if (
                     FinalCost in self.pm.flat_graph.output_dict
                     and key == self.pm.flat_graph.output_dict[FinalCost]
                 ):
-                    outputs[FinalCost] = PyArray(array_ptr.contents, shape=[1])
-                    outputs[key] = PyArray(array_ptr.contents, shape=[1])
+                    outputs[FinalCost] = PyArray(array_ptr.contents, [1], base)
+                    outputs[key] = PyArray(array_ptr.contents, [1], base)
                 else:
                     outputs[key] = PyArray(
-                        array_ptr.contents, shape=self.get_tensor_shape(key)
+                        array_ptr.contents, self.get_tensor_shape(key), base
                     )
 
             return outputs
@@ -288,8 +332,12 @@ class CGen(CodeGen[PyArray]):
                     self.pm.flat_graph.all_source_keys - self.pm.flat_graph.unused_keys
                 ):
                     # In CBackend we are creating all internal gradients with zeros.
-                    if self._has_grad(key) and key not in gradients:
-                        arr_shape = self.get_tensor_shape(key)
+                    if (
+                        self._has_grad(key)
+                        and key not in gradients
+                        and key + utils.BACKWARD_FN_SUFFIX not in self.grad_arena_arrays
+                        and (arr_shape := self.get_tensor_shape(key)) is not None
+                    ):
                         gradients[key] = self.backend.zeros(*arr_shape)
 
             gradients = {
@@ -305,6 +353,8 @@ class CGen(CodeGen[PyArray]):
                     )
                     for key in self.struct_keys.eval_grad_input_keys
                     if self.get_tensor_shape(key) is not None
+                    if key not in self.arena_arrays
+                    if key in inputs or key not in self.grad_arena_arrays
                 }
             )
 
@@ -316,7 +366,7 @@ class CGen(CodeGen[PyArray]):
                 key = grad_key.replace(utils.BACKWARD_FN_SUFFIX, "")
                 array_ptr = getattr(output_struct, grad_key)
                 gradients[key] = PyArray(
-                    array_ptr.contents, shape=self.get_tensor_shape(key)
+                    array_ptr.contents, self.get_tensor_shape(key), inputs.get(grad_key)
                 )
 
             outputs = {}
@@ -328,8 +378,7 @@ class CGen(CodeGen[PyArray]):
         return evaluate_wrapper, evaluate_gradients_wrapper  # type: ignore
 
     def generate_imports(self) -> list[c_ast.Include]:
-        header_path = os.path.join(self.backend.SRC_PATH, self.configs.HEADER_NAME)
-        return [c_ast.Include(header_path, system=False)]
+        return [c_ast.Include(self.header_path, system=False)]
 
     def generate_evaluate(self) -> c_ast.FunctionDef:
         # Function body
@@ -385,6 +434,30 @@ class CGen(CodeGen[PyArray]):
             )
         ]
 
+        # Gradients are accumulated, so their arena is cleared in each call.
+        # Arrays of the arena are used for the gradients not given.
+        if self.grad_arena_arrays:
+            pre_process.append(  # type: ignore
+                c_ast.MakeStmt(
+                    c_ast.Call(
+                        "memset",
+                        [GRAD_ARENA_NAME, "0", f"sizeof({GRAD_ARENA_NAME})"],
+                    )
+                )
+            )
+        for key, array_name in self.grad_arena_arrays.items():
+            key_ref = c_ast.Arrow(c_ast.Variable("inputs"), key)
+            pre_process.append(  # type: ignore
+                c_ast.If(
+                    c_ast.BinaryOp("==", key_ref, c_ast.Constant(None)),
+                    [
+                        c_ast.Assign(
+                            key_ref, c_ast.AddressOf(c_ast.Variable(array_name))
+                        )
+                    ],
+                )
+            )
+
         for output_key in reversed(list(self.pm.flat_graph.topological_order)):
             # Staticly infered and unused model will not be added
             if not self._has_grad(output_key):
@@ -544,6 +617,9 @@ class CGen(CodeGen[PyArray]):
         )
 
     def create_key_ref(self, key: str, context: str, load: bool = True) -> c_ast.Expr:
+        if (array_name := self.arena_arrays.get(key)) is not None:
+            return c_ast.AddressOf(c_ast.Variable(array_name))
+
         # TODO: This is a bit of a hack, we should have a better way to handle this
         if key in self.struct_keys.eval_cache_keys:
             if key == FinalCost and FinalCost in self.pm.flat_graph.output_dict:
@@ -691,6 +767,107 @@ class CGen(CodeGen[PyArray]):
 
         return struct_keys
 
+    def generate_arenas(self) -> list[c_ast.Stmt]:
+        """Places intermediate values with known shapes, and their gradients
+        in training, into statically allocated arenas.
+
+        Offsets, shapes and strides of the arrays are determined here, so the
+        generated functions do not allocate any memory. Intermediate values
+        share memory only if memory planning is requested, since their
+        gradients need them otherwise. Arenas are static globals of the
+        generated library, so its functions must not be called concurrently.
+        """
+        flat_graph = self.pm.flat_graph
+        shapes = self.pm.shapes
+        itemsize = self.backend.precision // 8
+        specs: dict[str, BufferSpec] = {}
+        for key in flat_graph.topological_order:
+            shape = shapes.get(key)
+            if (
+                key not in flat_graph.output_dict.values()
+                and flat_graph.all_data[key].is_tensor
+                and shape
+                and is_list_int(shape)
+            ):
+                specs[key] = BufferSpec(tuple(shape), "float32", itemsize)
+
+        if self.pm.plan_memory:
+            plan = self.pm.memory_plan = plan_memory(flat_graph, specs)
+        else:
+            plan = MemoryPlan(
+                list(specs.values()), {key: idx for idx, key in enumerate(specs)}
+            )
+
+        stmts: list[c_ast.Stmt] = []
+        sizes = [math.prod(spec.shape) for spec in plan.buffers]
+        *offsets, arena_size = accumulate(sizes, initial=0)
+        if arena_size:
+            stmts.append(c_ast.StaticVariable("float", f"{ARENA_NAME}[{arena_size}]"))
+        for key, idx in plan.assignments.items():
+            array_name = self.arena_arrays[key] = f"{ARENA_NAME}_{key}"
+            stmts += self.create_arena_array(
+                array_name, ARENA_NAME, offsets[idx], plan.buffers[idx].shape
+            )
+
+        if not self.pm.inference:
+            grad_keys = [key for key in plan.assignments if self._has_grad(key)]
+            grad_sizes = [math.prod(specs[key].shape) for key in grad_keys]
+            *grad_offsets, grad_arena_size = accumulate(grad_sizes, initial=0)
+            if grad_arena_size:
+                stmts.append(
+                    c_ast.StaticVariable(
+                        "float", f"{GRAD_ARENA_NAME}[{grad_arena_size}]"
+                    )
+                )
+            for key, offset in zip(grad_keys, grad_offsets, strict=True):
+                grad_key = key + utils.BACKWARD_FN_SUFFIX
+                array_name = self.grad_arena_arrays[grad_key] = (
+                    f"{ARENA_NAME}_{grad_key}"
+                )
+                stmts += self.create_arena_array(
+                    array_name, GRAD_ARENA_NAME, offset, specs[key].shape
+                )
+
+        return stmts
+
+    def create_arena_array(
+        self, array_name: str, arena_name: str, offset: int, shape: tuple[int, ...]
+    ) -> list[c_ast.Stmt]:
+        # static int arena_x_shape[] = {2, 3};
+        # static int arena_x_strides[] = {3, 1};
+        # static Array arena_x = {.data = arena + 0, .shape = arena_x_shape, ...};
+        strides = [math.prod(shape[idx + 1 :]) for idx in range(len(shape))]
+        return [
+            c_ast.StaticVariable(
+                "int",
+                f"{array_name}_shape[]",
+                c_ast.InitializerList(tuple(c_ast.Constant(dim) for dim in shape)),
+            ),
+            c_ast.StaticVariable(
+                "int",
+                f"{array_name}_strides[]",
+                c_ast.InitializerList(
+                    tuple(c_ast.Constant(stride) for stride in strides)
+                ),
+            ),
+            c_ast.StaticVariable(
+                self.configs.ARRAY_NAME,
+                array_name,
+                c_ast.InitializerDict(
+                    ("data", "shape", "strides", "ndim", "size"),
+                    (
+                        c_ast.BinaryOp(
+                            "+", c_ast.Variable(arena_name), c_ast.Constant(offset)
+                        ),
+                        c_ast.Variable(f"{array_name}_shape"),
+                        c_ast.Variable(f"{array_name}_strides"),
+                        c_ast.Constant(len(shape)),
+                        c_ast.Constant(math.prod(shape)),
+                    ),
+                ),
+            ),
+        ]
+
     def initialize_global_structs(self) -> None:
         # Init cache struct
         cache_struct = c_ast.StructInit(
@@ -13,10 +13,11 @@
 # limitations under the License.
 
 
-from collections.abc import Sequence
+from collections.abc import Callable, Sequence
 from typing import override
 
 from ....cores.c.array import PyArray
+from ....cores.c.ggml.quantization import BLOCK_SIZE, QUANTIZATION_TYPES
 from ...logical.operator import Operator
 from ...physical.model import PhysicalModel
 from . import c_ast, utils
@@ -38,6 +39,55 @@ class GGMLCodeGen(CGen):
             }
         )
 
+        # Quantized weights and the keys of their transposes, which are
+        # multiplied directly with the weights instead.
+        self.quantized_keys: dict[str, str] = {}
+        self.quantized_transposes: dict[str, str] = {}
+        self.determine_quantized_keys()
+
+    def determine_quantized_keys(self) -> None:
+        flat_graph = self.pm.flat_graph
+        for key, type in self.pm.quantized_keys.items():
+            if type not in QUANTIZATION_TYPES:
+                raise ValueError(
+                    f"Unsupported quantization type '{type}' for key '{key}', "
+                    f"expected one of {list(QUANTIZATION_TYPES)}."
+                )
+            if key not in flat_graph.input_keys or flat_graph.is_key_static(key):
+                raise KeyError(f"Quantized key '{key}' is not a weight of the model.")
+
+            shape = self.get_tensor_shape(key)
+            if shape is None or len(shape) != 2 or shape[-1] % BLOCK_SIZE != 0:
+                raise ValueError(
+                    f"Quantized key '{key}' must be a matrix whose last "
+                    f"dimension is a multiple of {BLOCK_SIZE}, got shape {shape}."
+                )
+
+            # Quantized tensors can only be the weights of ggml_mul_mat which
+            # multiplies with their transposes, i.e. input @ weight.T
+            for transpose_key in flat_graph.get_target_keys(key):
+                op = flat_graph.get_op(transpose_key)
+                axes_key = flat_graph.get_source_keys(transpose_key)[-1]
+                if op.formula_key != "transpose" or flat_graph.cached_data.get(
+                    axes_key
+                ) not in (None, (1, 0)):
+                    raise NotImplementedError(
+                        f"Quantized key '{key}' can only be used transposed."
+                    )
+                for target_key in flat_graph.get_target_keys(transpose_key):
+                    op = flat_graph.get_op(target_key)
+                    source_keys = flat_graph.get_source_keys(target_key)
+                    if (
+                        op.formula_key != "matrix_multiplication"
+                        or source_keys[1] != transpose_key
+                    ):
+                        raise NotImplementedError(
+                            f"Transpose of quantized key '{key}' can only be the "
+                            "right input of matrix multiplications."
+                        )
+                self.quantized_transposes[transpose_key] = key
+            self.quantized_keys[key] = QUANTIZATION_TYPES[type]
+
     def generate_code(self, file_path: str | None = None) -> None:
         # Include stdlib.h for atexit
         stdlib_include = c_ast.Include("stdlib.h", system=True)
@@ -70,6 +120,27 @@ class GGMLCodeGen(CGen):
             c_ast.Constant("NULL"),
         )
 
+        # Compute plans and their work buffers are also created once with
+        # the graphs, threads of the threadpool are shared by both graphs.
+        plans: list[c_ast.Stmt] = []
+        for fn_ref_name in ["eval", "eval_grad"]:
+            plans += [
+                c_ast.StaticVariable(
+                    "struct ggml_cplan", f"{fn_ref_name}_static_cplan"
+                ),
+                c_ast.StaticVariable(
+                    c_ast.Pointer("uint8_t"),
+                    f"{fn_ref_name}_static_work",
+                    c_ast.Constant("NULL"),
+                ),
+            ]
+
+        threadpool = c_ast.StaticVariable(
+            c_ast.Pointer("struct ggml_threadpool"),
+            "static_threadpool",
+            c_ast.Constant("NULL"),
+        )
+
         cleanup_fn = self.generate_cleanup_fn()
 
         self.globals.extend(
@@ -78,6 +149,8 @@ class GGMLCodeGen(CGen):
                 eval_grad_static_ctx,
                 eval_static_gf,
                 eval_grad_static_gf,
+                *plans,
+                threadpool,
                 cleanup_fn,
             ]
         )
@@ -109,6 +182,29 @@ class GGMLCodeGen(CGen):
         fn_body.append(if_check1)
         fn_body.append(if_check2)
 
+        for fn_ref_name in ["eval", "eval_grad"]:
+            fn_body += [
+                c_ast.MakeStmt(c_ast.Call("free", [f"{fn_ref_name}_static_work"])),
+                c_ast.Assign(
+                    c_ast.Variable(f"{fn_ref_name}_static_work"),
+                    c_ast.Constant("NULL"),
+                ),
+            ]
+
+        fn_body.append(
+            c_ast.If(
+                c_ast.Variable("static_threadpool != NULL"),
+                [
+                    c_ast.MakeStmt(
+                        c_ast.Call("ggml_threadpool_free", ["static_threadpool"])
+                    ),
+                    c_ast.Assign(
+                        c_ast.Variable("static_threadpool"), c_ast.Constant("NULL")
+                    ),
+                ],
+            )
+        )
+
         return c_ast.FunctionDef("void", "cleanup", [], fn_body)
 
     @override
@@ -134,6 +230,48 @@ class GGMLCodeGen(CGen):
             return_type, name, params, pre_process, operations, post_process
         )
 
+    @override
+    def generate_op(
+        self,
+        op: Operator,
+        inputs: Sequence[str | int | float | bool | None],
+        output_key: str,
+        context: str,
+        pre_processor: Callable[
+            [Operator, Sequence[str | int | float | bool | None], str],
+            tuple[
+                Operator, Sequence[str | int | float | bool | None], list[c_ast.Stmt]
+            ],
+        ]
+        | None = None,
+        post_processor: Callable[
+            [Operator, c_ast.Expr, str], tuple[c_ast.Expr, list[c_ast.Stmt]]
+        ]
+        | None = None,
+    ) -> list[c_ast.Stmt]:
+        # Transposes of quantized weights are not computed, matrix
+        # multiplications use the weights directly.
+        if output_key in self.quantized_transposes:
+            return []
+        if op.formula_key == "matrix_multiplication" and (
+            weight_key := self.quantized_transposes.get(inputs[1])  # type: ignore
+        ):
+            assert isinstance(inputs[0], str)
+            # ggml_mul_mat(a, b) computes b @ a.T
+            op_call = self.call_op(
+                "ggml_mul_mat",
+                [
+                    self.create_key_ref(weight_key, context=context),
+                    self.create_key_ref(inputs[0], context=context),
+                ],
+                context,
+            )
+            return [self.assign_primitive_output(output_key, op_call, context)]
+
+        return super().generate_op(
+            op, inputs, output_key, context, pre_processor, post_processor
+        )
+
     @override
     def call_op(
         self, formula_key: str, input_vars: list[c_ast.Expr], context: str
@@ -182,23 +320,16 @@ class GGMLCodeGen(CGen):
             input_keys, fn_ref_name
         )
 
+        # Compute graph with the plan created in initialization
         compute_block = [
             c_ast.Comment("Compute graph"),
             c_ast.MakeStmt(
                 c_ast.Call(
-                    "ggml_graph_compute_with_ctx",
-                    [ctx_name, f"{fn_ref_name}_static_gf", c_ast.Constant(1)],
-                )
-            ),
-        ]
-
-        # Compute graph
-        compute_block = [
-            c_ast.Comment("Compute graph"),
-            c_ast.MakeStmt(
-                c_ast.Call(
-                    "ggml_graph_compute_with_ctx",
-                    [ctx_name, f"{fn_ref_name}_static_gf", c_ast.Constant(1)],
+                    "ggml_graph_compute",
+                    [
+                        f"{fn_ref_name}_static_gf",
+                        c_ast.AddressOf(c_ast.Variable(f"{fn_ref_name}_static_cplan")),
+                    ],
                 )
             ),
         ]
@@ -256,7 +387,8 @@ class GGMLCodeGen(CGen):
             if shape is not None:
                 tensor = c_ast.Call(
                     f"ggml_new_tensor_{len(shape)}d",
-                    [ctx_name, "GGML_TYPE_F32"] + [str(size) for size in shape],
+                    [ctx_name, self.quantized_keys.get(key, "GGML_TYPE_F32")]
+                    + [str(size) for size in shape],
                 )
                 init_block.append(c_ast.Assign(c_ast.Variable(key), tensor))  # type: ignore
 
@@ -317,6 +449,7 @@ class GGMLCodeGen(CGen):
                 )
             )
 
+        init_block.extend(self.create_plan_block(fn_ref_name))  # type: ignore
         init_block.append(c_ast.MakeStmt(c_ast.Call("atexit", ["cleanup"])))  # type: ignore
 
         # Wrap initialization in if check
@@ -324,6 +457,51 @@ class GGMLCodeGen(CGen):
 
         return if_init  # type: ignore
 
+    def create_plan_block(self, fn_ref_name: str) -> list[c_ast.Stmt]:
+        # Planning the graph determines the work buffer size for the number
+        # of threads, so it is done once and reused in all subsequent calls
+        # instead of allocating a new buffer in the context for every call.
+        n_threads = c_ast.Constant(self.backend.n_threads)  # type: ignore
+        plan_name = f"{fn_ref_name}_static_cplan"
+        work_name = f"{fn_ref_name}_static_work"
+
+        create_threadpool = c_ast.If(
+            c_ast.Variable("static_threadpool == NULL"),
+            [
+                c_ast.Assign(
+                    c_ast.Variable("struct ggml_threadpool_params threadpool_params"),
+                    c_ast.Call("ggml_threadpool_params_default", [n_threads]),
+                ),
+                c_ast.Assign(
+                    c_ast.Variable("static_threadpool"),
+                    c_ast.Call(
+                        "ggml_threadpool_new",
+                        [c_ast.AddressOf(c_ast.Variable("threadpool_params"))],
+                    ),
+                ),
+            ],
+        )
+
+        return [
+            c_ast.Comment("Create compute plan and its work buffer only once"),
+            create_threadpool,
+            c_ast.Assign(
+                c_ast.Variable(plan_name),
+                c_ast.Call(
+                    "ggml_graph_plan",
+                    [f"{fn_ref_name}_static_gf", n_threads, "static_threadpool"],
+                ),
+            ),
+            c_ast.Assign(
+                c_ast.Variable(work_name),
+                c_ast.Call("malloc", [f"{plan_name}.work_size"]),
+            ),
+            c_ast.Assign(
+                c_ast.Dot(c_ast.Variable(plan_name), "work_data"),
+                c_ast.Variable(work_name),
+            ),
+        ]
+
     @override
     def create_key_ref(
         self, key: str, context: str, load: bool = True
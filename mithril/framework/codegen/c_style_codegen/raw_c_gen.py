@@ -13,16 +13,48 @@
 # limitations under the License.
 
 from collections.abc import Callable, Sequence
-from typing import override
+from typing import Any, override
 
+from ....cores.c.array import PyArray
 from ...logical.operator import Operator
+from ...physical.model import PhysicalModel
 from . import c_ast, utils
 from .c_gen import CGen
 
+# C functions whose names differ from the formula keys of their operators to
+# avoid clashes with the functions of the C math library.
+FUNCTION_NAMES = {
+    "exp": "array_exp",
+    "log": "array_log",
+    "sqrt": "array_sqrt",
+    "tanh": "array_tanh",
+}
+
 
 class RawCGen(CGen):
     dynamic_links = ["-lmithrilc"]
 
+    def __init__(self, pm: PhysicalModel[PyArray]) -> None:
+        super().__init__(pm)
+
+        # Names of the static arrays created for scalar operands of
+        # arithmetic operators.
+        self.scalar_arrays: dict[str, str] = {}
+
+        self.pre_processors.update(
+            {
+                "reduce_mean": self.pre_reduce_axis,
+                "variance": self.pre_reduce_axis,
+                "add": self.pre_scalar_operands,
+                "subtract": self.pre_scalar_operands,
+                "multiplication": self.pre_scalar_operands,
+                "divide": self.pre_scalar_operands,
+                "concat": self.pre_concat,
+                "cross_entropy": self.pre_cross_entropy,
+                "cross_entropy_with_logits": self.pre_cross_entropy,
+            }
+        )
+
     @override
     def determine_struct_keys(self) -> utils.StructKeys:
         struct_keys = super().determine_struct_keys()
@@ -41,7 +73,10 @@ class RawCGen(CGen):
     def create_key_ref(
         self, key: str, context: str, load: bool = True
     ) -> c_ast.Variable | c_ast.Expr:
-        if key in self.struct_keys.eval_input_keys:
+        if (array_name := self.scalar_arrays.get(key)) is not None:
+            return c_ast.AddressOf(c_ast.Variable(array_name))
+
+        if key in self.struct_keys.eval_input_keys and key not in self.arena_arrays:
             return c_ast.Variable(f"inputs->{key}")
 
         else:
@@ -53,6 +88,41 @@ class RawCGen(CGen):
     ) -> c_ast.Assign:
         return c_ast.MakeStmt(source)  # type: ignore
 
+    @override
+    def generate_op(
+        self,
+        op: Operator,
+        inputs: Sequence[str | int | float | bool | None],
+        output_key: str,
+        context: str,
+        pre_processor: Callable[
+            [Operator, Sequence[str | int | float | bool | None], str],
+            tuple[
+                Operator, Sequence[str | int | float | bool | None], list[c_ast.Stmt]
+            ],
+        ]
+        | None = None,
+        post_processor: Callable[
+            [Operator, c_ast.Expr, str], tuple[c_ast.Expr, list[c_ast.Stmt]]
+        ]
+        | None = None,
+    ) -> list[c_ast.Stmt]:
+        # Lists are not materialized, their items are given to the operators
+        # using them instead (see pre_concat).
+        if op.formula_key == "to_list":
+            return []
+        return super().generate_op(
+            op, inputs, output_key, context, pre_processor, post_processor
+        )
+
+    @override
+    def call_op(
+        self, formula_key: str, input_vars: list[c_ast.Expr], context: str
+    ) -> c_ast.Expr:
+        return super().call_op(
+            FUNCTION_NAMES.get(formula_key, formula_key), input_vars, context
+        )
+
     def pre_process_op(
         self,
         op: Operator,
@@ -68,15 +138,164 @@ class RawCGen(CGen):
     ) -> tuple[Operator, Sequence[str | int | float | bool | None], list[c_ast.Stmt]]:
         pre_op_stmts: list[c_ast.Stmt] = []
 
-        op, inputs, lines = self.handle_static_scalar(op, inputs)
-        pre_op_stmts.extend(lines)
-
+        # Operator specific pre-processors see the keys of static scalars
+        # before they are replaced with their values.
         op, inputs, _pre_op_stmts = super().pre_process_op(
             op, inputs, context, pre_processor
         )
         pre_op_stmts.extend(_pre_op_stmts)
+
+        op, inputs, lines = self.handle_static_scalar(op, inputs)
+        pre_op_stmts.extend(lines)
         return op, inputs, pre_op_stmts
 
+    def _get_input_index(self, op: Operator, key: str, context: str) -> int:
+        # Output is given before the inputs of the operators, and in gradient
+        # functions the output gradient and the index of the input as well.
+        offset = 1 if context == "eval" else 3
+        return offset + list(op.input_keys).index(key)
+
+    def _get_static_value(self, key: str | int | float | bool | None) -> Any:
+        if isinstance(key, str):
+            return self.pm.flat_graph.cached_data.get(key)
+        return None
+
+    def pre_reduce_axis(
+        self,
+        op: Operator,
+        inputs: Sequence[str | int | float | bool | None],
+        context: str,
+    ) -> tuple[Operator, list[str | int | float | bool | None], list[c_ast.Stmt]]:
+        # Reductions take their axes as tuples, a single axis is wrapped.
+        inputs = list(inputs)
+        idx = self._get_input_index(op, "axis", context)
+        axis = self._get_static_value(inputs[idx])
+        if type(axis) is not int:
+            return op, inputs, []
+
+        tuple_name = self.pm.flat_graph.get_next_unique_key(op.formula_key + "_tuple")
+        inputs[idx] = tuple_name
+        return op, inputs, [self.tuple_generator(tuple_name, (axis,))]
+
+    def pre_scalar_operands(
+        self,
+        op: Operator,
+        inputs: Sequence[str | int | float | bool | None],
+        context: str,
+    ) -> tuple[Operator, list[str | int | float | bool | None], list[c_ast.Stmt]]:
+        # Static scalar operands of arithmetic operators are given as static
+        # 0-d arrays, their gradients are not computed.
+        start = self._get_input_index(op, next(iter(op.input_keys)), context)
+        end = start + len(op.input_keys)
+        operands = list(inputs[start:end])
+        gradients = iter(inputs[end:])
+        new_gradients: list[str | int | float | bool | None] = []
+        for key in operands:
+            assert isinstance(key, str)
+            if self.pm.flat_graph.all_data[key].is_tensor:
+                if context == "eval_grad":
+                    new_gradients.append(next(gradients))
+                continue
+            if key not in self.scalar_arrays and self.is_static_scalar(key):
+                self.create_scalar_array(key)
+            if context == "eval_grad":
+                new_gradients.append("NULL")
+
+        return op, [*inputs[:end], *new_gradients], []
+
+    def create_scalar_array(self, key: str) -> None:
+        # static float scalar_x_data[] = {1.0};
+        # static Array scalar_x = {.data = scalar_x_data, .ndim = 0, .size = 1};
+        array_name = self.scalar_arrays[key] = f"scalar_{key}"
+        value = self.pm.flat_graph.cached_data[key]
+        self.globals += [
+            c_ast.StaticVariable(
+                "float",
+                f"{array_name}_data[]",
+                c_ast.InitializerList((c_ast.Constant(float(value)),)),
+            ),
+            c_ast.StaticVariable(
+                self.configs.ARRAY_NAME,
+                array_name,
+                c_ast.InitializerDict(
+                    ("data", "shape", "strides", "ndim", "size"),
+                    (
+                        c_ast.Variable(f"{array_name}_data"),
+                        c_ast.Constant(None),
+                        c_ast.Constant(None),
+                        c_ast.Constant(0),
+                        c_ast.Constant(1),
+                    ),
+                ),
+            ),
+        ]
+
+    def pre_concat(
+        self,
+        op: Operator,
+        inputs: Sequence[str | int | float | bool | None],
+        context: str,
+    ) -> tuple[Operator, list[str | int | float | bool | None], list[c_ast.Stmt]]:
+        # Items of the input list are given as an array of arrays with its
+        # length, and in gradient functions followed by their gradients:
+        # const Array * concat_inputs[] = {&arena_x, inputs->y};
+        # concat(output, concat_inputs, 2, axis);
+        idx = self._get_input_index(op, "input", context)
+        list_key = inputs[idx]
+        assert isinstance(list_key, str)
+        if self.pm.flat_graph.get_op(list_key).formula_key != "to_list":
+            raise NotImplementedError(
+                "Raw C backend supports only concatenation of the tensors "
+                "connected to the model."
+            )
+        item_keys = self.pm.flat_graph.get_source_keys(list_key)
+
+        array_name = self.pm.flat_graph.get_next_unique_key("concat_inputs")
+        stmts: list[c_ast.Stmt] = [
+            c_ast.Assign(
+                c_ast.Variable(f"const {self.configs.ARRAY_NAME} * {array_name}[]"),
+                c_ast.InitializerList(
+                    tuple(self.create_key_ref(key, context) for key in item_keys)
+                ),
+            )
+        ]
+        new_inputs = [*inputs[:idx], array_name, len(item_keys), *inputs[idx + 1 :]]
+
+        if context == "eval_grad":
+            grads_name = self.pm.flat_graph.get_next_unique_key("concat_grads")
+            stmts.append(
+                c_ast.Assign(
+                    c_ast.Variable(f"{self.configs.ARRAY_NAME} * {grads_name}[]"),
+                    c_ast.InitializerList(
+                        tuple(
+                            self.create_key_ref(key + utils.BACKWARD_FN_SUFFIX, context)
+                            if self._has_grad(key)
+                            else c_ast.Constant(None)
+                            for key in item_keys
+                        )
+                    ),
+                )
+            )
+            new_inputs.append(grads_name)
+        return op, new_inputs, stmts
+
+    def pre_cross_entropy(
+        self,
+        op: Operator,
+        inputs: Sequence[str | int | float | bool | None],
+        context: str,
+    ) -> tuple[Operator, list[str | int | float | bool | None], list[c_ast.Stmt]]:
+        # Class weights are either all ones or computed from target in C.
+        weights = self._get_static_value(
+            inputs[self._get_input_index(op, "weights", context)]
+        )
+        if not isinstance(weights, bool):
+            raise NotImplementedError(
+                "Raw C backend supports only 'auto' or no class weights for "
+                "cross entropy."
+            )
+        return op, list(inputs), []
+
     def handle_static_scalar(
         self, op: Operator, inputs: Sequence[str | int | float | bool | None]
     ) -> tuple[Operator, Sequence[str | int | float | bool | None], list[c_ast.Stmt]]:
@@ -86,10 +305,10 @@ class RawCGen(CGen):
         #   (1,2,3) -> `c_tuple my_tuple= {.size = 3, .data = (int[]) {1, 2, 3} };`
         #   Create a new key for the tuple and add it to the processed inputs
         #   Add the length of the tuple to the processed inputs
-        # 2) Bool:
+        # 2) Bool, int and float:
         #   True -> `op(..., true, ...);`
         #   False -> `op(..., false, ...);`
-        #   Add the bool to the processed inputs
+        #   Add the value to the processed inputs
 
         pre_op_stmts: list[c_ast.Stmt] = []
         processed_inputs: list[str | int | float | bool | None] = []
@@ -103,18 +322,23 @@ class RawCGen(CGen):
 
             value = self.pm.flat_graph.cached_data[key]
             match value:
+                case _ if key in self.scalar_arrays:
+                    processed_inputs.append(key)
+
                 case tuple():
                     # (1,2,3) -> `c_tuple my_tuple= {.size = 3, .data = (int[])
                     # {1, 2, 3} };`
+                    # Nested tuples (e.g. paddings) are flattened.
                     tuple_name = self.pm.flat_graph.get_next_unique_key(
                         op.formula_key + "_tuple"
                     )
-                    tuple_stmt = self.tuple_generator(tuple_name, value)
+                    tuple_stmt = self.tuple_generator(tuple_name, _flatten(value))
                     pre_op_stmts.append(tuple_stmt)
                     processed_inputs.append(tuple_name)
 
-                case bool() | None:
+                case bool() | int() | float() | None:
                     # True -> `op(..., true, ...);`
+                    # 1 -> `op(..., 1, ...);`
                     processed_inputs.append(value)
 
                 case _:
@@ -153,3 +377,13 @@ class RawCGen(CGen):
             c_ast.Pointer("c_tuple"), tuple_name, addressof_stmt
         )
         return tuple_var
+
+
+def _flatten(value: tuple[Any, ...]) -> tuple[int, ...]:
+    result: list[int] = []
+    for item in value:
+        if isinstance(item, tuple):
+            result.extend(_flatten(item))
+        else:
+            result.append(item)
+    return tuple(result)
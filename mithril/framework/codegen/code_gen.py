@@ -45,6 +45,20 @@ class CodeGen(ABC, Generic[DataType]):
     ) -> tuple[EvaluateType[DataType], EvaluateAllType[DataType] | None]:
         raise NotImplementedError("compile_code is not implemented")
 
+    def load_code(self, code: str, file_path: str | None = None) -> None:
+        """Use previously generated code instead of generating it again.
+
+        Args:
+            code (str): Source code produced by an earlier `generate_code` call
+                for an equivalent physical model.
+            file_path (str | None): Optional path to write the code into.
+        """
+        self.code = code
+        self.file_path = file_path
+        if file_path is not None:
+            with open(file_path, "w") as f:
+                f.write(code)
+
     def _has_grad(self, key: str) -> bool:
         """
         Check if a given key has gradient information.
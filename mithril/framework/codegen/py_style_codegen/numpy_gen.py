@@ -13,8 +13,9 @@
 # limitations under the License.
 
 import ast
+import inspect
 import keyword
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
 from functools import partial
 from typing import Any
 
@@ -33,6 +34,8 @@ from ...common import (
     is_type_adjustment_required,
 )
 from ...logical import Operator
+from ...physical.checkpointing import CheckpointSegment, find_checkpoint_segments
+from ...physical.memory_planner import BufferSpec, MemoryPlan, plan_memory
 from ...physical.model import PhysicalModel
 from ..utils import check_repr_inequality
 from .python_gen import PythonCodeGen, RawGradientType
@@ -41,6 +44,24 @@ from .python_gen import PythonCodeGen, RawGradientType
 # Numpy codegen will be updated after AUTOGRAD is added.
 class NumpyCodeGen(PythonCodeGen[np.ndarray[Any, Any]]):
     BACKWARD_FN_SUFFIX = "_grad"
+    OUT_FUNCTIONS = {
+        "add": ("np.add", ()),
+        "subtract": ("np.subtract", ()),
+        "multiplication": ("np.multiply", ()),
+        "divide": ("np.divide", ()),
+        "matrix_multiplication": ("np.matmul", ()),
+        "exp": ("np.exp", ()),
+        "sqrt": ("np.sqrt", ()),
+        "sin": ("np.sin", ()),
+        "cos": ("np.cos", ()),
+        "tanh": ("np.tanh", ()),
+        "abs": ("np.abs", ()),
+        "log": ("np.log", ()),
+        "relu": ("np.maximum", (0.0,)),
+    }
+    # Primitives using the global random state of NumPy, they are always
+    # evaluated by the calling thread to keep the generated values same.
+    SERIAL_PRIMITIVES = frozenset({"randn", "randint"})
 
     def __init__(self, pm: PhysicalModel[np.ndarray[Any, Any]]) -> None:
         super().__init__(pm)
@@ -49,6 +70,7 @@ class NumpyCodeGen(PythonCodeGen[np.ndarray[Any, Any]]):
         self.backend: NumpyBackend = self.pm.backend
         self._flatten_fn_imported = False
         self._numpy_imported = False
+        self._executor_defined = False
 
     def generate_functions(self) -> list[ast.FunctionDef]:
         functions: list[ast.FunctionDef] = []
@@ -57,6 +79,154 @@ class NumpyCodeGen(PythonCodeGen[np.ndarray[Any, Any]]):
             functions.append(self.generate_evaluate_gradients())
         return functions
 
+    def generate_evaluate(self) -> ast.FunctionDef:
+        func_def = super().generate_evaluate()
+        if self.backend.n_threads > 1:
+            func_def.body = self.schedule_body(func_def.body)
+        return ast.fix_missing_locations(func_def)
+
+    def create_memory_plan(self, excluded_keys: Iterable[str] = ()) -> MemoryPlan:
+        # Lifetimes of the planned keys follow the topological order, which
+        # does not hold when independent operations are evaluated concurrently.
+        if self.backend.n_threads > 1:
+            return plan_memory(self.pm.flat_graph, {})
+        return super().create_memory_plan(excluded_keys)
+
+    def schedule_body(self, body: list[ast.stmt]) -> list[ast.stmt]:
+        """Groups the statements of the evaluate function into levels of
+        independent statements and dispatches the primitive calls of each level
+        to a thread pool.
+
+        Level of a statement is one more than the largest level of the
+        statements assigning the names it reads. Results of a level are
+        collected before the next level starts and each call computes the same
+        value as in serial evaluation, so results are deterministic.
+        """
+        *body, return_stmt = body
+        levels: list[list[ast.Assign]] = []
+        deletions: list[list[ast.stmt]] = []
+        level_of: dict[str, int] = {}
+        last_use: dict[str, int] = {}
+        for stmt in body:
+            if isinstance(stmt, ast.Delete):
+                # Names are deleted after their last reader is evaluated.
+                names = [target.id for target in stmt.targets]  # type: ignore
+                deletions[max(last_use.get(name, 0) for name in names)].append(stmt)
+                continue
+
+            assert isinstance(stmt, ast.Assign)
+            loaded = {
+                node.id
+                for node in ast.walk(stmt)
+                if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+            }
+            level = 1 + max(
+                (level_of[name] for name in loaded if name in level_of), default=-1
+            )
+            if level == len(levels):
+                levels.append([])
+                deletions.append([])
+            levels[level].append(stmt)
+            for name in loaded:
+                last_use[name] = max(last_use.get(name, 0), level)
+            for target in stmt.targets:
+                if isinstance(target, ast.Name):
+                    level_of[target.id] = level
+
+        scheduled: list[ast.stmt] = []
+        for level_stmts, level_deletions in zip(levels, deletions, strict=True):
+            # Calling thread evaluates the last call of the level itself.
+            submitted = [stmt for stmt in level_stmts if self._is_concurrent(stmt)][:-1]
+            results: list[ast.stmt] = []
+            for idx, stmt in enumerate(submitted):
+                future = f"_future_{idx}"
+                scheduled.append(
+                    ast.Assign(
+                        targets=[ast.Name(future, ast.Store())],
+                        value=ast.Call(
+                            func=ast.Attribute(
+                                ast.Name("_executor", ast.Load()), "submit", ast.Load()
+                            ),
+                            args=[
+                                ast.Lambda(
+                                    args=ast.arguments(
+                                        posonlyargs=[],
+                                        args=[],
+                                        kwonlyargs=[],
+                                        kw_defaults=[],
+                                        defaults=[],
+                                    ),
+                                    body=stmt.value,
+                                )
+                            ],
+                            keywords=[],
+                        ),
+                    )
+                )
+                result = ast.Call(
+                    func=ast.Attribute(
+                        ast.Name(future, ast.Load()), "result", ast.Load()
+                    ),
+                    args=[],
+                    keywords=[],
+                )
+                results.append(ast.Assign(stmt.targets, result))
+            scheduled += [stmt for stmt in level_stmts if stmt not in submitted]
+            scheduled += results + level_deletions
+
+            if submitted:
+                self._define_executor()
+
+        return scheduled + [return_stmt]
+
+    def _define_executor(self) -> None:
+        if self._executor_defined:
+            return
+        self.imports.append(
+            ast.ImportFrom(
+                module="mithril.cores.python.numpy.utils",
+                names=[ast.alias(name="get_executor")],
+                level=0,
+            )
+        )
+        # Calling thread also evaluates operations, so pool has one less thread.
+        # Pools are shared by the models with the same number of threads.
+        self.globals.append(
+            ast.Assign(
+                targets=[ast.Name("_executor", ast.Store())],
+                value=ast.Call(
+                    func=ast.Name("get_executor", ast.Load()),
+                    args=[ast.Constant(self.backend.n_threads - 1)],
+                    keywords=[],
+                ),
+            )
+        )
+        self._executor_defined = True
+
+    def create_checkpoint_segments(self) -> list[CheckpointSegment]:
+        if self.pm.checkpoint_groups is None:
+            return []
+        # Caches of the operations are kept besides their outputs, so each
+        # operation costs the same.
+        return find_checkpoint_segments(
+            self.pm.flat_graph, self.pm.checkpoint_groups, self.is_recomputable
+        )
+
+    def is_recomputable(self, key: str) -> bool:
+        # Random primitives would generate different values when evaluated again.
+        op = self.pm.flat_graph.get_op(key)
+        return (
+            op.formula_key not in self.SERIAL_PRIMITIVES
+            and key not in self.pm.flat_graph.multi_node_keys
+        )
+
+    def _is_concurrent(self, stmt: ast.Assign) -> bool:
+        # Only primitive calls are dispatched to the thread pool.
+        return isinstance(stmt.value, ast.Call) and not any(
+            isinstance(node, ast.Name) and node.id in self.SERIAL_PRIMITIVES
+            for node in ast.walk(stmt.value)
+        )
+
     def generate_imports(self) -> list[ast.stmt]:
         # Numpy backend also imports gradient functions
         imports = super().generate_imports()
@@ -123,8 +293,15 @@ class NumpyCodeGen(PythonCodeGen[np.ndarray[Any, Any]]):
             )
             # Initialize gradients as zero with corresponding shapes.
             gradients: dict[str, np.ndarray[Any, Any]] = {}
+            # Gradients of the intermediate keys of checkpoint segments are
+            # initialized when their segments are recomputed.
+            recomputed_keys = {
+                key
+                for segment in self.checkpoint_segments
+                for key in segment.internal_keys
+            }
             for key in self.pm.flat_graph.all_keys - self.pm.flat_graph.unused_keys:
-                if not self._has_grad(key):
+                if not self._has_grad(key) or key in recomputed_keys:
                     continue
                 key_cache = cached_data.get(key + "_cache", {})
                 assert isinstance(key_cache, dict)
@@ -202,6 +379,8 @@ class NumpyCodeGen(PythonCodeGen[np.ndarray[Any, Any]]):
         g_input_keys: list[str],
         output_key: str,
         formula_key: str,
+        *,
+        recompute: bool = False,
     ) -> tuple[ast.Assign, set[str]]:
         generated_fn, used_keys = self.create_primitive_call(
             fn, l_input_keys, g_input_keys
@@ -209,13 +388,30 @@ class NumpyCodeGen(PythonCodeGen[np.ndarray[Any, Any]]):
         targets, _used_keys = self.create_primitive_call_targets(
             output_key, model, self.pm.inference
         )
+        if not recompute and (segment := self._segment_of.get(output_key)):
+            # Checkpointed operations write into temporary caches in forward
+            # pass, only outputs of their segments are kept.
+            cache_name = output_key + f"_{Operator.cache_name}"
+            self._replace_name(generated_fn, cache_name, ast.Dict(keys=[], values=[]))
+            if output_key not in segment.outputs:
+                targets = targets[:1]
+                used_keys.discard(cache_name)
+                _used_keys.discard(cache_name)
 
         if formula_key in self.backend.array_creation_funcs:
             self.add_partial_function(formula_key)
 
-        if is_make_array_required(self.pm.data[output_key]) or (
-            self.pm.data[output_key].is_tensor
-            and is_type_adjustment_required(self.pm.data, g_input_keys)
+        # Planned outputs are written into buffers of the backend's dtype.
+        is_planned = (
+            self.pm.memory_plan is not None
+            and output_key in self.pm.memory_plan.assignments
+        )
+        if not is_planned and (
+            is_make_array_required(self.pm.data[output_key])
+            or (
+                self.pm.data[output_key].is_tensor
+                and is_type_adjustment_required(self.pm.data, g_input_keys)
+            )
         ):
             generated_fn = ast.Call(
                 func=ast.Name(id="make_array", ctx=ast.Load()),
@@ -226,6 +422,37 @@ class NumpyCodeGen(PythonCodeGen[np.ndarray[Any, Any]]):
 
         return ast.Assign(targets, generated_fn), used_keys | _used_keys
 
+    @staticmethod
+    def _replace_name(call: ast.Call, name: str, value: ast.expr) -> None:
+        call.args = [
+            value if isinstance(arg, ast.Name) and arg.id == name else arg
+            for arg in call.args
+        ]
+        for kwarg in call.keywords:
+            if isinstance(kwarg.value, ast.Name) and kwarg.value.id == name:
+                kwarg.value = value
+
+    def create_out_call(
+        self, primitive_call: ast.Assign, formula_key: str, out: ast.expr
+    ) -> ast.Assign:
+        self._import_numpy()
+        return super().create_out_call(primitive_call, formula_key, out)
+
+    def create_buffer(self, spec: BufferSpec) -> ast.expr:
+        self._import_numpy()
+        return ast.Call(
+            func=ast.Attribute(ast.Name("np", ast.Load()), "empty", ast.Load()),
+            args=[ast.Constant(spec.shape)],
+            keywords=[ast.keyword(arg="dtype", value=ast.Constant(spec.dtype))],
+        )
+
+    def _import_numpy(self) -> None:
+        if not self._numpy_imported:
+            self.imports.append(
+                ast.Import(names=[ast.alias(name="numpy", asname="np")])
+            )
+            self._numpy_imported = True
+
     def create_primitive_call_targets(
         self, output_key: str, model: Operator, inference: bool
     ) -> tuple[list[ast.expr | ast.Name], set[str]]:
@@ -366,12 +593,7 @@ class NumpyCodeGen(PythonCodeGen[np.ndarray[Any, Any]]):
         This method also sets the `_flatten_fn_imported` flag to `True` to indicate
         that the imports and function definition have been completed.
         """
-        if not self._numpy_imported:
-            # Import numpy.
-            self.imports.append(
-                ast.Import(names=[ast.alias(name="numpy", asname="np")])
-            )
-            self._numpy_imported = True
+        self._import_numpy()
         # Import get_specific_types_from_value from mithril.common.
         self.imports.append(
             ast.ImportFrom(
@@ -468,170 +690,24 @@ class NumpyCodeGen(PythonCodeGen[np.ndarray[Any, Any]]):
                     function_body.append(assign)
 
         for output_key in reversed(list(self.pm.flat_graph.topological_order)):
-            if (
-                not self._has_grad(output_key)
-                or output_key in self.pm.flat_graph.multi_node_keys
-            ):
-                continue
-
-            # Iterate over Primitive models in topological order to add their formula.
-            model = self.pm.flat_graph.get_op(output_key)
-
-            output_key = self.pm.flat_graph.connections[output_key].key
-            inputs = list(self.pm.flat_graph.get_source_keys(output_key))
+            segment = self._segment_of.get(output_key)
+            if segment is not None and output_key == segment.keys[-1]:
+                used_keys |= self.recompute_segment(segment, function_body)
 
-            # Check if the model is disposable.
-            if model.disposable:
-                raise Exception(
-                    f"{model.__class__.__name__} is a disposable model."
-                    " Disposable models have no grad formulas!"
-                )
-
-            # Get primitive function inputs order
-            primitive_function = (
-                self.backend.op_function_dict[model.formula_key]
-                if model.formula_key in self.backend.op_function_dict
-                else self.backend.registered_primitives[model.formula_key]
-            )
-            local_to_global_dict = {
-                key: value
-                for key, value in zip(
-                    list(model.input_keys) + ["cache"], inputs, strict=False
-                )
-            }
-            args, kwargs = prepare_function_args(
-                self.pm.flat_graph.cached_data,
-                primitive_function,
-                local_to_global_dict,
-                self.backend.array_creation_funcs,
-                False,
-            )
-
-            # Get local keys in ordered
-            global_to_local_dict: dict[str, list[str]] = {}
-            for key, value in zip(
-                list(model.input_keys) + ["cache"], inputs, strict=False
+            if (
+                self._has_grad(output_key)
+                and output_key not in self.pm.flat_graph.multi_node_keys
             ):
-                global_to_local_dict.setdefault(value, [])
-                global_to_local_dict[value].append(key)
-            primitive_global_inputs = [
-                key for keys in args.values() for key in keys if "cache" not in key
-            ]
-            primitive_global_inputs += [
-                key for key in kwargs.values() if "cache" not in key
-            ] + [local_to_global_dict["cache"]]
-            primitive_local_inputs: list[str] = [
-                global_to_local_dict[key].pop(0) for key in primitive_global_inputs
-            ]
-
-            # Reorder global keys wrt primitive evaluate function local keys order
-            model_local_inputs = list(model.input_keys) + ["cache"]
-            _inputs = [
-                inputs[model_local_inputs.index(local_key)]
-                for local_key in primitive_local_inputs
-            ]
-            local_input_keys = [*primitive_local_inputs, "output_gradient", "idx"]
-            global_input_keys = _inputs + ["output_gradient", "idx"]
-
-            for idx, global_input_key in enumerate(global_input_keys[:-2]):
-                if not self._has_grad(global_input_key):
-                    continue
+                used_keys |= self.generate_op_gradients(output_key, function_body)
 
-                grad_fn = self.backend.primitive_grad_function_dict.get(
-                    model.grad_formula
-                )
-                if grad_fn is None:
-                    grad_fn = self.backend.registered_primitives_grad_fn.get(
-                        model.grad_formula
-                    )
+            if segment is not None:
+                self.release_recomputed(output_key, segment, function_body)
 
-                if grad_fn is None:
-                    raise NotImplementedError(
-                        f"Primitive {model.formula_key} does not have vjp "
-                        "implementation!"
-                    )
-
-                grad_arg = ast.Subscript(
-                    value=ast.Name(id="gradients", ctx=ast.Load()),
-                    slice=ast.Constant(
-                        "_" + output_key
-                        if keyword.iskeyword(output_key)
-                        or output_key in self.backend.op_function_dict
-                        else output_key
-                    ),
-                    ctx=ast.Load(),
-                )
-                idx_arg = ast.Constant(value=idx, kind=None)
-
-                default_args: dict[str, ast.expr] = {
-                    "output_gradient": grad_arg,
-                    "idx": idx_arg,
-                }
-                generated_fn, _used_keys = self.create_primitive_call(
-                    grad_fn, local_input_keys, global_input_keys, default_args
-                )
-
-                if is_make_array_required(self.pm.data[output_key]):
-                    generated_fn = ast.Call(
-                        func=ast.Name(id="make_array", ctx=ast.Load()),
-                        args=[generated_fn],
-                        keywords=[],
-                    )
-                    self.add_partial_function("make_array")
-
-                if (
-                    keyword.iskeyword(global_input_key)
-                    or global_input_key in self.backend.op_function_dict
-                ):
-                    manipulated_key = "_" + global_input_key
-                else:
-                    manipulated_key = global_input_key
-
-                if (
-                    (in_shape := self.pm.data[global_input_key].shape) is not None
-                    and (out_shape := self.pm.data[output_key].shape) is not None
-                    and check_repr_inequality(in_shape, out_shape)
-                ):
-                    generated_fn = ast.Call(
-                        func=ast.Name(id="accumulate_grads", ctx=ast.Load()),
-                        args=[
-                            generated_fn,
-                            ast.Name(manipulated_key),
-                            ast.Name(global_input_keys[-3]),
-                            idx_arg,
-                        ],
-                        keywords=[],
-                    )
-
-                if (
-                    subkeys := self.pm.flat_graph.multi_node_keys.get(global_input_key)
-                ) is not None:
-                    self._distribute_grads(
-                        global_input_key, generated_fn, subkeys, function_body
-                    )
-                else:
-                    target = ast.Subscript(
-                        value=ast.Name(id="gradients", ctx=ast.Load()),
-                        slice=ast.Constant(global_input_key),
-                        ctx=ast.Load(),
-                    )
-                    if self.pm.data[global_input_key].is_tensor:
-                        # Accumulate gradients for tensor data.
-                        function_body.append(
-                            ast.AugAssign(
-                                target=target, op=ast.Add(), value=generated_fn
-                            )
-                        )
-                    else:
-                        # TODO: Note that normally, Mithril does not support non-tensor
-                        # trainable data like list, tuple or dict. But for testing
-                        # purposes we use this feature. This part should be removed
-                        # after strategy of some testings updated (i.e. JSON tests.).
-                        function_body.append(
-                            ast.Assign(targets=[target], value=generated_fn)
-                        )
-
-                used_keys |= _used_keys - {"output_gradient", "idx"}
+        # Caches and intermediate values of checkpoint segments are defined by
+        # their recomputations.
+        for segment in self.checkpoint_segments:
+            used_keys -= {key + f"_{Operator.cache_name}" for key in segment.keys}
+            used_keys -= set(segment.internal_keys)
 
         for key in sorted(used_keys):
             if (
@@ -680,3 +756,246 @@ class NumpyCodeGen(PythonCodeGen[np.ndarray[Any, Any]]):
         )
 
         return ast.fix_missing_locations(func_def)
+
+    def recompute_segment(
+        self, segment: CheckpointSegment, function_body: list[ast.stmt]
+    ) -> set[str]:
+        """Evaluates operations of the segment again with fresh caches and
+        initializes gradients of its intermediate keys."""
+        used_keys: set[str] = set()
+        for output_key in segment.keys:
+            op, g_input_keys, l_input_keys = self.get_op_details(output_key)
+            formula_key = op.formula_key
+            if formula_key in self.backend.op_function_dict:
+                primitive_function = self.backend.op_function_dict[formula_key]
+            else:
+                primitive_function = self.backend.registered_primitives[formula_key]
+
+            cache_name = output_key + f"_{Operator.cache_name}"
+            function_body.append(
+                ast.Assign(
+                    targets=[ast.Name(id=cache_name, ctx=ast.Store())],
+                    value=ast.Dict(keys=[], values=[]),
+                )
+            )
+            primitive_call, _used_keys = self.call_primitive(
+                op,
+                primitive_function,
+                l_input_keys,
+                g_input_keys,
+                output_key,
+                formula_key,
+                recompute=True,
+            )
+            function_body.append(primitive_call)
+            used_keys |= _used_keys
+
+        for key in segment.internal_keys:
+            if self._has_grad(key):
+                function_body.append(
+                    ast.Assign(
+                        targets=[self._gradient_ref(key, ast.Store())],
+                        value=ast.Call(
+                            func=ast.Name(id="fill_zeros_like", ctx=ast.Load()),
+                            args=[self._var_ref_ast(key, ast.Load())],
+                            keywords=[],
+                        ),
+                    )
+                )
+        return used_keys
+
+    def release_recomputed(
+        self, output_key: str, segment: CheckpointSegment, function_body: list[ast.stmt]
+    ) -> None:
+        """Deletes the recomputed values of an operation of the segment once its
+        gradients are computed, since no remaining gradient formula uses them."""
+        targets: list[ast.expr] = [
+            ast.Name(id=output_key + f"_{Operator.cache_name}", ctx=ast.Del())
+        ]
+        if output_key not in segment.outputs:
+            targets.append(self._var_ref_ast(output_key, ast.Del()))
+            if self._has_grad(output_key):
+                targets.append(self._gradient_ref(output_key, ast.Del()))
+        function_body.append(ast.Delete(targets=targets))
+
+    def _gradient_ref(self, key: str, ctx: ast.expr_context) -> ast.Subscript:
+        return ast.Subscript(
+            value=ast.Name(id="gradients", ctx=ast.Load()),
+            slice=ast.Constant(key),
+            ctx=ctx,
+        )
+
+    def generate_op_gradients(
+        self, output_key: str, function_body: list[ast.stmt]
+    ) -> set[str]:
+        """Generates gradient formulas of the inputs of the operation computing
+        given key."""
+        used_keys: set[str] = set()
+        # Iterate over Primitive models in topological order to add their formula.
+        model = self.pm.flat_graph.get_op(output_key)
+
+        output_key = self.pm.flat_graph.connections[output_key].key
+        inputs = list(self.pm.flat_graph.get_source_keys(output_key))
+
+        # Check if the model is disposable.
+        if model.disposable:
+            raise Exception(
+                f"{model.__class__.__name__} is a disposable model."
+                " Disposable models have no grad formulas!"
+            )
+
+        # Get primitive function inputs order
+        primitive_function = (
+            self.backend.op_function_dict[model.formula_key]
+            if model.formula_key in self.backend.op_function_dict
+            else self.backend.registered_primitives[model.formula_key]
+        )
+        local_to_global_dict = {
+            key: value
+            for key, value in zip(
+                list(model.input_keys) + ["cache"], inputs, strict=False
+            )
+        }
+        args, kwargs = prepare_function_args(
+            self.pm.flat_graph.cached_data,
+            primitive_function,
+            local_to_global_dict,
+            self.backend.array_creation_funcs,
+            False,
+        )
+
+        # Get local keys in ordered
+        global_to_local_dict: dict[str, list[str]] = {}
+        for key, value in zip(list(model.input_keys) + ["cache"], inputs, strict=False):
+            global_to_local_dict.setdefault(value, [])
+            global_to_local_dict[value].append(key)
+        primitive_global_inputs = [
+            key for keys in args.values() for key in keys if "cache" not in key
+        ]
+        primitive_global_inputs += [
+            key for key in kwargs.values() if "cache" not in key
+        ] + [local_to_global_dict["cache"]]
+        primitive_local_inputs: list[str] = [
+            global_to_local_dict[key].pop(0) for key in primitive_global_inputs
+        ]
+
+        # Reorder global keys wrt primitive evaluate function local keys order
+        model_local_inputs = list(model.input_keys) + ["cache"]
+        _inputs = [
+            inputs[model_local_inputs.index(local_key)]
+            for local_key in primitive_local_inputs
+        ]
+        local_input_keys = [*primitive_local_inputs, "output_gradient", "idx"]
+        global_input_keys = _inputs + ["output_gradient", "idx"]
+        # Gradient functions computing gradients of all inputs at once take
+        # the indices of requested ones to compute and keep only them.
+        grad_idxs = ast.Tuple(
+            elts=[
+                ast.Constant(idx)
+                for idx, key in enumerate(_inputs)
+                if self._has_grad(key)
+            ],
+            ctx=ast.Load(),
+        )
+
+        for idx, global_input_key in enumerate(global_input_keys[:-2]):
+            if not self._has_grad(global_input_key):
+                continue
+
+            grad_fn = self.backend.primitive_grad_function_dict.get(model.grad_formula)
+            if grad_fn is None:
+                grad_fn = self.backend.registered_primitives_grad_fn.get(
+                    model.grad_formula
+                )
+
+            if grad_fn is None:
+                raise NotImplementedError(
+                    f"Primitive {model.formula_key} does not have vjp implementation!"
+                )
+
+            grad_arg = ast.Subscript(
+                value=ast.Name(id="gradients", ctx=ast.Load()),
+                slice=ast.Constant(
+                    "_" + output_key
+                    if keyword.iskeyword(output_key)
+                    or output_key in self.backend.op_function_dict
+                    else output_key
+                ),
+                ctx=ast.Load(),
+            )
+            idx_arg = ast.Constant(value=idx, kind=None)
+
+            default_args: dict[str, ast.expr] = {
+                "output_gradient": grad_arg,
+                "idx": idx_arg,
+            }
+            fn_local_keys, fn_global_keys = local_input_keys, global_input_keys
+            if "grad_idxs" in inspect.signature(grad_fn).parameters:
+                fn_local_keys = [*local_input_keys, "grad_idxs"]
+                fn_global_keys = [*global_input_keys, "grad_idxs"]
+                default_args["grad_idxs"] = grad_idxs
+            generated_fn, _used_keys = self.create_primitive_call(
+                grad_fn, fn_local_keys, fn_global_keys, default_args
+            )
+
+            if is_make_array_required(self.pm.data[output_key]):
+                generated_fn = ast.Call(
+                    func=ast.Name(id="make_array", ctx=ast.Load()),
+                    args=[generated_fn],
+                    keywords=[],
+                )
+                self.add_partial_function("make_array")
+
+            if (
+                keyword.iskeyword(global_input_key)
+                or global_input_key in self.backend.op_function_dict
+            ):
+                manipulated_key = "_" + global_input_key
+            else:
+                manipulated_key = global_input_key
+
+            if (
+                (in_shape := self.pm.data[global_input_key].shape) is not None
+                and (out_shape := self.pm.data[output_key].shape) is not None
+                and check_repr_inequality(in_shape, out_shape)
+            ):
+                generated_fn = ast.Call(
+                    func=ast.Name(id="accumulate_grads", ctx=ast.Load()),
+                    args=[
+                        generated_fn,
+                        ast.Name(manipulated_key),
+                        ast.Name(global_input_keys[-3]),
+                        idx_arg,
+                    ],
+                    keywords=[],
+                )
+
+            if (
+                subkeys := self.pm.flat_graph.multi_node_keys.get(global_input_key)
+            ) is not None:
+                self._distribute_grads(
+                    global_input_key, generated_fn, subkeys, function_body
+                )
+            else:
+                target = ast.Subscript(
+                    value=ast.Name(id="gradients", ctx=ast.Load()),
+                    slice=ast.Constant(global_input_key),
+                    ctx=ast.Load(),
+                )
+                if self.pm.data[global_input_key].is_tensor:
+                    # Accumulate gradients for tensor data.
+                    function_body.append(
+                        ast.AugAssign(target=target, op=ast.Add(), value=generated_fn)
+                    )
+                else:
+                    # TODO: Note that normally, Mithril does not support non-tensor
+                    # trainable data like list, tuple or dict. But for testing
+                    # purposes we use this feature. This part should be removed
+                    # after strategy of some testings updated (i.e. JSON tests.).
+                    function_body.append(
+                        ast.Assign(targets=[target], value=generated_fn)
+                    )
+
+            used_keys |= _used_keys - {"output_gradient", "idx", "grad_idxs"}
+
+        return used_keys
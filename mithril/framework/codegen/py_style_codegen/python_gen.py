@@ -14,8 +14,10 @@
 
 import ast
 import importlib
+import itertools
 import keyword
-from collections.abc import Callable
+import math
+from collections.abc import Callable, Iterable
 from functools import partial
 from posixpath import basename, splitext
 from typing import Any, Generic, Protocol
@@ -24,6 +26,7 @@ from ....backends.backend import ParallelBackend
 from ....common import PythonGenConfig
 from ....types import DataType
 from ....utils.func_utils import prepare_function_args
+from ....utils.type_utils import is_list_int
 from ...common import (
     DataEvalType,
     EvaluateAllType,
@@ -32,6 +35,9 @@ from ...common import (
     ParamsEvalType,
 )
 from ...logical import Operator
+from ...physical.checkpointing import CheckpointSegment, find_checkpoint_segments
+from ...physical.fusion import ELEMENTWISE_PRIMITIVES, FusionGroup, find_fusion_groups
+from ...physical.memory_planner import BufferSpec, MemoryPlan, plan_memory
 from ...physical.model import PhysicalModel
 from ...utils import GeneratedFunction
 from ..code_gen import CodeGen
@@ -74,6 +80,12 @@ class ManualGradWrapperFn(Protocol, Generic[DataType]):
 
 
 class PythonCodeGen(CodeGen[Any], Generic[DataType]):
+    # Primitives which can write their outputs into preallocated buffers, mapped
+    # to the functions of the backend's array module taking an `out` argument
+    # together with their additional positional arguments. Memory planning only
+    # reuses buffers for these primitives.
+    OUT_FUNCTIONS: dict[str, tuple[str, tuple[Any, ...]]] = {}
+
     def __init__(self, pm: PhysicalModel[DataType]) -> None:
         super().__init__(pm)
 
@@ -93,6 +105,13 @@ class PythonCodeGen(CodeGen[Any], Generic[DataType]):
         assert isinstance(self.backend.CODEGEN_CONFIG, PythonGenConfig)
         self.configs = self.backend.CODEGEN_CONFIG
 
+        # Segments whose operations are evaluated again by the backward pass
+        # instead of keeping their intermediate values.
+        self.checkpoint_segments = self.create_checkpoint_segments()
+        self._segment_of = {
+            key: segment for segment in self.checkpoint_segments for key in segment.keys
+        }
+
     def generate_code(self, file_path: str | None = None) -> None:
         self.file_path = file_path
 
@@ -329,6 +348,46 @@ class PythonCodeGen(CodeGen[Any], Generic[DataType]):
 
         determined_keys = cached_data_keys | unused_keys | discarded_keys
 
+        # Operations of a fusion group are evaluated by a single fused function
+        # which is called in place of the group's last operation.
+        fusion_groups = self.create_fusion_groups()
+        group_of = {key: group for group in fusion_groups for key in group.keys}
+        group_bodies: dict[str, list[ast.Assign]] = {}
+
+        # Operations of checkpoint segments are evaluated by checkpointed
+        # functions, which are called once the values of the segment are
+        # needed. Manual gradient backends recompute segments themselves.
+        checkpointed = {} if self.backend.is_manualgrad else self._segment_of
+        runs: dict[int, dict[str, ast.Assign]] = {}
+        checkpoint_ids = itertools.count()
+
+        def flush_run(segment_id: int) -> None:
+            run = runs.pop(segment_id)
+            stmts, input_keys = self.create_checkpoint_call(
+                run, f"_checkpoint_{next(checkpoint_ids)}"
+            )
+            function_body.extend(stmts)
+            assigned_output_keys.update(run)
+            self._delete_unused(
+                input_keys,
+                function_body,
+                deleted_vars,
+                determined_keys,
+                assigned_output_keys,
+            )
+
+        # Preallocate buffers of the memory plan as globals.
+        memory_plan = self.pm.memory_plan = self.create_memory_plan(
+            excluded_keys=group_of.keys()
+        )
+        for idx, spec in enumerate(memory_plan.buffers):
+            self.globals.append(
+                ast.Assign(
+                    targets=[ast.Name(id=f"_buffer_{idx}", ctx=ast.Store())],
+                    value=self.create_buffer(spec),
+                )
+            )
+
         # Iterate over ops in topological order to add their formula.
         for output_key in self.pm.flat_graph.topological_order:
             # Get operator details
@@ -354,27 +413,55 @@ class PythonCodeGen(CodeGen[Any], Generic[DataType]):
                 output_key,
                 formula_key,
             )
+            if (buffer_idx := memory_plan.assignments.get(output_key)) is not None:
+                primitive_call = self.create_out_call(
+                    primitive_call,
+                    formula_key,
+                    ast.Name(f"_buffer_{buffer_idx}", ast.Load()),
+                )
 
             used_keys |= _used_keys
             used_keys.add(output_key)
+
+            # Values of pending segments used by this operation are computed
+            # first.
+            segment = checkpointed.get(output_key)
+            for segment_id in [
+                segment_id
+                for segment_id, run in runs.items()
+                if segment_id != id(segment) and not run.keys().isdisjoint(g_input_keys)
+            ]:
+                flush_run(segment_id)
+
+            if segment is not None:
+                runs.setdefault(id(segment), {})[output_key] = primitive_call
+                if output_key == segment.keys[-1]:
+                    flush_run(id(segment))
+                continue
+
             assigned_output_keys.add(output_key)
-            function_body.append(primitive_call)
 
-            # Add deletion logic for intermediate variables
-            for used_key in g_input_keys:
-                if not self._check_deletable(
-                    used_key,
-                    deleted_vars,
-                    determined_keys,
-                    assigned_output_keys,
-                ):
+            if (group := group_of.get(output_key)) is not None:
+                group_body = group_bodies.setdefault(group.output_key, [])
+                group_body.append(primitive_call)
+                if output_key != group.output_key:
                     continue
-
-                delete_stmt = ast.Delete(
-                    targets=[self._var_ref_ast(used_key, ast.Del())]
+                primitive_call, g_input_keys = self.create_fused_call(
+                    group,
+                    group_bodies.pop(output_key),
+                    f"_fused_{fusion_groups.index(group)}",
                 )
-                function_body.append(delete_stmt)
-                deleted_vars.add(used_key)
+
+            function_body.append(primitive_call)
+
+            # Add deletion logic for intermediate variables
+            self._delete_unused(
+                g_input_keys,
+                function_body,
+                deleted_vars,
+                determined_keys,
+                assigned_output_keys,
+            )
 
         for key in sorted(used_keys):
             if key in cached_data_keys:
@@ -440,6 +527,315 @@ class PythonCodeGen(CodeGen[Any], Generic[DataType]):
         )
         return ast.fix_missing_locations(func_def)
 
+    def _delete_unused(
+        self,
+        used_keys: list[str],
+        function_body: list[ast.stmt],
+        deleted_vars: set[str],
+        determined_keys: set[str],
+        assigned_output_keys: set[str],
+    ) -> None:
+        for used_key in used_keys:
+            if not self._check_deletable(
+                used_key,
+                deleted_vars,
+                determined_keys,
+                assigned_output_keys,
+            ):
+                continue
+
+            delete_stmt = ast.Delete(targets=[self._var_ref_ast(used_key, ast.Del())])
+            function_body.append(delete_stmt)
+            deleted_vars.add(used_key)
+
+    def create_checkpoint_segments(self) -> list[CheckpointSegment]:
+        if self.pm.checkpoint_groups is None:
+            return []
+        return find_checkpoint_segments(
+            self.pm.flat_graph,
+            self.pm.checkpoint_groups,
+            self.is_recomputable,
+            self.get_activation_size,
+        )
+
+    def is_recomputable(self, key: str) -> bool:
+        # Only float tensors are passed between checkpointed functions, random
+        # primitives of autograd backends are recomputed with the same keys.
+        edge = self.pm.data[key]
+        return edge.is_tensor and edge.value_type is float
+
+    def get_activation_size(self, key: str) -> float:
+        # Number of elements of the value, unknown dimensions are counted as 1.
+        shape = self.pm.data[key].shape
+        if shape is None or not isinstance(shapes := shape.get_shapes(), list):
+            return 1.0
+        return float(max(math.prod(dim for dim in shapes if isinstance(dim, int)), 1))
+
+    def create_checkpoint_call(
+        self, run: dict[str, ast.Assign], fn_name: str
+    ) -> tuple[list[ast.stmt], list[str]]:
+        """Defines a function evaluating the primitive calls of consecutive
+        operations of a checkpoint segment, and returns its definition and
+        checkpointed call together with the input keys of the operations.
+
+        Tensor inputs which may be float are the arguments of the function.
+        Other inputs are bound as default values, since the function is
+        evaluated again in the backward pass after they might be deleted.
+        """
+        input_keys: list[str] = []
+        for key in run:
+            for source_key in self.pm.flat_graph.get_source_keys(key):
+                if source_key not in run and source_key not in input_keys:
+                    input_keys.append(source_key)
+        escaping = set(self.pm.flat_graph.output_dict.values())
+        output_keys = [
+            key
+            for key in run
+            if key in escaping
+            or not run.keys() >= set(self.pm.flat_graph.get_target_keys(key))
+        ] or [next(reversed(run))]
+
+        arg_keys: list[str] = []
+        bound_keys: list[str] = []
+        for key in input_keys:
+            if self.is_static_scalar(key):
+                continue
+            edge = self.pm.data[key]
+            if edge.is_tensor and edge.value_type not in (int, bool):
+                arg_keys.append(key)
+            else:
+                bound_keys.append(key)
+
+        fn_def = ast.FunctionDef(
+            name=fn_name,
+            args=ast.arguments(
+                posonlyargs=[],
+                args=[
+                    ast.arg(self._var_ref_ast(key, ast.Load()).id)
+                    for key in arg_keys + bound_keys
+                ],
+                kwonlyargs=[],
+                kw_defaults=[],
+                defaults=[self._var_ref_ast(key, ast.Load()) for key in bound_keys],
+            ),
+            body=[
+                *run.values(),
+                ast.Return(
+                    ast.Tuple(
+                        [self._var_ref_ast(key, ast.Load()) for key in output_keys],
+                        ast.Load(),
+                    )
+                ),
+            ],
+            decorator_list=[],
+            returns=None,
+            type_params=[],
+        )
+        call = ast.Assign(
+            targets=[
+                ast.Tuple(
+                    [self._var_ref_ast(key, ast.Store()) for key in output_keys],
+                    ast.Store(),
+                )
+            ],
+            value=ast.Call(
+                func=ast.Call(
+                    func=self.get_checkpoint_fn(),
+                    args=[ast.Name(fn_name, ast.Load())],
+                    keywords=[],
+                ),
+                args=[self._var_ref_ast(key, ast.Load()) for key in arg_keys],
+                keywords=[],
+            ),
+        )
+        return [fn_def, call], input_keys
+
+    def get_checkpoint_fn(self) -> ast.expr:
+        if self.backend.backend_type != "jax":
+            raise NotImplementedError(
+                f"Checkpointing is not supported by {self.__class__.__name__}!"
+            )
+        self._import_jax()
+        return ast.Attribute(ast.Name("jax", ast.Load()), "checkpoint", ast.Load())
+
+    def _import_jax(self) -> None:
+        if not any(
+            isinstance(stmt, ast.Import) and stmt.names[0].name == "jax"
+            for stmt in self.imports
+        ):
+            self.imports.append(ast.Import(names=[ast.alias(name="jax")]))
+
+    def create_fusion_groups(self) -> list[FusionGroup]:
+        if not self.pm.fuse_elementwise:
+            return []
+        return find_fusion_groups(self.pm.flat_graph, self.is_fusible)
+
+    def is_fusible(self, key: str) -> bool:
+        # Only tensor valued outputs of elementwise primitives are fused.
+        formula_key = self.pm.flat_graph.get_op(key).formula_key
+        return (
+            key not in self._segment_of
+            and formula_key in ELEMENTWISE_PRIMITIVES
+            and formula_key in self.backend.op_function_dict
+            and self.pm.data[key].is_tensor
+        )
+
+    def create_fused_call(
+        self, group: FusionGroup, body: list[ast.Assign], fn_name: str
+    ) -> tuple[ast.Assign, list[str]]:
+        """Defines a function evaluating the primitive calls of a fusion group
+        and returns its call together with the input keys of the group.
+        """
+        body = self.create_fused_body(group, body)
+        internal_names = {
+            target.id
+            for stmt in body
+            for target in stmt.targets
+            if isinstance(target, ast.Name)
+        }
+        # Names referenced as arguments of the primitive calls which are not
+        # computed inside the group are the arguments of the fused function.
+        arg_names: list[str] = []
+        for stmt in body:
+            fn_nodes = {
+                id(node)
+                for call in ast.walk(stmt.value)
+                if isinstance(call, ast.Call)
+                for node in ast.walk(call.func)
+            }
+            for node in ast.walk(stmt.value):
+                if (
+                    isinstance(node, ast.Name)
+                    and id(node) not in fn_nodes
+                    and node.id not in internal_names
+                    and node.id not in arg_names
+                ):
+                    arg_names.append(node.id)
+
+        *assignments, last_assignment = body
+        fn_def = ast.FunctionDef(
+            name=fn_name,
+            args=ast.arguments(
+                posonlyargs=[],
+                args=[ast.arg(name) for name in arg_names],
+                kwonlyargs=[],
+                kw_defaults=[],
+                defaults=[],
+            ),
+            body=[*assignments, ast.Return(last_assignment.value)],
+            decorator_list=self.get_fused_fn_decorators(),
+            returns=None,
+            type_params=[],
+        )
+        self.globals.append(ast.fix_missing_locations(fn_def))
+
+        fused_call = ast.Call(
+            func=ast.Name(fn_name, ast.Load()),
+            args=[ast.Name(name, ast.Load()) for name in arg_names],
+            keywords=[],
+        )
+        input_keys: list[str] = []
+        for key in group.keys:
+            for source_key in self.pm.flat_graph.get_source_keys(key):
+                if source_key not in group.keys and source_key not in input_keys:
+                    input_keys.append(source_key)
+
+        return ast.Assign(last_assignment.targets, fused_call), input_keys
+
+    def create_fused_body(
+        self, group: FusionGroup, body: list[ast.Assign]
+    ) -> list[ast.Assign]:
+        # Intermediate values of a group are only used by the next operations
+        # of the group, so in inference their arrays are overwritten by them if
+        # the shapes and dtypes of the results match.
+        if not self.pm.inference:
+            return body
+
+        overwritable: dict[str, BufferSpec] = {}
+        fused_body: list[ast.Assign] = []
+        for key, stmt in zip(group.keys, body, strict=True):
+            spec = self.get_buffer_spec(key)
+            call = stmt.value
+            if (
+                spec is not None
+                and isinstance(call, ast.Call)
+                and isinstance(call.func, ast.Name)
+                and call.func.id != "make_array"
+            ):
+                for source_key in self.pm.flat_graph.get_source_keys(key):
+                    if overwritable.get(source_key) == spec:
+                        del overwritable[source_key]
+                        formula_key = self.pm.flat_graph.get_op(key).formula_key
+                        stmt = self.create_out_call(
+                            stmt, formula_key, self._var_ref_ast(source_key, ast.Load())
+                        )
+                        break
+                overwritable[key] = spec
+            fused_body.append(stmt)
+        return fused_body
+
+    def get_fused_fn_decorators(self) -> list[ast.expr]:
+        # Fused functions are compiled as a single region by JAX.
+        if self.backend.backend_type != "jax":
+            return []
+        self._import_jax()
+        return [
+            ast.Attribute(ast.Name("jax", ast.Load()), "jit", ast.Load()),
+        ]
+
+    def create_memory_plan(self, excluded_keys: Iterable[str] = ()) -> MemoryPlan:
+        specs: dict[str, BufferSpec] = {}
+        if self.pm.plan_memory:
+            excluded_keys = set(excluded_keys)
+            for key in self.pm.flat_graph.topological_order:
+                if key in excluded_keys:
+                    continue
+                if (spec := self.get_buffer_spec(key)) is not None:
+                    specs[key] = spec
+        return plan_memory(self.pm.flat_graph, specs)
+
+    def get_buffer_spec(self, key: str) -> BufferSpec | None:
+        # Only float tensors with fully determined shapes computed from float
+        # tensors are planned, they are stored with the backend's dtype.
+        if self.pm.flat_graph.get_op(key).formula_key not in self.OUT_FUNCTIONS:
+            return None
+
+        for _key in [key] + self.pm.flat_graph.get_source_keys(key):
+            edge = self.pm.data.get(_key)
+            if edge is not None and edge.is_tensor and edge.value_type is not float:
+                return None
+
+        shape = self.pm.data[key].shape
+        assert shape is not None
+        if not is_list_int(shapes := shape.get_shapes()):
+            return None
+
+        return BufferSpec(
+            tuple(shapes), self.backend.default_dtype.name, self.backend.precision // 8
+        )
+
+    def create_buffer(self, spec: BufferSpec) -> ast.expr:
+        raise NotImplementedError(
+            f"Buffers are not supported by {self.__class__.__name__}!"
+        )
+
+    def create_out_call(
+        self, primitive_call: ast.Assign, formula_key: str, out: ast.expr
+    ) -> ast.Assign:
+        """Converts a primitive call into a call writing into given array."""
+        call = primitive_call.value
+        assert isinstance(call, ast.Call)
+        fn_name, extra_args = self.OUT_FUNCTIONS[formula_key]
+        fn = ast.parse(fn_name, mode="eval").body
+        keywords = [keyword for keyword in call.keywords if keyword.arg != "cache"]
+        keywords.append(ast.keyword(arg="out", value=out))
+        out_call = ast.Call(
+            func=fn,
+            args=call.args + [ast.Constant(arg) for arg in extra_args],
+            keywords=keywords,
+        )
+        return ast.Assign(primitive_call.targets, out_call)
+
     def add_partial_function(self, formula_key: str) -> None:
         # Simply creates partial functions for array creation fns
         # To avoid redundant argument passing for array creation fns
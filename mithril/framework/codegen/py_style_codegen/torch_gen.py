@@ -20,14 +20,34 @@ import torch
 
 from ....backends.with_autograd.torch_backend import TorchBackend
 from ...logical import Operator
+from ...physical.memory_planner import BufferSpec
 from ...physical.model import PhysicalModel
 from .python_gen import PythonCodeGen
 
 
 class TorchCodeGen(PythonCodeGen[torch.Tensor]):
+    OUT_FUNCTIONS = {
+        "add": ("torch.add", ()),
+        "subtract": ("torch.sub", ()),
+        "multiplication": ("torch.mul", ()),
+        "divide": ("torch.div", ()),
+        "matrix_multiplication": ("torch.matmul", ()),
+        "exp": ("torch.exp", ()),
+        "sqrt": ("torch.sqrt", ()),
+        "sin": ("torch.sin", ()),
+        "cos": ("torch.cos", ()),
+        "tanh": ("torch.tanh", ()),
+        "abs": ("torch.abs", ()),
+        "log": ("torch.log", ()),
+        "relu": ("torch.clamp", (0.0,)),
+    }
+
     def __init__(self, pm: PhysicalModel[torch.Tensor]) -> None:
         super().__init__(pm)
         self.is_parallel_defined = False
+        self._torch_imported = False
+        self._has_out_calls = False
+        self._checkpoint_imported = False
 
         assert isinstance(self.pm.backend, TorchBackend)
         self.backend: TorchBackend = self.pm.backend
@@ -93,3 +113,67 @@ class TorchCodeGen(PythonCodeGen[torch.Tensor]):
             )
 
         return ast.Assign(targets, generated_fn), used_keys | _used_keys
+
+    def generate_evaluate(self) -> ast.FunctionDef:
+        evaluate_fn = super().generate_evaluate()
+        # Functions with out arguments do not support autograd, so evaluation
+        # is done without recording gradients if any of them is called.
+        if self._has_out_calls:
+            evaluate_fn.decorator_list.append(
+                ast.Call(
+                    func=ast.Attribute(
+                        ast.Name("torch", ast.Load()), "no_grad", ast.Load()
+                    ),
+                    args=[],
+                    keywords=[],
+                )
+            )
+        return evaluate_fn
+
+    def get_buffer_spec(self, key: str) -> BufferSpec | None:
+        # Sharded tensors are not written into buffers.
+        if self.backend.get_raw_device_mesh() is not None:
+            return None
+        return super().get_buffer_spec(key)
+
+    def create_out_call(
+        self, primitive_call: ast.Assign, formula_key: str, out: ast.expr
+    ) -> ast.Assign:
+        self._import_torch()
+        self._has_out_calls = True
+        return super().create_out_call(primitive_call, formula_key, out)
+
+    def create_buffer(self, spec: BufferSpec) -> ast.expr:
+        self._import_torch()
+        return ast.Call(
+            func=ast.Attribute(ast.Name("torch", ast.Load()), "empty", ast.Load()),
+            args=[ast.Constant(spec.shape)],
+            keywords=[
+                ast.keyword(
+                    arg="dtype",
+                    value=ast.Attribute(
+                        ast.Name("torch", ast.Load()), spec.dtype, ast.Load()
+                    ),
+                ),
+                ast.keyword(
+                    arg="device", value=ast.Constant(str(self.backend.get_device()))
+                ),
+            ],
+        )
+
+    def get_checkpoint_fn(self) -> ast.expr:
+        if not self._checkpoint_imported:
+            self.imports.append(
+                ast.ImportFrom(
+                    module="mithril.cores.python.torch.utils",
+                    names=[ast.alias(name="checkpoint")],
+                    level=0,
+                )
+            )
+            self._checkpoint_imported = True
+        return ast.Name("checkpoint", ast.Load())
+
+    def _import_torch(self) -> None:
+        if not self._torch_imported:
+            self.imports.append(ast.Import(names=[ast.alias(name="torch")]))
+            self._torch_imported = True
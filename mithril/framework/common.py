@@ -14,12 +14,13 @@
 
 from __future__ import annotations
 
+import heapq
 from collections.abc import Callable, Iterator, KeysView, Mapping, Sequence
 from copy import copy, deepcopy
 from dataclasses import dataclass, field
 from enum import Enum
 from functools import partial, reduce
-from itertools import chain, combinations, cycle, product, zip_longest
+from itertools import chain, combinations, count, cycle, product, zip_longest
 from types import EllipsisType, GenericAlias, UnionType
 from typing import (
     Any,
@@ -329,9 +330,19 @@ class ConstraintSolver:
         updates |= self.solver_loop(updates.constraints)
 
     def solver_loop(self, constraints: set[Constraint]) -> Updates:
+        # Triggered constraints are solved in creation order, which roughly
+        # follows the order models are connected. So constraints mostly run
+        # after the constraints producing their inputs instead of running on
+        # partially inferred shapes and running again once they are updated.
         updates = Updates()
-        while constraints:
-            constr = constraints.pop()
+        # Deep copied constraints share priorities, ids break the ties.
+        queue = [(constr.priority, id(constr), constr) for constr in constraints]
+        heapq.heapify(queue)
+        constraints.clear()
+        queued = {constr for *_, constr in queue}
+        while queue:
+            *_, constr = heapq.heappop(queue)
+            queued.remove(constr)
             if (not constr.parents) and (constr in self.constraint_map):
                 hyper_edges = self.constraint_map[constr]
                 status, newly_added_symbols = constr(hyper_edges)
@@ -346,8 +357,12 @@ class ConstraintSolver:
                     for hyper_edge in hyper_edges:
                         hyper_edge.remove_constraint(constr)
 
-                constraints |= new_constraints
-                constraints.discard(constr)
+                for new_constr in new_constraints - queued:
+                    if new_constr is not constr:
+                        queued.add(new_constr)
+                        heapq.heappush(
+                            queue, (new_constr.priority, id(new_constr), new_constr)
+                        )
         return updates
 
     @staticmethod
@@ -1116,6 +1131,17 @@ def check_used_tensors(value: Any) -> None:
             )
 
 
+def _deepcopy(value: Any, memo: dict[int, Any]) -> Any:
+    # Fast path for sets which are not handled by copy module natively and
+    # are the most common containers of shape and constraint graphs.
+    if type(value) is not set:
+        return deepcopy(value, memo)
+    if (copied := memo.get(id(value))) is None:
+        copied = memo[id(value)] = set()
+        copied.update(deepcopy(item, memo) for item in value)
+    return copied
+
+
 class Tensor(Generic[TypeVarTensorType]):
     def __init__(
         self,
@@ -1144,6 +1170,16 @@ class Tensor(Generic[TypeVarTensorType]):
             self.set_value(value)
         self.is_used = False
 
+    def __deepcopy__(self, memo: dict[int, Any]) -> Tensor[TypeVarTensorType]:
+        if id(self) in memo:
+            return memo[id(self)]
+        new_instance = self.__class__.__new__(self.__class__)
+        memo[id(self)] = new_instance
+        for k, v in self.__dict__.items():
+            # Types are immutable, so they can be shared.
+            setattr(new_instance, k, v if k == "type" else _deepcopy(v, memo))
+        return new_instance
+
     def set_type(self, typ: _TensorTypes) -> Updates:
         updates = Updates()
         if self.type != (new_type := find_intersection_type(typ, self.type)):
@@ -1278,6 +1314,28 @@ class IOHyperEdge:
         if value is not TBD:
             self.set_value(value)
 
+    def __deepcopy__(self, memo: dict[int, Any]) -> IOHyperEdge:
+        if id(self) in memo:
+            return memo[id(self)]
+        new_instance = self.__class__.__new__(self.__class__)
+        memo[id(self)] = new_instance
+        for k, v in self.__dict__.items():
+            if k == "_type":
+                # Types are immutable, so they can be shared.
+                setattr(new_instance, k, v)
+            elif k == "constraints":
+                setattr(
+                    new_instance,
+                    k,
+                    {
+                        update_type: {deepcopy(constr, memo) for constr in constrs}
+                        for update_type, constrs in v.items()
+                    },
+                )
+            else:
+                setattr(new_instance, k, _deepcopy(v, memo))
+        return new_instance
+
     @property
     def _temp_shape(self) -> ShapeRepr | None:
         if isinstance(self._value, Tensor):
@@ -1648,6 +1706,14 @@ class Uniadic:
     def __eq__(self, other: Uniadic) -> bool:  # type: ignore
         return id(self.metadata) == id(other.metadata)
 
+    def __deepcopy__(self, memo: dict[int, Any]) -> Uniadic:
+        if id(self) in memo:
+            return memo[id(self)]
+        new_instance = self.__class__.__new__(self.__class__)
+        memo[id(self)] = new_instance
+        new_instance.metadata = deepcopy(self.metadata, memo)
+        return new_instance
+
     def set_value(self, value: int | set[int] | None) -> bool:  # Do we need set_value
         prev_value = self.metadata.possible_values
         new_value = self.metadata.update_possible_values(value)
@@ -1718,7 +1784,7 @@ class UniadicRecord:
         # First copy referee Uniadics.
         deepcopy(self.referees, memo)
         for k, v in self.__dict__.items():
-            setattr(new_instance, k, deepcopy(v, memo))
+            setattr(new_instance, k, _deepcopy(v, memo))
         return new_instance
 
     def update_possible_values(self, values: int | set[int] | None) -> set[int] | None:
@@ -2024,7 +2090,7 @@ class Variadic:
         # First copy shape reprs.
         deepcopy(self.reprs, memo)
         for k, v in self.__dict__.items():
-            setattr(new_instance, k, deepcopy(v, memo))
+            setattr(new_instance, k, _deepcopy(v, memo))
         return new_instance
 
     def _match(
@@ -2450,7 +2516,7 @@ class ShapeNode:
         # First copy shape reprs.
         deepcopy(self.reprs, memo)
         for k in self.__slots__:
-            setattr(new_instance, k, deepcopy(getattr(self, k), memo))
+            setattr(new_instance, k, _deepcopy(getattr(self, k), memo))
         return new_instance
 
     def add_repr(self, repr: ShapeRepr) -> None:
@@ -2638,7 +2704,7 @@ class ShapeRepr:
         # First copy shape node.
         deepcopy(self.node, memo)
         for k in self.__slots__:
-            setattr(new_instance, k, deepcopy(getattr(self, k), memo))
+            setattr(new_instance, k, _deepcopy(getattr(self, k), memo))
         return new_instance
 
     @property
@@ -2930,6 +2996,9 @@ class ShapeRepr:
         # self.node.reprs.remove(self)
 
 
+_constraint_priorities = count()
+
+
 # # Below functions are used in various constraints.
 # prod_fn = lambda a, b: (a if isinstance(a, int) else a.value) * (b if
 # isinstance(b, int) else b.value)
@@ -2940,6 +3009,8 @@ class Constraint:
     fn: ConstraintFunctionType
     types: list[UpdateType] = field(default_factory=lambda: [UpdateType.SHAPE])
     call_counter: int = 0
+    # Constraints are solved in creation order, see ConstraintSolver.solver_loop.
+    priority: int = field(default_factory=lambda: next(_constraint_priorities))
     parents: set[Constraint] = field(default_factory=lambda: set())
     children: set[Constraint] = field(default_factory=lambda: set())
 
@@ -2968,6 +3039,21 @@ class Constraint:
         self.call_counter += 1
         return status, updates
 
+    def __deepcopy__(self, memo: dict[int, Any]) -> Constraint:
+        if id(self) in memo:
+            return memo[id(self)]
+        new_instance = self.__class__.__new__(self.__class__)
+        memo[id(self)] = new_instance
+        # Constraint functions and update types are never mutated, so they
+        # are shared.
+        new_instance.fn = self.fn
+        new_instance.types = self.types
+        new_instance.call_counter = self.call_counter
+        new_instance.priority = self.priority
+        new_instance.parents = {deepcopy(constr, memo) for constr in self.parents}
+        new_instance.children = {deepcopy(constr, memo) for constr in self.children}
+        return new_instance
+
     def add_dependencies(self, *args: Constraint) -> None:
         self.parents.update(args)
         for constr in args:
@@ -1306,11 +1306,20 @@ class BaseModel:
         topo_order: list[BaseModel],
         visited: set[BaseModel],
     ) -> None:
+        # Iterative post-order DFS, an explicit stack is used instead of
+        # recursion in order not to hit recursion limit in deep graphs.
         visited.add(node)
-        for child in graph.get(node, OrderedSet()):
-            if child not in visited:
-                BaseModel._reverse_dfs(child, graph, topo_order, visited)
-        topo_order.append(node)
+        stack = [(node, iter(graph.get(node, OrderedSet())))]
+        while stack:
+            parent, children = stack[-1]
+            for child in children:
+                if child not in visited:
+                    visited.add(child)
+                    stack.append((child, iter(graph.get(child, OrderedSet()))))
+                    break
+            else:
+                stack.pop()
+                topo_order.append(parent)
 
     def get_models_in_topological_order(
         self, start: BaseModel | None = None
@@ -2399,15 +2408,16 @@ class DependencyMap:
     def look_for_cyclic_connection(
         self, target_conn: ConnectionData, specs: OrderedSet[ConnectionData]
     ) -> bool:
-        if target_conn in (conns := OrderedSet([conn for conn in specs])):
-            return True
-        else:
+        conns = specs
+        while target_conn not in conns:
+            # Follow the first connection having local dependencies.
             for conn in conns:
                 if conn in self.local_output_dependency_map:
-                    return self.look_for_cyclic_connection(
-                        target_conn, self.local_output_dependency_map[conn][1]
-                    )
-            return False
+                    conns = self.local_output_dependency_map[conn][1]
+                    break
+            else:
+                return False
+        return True
 
     def merge_global_connections(
         self, conn1: ConnectionData, conn2: ConnectionData
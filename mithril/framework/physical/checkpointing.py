@@ -0,0 +1,112 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+from ..logical.operator import Operator
+from .flat_graph import FlatGraph
+
+__all__ = ["CheckpointSegment", "find_checkpoint_segments"]
+
+
+@dataclass
+class CheckpointSegment:
+    """Operations whose intermediate values are not kept by the forward pass and
+    are evaluated again by the backward pass.
+
+    Attributes:
+        keys (list[str]): Output keys of the operations in topological order.
+        inputs (list[str]): Keys used by the operations which are not computed
+            in the segment.
+        outputs (list[str]): Keys computed in the segment which are outputs of
+            the model or used by operations outside of the segment. Only their
+            values are kept by the forward pass.
+    """
+
+    keys: list[str] = field(default_factory=list)
+    inputs: list[str] = field(default_factory=list)
+    outputs: list[str] = field(default_factory=list)
+
+    @property
+    def internal_keys(self) -> list[str]:
+        """Keys whose values are only used in the segment."""
+        return [key for key in self.keys if key not in self.outputs]
+
+
+def find_checkpoint_segments(
+    flat_graph: FlatGraph[Any],
+    groups: Sequence[Sequence[Operator]],
+    is_recomputable: Callable[[str], bool],
+    cost: Callable[[str], float] | None = None,
+) -> list[CheckpointSegment]:
+    """Creates checkpoint segments of the given operator groups.
+
+    If no group is given, recomputable operations are split into about sqrt(N)
+    consecutive segments of equal cost in topological order. So the forward
+    pass keeps the outputs of O(sqrt(N)) segments and the backward pass keeps
+    the intermediate values of a single segment at a time.
+
+    Args:
+        flat_graph (FlatGraph): Graph of the physical model.
+        groups (Sequence[Sequence[Operator]]): Operators of each segment.
+        is_recomputable (Callable[[str], bool]): Returns whether the operation
+            producing given key can be evaluated again with the same result.
+        cost (Callable[[str], float] | None): Estimated cost of keeping the
+            value of given key, e.g. its activation size. Each operation costs
+            the same if not given.
+
+    Returns:
+        list[CheckpointSegment]: Non-empty segments in topological order.
+    """
+    order = [key for key in flat_graph.topological_order if is_recomputable(key)]
+    if groups:
+        group_of = {id(op): idx for idx, group in enumerate(groups) for op in group}
+        segment_keys: list[list[str]] = [[] for _ in groups]
+        for key in order:
+            if (idx := group_of.get(id(flat_graph.get_op(key)))) is not None:
+                segment_keys[idx].append(key)
+    else:
+        costs = [1.0 if cost is None else cost(key) for key in order]
+        # A segment is closed once its cost reaches the average cost of
+        # ceil(sqrt(N)) operations.
+        budget = sum(costs) * math.ceil(math.sqrt(len(order))) / max(len(order), 1)
+        segment_keys = [[]]
+        total = 0.0
+        for key, key_cost in zip(order, costs, strict=True):
+            segment_keys[-1].append(key)
+            total += key_cost
+            if total >= budget:
+                segment_keys.append([])
+                total = 0.0
+
+    escaping = set(flat_graph.output_dict.values())
+    segments: list[CheckpointSegment] = []
+    for keys in segment_keys:
+        if not keys:
+            continue
+        segment = CheckpointSegment(keys=keys)
+        members = set(keys)
+        for key in keys:
+            for source_key in flat_graph.get_source_keys(key):
+                if source_key not in members and source_key not in segment.inputs:
+                    segment.inputs.append(source_key)
+            if key in escaping or not members.issuperset(
+                flat_graph.get_target_keys(key)
+            ):
+                segment.outputs.append(key)
+        segments.append(segment)
+    return segments
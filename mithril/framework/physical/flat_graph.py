@@ -32,6 +32,7 @@ from ..common import (
     DataEvalType,
     IOHyperEdge,
     MainValueType,
+    ShapeNode,
     StateKey,
     ToBeDetermined,
     Updates,
@@ -46,6 +47,23 @@ from ..logical.operator import Operator
 from ..logical.operators import BufferOp
 from .data_store import StaticDataStore
 
+# Primitives whose results do not depend on the order of their inputs.
+COMMUTATIVE_PRIMITIVES = frozenset(
+    {
+        "add",
+        "multiplication",
+        "minimum",
+        "maximum",
+        "equal",
+        "not_equal",
+        "logical_and",
+        "logical_or",
+        "logical_xor",
+    }
+)
+# Primitives which only depend on the shape of their first input.
+SHAPE_PRIMITIVES = frozenset({"shape", "size", "length"})
+
 
 class GConnection:
     """Represents a connection between models in a flat graph.
@@ -115,11 +133,19 @@ class FlatGraph(GenericDataType[DataType]):
         # Utility tables used for pruning duplicate connections
         self.unique_model_table: dict[str, GConnection] = {}
         self.value_table: dict[str, DataType | ValueType] = {}
+        # Shape nodes used in model ids, kept alive so that their ids are unique.
+        self.shape_table: dict[int, ShapeNode] = {}
+        # Number of operations pruned since they duplicate another operation.
+        self.n_pruned_duplicates = 0
 
         self.data_store: StaticDataStore[DataType] = StaticDataStore(backend)
         self.constraint_solver: ConstraintSolver = deepcopy(solver, memo=memo)
         self.multi_node_keys: dict[str, list[str]] = {}
 
+        # Cached topological order, it is reset by the methods which modify
+        # connections and recomputed on next access.
+        self._topological_order: OrderedSet[str] | None = None
+
     @property
     def hanging_keys(self) -> set[str]:
         hanging_keys = (self.all_target_keys - self.all_source_keys) | set(
@@ -174,10 +200,17 @@ class FlatGraph(GenericDataType[DataType]):
 
     @property
     def topological_order(self) -> OrderedSet[str]:
+        if self._topological_order is None:
+            self._topological_order = self._compute_topological_order()
+        return self._topological_order
+
+    def _compute_topological_order(self) -> OrderedSet[str]:
         # Traverse the model table in topological order
         topological_order: OrderedSet[str] = OrderedSet()
         keys_to_visit = list(sorted(self.all_source_keys - self.all_target_keys))
         visited: set[str] = set()
+        # Source keys of each target key which are not visited yet.
+        remaining_sources: dict[str, set[str]] = {}
 
         while keys_to_visit:
             key = keys_to_visit.pop()
@@ -185,21 +218,28 @@ class FlatGraph(GenericDataType[DataType]):
                 continue
 
             visited.add(key)
+            if (conn := self.connections.get(key)) is None:
+                continue
 
             # Visit all target keys of the current key
-            for target_key in self.get_target_keys(key):
+            for target_key in conn.target_keys:
                 if target_key in visited:
                     continue
 
-                # Numpy backend uses cache keys for internal operations.
-                # So, we need to exclude the cache keys from the source keys.
-                source_keys = self.get_source_keys(target_key)
-                if self.backend.is_manualgrad and source_keys[-1].endswith("_cache"):
-                    source_keys = source_keys[:-1]
+                if (sources := remaining_sources.get(target_key)) is None:
+                    # Numpy backend uses cache keys for internal operations.
+                    # So, we need to exclude the cache keys from the source keys.
+                    source_keys = self.connections[target_key].source_keys
+                    if self.backend.is_manualgrad and source_keys[-1].endswith(
+                        "_cache"
+                    ):
+                        source_keys = source_keys[:-1]
+                    sources = remaining_sources[target_key] = set(source_keys) - visited
+                sources.discard(key)
 
                 # If all source keys of the target key are visited,
                 # then add the target key to the topological order.
-                if set(source_keys).issubset(visited):
+                if not sources:
                     keys_to_visit.append(target_key)
                     topological_order.add(target_key)
 
@@ -265,6 +305,7 @@ class FlatGraph(GenericDataType[DataType]):
                                 outer_key
                             )
 
+        self._topological_order = None
         # Create output connection of the new Connection.
         out_conn = GConnection(output_key, model, [], [])
         self.model_table[model] = out_conn
@@ -328,6 +369,7 @@ class FlatGraph(GenericDataType[DataType]):
         self.connections[inserted_key].target_keys.remove(base_op_out_conn.key)
         self.connections[output_key].target_keys.append(base_op_out_conn.key)
         self.all_source_keys.add(output_key)
+        self._topological_order = None
 
     def insert_operator_after(
         self,
@@ -368,6 +410,7 @@ class FlatGraph(GenericDataType[DataType]):
         self.connections[new_source_key].target_keys = [target_key]
         self.connections[new_source_key].source_keys = cache_source_keys
         self.all_target_keys.add(target_key)
+        self._topological_order = None
 
     def _collapse_model_keys(self, output_key: str, new_reference_key: str) -> None:
         # If a model removed, the models that uses the output of the removed model
@@ -438,6 +481,7 @@ class FlatGraph(GenericDataType[DataType]):
 
         # The connection is already calculated
         if key in self.data_store.data_values:
+            self._topological_order = None
             # Unlink source connections
             for source_key in list(conn.source_keys):
                 src_conn = self.connections[source_key]
@@ -462,6 +506,7 @@ class FlatGraph(GenericDataType[DataType]):
 
         # Nuke buffer
         if isinstance(op, BufferOp):
+            self._topological_order = None
             input_key = conn.source_keys[0]
             input_conn = self.connections[input_key]
             input_conn = self._temp_connection_info.get(input_conn, input_conn)
@@ -486,22 +531,93 @@ class FlatGraph(GenericDataType[DataType]):
             if source_conn is None:
                 return
 
-            pruned_key = key
-            source_key = source_conn.key
+            self.replace_key(key, source_conn.key)
+            self.n_pruned_duplicates += 1
+
+    def replace_key(self, key: str, new_key: str) -> None:
+        """Replaces all uses of the output of an operation with another key and
+        removes the operation.
+
+        Args:
+            key (str): Output key of the removed operation.
+            new_key (str): Key used in place of the removed key. Its data is
+                matched with the data of the removed key.
+        """
+        conn = self.connections[key]
+        new_conn = self.connections[new_key]
+
+        # Match shapes
+        updates = self.all_data[new_key].match(self.all_data[key])
 
-            ## Update Data Memo
-            pruned_data = self.all_data[pruned_key]
-            remained_data = self.all_data[source_key]
+        # Finally prune the connection
+        self._prune_connection(conn, new_conn)
+        self._all_source_keys.add(new_key)
 
-            # Match shapes
-            updates = remained_data.match(pruned_data)
+        self.data_store.update_cached_data(updates)
+        self.constraint_solver(updates)
+
+    def replace_source_key(self, key: str, source_key: str, new_key: str) -> None:
+        """Replaces an input of the operation of given key with another key.
+
+        Args:
+            key (str): Output key of the operation.
+            source_key (str): Input key to be replaced.
+            new_key (str): Key used in place of the replaced input.
+        """
+        conn = self.connections[key]
+        conn.source_keys = [
+            new_key if _key == source_key else _key for _key in conn.source_keys
+        ]
+        source_conn = self.connections[source_key]
+        while key in source_conn.target_keys:
+            source_conn.target_keys.remove(key)
+        self._update_conn_info(source_conn)
+
+        self.connections[new_key].target_keys.append(key)
+        self._all_source_keys.add(new_key)
+        self._topological_order = None
+
+    def replace_operator(
+        self, op: Operator, new_op: Operator, keys: dict[str, str]
+    ) -> None:
+        """Replaces an operation with another one writing the same output key.
+
+        Args:
+            op (Operator): Replaced operation.
+            new_op (Operator): New operation.
+            keys (dict[str, str]): Global keys of the new operation's inputs and
+                output. Output key must be the output key of the replaced
+                operation.
+        """
+        conn = self.model_table.pop(op)
+        if keys[Operator.output_key] != conn.key:
+            raise ValueError(
+                f"Output key of the new operator must be `{conn.key}`, "
+                f"got `{keys[Operator.output_key]}`!"
+            )
 
-            # Finally prune the connection
-            self._prune_connection(conn, source_conn)
-            self._all_source_keys.add(source_conn.key)
+        self._topological_order = None
+        # Unlink source connections
+        for source_key in set(conn.source_keys):
+            source_conn = self.connections[source_key]
+            while conn.key in source_conn.target_keys:
+                source_conn.target_keys.remove(conn.key)
+            self._update_conn_info(source_conn)
 
-            self.data_store.update_cached_data(updates)
-            self.constraint_solver(updates)
+        # Link the new operation with its inputs
+        conn.op = new_op
+        conn.source_keys = []
+        self.model_table[new_op] = conn
+        for inner_key, outer_key in keys.items():
+            if inner_key == Operator.output_key:
+                continue
+            self._all_keys.add(outer_key)
+            if (source_conn := self.connections.get(outer_key)) is None:
+                source_conn = GConnection(outer_key, None, [], [])
+                self.connections[outer_key] = source_conn
+            conn.source_keys.append(outer_key)
+            source_conn.target_keys.append(conn.key)
+            self._all_source_keys.add(outer_key)
 
     def _is_duplicate(
         self,
@@ -509,13 +625,29 @@ class FlatGraph(GenericDataType[DataType]):
         data: dict[str, IOHyperEdge],
         constant_keys: Mapping[str, DataType | MainValueType],
     ) -> GConnection | None:
+        if conn.op is None:
+            raise RuntimeError(f"Connection {conn.key} must have an operator")
+        formula_key = conn.op.formula_key
+
         # Model id is a unique key for unique operation
         model_id: list[str] = []
-        for key in conn.source_keys:
+        for idx, key in enumerate(conn.source_keys):
             # We do not consider output and cache keys, when determining model id.
             if key == "output" or "cache" in key:
                 continue
 
+            # Shape primitives are identified by the shape of their input, so
+            # they are shared by all tensors whose shapes are known to be equal.
+            if (
+                idx == 0
+                and formula_key in SHAPE_PRIMITIVES
+                and (_data := data.get(key)) is not None
+                and (shape := _data.shape) is not None
+            ):
+                self.shape_table.setdefault(id(shape), shape)
+                model_id.append(f"<shape-{id(shape)}>")
+                continue
+
             # Extract value from data or static_keys
             value: DataType | AllValueType
             if (_data := data.get(key)) is not None and _data.is_valued:
@@ -569,10 +701,10 @@ class FlatGraph(GenericDataType[DataType]):
             else:
                 model_id.append(key)
 
-        if conn.op is None:
-            raise RuntimeError(f"Connection {conn.key} must have an operator")
+        if formula_key in COMMUTATIVE_PRIMITIVES:
+            model_id.sort()
 
-        final_model_id = "-".join(model_id) + f"-{conn.op.formula_key}"
+        final_model_id = "-".join(model_id) + f"-{formula_key}"
 
         if final_model_id in self.unique_model_table:
             return self.unique_model_table[final_model_id]
@@ -581,6 +713,7 @@ class FlatGraph(GenericDataType[DataType]):
         return None
 
     def _prune_connection(self, conn: GConnection, source_conn: GConnection) -> None:
+        self._topological_order = None
         self._collapse_model_keys(conn.key, source_conn.key)
 
         # Update target keys of connections
@@ -607,6 +740,7 @@ class FlatGraph(GenericDataType[DataType]):
             self._all_target_keys.remove(conn.key)
 
     def _remove_conn(self, conn: GConnection) -> None:
+        self._topological_order = None
         if conn.key in self.connections and conn.key not in self.output_dict.values():
             self.remove_key_from_store(conn.key, hard_remove=True)
 
@@ -0,0 +1,127 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from .flat_graph import FlatGraph
+
+__all__ = ["ELEMENTWISE_PRIMITIVES", "FusionGroup", "find_fusion_groups"]
+
+# Formula keys of primitives whose outputs are computed elementwise from their
+# (broadcasted) inputs.
+ELEMENTWISE_PRIMITIVES: frozenset[str] = frozenset(
+    {
+        "abs",
+        "absolute_error",
+        "add",
+        "clamp",
+        "cos",
+        "divide",
+        "exp",
+        "floor",
+        "floor_divide",
+        "gelu",
+        "leaky_relu",
+        "log",
+        "maximum",
+        "minimum",
+        "multiplication",
+        "negate",
+        "power",
+        "relu",
+        "robust_log",
+        "robust_power",
+        "robust_sqrt",
+        "sigmoid",
+        "sign",
+        "sin",
+        "softplus",
+        "sqrt",
+        "square",
+        "squared_error",
+        "stable_reciprocal",
+        "subtract",
+        "tanh",
+        "where",
+    }
+)
+
+
+@dataclass
+class FusionGroup:
+    """Connected elementwise operations evaluated by a single fused call.
+
+    Attributes:
+        keys (list[str]): Output keys of the fused operations in topological
+            order. Only the last one is used outside of the group.
+    """
+
+    keys: list[str] = field(default_factory=list)
+
+    @property
+    def output_key(self) -> str:
+        return self.keys[-1]
+
+
+def find_fusion_groups(
+    flat_graph: FlatGraph[Any], is_fusible: Callable[[str], bool]
+) -> list[FusionGroup]:
+    """Groups fusible operations whose intermediate values are used only once.
+
+    An operation is merged into the group of its consumer if both of them are
+    fusible and its output is neither an output of the model nor used by any
+    other operation. Hence values of all keys in a group except its output key
+    are only needed while the group is evaluated.
+
+    Args:
+        flat_graph (FlatGraph): Graph of the physical model.
+        is_fusible (Callable[[str], bool]): Returns whether the operation
+            producing given key can be fused.
+
+    Returns:
+        list[FusionGroup]: Groups with at least two operations in topological
+        order of their output keys.
+    """
+    order = list(flat_graph.topological_order)
+    positions = {key: idx for idx, key in enumerate(order)}
+    outputs = set(flat_graph.output_dict.values())
+    group_of: dict[str, FusionGroup] = {}
+    # Consumers are visited before their sources, so a group grows from its
+    # output key towards its inputs.
+    for key in reversed(order):
+        if not is_fusible(key):
+            continue
+        group = group_of.setdefault(key, FusionGroup())
+        for source_key in flat_graph.get_source_keys(key):
+            if (
+                source_key in group_of
+                or source_key in outputs
+                or source_key not in positions
+                or set(flat_graph.get_target_keys(source_key)) != {key}
+                or not is_fusible(source_key)
+            ):
+                continue
+            group_of[source_key] = group
+
+    fused_keys = [key for key in order if key in group_of]
+    for key in fused_keys:
+        group_of[key].keys.append(key)
+
+    return [
+        group
+        for key in fused_keys
+        if (group := group_of[key]).output_key == key and len(group.keys) > 1
+    ]
@@ -0,0 +1,133 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import heapq
+import math
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Any
+
+from .flat_graph import FlatGraph
+
+__all__ = ["BufferSpec", "MemoryPlan", "plan_memory"]
+
+
+@dataclass(frozen=True)
+class BufferSpec:
+    shape: tuple[int, ...]
+    dtype: str
+    itemsize: int
+
+    @property
+    def nbytes(self) -> int:
+        return math.prod(self.shape) * self.itemsize
+
+
+@dataclass
+class MemoryPlan:
+    """Assignment of intermediate keys to reusable buffers.
+
+    Attributes:
+        buffers (list[BufferSpec]): Buffers to be preallocated.
+        assignments (dict[str, int]): Index of the buffer each planned key is
+            written into.
+        lifetimes (dict[str, tuple[int, int]]): Indices of the operations in
+            topological order which produce and last use each planned key.
+        naive_size (int): Total bytes of planned keys if each of them is
+            allocated separately.
+    """
+
+    buffers: list[BufferSpec] = field(default_factory=list)
+    assignments: dict[str, int] = field(default_factory=dict)
+    lifetimes: dict[str, tuple[int, int]] = field(default_factory=dict)
+    naive_size: int = 0
+
+    @property
+    def arena_size(self) -> int:
+        """Total bytes of preallocated buffers."""
+        return sum(buffer.nbytes for buffer in self.buffers)
+
+
+def plan_memory(
+    flat_graph: FlatGraph[Any], specs: Mapping[str, BufferSpec]
+) -> MemoryPlan:
+    """Assigns buffers to intermediate keys whose lifetimes do not overlap.
+
+    Keys in `specs` are the outputs of operations which write into a given
+    buffer, so their values never alias their inputs. Outputs of any other
+    operation may be views of their inputs (e.g. reshape or indexing), hence
+    an input of such an operation is kept alive as long as the output of the
+    operation is alive. Keys which are alive at the end of evaluation (i.e.
+    model outputs or their views) are not planned since their buffers would
+    be overwritten by the next evaluation.
+
+    Args:
+        flat_graph (FlatGraph): Graph of the physical model.
+        specs (Mapping[str, BufferSpec]): Buffer requirements of the keys which
+            can be written into preallocated buffers.
+
+    Returns:
+        MemoryPlan: Buffers and their assignments. Buffers are only shared by
+        keys with the same shape and dtype, so values can be written into them
+        without reallocation.
+    """
+    order = list(flat_graph.topological_order)
+    positions = {key: idx for idx, key in enumerate(order)}
+    # Lifetimes of keys escaping the evaluation are never over.
+    never = len(order)
+    escaping = set(flat_graph.output_dict.values())
+
+    last_uses: dict[str, int] = {}
+    for idx in reversed(range(len(order))):
+        key = order[idx]
+        if key in escaping:
+            last_uses[key] = never
+            continue
+        last_use = idx
+        for target_key in flat_graph.get_target_keys(key):
+            if target_key not in positions:
+                last_use = never
+                break
+            if target_key in specs:
+                last_use = max(last_use, positions[target_key])
+            else:
+                last_use = max(last_use, last_uses[target_key])
+        last_uses[key] = last_use
+
+    plan = MemoryPlan()
+    free_buffers: dict[BufferSpec, list[int]] = {}
+    # (last use, buffer index) pairs of buffers in use.
+    active: list[tuple[int, int]] = []
+    for idx, key in enumerate(order):
+        # Buffers whose values were last used by the previous operations are
+        # free to be written again.
+        while active and active[0][0] < idx:
+            _, buffer_idx = heapq.heappop(active)
+            free_buffers[plan.buffers[buffer_idx]].append(buffer_idx)
+
+        if (spec := specs.get(key)) is None or last_uses[key] == never:
+            continue
+
+        if free := free_buffers.setdefault(spec, []):
+            buffer_idx = free.pop()
+        else:
+            buffer_idx = len(plan.buffers)
+            plan.buffers.append(spec)
+
+        plan.assignments[key] = buffer_idx
+        plan.lifetimes[key] = (idx, last_uses[key])
+        plan.naive_size += spec.nbytes
+        heapq.heappush(active, (last_uses[key], buffer_idx))
+
+    return plan
@@ -14,12 +14,14 @@
 
 from __future__ import annotations
 
+import logging
 import math
 import warnings
 from collections.abc import Callable, Mapping, Sequence
 from copy import deepcopy
 from dataclasses import dataclass
 from functools import cached_property
+from itertools import chain
 from typing import Any, Literal, get_args, overload
 
 from ...backends.backend import Backend, ParallelBackend
@@ -58,6 +60,8 @@ from ..logical.model import (
 )
 from ..logical.operator import Operator
 from .flat_graph import FlatGraph
+from .memory_planner import MemoryPlan
+from .rewrites import rewrite_graph
 
 __all__ = ["PhysicalModel"]
 
@@ -81,6 +85,13 @@ PhysicalShapeType = (
 StringOrConnectionSetType = set[str | Connection] | set[str] | set[Connection]
 
 
+@dataclass
+class CompileRequest:
+    constant_keys: dict[str, Any]
+    data_keys: set[str]
+    shapes: dict[str, PhysicalShapeValueType]
+
+
 class PhysicalModel(GenericDataType[DataType]):
     def __init__(
         self,
@@ -97,10 +108,42 @@ class PhysicalModel(GenericDataType[DataType]):
         safe_names: bool,
         use_short_namings: bool,
         jit: bool,
+        keep_template: bool = False,
+        plan_memory: bool = False,
+        fuse_elementwise: bool = False,
+        checkpoint: bool | Sequence[BaseModel] = False,
+        rewrite: bool = True,
+        quantized_keys: Mapping[str, str] | None = None,
     ) -> None:
         if len(model.conns.output_keys) == 0 and len(model.conns.couts) == 0:
             raise KeyError("Models with no output keys can not be compiled.")
 
+        if plan_memory and not inference:
+            raise ValueError("Memory planning is only supported in inference mode!")
+
+        if fuse_elementwise and backend.is_manualgrad and not inference:
+            raise ValueError(
+                "Elementwise fusion is only supported in inference mode for "
+                "manual gradient backends!"
+            )
+
+        if checkpoint is not False:
+            if inference:
+                raise ValueError("Checkpointing is only supported in training mode!")
+            if backend.backend_type not in ("numpy", "torch", "jax"):
+                raise NotImplementedError(
+                    f"Checkpointing is not supported for {backend.backend_type} "
+                    "backend!"
+                )
+
+        if quantized_keys:
+            if backend.backend_type != "ggml":
+                raise NotImplementedError(
+                    "Quantized keys are only supported by GGML backend!"
+                )
+            if not inference:
+                raise ValueError("Quantized keys are only supported in inference mode!")
+
         # TODO: Update StaticDataStore.convert_data_to_physical function.
 
         self.jit: bool = jit
@@ -155,6 +198,10 @@ class PhysicalModel(GenericDataType[DataType]):
         _trainable_keys = {self._convert_key(model, key) for key in trainable_keys}
         _discard_keys = {self._convert_key(model, key) for key in discard_keys}
         _shapes = {self._convert_key(model, k): v for k, v in shapes.items()}
+        # Quantization types of the weights which are given as quantized arrays.
+        self.quantized_keys: dict[str, str] = {
+            self._convert_key(model, k): v for k, v in (quantized_keys or {}).items()
+        }
 
         # Check provided constant and data_keys do not have
         # any preset value. Note that this check is done after key conversions.
@@ -165,11 +212,23 @@ class PhysicalModel(GenericDataType[DataType]):
         # Final validation process of provided keys.
         self._validate_keys(_constant_keys, _data_keys, _trainable_keys, _discard_keys)
 
+        # Physical keys of the request, recompile updates them.
+        self._request = CompileRequest(_constant_keys, _data_keys, _shapes)
+
         # Set provided non-differentiable and trainable tensor keys.
         self._non_differentiable_keys: set[str] = _constant_keys.keys() | _data_keys
         self._trainable_tensor_inputs: set[str] = _trainable_keys
         self.discarded_keys = _discard_keys
         self.inference = inference
+        # If set, code generators write intermediate values into reused
+        # buffers and store their plan in memory_plan.
+        self.plan_memory = plan_memory
+        self.memory_plan: MemoryPlan | None = None
+        # If set, Python code generators evaluate chains of elementwise
+        # operations by a single fused function.
+        self.fuse_elementwise = fuse_elementwise
+        # If set, registered rewrite rules simplify the flat graph.
+        self.rewrite = rewrite
 
         # Initialize flat graph and data store.
         memo: dict[int, IOHyperEdge] = {}
@@ -253,6 +312,25 @@ class PhysicalModel(GenericDataType[DataType]):
 
             self.flat_graph.add_value(p_model, mappings)
 
+        # Operators of each checkpointed submodel, code generators evaluate them
+        # again in backward pass instead of keeping their intermediate values.
+        # An empty list lets code generators choose the segments. None if
+        # checkpointing is disabled.
+        self.checkpoint_groups: list[list[Operator]] | None = None
+        if checkpoint is True:
+            self.checkpoint_groups = []
+        elif not isinstance(checkpoint, bool) and checkpoint:
+            self.checkpoint_groups = self._find_checkpoint_groups(
+                list(flat_model.mappings), checkpoint
+            )
+
+        # Snapshot of the model before any shape or value dependent inference
+        # is done. Compiling the same structure with different constant values
+        # or shapes only requires running _pre_compile on a copy of it.
+        self._template: PhysicalModel[DataType] | None = (
+            self.copy() if keep_template else None
+        )
+
         # First part of the pm with all the inferences.
         self._pre_compile(
             constant_keys=_constant_keys,
@@ -260,25 +338,190 @@ class PhysicalModel(GenericDataType[DataType]):
             shapes=_shapes,
         )
 
-        # If shape_names is True, all data (not params) provided in
-        # runtime must be manually named in logical model.
         if safe_names:
-            runtime_data_keys = self.flat_graph.runtime_static_keys
-            unnamed_inputs = model.input_keys - self._input_keys - self.discarded_keys
-            unnamed_data_keys = sorted(
-                [
-                    local_key
-                    for local_key in unnamed_inputs
-                    if (key := self.external_key_mapping.get(local_key, local_key))
-                    in runtime_data_keys
-                ]
+            self._check_runtime_data_names(model)
+
+    def copy(self, memo: dict[int, Any] | None = None) -> PhysicalModel[DataType]:
+        """Creates an independent copy of the physical model. Backend, logical
+        operators and constant arrays are shared with the copy, everything else
+        (flat graph, data store, constraint solver) is deep copied.
+
+        Note that generated evaluate functions are bound to their own physical
+        model, so a copy has to generate its own functions.
+
+        Args:
+            memo (dict[int, Any] | None): Optional deepcopy memo. It can be used
+                to find copies of the objects of the original model or to
+                replace the backend of the copy.
+
+        Returns:
+            PhysicalModel: Copied physical model.
+        """
+        if memo is None:
+            memo = {}
+        memo.setdefault(id(self.backend), self.backend)
+        # Removed connections keep their operators, which must not be copied
+        # either since operators refer to their whole logical model.
+        flat_graph = self.flat_graph
+        for conn in chain(
+            flat_graph.connections.values(),
+            flat_graph.unique_model_table.values(),
+            *flat_graph._temp_connection_info.items(),
+        ):
+            if conn.op is not None:
+                memo[id(conn.op)] = conn.op
+        for op in flat_graph.model_table:
+            memo[id(op)] = op
+        array_type = self.backend.get_backend_array_type()
+        for value in self.flat_graph.cached_data.values():
+            if isinstance(value, array_type):
+                memo[id(value)] = value
+
+        # Generated functions are not copied, template and request are shared.
+        excluded = {
+            key: self.__dict__.pop(key)
+            for key in (
+                "_generated_eval_fn",
+                "_generated_evaluate_all_fn",
+                "_template",
+                "_request",
+            )
+            if key in self.__dict__
+        }
+        try:
+            pm = deepcopy(self, memo)
+        finally:
+            self.__dict__.update(excluded)
+        pm._template = excluded.get("_template")
+        pm._request = excluded["_request"]
+        return pm
+
+    def _specialize(
+        self,
+        model: BaseModel,
+        *,
+        constant_keys: PhysicalConstantType[DataType],
+        data_keys: StringOrConnectionSetType,
+        shapes: PhysicalShapeType,
+        safe_names: bool,
+        memo: dict[int, Any] | None = None,
+    ) -> PhysicalModel[DataType]:
+        """Runs shape and value dependent inference on a copy of this model,
+        which must be a template (i.e. `_template` of a physical model). Given
+        keys must be the same keys the template is created with, only constant
+        values and shapes can differ.
+        """
+        pm = self._instantiate(
+            CompileRequest(
+                constant_keys={
+                    self._convert_key(model, key): value
+                    for key, value in constant_keys.items()
+                },
+                data_keys={self._convert_key(model, key) for key in data_keys},
+                shapes={
+                    self._convert_key(model, key): value
+                    for key, value in shapes.items()
+                },
+            ),
+            memo,
+        )
+        if safe_names:
+            pm._check_runtime_data_names(model)
+        return pm
+
+    def _instantiate(
+        self, request: CompileRequest, memo: dict[int, Any] | None = None
+    ) -> PhysicalModel[DataType]:
+        # Runs _pre_compile on a copy of this template for given request.
+        pm = self.copy(memo)
+        pm._template = self
+        pm._request = request
+        pm._pre_compile(
+            constant_keys=request.constant_keys,
+            data_keys=request.data_keys,
+            shapes=request.shapes,
+        )
+        return pm
+
+    def recompile(
+        self,
+        constant_keys: Mapping[str, Any] | None = None,
+        shapes: Mapping[str, PhysicalShapeValueType] | None = None,
+        *,
+        file_path: str | None = None,
+    ) -> PhysicalModel[DataType]:
+        """Compiles this model again with updated constant values and shapes.
+
+        Flattening and constraint setup of the logical model are not repeated,
+        only shape and value dependent inference and code generation run on a
+        copy of the template of this model. Therefore, the model must be
+        compiled with `recompilable=True` (or `memoize=True`).
+
+        Args:
+            constant_keys (Mapping[str, Any] | None): New values of the keys
+                which are compiled as constant keys. Other constant keys keep
+                their values.
+            shapes (Mapping[str, Sequence[int | None]] | None): Shapes replacing
+                the shapes of given keys. Shapes of the other keys are kept.
+            file_path (str | None): Optional file path of the generated code.
+
+        Returns:
+            PhysicalModel: New evaluable physical model, this model is not
+                modified.
+        """
+        from ..codegen import code_gen_map
+
+        if self._template is None:
+            raise ValueError(
+                "Model can not be recompiled since it is compiled without "
+                "recompilable=True."
+            )
+
+        constant_keys = {
+            self.external_key_mapping.get(key, key): value
+            for key, value in (constant_keys or {}).items()
+        }
+        shapes = {
+            self.external_key_mapping.get(key, key): value
+            for key, value in (shapes or {}).items()
+        }
+        if unknown_keys := constant_keys.keys() - self._request.constant_keys.keys():
+            raise KeyError(
+                "Only values of constant keys can be updated, following keys are "
+                f"not constant: {', '.join(sorted(unknown_keys))}"
+            )
+
+        pm = self._template._instantiate(
+            CompileRequest(
+                constant_keys=self._request.constant_keys | constant_keys,
+                data_keys=self._request.data_keys,
+                shapes={**self._request.shapes, **shapes},
+            )
+        )
+        codegen = code_gen_map[self.backend.__class__](pm)
+        codegen.generate_code(file_path=file_path)
+        pm.generate_functions(*codegen.compile_code(jit=self.jit))
+        return pm
+
+    def _check_runtime_data_names(self, model: BaseModel) -> None:
+        # All data (not params) provided in runtime must be manually
+        # named in logical model.
+        runtime_data_keys = self.flat_graph.runtime_static_keys
+        unnamed_inputs = model.input_keys - self._input_keys - self.discarded_keys
+        unnamed_data_keys = sorted(
+            [
+                local_key
+                for local_key in unnamed_inputs
+                if self.external_key_mapping.get(local_key, local_key)
+                in runtime_data_keys
+            ]
+        )
+        if unnamed_data_keys:
+            raise KeyError(
+                "Runtime data keys must be named in logical model when "
+                "safe_names set to True. The following keys are unnamed: "
+                f"{', '.join(str(key) for key in unnamed_data_keys)}"
             )
-            if unnamed_data_keys:
-                raise KeyError(
-                    "Runtime data keys must be named in logical model when "
-                    "safe_names set to True. The following keys are unnamed: "
-                    f"{', '.join(str(key) for key in unnamed_data_keys)}"
-                )
 
     @property
     def cotangent_keys(self) -> set[str]:
@@ -344,6 +587,33 @@ class PhysicalModel(GenericDataType[DataType]):
                     "set as static with a value!"
                 )
 
+    def _find_checkpoint_groups(
+        self, operators: list[Operator], models: Sequence[BaseModel]
+    ) -> list[list[Operator]]:
+        indices = {id(model): idx for idx, model in enumerate(models)}
+        groups: list[list[Operator]] = [[] for _ in models]
+        for op in operators:
+            # Find the checkpointed models containing the operator.
+            found = False
+            parent = op.parent
+            while parent is not None:
+                if (idx := indices.get(id(parent))) is not None:
+                    if found:
+                        raise ValueError(
+                            "Checkpointed models must not contain each other!"
+                        )
+                    groups[idx].append(op)
+                    found = True
+                parent = parent.parent
+
+        for model, group in zip(models, groups, strict=True):
+            if not group:
+                raise ValueError(
+                    f"Checkpointed model {model.__class__.__name__} is not a "
+                    "submodel of the compiled model!"
+                )
+        return groups
+
     def _validate_keys(
         self,
         constant_keys: PhysicalConstantType[DataType],
@@ -681,6 +951,13 @@ class PhysicalModel(GenericDataType[DataType]):
         # Infer and store all static keys using user provided constant keys and
         # the non-tensor constants defined in logical model.
         self.flat_graph.infer_static_keys()
+        if n_pruned := self.flat_graph.n_pruned_duplicates:
+            logging.info(f"Common subexpression elimination removed {n_pruned} ops.")
+
+        # Simplify the graph, operations which become unused are discarded
+        # below together with other hanging keys.
+        if self.rewrite and (rewrites := rewrite_graph(self.flat_graph)):
+            logging.info(f"Graph rewrites applied: {rewrites}.")
 
         # Check if there exists any unused keys in the provided data_keys.
         # TODO: Consider to remove this check. Same check is done in
@@ -1448,33 +1725,48 @@ class FlatModel:
         if mappings is None:
             mappings = {}
 
-        if isinstance(model, Operator):
-            if not self._is_primitive_ready(model):
-                self._add_primitive_to_queue(model, mappings, parent_name)
-                return
+        # Submodels are visited in depth-first order using an explicit stack
+        # so that deeply nested models do not hit the recursion limit.
+        stack: list[tuple[BaseModel, dict[str, str], str]] = [
+            (model, mappings, parent_name)
+        ]
+        while stack:
+            model, mappings, parent_name = stack.pop()
+            if isinstance(model, Operator):
+                if not self._is_primitive_ready(model):
+                    self._add_primitive_to_queue(model, mappings, parent_name)
+                    continue
+
+                output_edge = self._process_primitive_model(
+                    model, mappings, parent_name
+                )
+                self._check_for_queue(output_edge)
 
-            self._process_primitive_model(model, mappings, parent_name)
+            elif isinstance(model, Model):
+                if model.formula_key and model.formula_key in self.primitive_lut:
+                    # If corresponding primitive exists in the primitive_lut,
+                    # replace the model with the primitive version
+                    self._replace_with_primitive(model, mappings, parent_name)
+                else:
+                    stack.extend(
+                        reversed(self._process_model(model, mappings, parent_name))
+                    )
 
-        elif isinstance(model, Model):
-            if model.formula_key and model.formula_key in self.primitive_lut:
-                # If corresponding primitive exists in the primitive_lut, replace
-                # the model with the primitive version
-                self._replace_with_primitive(model, mappings, parent_name)
             else:
-                self._process_model(model, mappings, parent_name)
-
-        else:
-            raise ValueError("Model must be either Operator or Model")
+                raise ValueError("Model must be either Operator or Model")
 
     def _process_primitive_model(
         self, model: Operator, mappings: dict[str, str], parent_name: str
-    ) -> None:
+    ) -> IOHyperEdge:
         """
         Process a primitive model.
 
         Args:
             model (Operator): The primitive model.
             mappings (dict[str, str]): The mappings of keys.
+
+        Returns:
+            IOHyperEdge: The output edge of the primitive model.
         """
 
         self.mappings.setdefault(model, {})
@@ -1502,12 +1794,25 @@ class FlatModel:
         output_con = model.conns.get_connection("output")
         assert output_con is not None
         self.used_edges.add(output_con.metadata)
-        self._check_for_queue(output_con.metadata)
+        return output_con.metadata
 
     def _process_model(
         self, model: Model, mappings: dict[str, str], parent_name: str
-    ) -> None:
+    ) -> list[tuple[BaseModel, dict[str, str], str]]:
+        """
+        Generate key mappings of the submodels of a model.
+
+        Args:
+            model (Model): The model.
+            mappings (dict[str, str]): The mappings of keys.
+            parent_name (str): The parent name.
+
+        Returns:
+            list[tuple[BaseModel, dict[str, str], str]]: Submodels with their
+            mappings and parent names in the order they should be processed.
+        """
         submodel_names = model.get_unique_submodel_names()
+        submodels: list[tuple[BaseModel, dict[str, str], str]] = []
 
         for m, value in model.dag.items():
             submodel_name = submodel_names[m].lower()
@@ -1535,15 +1840,23 @@ class FlatModel:
                         )
                 else:
                     name_mapping[key] = mappings[conn.key]
-            self.generate_keys(m, name_mapping, parent_name=name)
+            submodels.append((m, name_mapping, name))
+        return submodels
 
     def _check_for_queue(self, hyperedge: IOHyperEdge) -> None:
-        if hyperedge in self.queued_models:
-            for m, mappings, parent_name in self.queued_models[hyperedge]:
+        # Process queued primitives which become ready in depth-first order.
+        # Each stack entry iterates over the queue of an edge.
+        stack = [iter(self.queued_models.get(hyperedge, []))]
+        while stack:
+            for m, mappings, parent_name in stack[-1]:
                 if self._is_primitive_ready(m):
-                    self._process_primitive_model(
+                    output_edge = self._process_primitive_model(
                         m, mappings=mappings, parent_name=parent_name
                     )
+                    stack.append(iter(self.queued_models.get(output_edge, [])))
+                    break
+            else:
+                stack.pop()
 
     def _is_primitive_ready(self, model: Operator) -> bool:
         """
@@ -1588,16 +1901,14 @@ class FlatModel:
         Returns:
             str: The next unique name.
         """
-        self.key_origins[name] = self.key_origins.get(name, -1) + 1
-        candidate_name = f"{name}_{self.key_origins[name]}"
-        if (
-            candidate_name in self.assigned_names
-            or candidate_name in self.reserved_keys
-        ):
-            return self._get_next_unique_name(name)
-        while candidate_name in self.reserved_keys:
-            candidate_name = f"_{candidate_name}"
-        return candidate_name
+        while True:
+            self.key_origins[name] = self.key_origins.get(name, -1) + 1
+            candidate_name = f"{name}_{self.key_origins[name]}"
+            if (
+                candidate_name not in self.assigned_names
+                and candidate_name not in self.reserved_keys
+            ):
+                return candidate_name
 
     def _create_name(self, name: str, key_origin: str) -> Name:
         """
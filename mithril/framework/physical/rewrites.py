@@ -0,0 +1,264 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from ..common import TBD
+from ..logical.operator import Operator
+from .flat_graph import FlatGraph
+
+__all__ = ["RewriteRule", "rewrite_rules", "register_rewrite_rule", "rewrite_graph"]
+
+RewriteFn = Callable[[FlatGraph[Any], str], bool]
+
+
+@dataclass(frozen=True)
+class RewriteRule:
+    """Rewrites the operation producing a key if it matches a pattern.
+
+    Attributes:
+        name (str): Name of the rule.
+        formula_key (str): Formula key of the operations the rule is applied to.
+        fn (RewriteFn): Applies the rule to the operation producing given key
+            of the flat graph and returns whether the graph is rewritten.
+    """
+
+    name: str
+    formula_key: str
+    fn: RewriteFn
+
+
+# Registered rules by the formula keys of the operations they are applied to.
+rewrite_rules: dict[str, list[RewriteRule]] = {}
+
+
+def register_rewrite_rule(
+    formula_key: str, name: str | None = None
+) -> Callable[[RewriteFn], RewriteFn]:
+    """Registers the decorated function as a rewrite rule of the operations
+    with given formula key.
+
+    Rules only need to rewire the graph, operations whose outputs are not used
+    anymore are removed by the compiler afterwards.
+    """
+
+    def decorator(fn: RewriteFn) -> RewriteFn:
+        rule = RewriteRule(name or fn.__name__, formula_key, fn)
+        rewrite_rules.setdefault(formula_key, []).append(rule)
+        return fn
+
+    return decorator
+
+
+def rewrite_graph(
+    flat_graph: FlatGraph[Any], rules: dict[str, list[RewriteRule]] | None = None
+) -> dict[str, int]:
+    """Applies rewrite rules to the operations of the flat graph until none of
+    them matches.
+
+    Args:
+        flat_graph (FlatGraph): Graph to be rewritten.
+        rules (dict[str, list[RewriteRule]] | None): Rules by the formula keys
+            of the operations they are applied to. Registered rules are used if
+            not given.
+
+    Returns:
+        dict[str, int]: Number of rewrites done by each rule.
+    """
+    if rules is None:
+        rules = rewrite_rules
+
+    counts: dict[str, int] = {}
+    is_rewritten = True
+    while is_rewritten:
+        is_rewritten = False
+        for key in list(flat_graph.topological_order):
+            if (conn := flat_graph.get_connection(key)) is None or conn.op is None:
+                continue
+            for rule in rules.get(conn.op.formula_key, []):
+                if rule.fn(flat_graph, key):
+                    counts[rule.name] = counts.get(rule.name, 0) + 1
+                    is_rewritten = True
+                    break
+    return counts
+
+
+def _get_sources(flat_graph: FlatGraph[Any], key: str) -> dict[str, str]:
+    op = flat_graph.get_op(key)
+    return dict(zip(op.input_keys, flat_graph.get_source_keys(key), strict=False))
+
+
+def _get_producer(
+    flat_graph: FlatGraph[Any], key: str, formula_key: str
+) -> dict[str, str] | None:
+    # Returns sources of the operation producing given key if it has the given
+    # formula key.
+    conn = flat_graph.get_connection(key)
+    if conn is None or conn.op is None or conn.op.formula_key != formula_key:
+        return None
+    return _get_sources(flat_graph, key)
+
+
+def _get_static_value(flat_graph: FlatGraph[Any], key: str) -> Any:
+    return flat_graph.cached_data.get(key, TBD)
+
+
+def _is_scalar(value: Any, scalar: int) -> bool:
+    return type(value) in (int, float) and value == scalar
+
+
+def _bypass(flat_graph: FlatGraph[Any], key: str, new_key: str) -> bool:
+    # Outputs of the model are kept. Values of the keys are equal, yet their
+    # types must be equal too.
+    data, new_data = flat_graph.all_data[key], flat_graph.all_data[new_key]
+    if (
+        key in flat_graph.output_dict.values()
+        or data.is_tensor != new_data.is_tensor
+        or data.value_type != new_data.value_type
+    ):
+        return False
+    flat_graph.replace_key(key, new_key)
+    return True
+
+
+def _normalize_axes(axes: Any, ndim: int) -> Sequence[int]:
+    if axes is None:
+        return list(reversed(range(ndim)))
+    if isinstance(axes, int):
+        return [axes]
+    return list(axes)
+
+
+@register_rewrite_rule("transpose")
+def transpose_of_transpose(flat_graph: FlatGraph[Any], key: str) -> bool:
+    """transpose(transpose(x)) -> x if the axes cancel each other."""
+    sources = _get_sources(flat_graph, key)
+    if (inner := _get_producer(flat_graph, sources["input"], "transpose")) is None:
+        return False
+
+    axes = _get_static_value(flat_graph, sources["axes"])
+    inner_axes = _get_static_value(flat_graph, inner["axes"])
+    if axes is TBD or inner_axes is TBD:
+        return False
+    if axes is not None or inner_axes is not None:
+        ndim = len(_normalize_axes(axes if axes is not None else inner_axes, 0))
+        axes = _normalize_axes(axes, ndim)
+        inner_axes = _normalize_axes(inner_axes, ndim)
+        if [inner_axes[axis] for axis in axes] != list(range(ndim)):
+            return False
+
+    return _bypass(flat_graph, key, inner["input"])
+
+
+@register_rewrite_rule("reshape")
+def reshape_of_reshape(flat_graph: FlatGraph[Any], key: str) -> bool:
+    """reshape(reshape(x, shape_1), shape_2) -> reshape(x, shape_2)"""
+    sources = _get_sources(flat_graph, key)
+    if (inner := _get_producer(flat_graph, sources["input"], "reshape")) is None:
+        return False
+    flat_graph.replace_source_key(key, sources["input"], inner["input"])
+    return True
+
+
+@register_rewrite_rule("add")
+def add_zero(flat_graph: FlatGraph[Any], key: str) -> bool:
+    """x + 0 -> x, 0 + x -> x"""
+    sources = _get_sources(flat_graph, key)
+    for value_key, input_key in (("right", "left"), ("left", "right")):
+        if _is_scalar(_get_static_value(flat_graph, sources[value_key]), 0):
+            return _bypass(flat_graph, key, sources[input_key])
+    return False
+
+
+@register_rewrite_rule("subtract")
+def subtract_zero(flat_graph: FlatGraph[Any], key: str) -> bool:
+    """x - 0 -> x"""
+    sources = _get_sources(flat_graph, key)
+    if _is_scalar(_get_static_value(flat_graph, sources["right"]), 0):
+        return _bypass(flat_graph, key, sources["left"])
+    return False
+
+
+@register_rewrite_rule("multiplication")
+def multiply_one(flat_graph: FlatGraph[Any], key: str) -> bool:
+    """x * 1 -> x, 1 * x -> x"""
+    sources = _get_sources(flat_graph, key)
+    for value_key, input_key in (("right", "left"), ("left", "right")):
+        if _is_scalar(_get_static_value(flat_graph, sources[value_key]), 1):
+            return _bypass(flat_graph, key, sources[input_key])
+    return False
+
+
+@register_rewrite_rule("divide")
+def divide_one(flat_graph: FlatGraph[Any], key: str) -> bool:
+    """x / 1 -> x"""
+    sources = _get_sources(flat_graph, key)
+    if _is_scalar(_get_static_value(flat_graph, sources["denominator"]), 1):
+        return _bypass(flat_graph, key, sources["numerator"])
+    return False
+
+
+@register_rewrite_rule("log")
+def log_of_exp(flat_graph: FlatGraph[Any], key: str) -> bool:
+    """log(exp(x)) -> x"""
+    sources = _get_sources(flat_graph, key)
+    if (inner := _get_producer(flat_graph, sources["input"], "exp")) is None:
+        return False
+    return _bypass(flat_graph, key, inner["input"])
+
+
+@register_rewrite_rule("add")
+def linear_bias(flat_graph: FlatGraph[Any], key: str) -> bool:
+    """matmul(x, transpose(w)) + b -> linear_bias(x, w, b) for the backends
+    providing linear_bias primitive.
+    """
+    backend = flat_graph.backend
+    if "linear_bias" not in backend.op_function_dict or backend.is_manualgrad:
+        return False
+
+    sources = _get_sources(flat_graph, key)
+    for mult_key, bias_key in (("left", "right"), ("right", "left")):
+        mult_out = sources[mult_key]
+        # Matrix multiplication is only fused if its result is not used
+        # elsewhere, otherwise it would be computed twice.
+        if (
+            (mult := _get_producer(flat_graph, mult_out, "matrix_multiplication"))
+            is None
+            or flat_graph.get_target_keys(mult_out, include_outputs=True) != [key]
+            or mult_out in flat_graph.output_dict.values()
+        ):
+            continue
+        transpose = _get_producer(flat_graph, mult["right"], "transpose")
+        if (
+            transpose is None
+            or _get_static_value(flat_graph, transpose["axes"]) is not None
+        ):
+            continue
+
+        keys = {
+            "input": mult["left"],
+            "weight": transpose["input"],
+            "bias": sources[bias_key],
+            Operator.output_key: key,
+        }
+        op = Operator(
+            "linear_bias",
+            name="Linear",
+            **{_key: flat_graph.all_data[value] for _key, value in keys.items()},
+        )
+        flat_graph.replace_operator(flat_graph.get_op(key), op, keys)
+        return True
+    return False
@@ -0,0 +1,594 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import warnings
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from dataclasses import dataclass
+from enum import Enum
+from importlib import metadata
+from typing import Any
+
+import numpy as np
+
+from ..backends.backend import Backend
+from ..backends.with_manualgrad.c_backend import CBackend
+from ..backends.with_manualgrad.ggml_backend import GGMLBackend
+from ..cores.c.array import PyArray
+from ..framework.codegen import code_gen_map
+from ..framework.codegen.c_style_codegen.c_gen import CGen
+from ..framework.codegen.code_gen import CodeGen
+from ..framework.common import IOHyperEdge
+from ..framework.logical.base import BaseModel
+from ..framework.logical.model import Connection, Model
+from ..framework.physical.model import (
+    PhysicalConstantType,
+    PhysicalModel,
+    PhysicalShapeType,
+    StringOrConnectionSetType,
+)
+from ..types import DataType
+from .dict_conversions import model_to_dict
+
+__all__ = ["CompileCache", "CompileMemo", "compile_memo"]
+
+# Bump this whenever the layout of a cache entry changes.
+CACHE_FORMAT_VERSION = 2
+
+MODEL_FILE = "physical_model.pkl"
+PY_CODE_FILE = "code.py"
+C_CODE_FILE = "code.c"
+SHARED_LIB_FILE = "code.so"
+
+EdgePath = tuple[int | str, ...]
+
+
+def _mithril_version() -> str:
+    try:
+        return metadata.version("mithril")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _iter_logical_edges(model: BaseModel) -> Iterator[tuple[EdgePath, IOHyperEdge]]:
+    """Yields every logical edge of the model with a path which only depends on
+    the structure of the model, i.e. the same path addresses the same edge for
+    a model built again with the same definition in another process.
+    """
+    seen: set[int] = set()
+    stack: list[tuple[BaseModel, EdgePath]] = [(model, ())]
+    while stack:
+        current, prefix = stack.pop()
+        for key, conn in current.conns.all.items():
+            edge = conn.metadata
+            if id(edge) not in seen:
+                seen.add(id(edge))
+                yield prefix + (key,), edge
+        if isinstance(current, Model):
+            # Reversed so that submodels are visited in insertion order.
+            for idx, submodel in reversed(list(enumerate(current.dag))):
+                stack.append((submodel, prefix + (idx,)))
+
+
+class _PhysicalModelPickler(pickle.Pickler):
+    """Pickles a physical model without its backend. C arrays are stored as
+    numpy arrays so that they can be re-created on the backend which loads
+    the model.
+    """
+
+    def __init__(self, file: Any, backend: Backend[Any]) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.backend = backend
+
+    def persistent_id(self, obj: Any) -> Any:
+        if obj is self.backend:
+            return ("backend",)
+        if isinstance(obj, PyArray):
+            assert isinstance(self.backend, CBackend | GGMLBackend)
+            return ("array", self.backend.to_numpy(obj))
+        return None
+
+
+class _PhysicalModelUnpickler(pickle.Unpickler):
+    def __init__(self, file: Any, backend: Backend[Any]) -> None:
+        super().__init__(file)
+        self.backend = backend
+
+    def persistent_load(self, pid: Any) -> Any:
+        match pid:
+            case ("backend",):
+                return self.backend
+            case ("array", value):
+                assert isinstance(self.backend, CBackend | GGMLBackend)
+                return self.backend.array(value)
+        raise pickle.UnpicklingError(f"Unknown persistent id: {pid}")
+
+
+def fingerprint(
+    model: BaseModel,
+    backend: Backend[DataType],
+    *,
+    constant_keys: Mapping[str | Connection, Any],
+    data_keys: Iterable[str | Connection],
+    discard_keys: Iterable[str | Connection],
+    trainable_keys: Iterable[str | Connection],
+    shapes: Mapping[str | Connection, Any],
+    checkpoint: bool | Sequence[BaseModel] = False,
+    quantized_keys: Mapping[str, str] | None = None,
+    structural: bool = False,
+    **flags: bool,
+) -> str | None:
+    """Computes the fingerprint of a compilation request.
+
+    Parameters
+    ----------
+    structural : bool, optional
+        If True, constant values and shapes are excluded from the fingerprint,
+        so that requests which only differ in them share the same fingerprint,
+        by default False
+
+    Returns
+    -------
+    str | None
+        Hex digest of the request. None if the given model can not be
+        fingerprinted (e.g. it can not be converted into a dict), in which
+        case the request should not be cached.
+    """
+    # Invalid checkpoints are errors of the request itself.
+    checkpoint_spec: bool | list[EdgePath] = (
+        checkpoint if isinstance(checkpoint, bool) else _model_paths(model, checkpoint)
+    )
+    try:
+        spec: dict[str, Any] = {
+            "format": CACHE_FORMAT_VERSION,
+            "mithril": _mithril_version(),
+            "python": list(sys.version_info[:2]),
+            "model": model_to_dict(model),
+            "backend": {
+                "type": f"{type(backend).__module__}.{type(backend).__qualname__}",
+                "precision": backend.precision,
+                "device": str(backend.device),
+                "primitives": sorted(backend.registered_primitives),
+                # Options of the backend which change the generated code.
+                "options": {
+                    name: getattr(backend, name)
+                    for name in ("n_threads",)
+                    if hasattr(backend, name)
+                },
+            },
+            "data_keys": _key_names(model, data_keys),
+            "discard_keys": _key_names(model, discard_keys),
+            "trainable_keys": _key_names(model, trainable_keys),
+            "flags": flags,
+            "checkpoint": checkpoint_spec,
+            "quantized_keys": {
+                _key_name(model, key): type
+                for key, type in (quantized_keys or {}).items()
+            },
+        }
+        if structural:
+            spec["constant_keys"] = _key_names(model, constant_keys)
+        else:
+            spec["constant_keys"] = {
+                _key_name(model, key): value for key, value in constant_keys.items()
+            }
+            spec["shapes"] = {
+                _key_name(model, key): value for key, value in shapes.items()
+            }
+        serialized = json.dumps(
+            spec, sort_keys=True, default=lambda value: _encode(value, backend)
+        )
+    except Exception as e:
+        warnings.warn(
+            f"Compile caching is disabled for this model since it could not "
+            f"be fingerprinted: {e}",
+            stacklevel=3,
+        )
+        return None
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def _key_name(model: BaseModel, key: str | Connection) -> str:
+    if isinstance(key, Connection):
+        if (conn := model.conns.get_con_by_metadata(key.metadata)) is None:
+            raise KeyError(f"Given connection not found: {key}")
+        return conn.key
+    return key
+
+
+def _key_names(model: BaseModel, keys: Iterable[str | Connection]) -> list[str]:
+    return sorted(_key_name(model, key) for key in keys)
+
+
+def _model_paths(model: BaseModel, submodels: Sequence[BaseModel]) -> list[EdgePath]:
+    # Submodels are addressed by their indices in the dags of their parents.
+    paths: dict[int, EdgePath] = {}
+    stack: list[tuple[BaseModel, EdgePath]] = [(model, ())]
+    while stack:
+        current, prefix = stack.pop()
+        paths[id(current)] = prefix
+        if isinstance(current, Model):
+            for idx, submodel in enumerate(current.dag):
+                stack.append((submodel, prefix + (idx,)))
+    for submodel in submodels:
+        if id(submodel) not in paths:
+            raise ValueError(
+                f"Checkpointed model {submodel.__class__.__name__} is not a "
+                "submodel of the compiled model!"
+            )
+    return [paths[id(submodel)] for submodel in submodels]
+
+
+def _map_logical_edges(
+    pm: PhysicalModel[Any], model: BaseModel
+) -> dict[EdgePath, IOHyperEdge]:
+    data_memo = pm.flat_graph.data_memo
+    return {
+        path: data_memo[id(edge)]
+        for path, edge in _iter_logical_edges(model)
+        if id(edge) in data_memo
+    }
+
+
+def _bind_logical_edges(
+    pm: PhysicalModel[Any], model: BaseModel, edges: Mapping[EdgePath, IOHyperEdge]
+) -> None:
+    # Re-bind logical edges of an equivalent model to their physical
+    # counterparts.
+    data_memo = pm.flat_graph.data_memo
+    data_memo.clear()
+    for path, logical_edge in _iter_logical_edges(model):
+        if (physical_edge := edges.get(path)) is not None:
+            data_memo[id(logical_edge)] = physical_edge
+
+
+_scratch_dir: str | None = None
+
+
+def _temp_file_path(suffix: str) -> str:
+    """Returns a new file path in the scratch directory of the process, which
+    is removed at exit together with all libraries and sources generated for
+    the entries of the compile caches.
+    """
+    global _scratch_dir
+    if _scratch_dir is None:
+        _scratch_dir = tempfile.mkdtemp(prefix="mithril_")
+        atexit.register(shutil.rmtree, _scratch_dir, ignore_errors=True)
+    with tempfile.NamedTemporaryFile(
+        dir=_scratch_dir, suffix=suffix, delete=False
+    ) as tmp_file:
+        return tmp_file.name
+
+
+def _generate_functions(
+    pm: PhysicalModel[DataType],
+    code: str,
+    shared_lib_path: str | None,
+    *,
+    jit: bool,
+    file_path: str | None,
+) -> None:
+    """Generates functions of the physical model from previously generated
+    code (and shared library for C based backends).
+    """
+    codegen = code_gen_map[pm.backend.__class__](pm)
+    if file_path is None and isinstance(codegen, CGen):
+        file_path = _temp_file_path(".c")
+    codegen.load_code(code, file_path)
+    if isinstance(codegen, CGen):
+        assert shared_lib_path is not None
+        # Each physical model gets its own copy of the library since
+        # generated C code keeps its state in global variables.
+        shutil.copyfile(shared_lib_path, codegen.so_file_path)
+        evaluate, evaluate_all = codegen.load_shared_library(codegen.so_file_path)
+    else:
+        evaluate, evaluate_all = codegen.compile_code(jit=jit)
+    pm.generate_functions(evaluate, evaluate_all)
+
+
+class CompileCache:
+    """On-disk cache of compiled physical models.
+
+    Every entry is stored in its own directory named after the fingerprint
+    of the compilation request. An entry holds the pickled physical model
+    (flat graph, data store and all inferred shapes/types) together with the
+    generated evaluate code, and for C based backends the compiled shared
+    library, so that a hit skips flattening, constraint solving and code
+    generation altogether.
+
+    Note that the logical model is fingerprinted by its `model_to_dict`
+    representation, so the cache must be cleared if the definition of a
+    model class changes without changing its name and arguments.
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def load(
+        self,
+        fingerprint: str,
+        model: BaseModel,
+        backend: Backend[DataType],
+        *,
+        jit: bool,
+        file_path: str | None = None,
+    ) -> PhysicalModel[DataType] | None:
+        """Loads the cached physical model for given fingerprint and generates
+        its functions from the cached code. Returns None on a cache miss.
+        """
+        entry_dir = os.path.join(self.cache_dir, fingerprint)
+        model_file = os.path.join(entry_dir, MODEL_FILE)
+        if not os.path.isfile(model_file):
+            return None
+
+        try:
+            with open(model_file, "rb") as f:
+                payload = _PhysicalModelUnpickler(f, backend).load()
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError) as e:
+            warnings.warn(f"Ignoring corrupted compile cache entry: {e}", stacklevel=3)
+            return None
+
+        pm: PhysicalModel[DataType] = payload["model"]
+        # Logical edges are re-created in every process.
+        _bind_logical_edges(pm, model, payload["edges"])
+
+        if isinstance(pm.backend, CBackend | GGMLBackend):
+            code_file, shared_lib_path = (
+                C_CODE_FILE,
+                os.path.join(entry_dir, SHARED_LIB_FILE),
+            )
+        else:
+            code_file, shared_lib_path = PY_CODE_FILE, None
+        with open(os.path.join(entry_dir, code_file)) as f:
+            code = f.read()
+        _generate_functions(pm, code, shared_lib_path, jit=jit, file_path=file_path)
+        return pm
+
+    def save(
+        self,
+        fingerprint: str,
+        model: BaseModel,
+        pm: PhysicalModel[DataType],
+        codegen: CodeGen[DataType],
+    ) -> None:
+        """Stores a freshly compiled physical model. Must be called before
+        the generated functions are attached to the physical model.
+        """
+        assert codegen.code is not None, "Code has not been generated yet!"
+        edges = _map_logical_edges(pm, model)
+
+        entry_dir = os.path.join(self.cache_dir, fingerprint)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp_")
+        try:
+            with open(os.path.join(tmp_dir, MODEL_FILE), "wb") as f:
+                _PhysicalModelPickler(f, pm.backend).dump({"model": pm, "edges": edges})
+            if isinstance(codegen, CGen):
+                with open(os.path.join(tmp_dir, C_CODE_FILE), "w") as f:
+                    f.write(codegen.code)
+                shutil.copyfile(
+                    codegen.so_file_path, os.path.join(tmp_dir, SHARED_LIB_FILE)
+                )
+            else:
+                with open(os.path.join(tmp_dir, PY_CODE_FILE), "w") as f:
+                    f.write(codegen.code)
+
+            # Entries are published atomically, a concurrent writer of the
+            # same entry simply loses the race.
+            os.rename(tmp_dir, entry_dir)
+        except (OSError, pickle.PicklingError, AttributeError, TypeError) as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(entry_dir):
+                warnings.warn(f"Compiled model could not be cached: {e}", stacklevel=3)
+
+    def clear(self) -> None:
+        """Removes all entries of the cache."""
+        for name in os.listdir(self.cache_dir):
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+
+@dataclass
+class _CompiledEntry:
+    pm: PhysicalModel[Any]
+    edges: dict[EdgePath, IOHyperEdge]
+    code: str
+    shared_lib_path: str | None
+
+
+class CompileMemo:
+    """Bounded in-process LRU cache of compiled physical models.
+
+    Two kinds of entries are kept, each bounded by `maxsize`. Compiled entries
+    are keyed by the full fingerprint of a request and hold a copy of the
+    compiled physical model with its generated code, so repeating the same
+    request only copies the model and reloads the code. Templates are keyed by
+    the structural fingerprint (constant values and shapes excluded) and hold
+    the physical model before any shape or value dependent inference, so
+    compiling a structurally equal model only re-runs `_pre_compile` and
+    code generation.
+
+    The bound of the process wide `compile_memo` can be changed by setting
+    its `maxsize`, e.g. `compile_memo.maxsize = 64`.
+    """
+
+    def __init__(self, maxsize: int = 16) -> None:
+        self._compiled: OrderedDict[str, _CompiledEntry] = OrderedDict()
+        self._templates: OrderedDict[
+            str, tuple[PhysicalModel[Any], dict[EdgePath, IOHyperEdge]]
+        ] = OrderedDict()
+        self.maxsize = maxsize
+
+    def __len__(self) -> int:
+        return len(self._compiled)
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value: int) -> None:
+        if value < 0:
+            raise ValueError("maxsize of the compile memo can not be negative!")
+        self._maxsize = value
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self._compiled) > self._maxsize:
+            _, evicted = self._compiled.popitem(last=False)
+            if evicted.shared_lib_path is not None:
+                os.remove(evicted.shared_lib_path)
+        while len(self._templates) > self._maxsize:
+            self._templates.popitem(last=False)
+
+    def load(
+        self,
+        key: str,
+        model: BaseModel,
+        backend: Backend[DataType],
+        *,
+        jit: bool,
+        file_path: str | None = None,
+    ) -> PhysicalModel[DataType] | None:
+        """Returns a copy of the compiled physical model stored with given key
+        with its functions generated. Returns None on a miss.
+        """
+        if (entry := self._compiled.get(key)) is None:
+            return None
+        self._compiled.move_to_end(key)
+
+        memo: dict[int, Any] = {id(entry.pm.backend): backend}
+        pm = entry.pm.copy(memo)
+        _bind_logical_edges(
+            pm, model, {path: memo[id(edge)] for path, edge in entry.edges.items()}
+        )
+        _generate_functions(
+            pm, entry.code, entry.shared_lib_path, jit=jit, file_path=file_path
+        )
+        return pm
+
+    def store(
+        self,
+        key: str,
+        model: BaseModel,
+        pm: PhysicalModel[DataType],
+        codegen: CodeGen[DataType],
+    ) -> None:
+        """Stores a copy of a freshly compiled physical model. Must be called
+        before the generated functions are attached to the physical model.
+        """
+        assert codegen.code is not None, "Code has not been generated yet!"
+        memo: dict[int, Any] = {}
+        stored_pm = pm.copy(memo)
+        edges = {
+            path: memo[id(edge)] for path, edge in _map_logical_edges(pm, model).items()
+        }
+        shared_lib_path = None
+        if isinstance(codegen, CGen):
+            # Keep a private copy since the library of the compiled model can
+            # be overwritten by a later compilation with the same file path.
+            shared_lib_path = _temp_file_path(".so")
+            shutil.copyfile(codegen.so_file_path, shared_lib_path)
+
+        self._compiled[key] = _CompiledEntry(
+            stored_pm, edges, codegen.code, shared_lib_path
+        )
+        self._compiled.move_to_end(key)
+        self._evict()
+
+    def specialize(
+        self,
+        key: str,
+        model: BaseModel,
+        backend: Backend[DataType],
+        *,
+        constant_keys: PhysicalConstantType[DataType],
+        data_keys: StringOrConnectionSetType,
+        shapes: PhysicalShapeType,
+        safe_names: bool,
+    ) -> PhysicalModel[DataType] | None:
+        """Creates a physical model from the template stored with given
+        structural key. Returns None on a miss.
+        """
+        if (item := self._templates.get(key)) is None:
+            return None
+        self._templates.move_to_end(key)
+
+        template, edges = item
+        memo: dict[int, Any] = {id(template.backend): backend}
+        pm = template._specialize(
+            model,
+            constant_keys=constant_keys,
+            data_keys=data_keys,
+            shapes=shapes,
+            safe_names=safe_names,
+            memo=memo,
+        )
+        _bind_logical_edges(
+            pm, model, {path: memo[id(edge)] for path, edge in edges.items()}
+        )
+        return pm
+
+    def store_template(
+        self, key: str, model: BaseModel, pm: PhysicalModel[DataType]
+    ) -> None:
+        """Stores the template of a physical model compiled with
+        `keep_template=True`.
+        """
+        assert pm._template is not None, "Physical model has no template!"
+        self._templates[key] = (pm._template, _map_logical_edges(pm._template, model))
+        self._templates.move_to_end(key)
+        self._evict()
+
+    def clear(self) -> None:
+        """Removes all entries of the cache."""
+        for entry in self._compiled.values():
+            if entry.shared_lib_path is not None:
+                os.remove(entry.shared_lib_path)
+        self._compiled.clear()
+        self._templates.clear()
+
+
+# Process wide memo used by ml.compile.
+compile_memo = CompileMemo()
+
+
+def _encode(value: Any, backend: Backend[Any]) -> Any:
+    """JSON encoder for values which are not natively serializable."""
+    if isinstance(value, PyArray):
+        assert isinstance(backend, CBackend | GGMLBackend)
+        value = backend.to_numpy(value)
+    if hasattr(value, "__array__"):
+        array = np.ascontiguousarray(value)
+        return {
+            "array": hashlib.sha256(array.tobytes()).hexdigest(),
+            "shape": list(array.shape),
+            "dtype": str(array.dtype),
+        }
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    if isinstance(value, Enum):
+        return f"{type(value).__qualname__}.{value.name}"
+    if isinstance(value, set | frozenset):
+        return sorted(repr(item) for item in value)
+    return repr(value)
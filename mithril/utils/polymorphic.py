@@ -0,0 +1,327 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Callable, Mapping, Sequence
+from typing import Any, Generic, Literal
+
+from ..backends.backend import Backend
+from ..framework.common import DataEvalType, ParamsEvalType, UniadicRecord
+from ..framework.logical.model import Model
+from ..framework.physical.model import PhysicalModel
+from ..types import DataType
+
+__all__ = ["PolymorphicModel", "bucket_size"]
+
+BucketingType = Literal["exact", "pow2"] | Callable[[int], int]
+
+# (key, axis) pairs of dynamic input dimensions.
+DynamicDim = tuple[str, int]
+
+
+def bucket_size(size: int, bucketing: BucketingType) -> int:
+    """Maps a concrete dimension size to the size of its bucket.
+
+    Parameters
+    ----------
+    size : int
+        Concrete size of the dimension.
+    bucketing : "exact" | "pow2" | Callable[[int], int]
+        "exact" creates a bucket for every size, "pow2" rounds sizes up to the
+        next power of two. A callable must return a size not less than the
+        given size.
+
+    Returns
+    -------
+    int
+        Size of the bucket.
+    """
+    if bucketing == "exact":
+        return size
+    elif bucketing == "pow2":
+        return 1 << max(size - 1, 0).bit_length()
+    elif callable(bucketing):
+        if (bucket := bucketing(size)) < size:
+            raise ValueError(
+                f"Bucket size {bucket} can not be less than dimension size {size}!"
+            )
+        return bucket
+    raise ValueError(f"Unknown bucketing: {bucketing}")
+
+
+class PolymorphicModel(Generic[DataType]):
+    """Physical model whose selected input dimensions are left symbolic.
+
+    The logical model is compiled once with the dynamic dimensions unknown.
+    Shape inference of this generic model tells which dimensions of the
+    outputs are the same dimensions (i.e. share the same Uniadic) with the
+    dynamic input dimensions. On evaluation, concrete sizes of the dynamic
+    dimensions are mapped to buckets and a specialized physical model is
+    compiled lazily (and jitted if requested) for each bucket. Since
+    specializations are compiled with `memoize=True`, they reuse the
+    flattened template of the generic model and only run shape dependent
+    inference and code generation. At most `max_specializations` models are
+    kept, least recently used ones are dropped.
+
+    If bucketing is not "exact", inputs are zero padded along their dynamic
+    dimensions up to bucket sizes and the corresponding dimensions of outputs
+    and gradients are sliced back. This is only correct for models in which
+    padded positions do not affect the others, e.g. batch dimensions or
+    sequence dimensions with causal masking, but not reductions along dynamic
+    dimensions. Hence the first padded evaluation is also run on an exact
+    specialization and a ValueError is raised if their results differ.
+    """
+
+    def __init__(
+        self,
+        compile_fn: Callable[..., PhysicalModel[DataType]],
+        model: Model,
+        backend: Backend[DataType],
+        dynamic_axes: Mapping[str, Sequence[int]],
+        *,
+        bucketing: BucketingType = "exact",
+        max_specializations: int = 8,
+        shapes: Mapping[str, Sequence[int | None]] | None = None,
+        **compile_kwargs: Any,
+    ) -> None:
+        if max_specializations < 1:
+            raise ValueError("max_specializations must be a positive integer!")
+
+        self.backend = backend
+        self.bucketing = bucketing
+        self.max_specializations = max_specializations
+        self._model = model
+        self._compile_fn = compile_fn
+        # Specializations reuse the flattened template of the generic model,
+        # compiled specializations are only kept by this model.
+        compile_kwargs.pop("memoize", None)
+        self._compile_kwargs = compile_kwargs
+        self._shapes = dict(shapes) if shapes is not None else {}
+        self._specializations: OrderedDict[tuple[int, ...], PhysicalModel[DataType]] = (
+            OrderedDict()
+        )
+        # Set once a padded specialization is checked against an exact one.
+        self._validated = bucketing == "exact"
+
+        # Mark dynamic dimensions as unknown.
+        generic_shapes: dict[str, list[int | None]] = {}
+        self.dynamic_dims: list[DynamicDim] = []
+        for key, axes in dynamic_axes.items():
+            if (shape := self._shapes.get(key)) is None:
+                raise KeyError(f"Shape of dynamic input '{key}' must be provided!")
+            generic_shapes[key] = list(shape)
+            for axis in axes:
+                axis = axis % len(shape)
+                generic_shapes[key][axis] = None
+                self.dynamic_dims.append((key, axis))
+
+        self.pm = compile_fn(
+            model,
+            backend,
+            shapes=self._shapes | generic_shapes,
+            memoize="template",
+            **compile_kwargs,
+        )
+
+        # Find dimensions of all tensors which are equal to dynamic dimensions.
+        records: dict[UniadicRecord, int] = {}
+        for idx, (key, axis) in enumerate(self.dynamic_dims):
+            record = self._get_records(key)[axis]
+            if record is None:
+                raise ValueError(f"Axis {axis} of '{key}' is not a single dimension!")
+            if records.setdefault(record, idx) != idx:
+                raise ValueError(
+                    f"Axis {axis} of '{key}' is the same dimension with another "
+                    "dynamic dimension!"
+                )
+        self._dependent_dims: dict[str, list[tuple[int, int]]] = {}
+        for key in self.pm.data:
+            if not self.pm.data[key].is_tensor:
+                continue
+            for axis, record in self._get_records(key).items():
+                if record in records:
+                    self._dependent_dims.setdefault(key, []).append(
+                        (axis, records[record])
+                    )
+
+    @property
+    def specializations(self) -> list[tuple[int, ...]]:
+        """Bucket sizes of currently compiled specializations."""
+        return list(self._specializations)
+
+    def get_specialization(
+        self, data: Mapping[str, DataType]
+    ) -> tuple[PhysicalModel[DataType], tuple[int, ...]]:
+        """Returns the specialized physical model for given data with the
+        bucket sizes of dynamic dimensions.
+        """
+        buckets = tuple(
+            bucket_size(data[key].shape[axis], self.bucketing)  # type: ignore
+            for key, axis in self.dynamic_dims
+        )
+        if (pm := self._specializations.get(buckets)) is not None:
+            self._specializations.move_to_end(buckets)
+            return pm, buckets
+
+        pm = self._compile(buckets)
+        self._specializations[buckets] = pm
+        if len(self._specializations) > self.max_specializations:
+            self._specializations.popitem(last=False)
+        return pm, buckets
+
+    def _compile(self, sizes: tuple[int, ...]) -> PhysicalModel[DataType]:
+        shapes = self._shapes.copy()
+        for (key, axis), size in zip(self.dynamic_dims, sizes, strict=True):
+            shape = list(shapes[key])
+            shape[axis] = size
+            shapes[key] = shape
+
+        return self._compile_fn(
+            self._model,
+            self.backend,
+            shapes=shapes,
+            memoize="template",
+            **self._compile_kwargs,
+        )
+
+    def evaluate(
+        self,
+        params: ParamsEvalType[DataType] | None = None,
+        data: DataEvalType[DataType] | None = None,
+        *,
+        output_gradients: ParamsEvalType[DataType] | bool = False,
+    ) -> (
+        DataEvalType[DataType] | tuple[DataEvalType[DataType], ParamsEvalType[DataType]]
+    ):
+        if data is None:
+            data = {}
+        missing = {key for key, _ in self.dynamic_dims} - data.keys()
+        if missing:
+            raise KeyError(
+                f"Dynamic inputs must be provided in data: {', '.join(missing)}"
+            )
+
+        pm, buckets = self.get_specialization(data)  # type: ignore
+        sizes = tuple(
+            data[key].shape[axis]  # type: ignore
+            for key, axis in self.dynamic_dims
+        )
+        padded_data = self._pad(data, buckets)  # type: ignore
+        padded_output_gradients = output_gradients
+        if isinstance(output_gradients, dict):
+            padded_output_gradients = self._pad(output_gradients, buckets)
+
+        results: tuple[dict[str, DataType], ...]
+        if output_gradients is False:
+            outputs = pm.evaluate(params, padded_data)
+            results = (self._slice(outputs, sizes, buckets),)  # type: ignore
+        else:
+            outputs, gradients = pm.evaluate(
+                params, padded_data, output_gradients=padded_output_gradients
+            )
+            results = (
+                self._slice(outputs, sizes, buckets),  # type: ignore
+                self._slice(gradients, sizes, buckets),  # type: ignore
+            )
+
+        if not self._validated and sizes != buckets:
+            self._validate(results, sizes, params, data, output_gradients)  # type: ignore
+            self._validated = True
+        return results[0] if output_gradients is False else results  # type: ignore
+
+    def _validate(
+        self,
+        results: tuple[dict[str, DataType], ...],
+        sizes: tuple[int, ...],
+        params: ParamsEvalType[DataType] | None,
+        data: DataEvalType[DataType],
+        output_gradients: ParamsEvalType[DataType] | bool,
+    ) -> None:
+        """Checks results of a padded specialization against the results of
+        the exact specialization for the same inputs.
+        """
+        pm = self._compile(sizes)
+        if output_gradients is False:
+            expected = (pm.evaluate(params, data),)
+        else:
+            expected = pm.evaluate(params, data, output_gradients=output_gradients)
+
+        for result, reference in zip(results, expected, strict=True):
+            for key, value in reference.items():  # type: ignore
+                if not hasattr(value, "shape"):
+                    continue
+                actual = result[key]
+                tolerance = 1e-5 + 1e-4 * self.backend.abs(value)
+                if actual.shape != value.shape or not self.backend.all(  # type: ignore
+                    self.backend.abs(actual - value) <= tolerance  # type: ignore
+                ):
+                    raise ValueError(
+                        f"Padding along dynamic axes changes the value of '{key}'! "
+                        "Bucketing policies other than 'exact' require operations "
+                        "to be position-wise along dynamic axes (e.g. no "
+                        "reductions over them), use bucketing='exact' instead."
+                    )
+
+    def _get_records(self, key: str) -> dict[int, UniadicRecord | None]:
+        shape = self.pm.data[key].shape
+        assert shape is not None
+        repr = shape.get_most_informative_repr()
+        records: dict[int, UniadicRecord | None] = {}
+        for idx, uni in enumerate(repr.prefix):
+            records[idx] = uni.metadata
+        for idx, uni in enumerate(repr.suffix):
+            records[idx - len(repr.suffix)] = uni.metadata
+        if repr.root is None:
+            # Use positive axes if the shape is fully determined.
+            return {idx % len(repr.prefix): record for idx, record in records.items()}
+        return records
+
+    def _pad(
+        self, arrays: Mapping[str, DataType], buckets: tuple[int, ...]
+    ) -> dict[str, DataType]:
+        padded: dict[str, DataType] = {}
+        for key, array in arrays.items():
+            if (
+                self.bucketing == "exact"
+                or (dims := self._dependent_dims.get(key)) is None
+                or not hasattr(array, "shape")
+            ):
+                padded[key] = array
+                continue
+            pad_width = [(0, 0)] * len(array.shape)
+            for axis, idx in dims:
+                pad_width[axis] = (0, buckets[idx] - array.shape[axis])
+            if any(after for _, after in pad_width):
+                array = self.backend.pad(array, tuple(pad_width))
+            padded[key] = array
+        return padded
+
+    def _slice(
+        self,
+        arrays: Mapping[str, DataType],
+        sizes: tuple[int, ...],
+        buckets: tuple[int, ...],
+    ) -> dict[str, DataType]:
+        sliced: dict[str, DataType] = {}
+        for key, array in arrays.items():
+            if sizes == buckets or (dims := self._dependent_dims.get(key)) is None:
+                sliced[key] = array
+                continue
+            index: list[slice] = [slice(None)] * len(array.shape)  # type: ignore
+            for axis, idx in dims:
+                index[axis] = slice(0, sizes[idx])
+            sliced[key] = array[tuple(index)]  # type: ignore
+        return sliced
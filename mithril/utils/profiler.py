@@ -0,0 +1,238 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import functools
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from types import TracebackType
+from typing import Any, Literal
+
+from ..framework.codegen import code_gen_map
+from ..framework.common import Constraint, ConstraintSolver, Table
+from ..framework.physical.flat_graph import FlatGraph
+from ..framework.physical.model import FlatModel, PhysicalModel
+
+__all__ = ["CompileProfiler", "ProfileRecord"]
+
+ProfileCategory = Literal["phase", "constraint"]
+
+# Methods of the compile pipeline which are measured as phases.
+PHASES: list[tuple[type, list[str]]] = [
+    (FlatModel, ["__init__", "__next__"]),
+    (PhysicalModel, ["__init__", "_pre_compile", "traverse_graph"]),
+    (ConstraintSolver, ["solver_loop", "update_shapes"]),
+    (
+        FlatGraph,
+        [
+            "add_value",
+            "set_shapes",
+            "set_static_keys",
+            "graph_update",
+            "prune_duplicate_operation",
+            "infer_static_keys",
+            "infer_ignore",
+        ],
+    ),
+]
+CODEGEN_PHASES = ["generate_code", "generate_evaluate", "compile_code"]
+
+
+@dataclass
+class ProfileRecord:
+    name: str
+    category: ProfileCategory
+    calls: int = 0
+    # Total time includes time spent in the other measured functions, self time
+    # does not.
+    total_time: float = 0.0
+    self_time: float = 0.0
+    _depth: int = field(default=0, repr=False, compare=False)
+
+
+class CompileProfiler:
+    """Records wall time and call counts of compile phases and of constraint
+    functions while active.
+
+    Measured phases are the methods of FlatModel, PhysicalModel,
+    ConstraintSolver, FlatGraph and of the code generators which make up the
+    compile pipeline. Constraints are recorded by the names of their
+    functions (e.g. `bcast`). Note that jitted functions are compiled by the
+    backend on their first call, so backend jit time is only covered for
+    backends compiling eagerly.
+
+    Examples
+    --------
+    >>> with CompileProfiler() as profiler:
+    ...     pm = ml.compile(model, backend)
+    >>> profiler.top(5)
+    >>> profiler.display()
+    """
+
+    _active: CompileProfiler | None = None
+
+    def __init__(self) -> None:
+        self.records: dict[str, ProfileRecord] = {}
+        self.total_time = 0.0
+        self._stack: list[float] = []
+        self._patches: list[tuple[type, str, Callable[..., Any]]] = []
+        self._start = 0.0
+
+    def __enter__(self) -> CompileProfiler:
+        if CompileProfiler._active is not None:
+            raise RuntimeError("Compile profilers can not be nested!")
+        CompileProfiler._active = self
+
+        targets = [(cls, method) for cls, methods in PHASES for method in methods]
+        for codegen_cls in set(code_gen_map.values()):
+            for cls in codegen_cls.__mro__:
+                targets += [
+                    (cls, method) for method in CODEGEN_PHASES if method in vars(cls)
+                ]
+        for cls, method in dict.fromkeys(targets):
+            self._patch(cls, method, self._wrap_phase)
+        self._patch(Constraint, "__call__", self._wrap_constraint)
+
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.total_time += time.perf_counter() - self._start
+        for cls, method, fn in reversed(self._patches):
+            setattr(cls, method, fn)
+        self._patches.clear()
+        CompileProfiler._active = None
+
+    def top(
+        self, n: int | None = 10, category: ProfileCategory | None = None
+    ) -> list[ProfileRecord]:
+        """Returns the records which take the most self time.
+
+        Parameters
+        ----------
+        n : int | None, optional
+            Number of records, all records are returned if None, by default 10
+        category : "phase" | "constraint" | None, optional
+            Only records of given category are returned if given, by default None
+
+        Returns
+        -------
+        list[ProfileRecord]
+            Records sorted by their self time in descending order.
+        """
+        records = sorted(
+            (
+                record
+                for record in self.records.values()
+                if category is None or record.category == category
+            ),
+            key=lambda record: record.self_time,
+            reverse=True,
+        )
+        return records[:n]
+
+    def to_table(
+        self, n: int | None = 20, category: ProfileCategory | None = None
+    ) -> Table:
+        """Creates a compiled table of the top `n` records."""
+        table = Table(name=f"Compile Profile ({self.total_time:.3f} s)")
+        table.add_header(
+            ["Name", "Category", "Calls", "Total Time (s)", "Self Time (s)", "Self %"]
+        )
+        for record in self.top(n, category):
+            ratio = record.self_time / self.total_time if self.total_time else 0.0
+            table.add_row(
+                [
+                    [record.name],
+                    [record.category],
+                    [str(record.calls)],
+                    [f"{record.total_time:.4f}"],
+                    [f"{record.self_time:.4f}"],
+                    [f"{100 * ratio:.1f}"],
+                ]
+            )
+        table.compile()
+        return table
+
+    def display(
+        self, n: int | None = 20, category: ProfileCategory | None = None
+    ) -> None:
+        """Prints the top `n` records."""
+        self.to_table(n, category).display()
+
+    def _patch(
+        self,
+        cls: type,
+        method: str,
+        wrapper: Callable[[Callable[..., Any], str], Callable[..., Any]],
+    ) -> None:
+        fn = vars(cls)[method]
+        self._patches.append((cls, method, fn))
+        setattr(cls, method, wrapper(fn, f"{cls.__name__}.{method}"))
+
+    def _record(
+        self,
+        name: str,
+        category: ProfileCategory,
+        fn: Callable[..., Any],
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+    ) -> Any:
+        if (record := self.records.get(name)) is None:
+            record = self.records[name] = ProfileRecord(name, category)
+        record._depth += 1
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            child_time = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            record._depth -= 1
+            record.calls += 1
+            record.self_time += elapsed - child_time
+            # Do not count recursive calls twice.
+            if record._depth == 0:
+                record.total_time += elapsed
+
+    def _wrap_phase(self, fn: Callable[..., Any], name: str) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return self._record(name, "phase", fn, args, kwargs)
+
+        return wrapper
+
+    def _wrap_constraint(self, fn: Callable[..., Any], _: str) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(constraint: Constraint, keys: Any) -> Any:
+            name = _constraint_name(constraint)
+            return self._record(name, "constraint", fn, (constraint, keys), {})
+
+        return wrapper
+
+
+def _constraint_name(constraint: Constraint) -> str:
+    fn = constraint.fn
+    while isinstance(fn, functools.partial):
+        fn = fn.func
+    return getattr(fn, "__name__", type(fn).__name__)
@@ -12,17 +12,54 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import ctypes
+import gc
 import os
+import subprocess
 from collections.abc import Callable
 from copy import deepcopy
 from itertools import product
 
 import numpy as np
-
-from mithril import Backend, CBackend, GGMLBackend, NumpyBackend, compile
+import pytest
+
+from mithril import (
+    Backend,
+    CBackend,
+    GGMLBackend,
+    NumpyBackend,
+    compile,
+    export_c,
+)
 from mithril.cores.c.array import PyArray
+from mithril.cores.c.ggml.quantization import dequantize, quantize
 from mithril.framework.common import Tensor
-from mithril.models import Add, BroadcastTo, IOKey, Mean, Model, Multiply
+from mithril.models import (
+    Add,
+    AvgPool2D,
+    BroadcastTo,
+    Concat,
+    Convolution2D,
+    CrossEntropy,
+    Divide,
+    Exponential,
+    IOKey,
+    LayerNorm,
+    Linear,
+    Log,
+    MatrixMultiply,
+    MaxPool2D,
+    Mean,
+    Model,
+    Multiply,
+    Relu,
+    Reshape,
+    Sigmoid,
+    Softmax,
+    Sqrt,
+    Subtract,
+    Tanh,
+)
 
 from ..utils import with_temp_file
 
@@ -363,3 +400,556 @@ def test_implicit_broadcast_ops():
 
         assert out.shape == (5, 5)
         np.testing.assert_allclose(backend.to_numpy(out), op[1](left, right))
+
+
+def _build_mlp() -> Model:
+    model = Model()
+    model |= Linear(8).connect(input="input", weight="w1", bias="b1", output="h1")
+    model |= Relu().connect(input="h1", output="a1")
+    model |= Linear(8).connect(input="a1", weight="w2", bias="b2", output="h2")
+    model |= Relu().connect(input="h2", output="a2")
+    model |= Linear(4).connect(input="a2", weight="w3", bias="b3", output="h3")
+    model |= Relu().connect(input="h3", output=IOKey("output"))
+    return model
+
+
+@with_temp_file(suffix=".c")
+def test_cbackend_static_arena(file_path: str):
+    c_backend = CBackend()
+    np_backend = NumpyBackend()
+    shapes = {"input": [5, 3]}
+    c_pm = compile(
+        _build_mlp(), c_backend, file_path=file_path, shapes=shapes, jit=False
+    )
+    np_pm = compile(_build_mlp(), np_backend, shapes=shapes, jit=False)
+
+    with open(file_path) as file:
+        code = file.read()
+    # Intermediate values and their gradients are placed in arenas with
+    # precomputed strides, outputs are allocated by the caller.
+    assert "static float arena[" in code
+    assert "static float grad_arena[" in code
+    assert "static int arena_h1_strides[] = {8, 1};" in code
+    assert "memset(grad_arena, 0, sizeof(grad_arena));" in code
+    assert "arena_output " not in code
+
+    params = np_pm.randomize_params()
+    data = {"input": np_backend.rand(5, 3)}
+    output_grad = np_backend.rand(5, 4)
+    np_outputs, np_grads = np_pm.evaluate(
+        params, data, output_gradients={"output": output_grad}
+    )
+
+    c_params = {key: c_backend.array(value) for key, value in params.items()}
+    c_data = {"input": c_backend.array(data["input"])}
+    # Arenas are reused by consecutive calls.
+    for _ in range(2):
+        c_outputs, c_grads = c_pm.evaluate(
+            c_params,
+            c_data,
+            output_gradients={"output": c_backend.array(output_grad)},
+        )
+        np.testing.assert_allclose(
+            c_backend.to_numpy(c_outputs["output"]), np_outputs["output"], rtol=1e-5
+        )
+        for key, grad in np_grads.items():
+            np.testing.assert_allclose(
+                c_backend.to_numpy(c_grads[key]), grad, rtol=1e-4, atol=1e-6
+            )
+    os.remove(file_path.replace(".c", ".so"))
+
+
+def test_cbackend_static_arena_memory_planning():
+    c_backend = CBackend()
+    np_backend = NumpyBackend()
+    shapes = {"input": [5, 3]}
+    c_pm = compile(
+        _build_mlp(),
+        c_backend,
+        shapes=shapes,
+        jit=False,
+        inference=True,
+        plan_memory=True,
+    )
+    np_pm = compile(_build_mlp(), np_backend, shapes=shapes, jit=False)
+
+    # Intermediate values share the regions of the arena.
+    assert c_pm.memory_plan is not None
+    assert c_pm.memory_plan.arena_size < c_pm.memory_plan.naive_size
+    assignments = c_pm.memory_plan.assignments
+    assert len(set(assignments.values())) < len(assignments)
+
+    params = np_pm.randomize_params()
+    data = {"input": np_backend.rand(5, 3)}
+    c_params = {key: c_backend.array(value) for key, value in params.items()}
+    c_data = {"input": c_backend.array(data["input"])}
+    for _ in range(2):
+        np.testing.assert_allclose(
+            c_backend.to_numpy(c_pm.evaluate(c_params, c_data)["output"]),
+            np_pm.evaluate(params, data)["output"],
+            rtol=1e-5,
+        )
+
+
+def test_cbackend_tiled_kernels():
+    # Shapes are not multiples of the tiles of the kernels and bias is
+    # broadcasted along the leading dimensions.
+    model = Model()
+    model |= MatrixMultiply().connect(
+        left=IOKey("left", differentiable=True),
+        right=IOKey("right", differentiable=True),
+        output="product",
+    )
+    model |= Add().connect(
+        left="product",
+        right=IOKey("bias", differentiable=True),
+        output=IOKey("output"),
+    )
+
+    c_backend = CBackend()
+    np_backend = NumpyBackend()
+    shapes = {"left": [3, 70, 300], "right": [300, 37], "bias": [37]}
+    c_pm = compile(model, c_backend, shapes=shapes, jit=False)
+    np_pm = compile(model, np_backend, shapes=shapes, jit=False)
+
+    params = np_pm.randomize_params()
+    output_grad = np_backend.rand(3, 70, 37)
+    np_outputs, np_grads = np_pm.evaluate(
+        params, output_gradients={"output": output_grad}
+    )
+    c_outputs, c_grads = c_pm.evaluate(
+        {key: c_backend.array(value) for key, value in params.items()},
+        output_gradients={"output": c_backend.array(output_grad)},
+    )
+
+    np.testing.assert_allclose(
+        c_backend.to_numpy(c_outputs["output"]),
+        np_outputs["output"],
+        rtol=1e-4,
+        atol=1e-3,
+    )
+    for key, grad in np_grads.items():
+        np.testing.assert_allclose(
+            c_backend.to_numpy(c_grads[key]), grad, rtol=1e-4, atol=1e-3
+        )
+
+
+def _assert_c_parity(
+    model: Model,
+    shapes: dict[str, list[int]],
+    data: dict[str, np.ndarray] | None = None,
+    output_grad: np.ndarray | None = None,
+):
+    c_backend = CBackend()
+    np_backend = NumpyBackend()
+    data = {} if data is None else data
+    c_pm = compile(model, c_backend, shapes=shapes, data_keys=set(data), jit=False)
+    np_pm = compile(model, np_backend, shapes=shapes, data_keys=set(data), jit=False)
+
+    params = {
+        key: np.abs(value) + 0.5 for key, value in np_pm.randomize_params().items()
+    }
+    if output_grad is None:
+        output_grad = np.ones(np_pm.shapes["output"], dtype=np.float32)  # type: ignore
+    np_outputs, np_grads = np_pm.evaluate(
+        params, data, output_gradients={"output": output_grad}
+    )
+    c_outputs, c_grads = c_pm.evaluate(
+        {key: c_backend.array(value) for key, value in params.items()},
+        {key: c_backend.array(value.astype(np.float32)) for key, value in data.items()},
+        output_gradients={"output": c_backend.array(output_grad)},
+    )
+
+    np.testing.assert_allclose(
+        c_backend.to_numpy(c_outputs["output"]),
+        np_outputs["output"],
+        rtol=1e-4,
+        atol=1e-5,
+    )
+    for key, grad in np_grads.items():
+        np.testing.assert_allclose(
+            c_backend.to_numpy(c_grads[key]), grad, rtol=1e-4, atol=1e-5
+        )
+
+
+@pytest.mark.parametrize("primitive", [Sigmoid, Tanh, Exponential, Log, Sqrt, Softmax])
+def test_cbackend_unary_primitives(primitive):
+    model = Model()
+    model |= primitive().connect(
+        input=IOKey("input", differentiable=True), output=IOKey("output")
+    )
+    output_grad = np.linspace(-1, 1, 12, dtype=np.float32).reshape(3, 4)
+    _assert_c_parity(model, {"input": [3, 4]}, output_grad=output_grad)
+
+
+@pytest.mark.parametrize("primitive", [Subtract, Divide])
+def test_cbackend_binary_primitives(primitive):
+    model = Model()
+    model |= primitive().connect(
+        IOKey("left", differentiable=True),
+        IOKey("right", differentiable=True),
+        output="result",
+    )
+    model |= Multiply().connect("result", 2.0, output=IOKey("output"))
+    _assert_c_parity(model, {"left": [2, 3, 4], "right": [3, 1]})
+
+
+def test_cbackend_cnn_layer_norm_cross_entropy():
+    model = Model()
+    model |= Convolution2D(kernel_size=3, out_channels=4, padding=1).connect(
+        input="input", output="conv"
+    )
+    model |= Relu().connect(input="conv", output="relu")
+    model |= MaxPool2D(kernel_size=2).connect(input="relu", output="max_pool")
+    model |= AvgPool2D(kernel_size=2).connect(input="max_pool", output="avg_pool")
+    model |= (flatten := Reshape(shape=(2, 1, 16))).connect(
+        input="avg_pool", output="flat"
+    )
+    model |= (norm := LayerNorm()).connect(input="flat", output="norm")
+    model |= Concat(axis=-1).connect(
+        input=[norm.output, flatten.output], output="features"
+    )
+    model |= Reshape(shape=(2, 32)).connect(input="features", output="hidden")
+    model |= Linear(10).connect(input="hidden", output="logits")
+    model |= CrossEntropy(input_type="logits").connect(
+        input="logits", target="target", output="loss"
+    )
+    model |= Mean().connect(input="loss", output=IOKey("output"))
+
+    data = {
+        "input": np.random.default_rng(0)
+        .standard_normal((2, 3, 8, 8))
+        .astype(np.float32),
+        "target": np.array([3, 7]),
+    }
+    _assert_c_parity(
+        model,
+        {"input": [2, 3, 8, 8]},
+        data=data,
+        output_grad=np.array(1.0, dtype=np.float32),
+    )
+
+
+def test_ggml_multithreaded_repeated_evaluate():
+    # Graph is built once in the first call, following calls only update the
+    # data of the inputs and compute the same graph with the same plan.
+    model = Model()
+    model |= MatrixMultiply().connect(
+        left=IOKey("left", differentiable=True),
+        right=IOKey("right", differentiable=True),
+        output="product",
+    )
+    model |= Relu().connect(input="product", output=IOKey("output"))
+
+    ggml_backend = GGMLBackend(n_threads=2)
+    np_backend = NumpyBackend()
+    shapes = {"left": [8, 16], "right": [16, 4]}
+    ggml_pm = compile(model, ggml_backend, shapes=shapes, jit=False)
+    np_pm = compile(model, np_backend, shapes=shapes, jit=False)
+
+    for _ in range(3):
+        params = np_pm.randomize_params()
+        output_grad = np_backend.rand(8, 4)
+        np_outputs, np_grads = np_pm.evaluate(
+            params, output_gradients={"output": output_grad}
+        )
+        ggml_outputs, ggml_grads = ggml_pm.evaluate(
+            {key: ggml_backend.array(value) for key, value in params.items()},
+            output_gradients={"output": ggml_backend.array(output_grad)},
+        )
+
+        np.testing.assert_allclose(
+            ggml_backend.to_numpy(ggml_outputs["output"]),
+            np_outputs["output"],
+            rtol=1e-5,
+            atol=1e-5,
+        )
+        for key, grad in np_grads.items():
+            np.testing.assert_allclose(
+                ggml_backend.to_numpy(ggml_grads[key]), grad, rtol=1e-5, atol=1e-5
+            )
+
+
+@pytest.mark.parametrize("backend", [CBackend(), GGMLBackend()])
+def test_numpy_arrays_are_not_copied(backend):
+    data = np.arange(6, dtype=np.float32).reshape(2, 3)
+    array = backend.array(data)
+    view = backend.to_numpy(array)
+    assert np.shares_memory(view, data)
+    data[0, 0] = 10.0
+    assert view[0, 0] == 10.0
+
+    # Buffers are kept alive by the arrays wrapping them and by their views.
+    del data, array
+    gc.collect()
+    np.testing.assert_allclose(view, [[10.0, 1.0, 2.0], [3.0, 4.0, 5.0]])
+
+    # Arrays which can not be wrapped are copied.
+    for data in [
+        np.ones((2, 3)),
+        np.ones((3, 2), dtype=np.float32).T,
+        np.broadcast_to(np.ones(3, dtype=np.float32), (2, 3)),
+    ]:
+        view = backend.to_numpy(backend.array(data))
+        assert not np.shares_memory(view, data)
+        np.testing.assert_allclose(view, data)
+
+
+def test_ggml_n_threads():
+    assert GGMLBackend(n_threads=4).n_threads == 4
+    assert GGMLBackend().n_threads == (os.cpu_count() or 1)
+    with pytest.raises(ValueError):
+        GGMLBackend(n_threads=0)
+
+
+@pytest.mark.parametrize("type, block_bytes, bits", [("q8_0", 34, 8), ("q4_0", 18, 4)])
+def test_ggml_quantize_round_trip(type, block_bytes, bits):
+    array = np.random.default_rng(0).standard_normal((8, 64)).astype(np.float32)
+    data = quantize(array, type)
+    assert data.nbytes == array.size // 32 * block_bytes
+
+    # Error of each element is at most half of the step of its block.
+    blocks = array.reshape(-1, 32)
+    step = np.abs(blocks).max(axis=1, keepdims=True) / (2 ** (bits - 1) - 1)
+    error = np.abs(dequantize(data, type, array.shape) - array).reshape(-1, 32)
+    assert np.all(error <= step * 0.51 + 1e-3 * np.abs(blocks))
+
+
+@pytest.mark.parametrize("type", ["q8_0", "q4_0"])
+def test_ggml_quantized_linear(type):
+    model = Model()
+    model |= Linear(16).connect(input="input", weight="w1", output="hidden")
+    model |= Relu().connect(input="hidden", output="relu")
+    model |= Linear(4).connect(input="relu", weight="w2", output=IOKey("output"))
+
+    ggml_backend = GGMLBackend()
+    np_backend = NumpyBackend()
+    shapes = {"input": [3, 64]}
+    ggml_pm = compile(
+        model,
+        ggml_backend,
+        shapes=shapes,
+        jit=False,
+        inference=True,
+        quantized_keys={"w1": type},
+    )
+    np_pm = compile(model, np_backend, shapes=shapes, jit=False, inference=True)
+
+    params = np_pm.randomize_params()
+    data = {"input": np_backend.randn(3, 64)}
+    # Reference uses the weights which are rounded by quantization.
+    params["w1"] = dequantize(quantize(params["w1"], type), type, (16, 64))
+    ggml_params = {
+        key: ggml_backend.quantize(value, type)
+        if key == "w1"
+        else ggml_backend.array(value)
+        for key, value in params.items()
+    }
+
+    np_outputs = np_pm.evaluate(params, data)
+    ggml_outputs = ggml_pm.evaluate(
+        ggml_params, {"input": ggml_backend.array(data["input"])}
+    )
+    # Inputs of the matrix multiplication are also quantized in GGML.
+    np.testing.assert_allclose(
+        ggml_backend.to_numpy(ggml_outputs["output"]),
+        np_outputs["output"],
+        rtol=0.05,
+        atol=0.05,
+    )
+
+
+def test_ggml_quantized_key_errors():
+    model = Model()
+    model |= Linear(16).connect(input="input", weight="weight", output=IOKey("output"))
+    shapes = {"input": [3, 64]}
+
+    with pytest.raises(ValueError):
+        compile(
+            model,
+            GGMLBackend(),
+            shapes=shapes,
+            inference=True,
+            quantized_keys={"weight": "q2_k"},
+        )
+    with pytest.raises(ValueError):
+        compile(model, GGMLBackend(), shapes=shapes, quantized_keys={"weight": "q8_0"})
+    with pytest.raises(NotImplementedError):
+        compile(
+            model,
+            NumpyBackend(),
+            shapes=shapes,
+            inference=True,
+            quantized_keys={"weight": "q8_0"},
+        )
+    with pytest.raises(ValueError):
+        compile(
+            model,
+            GGMLBackend(),
+            shapes={"input": [3, 40]},
+            inference=True,
+            quantized_keys={"weight": "q8_0"},
+        )
+    with pytest.raises(KeyError):
+        compile(
+            model,
+            GGMLBackend(),
+            shapes=shapes,
+            data_keys={"input"},
+            inference=True,
+            quantized_keys={"input": "q8_0"},
+        )
+    with pytest.raises(KeyError):
+        compile(
+            model,
+            GGMLBackend(),
+            shapes=shapes,
+            inference=True,
+            quantized_keys={"unknown": "q8_0"},
+        )
+
+
+def _export_inputs(pm):
+    rng = np.random.default_rng(0)
+    params = {
+        key: rng.standard_normal(pm.shapes[key]).astype(np.float32)  # type: ignore
+        for key in ["b1", "b2", "b3", "w1", "w2", "w3"]
+    }
+    input = rng.random((5, 3), dtype=np.float32)
+    output_grad = rng.random((5, 4), dtype=np.float32)
+    outputs, grads = pm.evaluate(
+        {key: pm.backend.array(value) for key, value in params.items()},
+        {"input": pm.backend.array(input)},
+        output_gradients={"output": pm.backend.array(output_grad)},
+    )
+    return params, input, output_grad, outputs, grads
+
+
+@pytest.mark.parametrize("weights", ["embedded", "sidecar"])
+def test_export_c_shared_library(tmp_path, weights):
+    backend = CBackend()
+    pm = compile(_build_mlp(), backend, shapes={"input": [5, 3]}, jit=False)
+    params, input, output_grad, outputs, grads = _export_inputs(pm)
+
+    result = export_c(pm, str(tmp_path), params, name="mlp", weights=weights)
+    assert result.library_path is not None
+    assert (result.weights_path is not None) == (weights == "sidecar")
+    with open(result.header_path) as f:
+        header = f.read()
+    assert "void mlp_evaluate(" in header
+    assert "#define MLP_INPUT_SIZE 15" in header
+
+    lib = ctypes.CDLL(result.library_path)
+    if result.weights_path is not None:
+        assert lib.mlp_load_weights(result.weights_path.encode()) == 0
+
+    def ptr(arr):
+        return arr.ctypes.data_as(ctypes.c_void_p)
+
+    output = np.zeros((5, 4), dtype=np.float32)
+    lib.mlp_evaluate(ptr(input), ptr(output))
+    np.testing.assert_allclose(
+        output, backend.to_numpy(outputs["output"]), rtol=1e-5, atol=1e-5
+    )
+
+    # Gradients are reset on each call.
+    param_grads = {key: np.zeros_like(value) for key, value in sorted(params.items())}
+    for _ in range(2):
+        lib.mlp_evaluate_gradients(
+            ptr(input),
+            ptr(output_grad),
+            ptr(output),
+            *[ptr(grad) for grad in param_grads.values()],
+        )
+    for key, grad in param_grads.items():
+        np.testing.assert_allclose(
+            grad, backend.to_numpy(grads[key]), rtol=1e-5, atol=1e-5
+        )
+
+
+def test_export_c_static_library(tmp_path):
+    backend = CBackend()
+    pm = compile(_build_mlp(), backend, shapes={"input": [5, 3]}, jit=False)
+    params, input, _, outputs, _ = _export_inputs(pm)
+    result = export_c(pm, str(tmp_path), params, name="mlp", library="static")
+    assert result.library_path is not None
+    assert result.library_path.endswith(".a")
+
+    main_path = os.path.join(tmp_path, "main.c")
+    with open(main_path, "w") as f:
+        values = ", ".join(f"{float(value)!r}f" for value in input.flatten())
+        f.write(
+            "#include <stdio.h>\n"
+            '#include "mlp.h"\n'
+            "int main(void) {\n"
+            f"  const float input[MLP_INPUT_SIZE] = {{{values}}};\n"
+            "  float output[MLP_OUTPUT_SIZE];\n"
+            "  mlp_evaluate(input, output);\n"
+            "  for (int i = 0; i < MLP_OUTPUT_SIZE; i++)\n"
+            '    printf("%.9g\\n", output[i]);\n'
+            "  return 0;\n"
+            "}\n"
+        )
+    exe_path = os.path.join(tmp_path, "main")
+    subprocess.check_call(["cc", main_path, result.library_path, "-lm", "-o", exe_path])
+    stdout = subprocess.run([exe_path], capture_output=True, text=True, check=True)
+    output = np.array(stdout.stdout.split(), dtype=np.float32).reshape(5, 4)
+    np.testing.assert_allclose(
+        output, backend.to_numpy(outputs["output"]), rtol=1e-5, atol=1e-5
+    )
+
+
+def test_export_c_models_link_together(tmp_path):
+    backend = CBackend()
+    pm = compile(_build_mlp(), backend, shapes={"input": [5, 3]}, jit=False)
+    params, input, _, outputs, _ = _export_inputs(pm)
+    libraries = []
+    for name in ("first", "second"):
+        result = export_c(pm, str(tmp_path / name), params, name=name, library="static")
+        assert result.library_path is not None
+        libraries.append(result.library_path)
+        # Entry points are the only global symbols of the exported code.
+        symbols = subprocess.run(
+            ["nm", "-g", "--defined-only", result.library_path],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        assert {
+            fields[-1].lstrip("_")
+            for line in symbols.splitlines()
+            if len(fields := line.split()) == 3
+        } == {f"{name}_evaluate", f"{name}_evaluate_gradients"}
+
+    main_path = os.path.join(tmp_path, "main.c")
+    with open(main_path, "w") as f:
+        f.write(
+            '#include "first/first.h"\n'
+            '#include "second/second.h"\n'
+            "int main(void) {\n"
+            "  float input[FIRST_INPUT_SIZE] = {0};\n"
+            "  float first[FIRST_OUTPUT_SIZE], second[SECOND_OUTPUT_SIZE];\n"
+            "  first_evaluate(input, first);\n"
+            "  second_evaluate(input, second);\n"
+            "  return 0;\n"
+            "}\n"
+        )
+    exe_path = os.path.join(tmp_path, "main")
+    subprocess.check_call(["cc", main_path, *libraries, "-lm", "-o", exe_path])
+    subprocess.check_call([exe_path])
+
+
+def test_export_c_errors(tmp_path):
+    shapes = {"input": [5, 3]}
+    pm = compile(_build_mlp(), NumpyBackend(), shapes=shapes, jit=False)
+    with pytest.raises(NotImplementedError):
+        export_c(pm, str(tmp_path), {})  # type: ignore
+
+    pm = compile(_build_mlp(), CBackend(), shapes=shapes, jit=False)
+    params, *_ = _export_inputs(pm)
+    with pytest.raises(ValueError):
+        export_c(pm, str(tmp_path), params, name="my-model")
+    with pytest.raises(ValueError):
+        export_c(pm, str(tmp_path), params, optimization="fastest")  # type: ignore
+    with pytest.raises(KeyError):
+        export_c(pm, str(tmp_path), {"w1": params["w1"]})
@@ -0,0 +1,323 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from collections.abc import Callable
+
+import jax
+import numpy as np
+import pytest
+import torch
+
+import mithril as ml
+from mithril.cores.python.torch.utils import _Checkpoint
+from mithril.cores.python.torch.utils import checkpoint as torch_checkpoint
+from mithril.framework.codegen.py_style_codegen.numpy_gen import NumpyCodeGen
+from mithril.framework.physical.checkpointing import find_checkpoint_segments
+from mithril.framework.physical.model import PhysicalModel
+from mithril.models import (
+    Add,
+    IOKey,
+    Linear,
+    Model,
+    Multiply,
+    PrimitiveRandn,
+    Reshape,
+    Shape,
+    Sigmoid,
+    Softmax,
+    Tanh,
+)
+
+
+def _build_blocks(n_blocks: int = 4) -> tuple[Model, list[Model]]:
+    model = Model()
+    blocks: list[Model] = []
+    input = "input"
+    for idx in range(n_blocks):
+        block = Model()
+        block |= Linear(8).connect(input="input", output="hidden")
+        block |= Tanh().connect(input="hidden", output="activation")
+        block |= Add().connect(left="activation", right="input", output=IOKey("output"))
+        model |= block.connect(input=input, output=f"block_{idx}")
+        input = f"block_{idx}"
+        blocks.append(block)
+    model |= Softmax().connect(input=input, output=IOKey("output"))
+    return model, blocks
+
+
+def _evaluate(model: Model, backend: ml.Backend, **kwargs):
+    pm = ml.compile(model, backend, shapes={"input": [4, 8]}, jit=False, **kwargs)
+    rng = np.random.default_rng(0)
+    params = {
+        key: backend.array(rng.standard_normal(value.shape))
+        for key, value in sorted(pm.randomize_params().items())
+    }
+    data = {"input": backend.array(rng.standard_normal((4, 8)))}
+    output_gradients = {"output": backend.array(rng.standard_normal((4, 8)))}
+    outputs, grads = pm.evaluate(params, data, output_gradients=output_gradients)
+    return pm, outputs, grads
+
+
+def _assert_grads_equal(grads, ref_grads):
+    assert grads.keys() == ref_grads.keys()
+    for key, grad in grads.items():
+        np.testing.assert_allclose(np.asarray(grad), np.asarray(ref_grads[key]))
+
+
+@pytest.mark.parametrize("checkpoint", ["blocks", "auto"])
+def test_checkpointed_gradients_match(checkpoint):
+    backend = ml.NumpyBackend(dtype=ml.float64)
+    model, _ = _build_blocks()
+    _, ref_outputs, ref_grads = _evaluate(model, backend)
+
+    model, blocks = _build_blocks()
+    pm, outputs, grads = _evaluate(
+        model, backend, checkpoint=blocks if checkpoint == "blocks" else True
+    )
+    np.testing.assert_allclose(outputs["output"], ref_outputs["output"])
+    assert grads.keys() == ref_grads.keys()
+    for key, grad in grads.items():
+        np.testing.assert_allclose(grad, ref_grads[key])
+
+    # Gradients are same when evaluated again with the same caches.
+    _, outputs, grads = _evaluate(
+        model, backend, checkpoint=blocks if checkpoint == "blocks" else True
+    )
+    for key, grad in grads.items():
+        np.testing.assert_allclose(grad, ref_grads[key])
+
+
+def test_checkpointed_caches_are_not_kept():
+    backend = ml.NumpyBackend(dtype=ml.float64)
+    model, blocks = _build_blocks()
+    pm, *_ = _evaluate(model, backend, checkpoint=blocks)
+
+    codegen = NumpyCodeGen(pm)
+    segments = codegen.checkpoint_segments
+    assert len(segments) == 4
+    # Only the outputs of the blocks are kept by the forward pass.
+    for segment in segments:
+        assert len(segment.keys) == 5
+        assert len(segment.outputs) == 1
+    kept = {
+        key.removesuffix("_cache")
+        for key, value in pm.flat_graph.cached_data.items()
+        if isinstance(value, dict) and value
+    }
+    assert kept == {segment.outputs[0] for segment in segments} | {"output"}
+    for segment in segments:
+        assert pm.flat_graph.cached_data[segment.outputs[0] + "_cache"].keys() == {
+            "output"
+        }
+
+
+def test_automatic_checkpoint_segments():
+    model, _ = _build_blocks(8)
+    pm = ml.compile(
+        model,
+        ml.NumpyBackend(),
+        shapes={"input": [4, 8]},
+        jit=False,
+        checkpoint=True,
+    )
+    segments = NumpyCodeGen(pm).checkpoint_segments
+    # 41 operations are split into segments of 7 operations.
+    assert [len(segment.keys) for segment in segments] == [7] * 5 + [6]
+    assert [key for segment in segments for key in segment.keys] == list(
+        pm.flat_graph.topological_order
+    )
+
+
+def test_random_primitives_are_not_recomputed():
+    model = Model()
+    model |= PrimitiveRandn(shape=(4, 8)).connect(key="key", output="noise")
+    model |= Add().connect(left="input", right="noise", output="noisy")
+    model |= Tanh().connect(input="noisy", output=IOKey("output"))
+    pm = ml.compile(
+        model,
+        ml.NumpyBackend(),
+        data_keys={"key"},
+        trainable_keys={"input"},
+        jit=False,
+        checkpoint=[model],
+    )
+    (segment,) = NumpyCodeGen(pm).checkpoint_segments
+    assert segment.keys == ["noisy", "output"]
+
+
+def test_checkpoint_errors():
+    model, blocks = _build_blocks()
+    backend = ml.NumpyBackend()
+    with pytest.raises(ValueError):
+        ml.compile(model, backend, inference=True, checkpoint=True)
+    with pytest.raises(ValueError):
+        ml.compile(model, backend, checkpoint=[model, blocks[0]])
+    with pytest.raises(ValueError):
+        ml.compile(model, backend, checkpoint=[Linear(8)])
+    with pytest.raises(NotImplementedError):
+        ml.compile(model, ml.CBackend(), checkpoint=True)
+
+
+@pytest.mark.parametrize("backend_type", [ml.TorchBackend, ml.JaxBackend])
+@pytest.mark.parametrize("checkpoint", ["blocks", "auto"])
+def test_autograd_checkpointed_gradients_match(backend_type, checkpoint):
+    backend = backend_type(dtype=ml.float64)
+    model, _ = _build_blocks()
+    _, ref_outputs, ref_grads = _evaluate(model, backend)
+
+    model, blocks = _build_blocks()
+    pm, outputs, grads = _evaluate(
+        model, backend, checkpoint=blocks if checkpoint == "blocks" else True
+    )
+    np.testing.assert_allclose(
+        np.asarray(outputs["output"]), np.asarray(ref_outputs["output"])
+    )
+    _assert_grads_equal(grads, ref_grads)
+
+    codegen = ml.framework.codegen.code_gen_map[backend_type](pm)
+    codegen.generate_code()
+    assert codegen.code.count("def _checkpoint_") == len(codegen.checkpoint_segments)
+    if checkpoint == "blocks":
+        assert len(codegen.checkpoint_segments) == 4
+
+
+def _saved_tensors(
+    fn: Callable[[torch.Tensor], tuple[torch.Tensor, ...]],
+) -> tuple[list[torch.Tensor], torch.Tensor]:
+    saved: list[torch.Tensor] = []
+
+    def pack(tensor: torch.Tensor) -> torch.Tensor:
+        saved.append(tensor)
+        return tensor
+
+    input = torch.linspace(-1.0, 1.0, 12, dtype=torch.float64).reshape(3, 4)
+    input.requires_grad_()
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        (output,) = fn(input)
+    output.sum().backward()
+    assert input.grad is not None
+    return saved, input.grad
+
+
+def test_torch_checkpoint_keeps_only_inputs():
+    def fn(input: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        return (torch.tanh(torch.tanh(input) * input),)
+
+    saved, grad = _saved_tensors(fn)
+    checkpointed_saved, checkpointed_grad = _saved_tensors(torch_checkpoint(fn))
+    # Autograd keeps only the input of the checkpointed function.
+    assert len(saved) > 1
+    assert len(checkpointed_saved) == 1
+    np.testing.assert_allclose(checkpointed_grad, grad)
+
+
+def test_torch_checkpoint_boundary_is_used(monkeypatch):
+    n_calls = 0
+    backward = _Checkpoint.backward
+
+    def counted_backward(ctx, *grads):
+        nonlocal n_calls
+        n_calls += 1
+        return backward(ctx, *grads)
+
+    monkeypatch.setattr(_Checkpoint, "backward", staticmethod(counted_backward))
+    backend = ml.TorchBackend(dtype=ml.float64)
+    model, _ = _build_blocks()
+    _evaluate(model, backend)
+    assert n_calls == 0
+
+    model, blocks = _build_blocks()
+    _evaluate(model, backend, checkpoint=blocks)
+    # Each block is evaluated again in the backward pass.
+    assert n_calls == 4
+
+
+def _count_remats(pm: PhysicalModel, backend: ml.Backend) -> int:
+    data = {"input": backend.ones(4, 8)}
+    output_gradients = {"output": backend.ones(4, 8)}
+    jaxpr = jax.make_jaxpr(
+        lambda params: pm.evaluate(params, data, output_gradients=output_gradients)[1]
+    )(pm.randomize_params())
+    return len(re.findall(r"\b(?:remat\d*|checkpoint)\[", str(jaxpr)))
+
+
+def test_jax_checkpoint_boundary_is_used():
+    backend = ml.JaxBackend(dtype=ml.float64)
+    model, _ = _build_blocks()
+    pm = ml.compile(model, backend, shapes={"input": [4, 8]}, jit=False)
+    assert _count_remats(pm, backend) == 0
+
+    model, blocks = _build_blocks()
+    pm = ml.compile(
+        model, backend, shapes={"input": [4, 8]}, jit=False, checkpoint=blocks
+    )
+    assert _count_remats(pm, backend) == 4
+
+
+@pytest.mark.parametrize("backend_type", [ml.TorchBackend, ml.JaxBackend])
+def test_autograd_segments_are_split_by_non_float_values(backend_type):
+    def build() -> Model:
+        model = Model()
+        model |= Tanh().connect(input="input", output="hidden")
+        model |= Shape().connect(input="hidden", output="hidden_shape")
+        model |= Sigmoid().connect(input="hidden", output="gate")
+        model |= Reshape().connect(
+            input="gate", shape="hidden_shape", output="reshaped"
+        )
+        model |= Multiply().connect(
+            left="reshaped", right="hidden", output=IOKey("output")
+        )
+        return model
+
+    backend = backend_type(dtype=ml.float64)
+    params = {"input": backend.array(np.random.default_rng(0).standard_normal((3, 4)))}
+    output_gradients = {"output": backend.ones(3, 4)}
+    all_grads = []
+    for checkpoint in [False, True]:
+        model = build()
+        pm = ml.compile(
+            model,
+            backend,
+            trainable_keys={"input"},
+            jit=False,
+            checkpoint=[model] if checkpoint else False,
+        )
+        all_grads.append(pm.evaluate(params, output_gradients=output_gradients)[1])
+    _assert_grads_equal(*all_grads)
+
+    # Shape of the hidden value is computed between the checkpointed functions
+    # and bound to the second one.
+    codegen = ml.framework.codegen.code_gen_map[backend_type](pm)
+    codegen.generate_code()
+    assert codegen.code.count("def _checkpoint_") == 2
+    assert "hidden_shape=hidden_shape" in codegen.code
+
+
+def test_automatic_segments_balance_activation_sizes():
+    model, _ = _build_blocks(8)
+    pm = ml.compile(
+        model,
+        ml.TorchBackend(),
+        shapes={"input": [4, 8]},
+        jit=False,
+        checkpoint=True,
+    )
+    order = list(pm.flat_graph.topological_order)
+    segments = find_checkpoint_segments(
+        pm.flat_graph, [], lambda key: True, lambda key: 100.0 * (key == order[0])
+    )
+    # The first operation costs as much as all segments on average.
+    assert segments[0].keys == order[:1]
+    assert [key for segment in segments for key in segment.keys] == order
@@ -0,0 +1,359 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import warnings
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+import mithril as ml
+from mithril.models import Add, Linear, Model, Relu
+from mithril.utils.compile_cache import (
+    CompileCache,
+    CompileMemo,
+    compile_memo,
+    fingerprint,
+)
+
+
+def _build_mlp() -> Model:
+    model = Model()
+    model |= Linear(8).connect(input="input", output="hidden")
+    model |= Relu().connect(input="hidden", output="output")
+    return model
+
+
+def _count_pm_inits():
+    return patch.object(
+        ml.PhysicalModel,
+        "__init__",
+        autospec=True,
+        side_effect=ml.PhysicalModel.__init__,
+    )
+
+
+def test_cache_hit_skips_physical_model_creation(tmp_path):
+    backend = ml.NumpyBackend()
+    pm_1 = ml.compile(
+        _build_mlp(), backend, shapes={"input": [4, 3]}, cache_dir=str(tmp_path)
+    )
+    assert len(os.listdir(tmp_path)) == 1
+
+    with _count_pm_inits() as init:
+        pm_2 = ml.compile(
+            _build_mlp(), backend, shapes={"input": [4, 3]}, cache_dir=str(tmp_path)
+        )
+    assert init.call_count == 0
+
+    params = pm_1.randomize_params()
+    data = {"input": backend.ones(4, 3)}
+    output_gradients = {"output": backend.ones(4, 8)}
+    out_1, grads_1 = pm_1.evaluate(params, data, output_gradients=output_gradients)
+    out_2, grads_2 = pm_2.evaluate(params, data, output_gradients=output_gradients)
+    np.testing.assert_allclose(out_1["output"], out_2["output"])
+    for key in grads_1:
+        np.testing.assert_allclose(grads_1[key], grads_2[key])
+
+    assert pm_1.shapes == pm_2.shapes
+    assert pm_1.input_keys == pm_2.input_keys
+    assert pm_1.output_keys == pm_2.output_keys
+
+
+def test_cache_miss_on_different_shapes(tmp_path):
+    backend = ml.NumpyBackend()
+    ml.compile(_build_mlp(), backend, shapes={"input": [4, 3]}, cache_dir=str(tmp_path))
+    pm = ml.compile(
+        _build_mlp(), backend, shapes={"input": [5, 3]}, cache_dir=str(tmp_path)
+    )
+    assert len(os.listdir(tmp_path)) == 2
+    assert pm.shapes["output"] == [5, 8]
+
+
+def test_cache_miss_on_different_backend_options(tmp_path):
+    shapes = {"input": [4, 3]}
+    for n_threads in [1, 2]:
+        backend = ml.NumpyBackend(n_threads=n_threads)
+        ml.compile(_build_mlp(), backend, shapes=shapes, cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_cache_miss_on_different_checkpoints(tmp_path):
+    backend = ml.NumpyBackend()
+    shapes = {"input": [4, 3]}
+    for checkpoint in [False, True, "linear", "relu"]:
+        model = _build_mlp()
+        if isinstance(checkpoint, str):
+            linear, relu = model.dag
+            checkpoint = [linear if checkpoint == "linear" else relu]
+        ml.compile(
+            model,
+            backend,
+            shapes=shapes,
+            cache_dir=str(tmp_path),
+            checkpoint=checkpoint,
+        )
+    assert len(os.listdir(tmp_path)) == 4
+
+    model = _build_mlp()
+    with _count_pm_inits() as init:
+        ml.compile(
+            model,
+            backend,
+            shapes=shapes,
+            cache_dir=str(tmp_path),
+            checkpoint=list(model.dag)[:1],
+        )
+    assert init.call_count == 0
+
+
+def test_cache_with_foreign_checkpoint_raises(tmp_path):
+    backend = ml.NumpyBackend()
+    for kwargs in [{"cache_dir": str(tmp_path)}, {"memoize": True}]:
+        with (
+            warnings.catch_warnings(),
+            pytest.raises(ValueError, match="is not a submodel"),
+        ):
+            warnings.simplefilter("error")
+            ml.compile(
+                _build_mlp(),
+                backend,
+                shapes={"input": [4, 3]},
+                checkpoint=[Linear(8)],
+                **kwargs,
+            )
+    compile_memo.clear()
+
+
+def test_fingerprint_of_quantized_keys():
+    model = Model()
+    model |= Linear(8).connect(input="input", weight="weight", output="output")
+    backend = ml.GGMLBackend()
+    request = {
+        "constant_keys": {},
+        "data_keys": set(),
+        "discard_keys": set(),
+        "trainable_keys": set(),
+        "shapes": {"input": [4, 32]},
+    }
+    keys = {
+        fingerprint(model, backend, **request),  # type: ignore
+        fingerprint(model, backend, quantized_keys={"weight": "q8_0"}, **request),  # type: ignore
+        fingerprint(model, backend, quantized_keys={"weight": "q4_0"}, **request),  # type: ignore
+    }
+    assert len(keys) == 3
+
+
+def test_cache_miss_on_different_constant_values(tmp_path):
+    backend = ml.NumpyBackend()
+    model = Model()
+    model |= Add().connect(left="left", right="right", output="output")
+    pm_1 = ml.compile(
+        model,
+        backend,
+        constant_keys={"right": backend.ones(3)},
+        inference=True,
+        cache_dir=str(tmp_path),
+    )
+    pm_2 = ml.compile(
+        model,
+        backend,
+        constant_keys={"right": backend.zeros(3)},
+        inference=True,
+        cache_dir=str(tmp_path),
+    )
+    assert len(os.listdir(tmp_path)) == 2
+    data = {"left": backend.ones(3)}
+    np.testing.assert_allclose(pm_1.evaluate({}, data)["output"], 2 * np.ones(3))
+    np.testing.assert_allclose(pm_2.evaluate({}, data)["output"], np.ones(3))
+
+
+def test_cached_constant_values_are_restored(tmp_path):
+    backend = ml.NumpyBackend()
+    model = Model()
+    model |= Add().connect(left="left", right="right", output="output")
+    kwargs = {
+        "constant_keys": {"right": backend.array([1.0, 2.0, 3.0])},
+        "inference": True,
+        "cache_dir": str(tmp_path),
+    }
+    ml.compile(model, backend, **kwargs)  # type: ignore
+    with _count_pm_inits() as init:
+        pm = ml.compile(model, backend, **kwargs)  # type: ignore
+    assert init.call_count == 0
+    np.testing.assert_allclose(
+        pm.evaluate({}, {"left": backend.ones(3)})["output"], [2.0, 3.0, 4.0]
+    )
+
+
+def test_cached_model_summary_with_submodel(tmp_path):
+    backend = ml.NumpyBackend()
+    ml.compile(_build_mlp(), backend, shapes={"input": [4, 3]}, cache_dir=str(tmp_path))
+    model = _build_mlp()
+    pm = ml.compile(model, backend, shapes={"input": [4, 3]}, cache_dir=str(tmp_path))
+    linear = next(iter(model.dag))
+    assert pm.get_shapes(model=linear)["output"] == [4, 8]
+
+
+def test_cache_c_backend(tmp_path):
+    backend = ml.CBackend()
+    model = Model()
+    model |= Add().connect(left="left", right="right", output="hidden")
+    model |= Relu().connect(input="hidden", output="output")
+    kwargs = {
+        "shapes": {"left": [2, 3], "right": [2, 3]},
+        "trainable_keys": {"left", "right"},
+        "jit": False,
+        "cache_dir": str(tmp_path),
+    }
+    ml.compile(model, backend, **kwargs)  # type: ignore
+    with _count_pm_inits() as init:
+        pm = ml.compile(model, backend, **kwargs)  # type: ignore
+    assert init.call_count == 0
+
+    left = np.array([[-1.0, 2.0, 0.5], [3.0, -4.0, 1.0]], dtype=np.float32)
+    right = np.ones((2, 3), dtype=np.float32)
+    params = {"left": backend.array(left), "right": backend.array(right)}
+    out, grads = pm.evaluate(params, output_gradients={"output": backend.ones(2, 3)})
+    np.testing.assert_allclose(
+        backend.to_numpy(out["output"]), np.maximum(left + right, 0)
+    )
+    np.testing.assert_allclose(
+        backend.to_numpy(grads["left"]), (left + right > 0).astype(np.float32)
+    )
+
+
+def test_clear_cache(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    ml.compile(
+        _build_mlp(),
+        ml.NumpyBackend(),
+        shapes={"input": [4, 3]},
+        cache_dir=str(tmp_path),
+    )
+    assert len(os.listdir(tmp_path)) == 1
+    cache.clear()
+    assert len(os.listdir(tmp_path)) == 0
+
+
+def test_memoize_equal_models():
+    compile_memo.clear()
+    backend = ml.NumpyBackend()
+    pm_1 = ml.compile(_build_mlp(), backend, shapes={"input": [4, 3]}, memoize=True)
+    assert len(compile_memo) == 1
+
+    with _count_pm_inits() as init:
+        pm_2 = ml.compile(_build_mlp(), backend, shapes={"input": [4, 3]}, memoize=True)
+    assert init.call_count == 0
+    assert pm_1 is not pm_2
+    assert pm_1.flat_graph is not pm_2.flat_graph
+
+    params = pm_1.randomize_params()
+    data = {"input": backend.ones(4, 3)}
+    output_gradients = {"output": backend.ones(4, 8)}
+    out_1, grads_1 = pm_1.evaluate(params, data, output_gradients=output_gradients)
+    out_2, grads_2 = pm_2.evaluate(params, data, output_gradients=output_gradients)
+    np.testing.assert_allclose(out_1["output"], out_2["output"])
+    for key in grads_1:
+        np.testing.assert_allclose(grads_1[key], grads_2[key])
+    compile_memo.clear()
+
+
+def test_memoize_structurally_equal_models_with_different_shapes():
+    compile_memo.clear()
+    backend = ml.NumpyBackend()
+    ml.compile(_build_mlp(), backend, shapes={"input": [4, 3]}, memoize=True)
+
+    model = _build_mlp()
+    with _count_pm_inits() as init:
+        pm = ml.compile(model, backend, shapes={"input": [5, 3]}, memoize=True)
+    assert init.call_count == 0
+    assert pm.shapes["output"] == [5, 8]
+    assert pm.get_shapes(model=next(iter(model.dag)))["output"] == [5, 8]
+
+    reference = ml.compile(_build_mlp(), backend, shapes={"input": [5, 3]})
+    params = reference.randomize_params()
+    data = {"input": backend.ones(5, 3)}
+    np.testing.assert_allclose(
+        pm.evaluate(params, data)["output"],
+        reference.evaluate(params, data)["output"],
+    )
+    compile_memo.clear()
+
+
+def test_memoize_structurally_equal_models_with_different_constants():
+    compile_memo.clear()
+    backend = ml.NumpyBackend()
+
+    def build() -> Model:
+        model = Model()
+        model |= Add().connect(left="left", right="right", output="output")
+        return model
+
+    pm_1 = ml.compile(
+        build(),
+        backend,
+        constant_keys={"right": backend.ones(3)},
+        inference=True,
+        memoize=True,
+    )
+    with _count_pm_inits() as init:
+        pm_2 = ml.compile(
+            build(),
+            backend,
+            constant_keys={"right": backend.zeros(3)},
+            inference=True,
+            memoize=True,
+        )
+    assert init.call_count == 0
+    data = {"left": backend.ones(3)}
+    np.testing.assert_allclose(pm_1.evaluate({}, data)["output"], 2 * np.ones(3))
+    np.testing.assert_allclose(pm_2.evaluate({}, data)["output"], np.ones(3))
+    compile_memo.clear()
+
+
+def test_memo_is_bounded():
+    memo = CompileMemo(maxsize=2)
+    backend = ml.NumpyBackend()
+    for idx in range(3):
+        model = _build_mlp()
+        pm = ml.PhysicalModel(
+            model=model,
+            backend=backend,
+            data_keys=set(),
+            constant_keys={},
+            trainable_keys=set(),
+            discard_keys=set(),
+            shapes={"input": [idx + 1, 3]},
+            inference=False,
+            safe_shapes=True,
+            safe_names=True,
+            use_short_namings=True,
+            jit=False,
+            keep_template=True,
+        )
+        codegen = ml.framework.codegen.code_gen_map[ml.NumpyBackend](pm)
+        codegen.generate_code()
+        memo.store(str(idx), model, pm, codegen)
+        memo.store_template(str(idx), model, pm)
+    assert len(memo) == 2
+    assert memo.load("0", _build_mlp(), backend, jit=False) is None
+    assert memo.load("2", _build_mlp(), backend, jit=False) is not None
+    assert memo.load("1", _build_mlp(), backend, jit=False) is not None
+
+    memo.maxsize = 1
+    assert len(memo) == 1
+    assert len(memo._templates) == 1
+    assert memo.load("2", _build_mlp(), backend, jit=False) is None
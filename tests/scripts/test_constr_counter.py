@@ -18,6 +18,8 @@ import pytest
 from mithril.framework.common import (
     NOT_GIVEN,
     TBD,
+    Constraint,
+    ConstraintSolver,
     IOHyperEdge,
     ShapeRepr,
     Tensor,
@@ -1339,3 +1341,23 @@ def test_error_check_counter_3():
         "Shape mismatch for broadcast. Dimensionalities for the corresponding "
         "shape index are left: 9, right: 5, output: 9"
     )
+
+
+def test_solver_loop_follows_creation_order():
+    trace: list[str] = []
+
+    def make_constraint(name: str) -> Constraint:
+        def fn() -> tuple[bool, Updates]:
+            trace.append(name)
+            return True, Updates()
+
+        return Constraint(fn=fn)
+
+    constraints = [make_constraint(f"c{idx}") for idx in range(5)]
+    solver = ConstraintSolver()
+    for constr in constraints:
+        solver.constraint_map[constr] = []
+    solver.solver_loop(set(reversed(constraints)))
+    assert trace == ["c0", "c1", "c2", "c3", "c4"]
+    assert all(constr.call_counter == 1 for constr in constraints)
+    assert solver.constraint_map == {}
@@ -632,3 +632,26 @@ def test_insert_to_output_key_not_in_keys_err():
         )
 
     assert str(e.value) == ("Inserted key `not_in_keys` must be in the keys dictionary")
+
+
+def test_topological_order_is_updated_after_graph_changes():
+    sine_op = SineOp()
+    multiply_op = MultiplyOp()
+    transpose_op = TransposeOp()
+    fg = FlatGraph({"input"}, {"output"}, ml.TorchBackend(), ConstraintSolver(), [])
+    fg.add_value(sine_op, {"input": "input", "output": "sin_out"})
+    fg.add_value(multiply_op, {"left": "sin_out", "right": "input", "output": "output"})
+    assert list(fg.topological_order) == ["sin_out", "output"]
+    # Order is cached until the graph is modified.
+    assert fg.topological_order is fg.topological_order
+
+    fg.insert_operator_before(
+        transpose_op,
+        {"input": "sin_out", "output": "transpose_out"},
+        multiply_op,
+        "sin_out",
+    )
+    assert list(fg.topological_order) == ["sin_out", "transpose_out", "output"]
+
+    fg.remove_key("transpose_out")
+    assert list(fg.topological_order) == ["sin_out", "output"]
@@ -13,6 +13,8 @@
 # limitations under the License.
 
 
+import sys
+
 import numpy as np
 
 import mithril as ml
@@ -478,3 +480,29 @@ def test_integration_collision_from_different_levels():
 
     np.testing.assert_allclose(expected_res["_e"], res_short["_e"])  # type: ignore
     np.testing.assert_allclose(expected_res["_e"], res_long["e"])  # type: ignore
+
+
+def test_deeply_nested_model_under_low_recursion_limit():
+    depth = 300
+    model = Model()
+    model |= Relu().connect(input="input", output=IOKey("output"))
+    for _ in range(depth):
+        outer = Model()
+        outer |= model.connect(input="input", output="hidden")
+        outer |= Add().connect(left="hidden", right="input", output=IOKey("output"))
+        model = outer
+
+    backend = ml.NumpyBackend()
+    recursion_limit = sys.getrecursionlimit()
+    # Flattening must not recurse through submodels.
+    sys.setrecursionlimit(depth)
+    try:
+        pm = ml.compile(
+            model, backend, shapes={"input": [2]}, inference=True, jit=False
+        )
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+
+    input = backend.array([-1.0, 2.0])
+    res = pm.evaluate(data={"input": input})
+    np.testing.assert_allclose(res["output"], [-depth, 2.0 + 2.0 * depth])  # type: ignore
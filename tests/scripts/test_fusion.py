@@ -0,0 +1,137 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+import mithril as ml
+from mithril.framework.physical.fusion import find_fusion_groups
+from mithril.models import Add, Gelu, IOKey, Linear, Model, Multiply, Relu, Tanh
+
+
+def _build_model() -> Model:
+    model = Model()
+    model |= Linear(8).connect(input="input", output="hidden")
+    model |= Gelu().connect(input="hidden", output="act")
+    model |= Multiply().connect(
+        left="act", right=IOKey("scale", type=ml.Tensor[float]), output="scaled"
+    )
+    model |= Tanh().connect(input="scaled", output="squashed")
+    model |= Add().connect(left="squashed", right=1.0, output=IOKey("output"))
+    return model
+
+
+def _compile(backend, inference=True, **kwargs) -> ml.PhysicalModel:
+    return ml.compile(
+        _build_model(),
+        backend,
+        shapes={"input": [4, 3], "scale": [4, 8]},
+        inference=inference,
+        jit=False,
+        **kwargs,
+    )
+
+
+def test_fusion_groups_stop_at_shared_values():
+    model = Model()
+    model |= Relu().connect(input="input", output="relu")
+    model |= Tanh().connect(input="relu", output="left")
+    model |= Add().connect(left="left", right="relu", output="sum")
+    model |= Tanh().connect(input="sum", output="squashed")
+    model |= Add().connect(left="squashed", right=1.0, output=IOKey("output"))
+    pm = ml.compile(
+        model,
+        ml.NumpyBackend(),
+        shapes={"input": [4, 3]},
+        data_keys={"input"},
+        inference=True,
+        jit=False,
+    )
+    groups = find_fusion_groups(pm.flat_graph, lambda key: True)
+    # relu is used twice, so it can not be fused into its consumers.
+    assert [group.keys for group in groups] == [["left", "sum", "squashed", "output"]]
+
+
+def test_numpy_fusion_writes_in_place(tmp_path):
+    backend = ml.NumpyBackend()
+    reference = _compile(backend)
+    file_path = str(tmp_path / "fused.py")
+    pm = _compile(backend, fuse_elementwise=True, file_path=file_path)
+    with open(file_path) as file:
+        code = file.read()
+    # All elementwise operations following the matrix multiplication are
+    # fused, results of ufuncs are overwritten by the next ones.
+    assert code.count("def _fused_") == 1
+    assert "np.tanh(scaled, out=scaled)" in code
+    assert "np.add(squashed, 1.0, out=squashed)" in code
+
+    params = reference.randomize_params()
+    data = {"input": backend.ones(4, 3), "scale": backend.ones(4, 8) * 2}
+    np.testing.assert_allclose(
+        pm.evaluate(params, data)["output"],
+        reference.evaluate(params, data)["output"],
+        rtol=1e-6,
+    )
+
+
+@pytest.mark.parametrize("inference", [True, False])
+@pytest.mark.parametrize("backend", [ml.TorchBackend(), ml.JaxBackend()])
+def test_autograd_fusion_matches_unfused(backend, inference):
+    reference = _compile(backend, inference)
+    pm = _compile(backend, inference, fuse_elementwise=True)
+
+    params = reference.randomize_params()
+    data = {"input": backend.ones(4, 3), "scale": backend.ones(4, 8) * 2}
+    np.testing.assert_allclose(
+        np.asarray(pm.evaluate(params, data)["output"]),
+        np.asarray(reference.evaluate(params, data)["output"]),
+        rtol=1e-6,
+    )
+    if not inference:
+        output_gradients = {"output": backend.ones(4, 8)}
+        _, ref_grads = reference.evaluate(
+            params, data, output_gradients=output_gradients
+        )
+        _, grads = pm.evaluate(params, data, output_gradients=output_gradients)
+        for key, grad in ref_grads.items():
+            np.testing.assert_allclose(
+                np.asarray(grads[key]), np.asarray(grad), rtol=1e-6
+            )
+
+
+def test_numpy_fusion_requires_inference():
+    with pytest.raises(ValueError) as err_info:
+        _compile(ml.NumpyBackend(), inference=False, fuse_elementwise=True)
+    assert str(err_info.value) == (
+        "Elementwise fusion is only supported in inference mode for manual "
+        "gradient backends!"
+    )
+
+
+def test_fusion_with_memory_planning():
+    backend = ml.NumpyBackend()
+    reference = _compile(backend)
+    pm = _compile(backend, fuse_elementwise=True, plan_memory=True)
+    # Fused operations are not planned.
+    assert pm.memory_plan is not None
+    assert not {"act", "scaled", "squashed"} & pm.memory_plan.assignments.keys()
+
+    params = reference.randomize_params()
+    data = {"input": backend.ones(4, 3), "scale": backend.ones(4, 8) * 2}
+    for _ in range(2):
+        np.testing.assert_allclose(
+            pm.evaluate(params, data)["output"],
+            reference.evaluate(params, data)["output"],
+            rtol=1e-6,
+        )
@@ -13,6 +13,9 @@
 # limitations under the License.
 
 
+from copy import deepcopy
+from typing import Any
+
 import pytest
 
 from mithril.framework.common import (
@@ -24,6 +27,7 @@ from mithril.framework.common import (
     ShapeRepr,
     Tensor,
     ToBeDetermined,
+    Uniadic,
     UpdateType,
     Variadic,
 )
@@ -1356,3 +1360,55 @@ def test_hyperedge_set_same_type():
     assert edge1.constraints[UpdateType.SHAPE] == set()
     assert edge1.constraints[UpdateType.TYPE] == {constr1}
     assert edge1.constraints[UpdateType.VALUE] == set()
+
+
+############## Deepcopy Tests ##############
+
+
+def test_hyperedge_deepcopy():
+    constr1 = Constraint(fn=reduce_constraints, types=[UpdateType.SHAPE])
+    constr2 = Constraint(fn=reduce_type_constraint, types=[UpdateType.TYPE])
+    constr1.add_dependencies(constr2)
+
+    edge1 = IOHyperEdge(type=Tensor[int | float], value=TBD)
+    edge2 = IOHyperEdge(type=Tensor[int | float], value=TBD)
+    edge1.add_constraint(constr1)
+    edge1.add_constraint(constr2)
+    edge2.add_constraint(constr1)
+    assert edge2._value is not edge1._value
+    edge2.set_value(edge1._value)  # type: ignore
+    assert edge1.shape is not None
+
+    memo: dict[int, Any] = {}
+    copy1 = deepcopy(edge1, memo)
+    copy2 = deepcopy(edge2, memo)
+
+    # Structure is copied.
+    assert copy1 is not edge1
+    assert copy1._value is copy2._value
+    assert copy1._value is not edge1._value
+    assert copy1.shape is not edge1.shape
+    assert copy1.shape.referees == {copy1._value}
+    assert isinstance(copy1._value, Tensor) and copy1._value.referees == {
+        copy1,
+        copy2,
+    }
+    (copy_constr1,) = copy1.constraints[UpdateType.SHAPE]
+    (copy_constr2,) = copy1.constraints[UpdateType.TYPE]
+    assert copy2.constraints[UpdateType.SHAPE] == {copy_constr1}
+    assert copy_constr1 not in (constr1, constr2)
+    assert copy_constr1.parents == {copy_constr2}
+    assert copy_constr2.children == {copy_constr1}
+
+    # Immutable parts are shared.
+    assert copy1._type is edge1._type
+    assert copy_constr1.fn is constr1.fn
+
+    # Copies are mutated independently.
+    copy1.set_type(Tensor[float])
+    assert copy1.value_type is float
+    assert edge1.value_type == int | float
+    shape = ShapeRepr(prefix=[Uniadic(3)], root=None).node
+    copy1.shape.merge(shape)
+    assert copy1.shape.get_shapes() == [3]
+    assert edge1.shape.get_shapes() != [3]
@@ -0,0 +1,143 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+import mithril as ml
+from mithril.framework.physical.memory_planner import BufferSpec, plan_memory
+from mithril.models import Add, IOKey, Linear, Model, Relu, Reshape, Tanh
+
+
+def _build_mlp() -> Model:
+    model = Model()
+    model |= Linear(8).connect(input="input", output="hidden_0")
+    model |= Relu().connect(input="hidden_0", output="relu_0")
+    model |= Linear(8).connect(input="relu_0", output="hidden_1")
+    model |= Tanh().connect(input="hidden_1", output="tanh_1")
+    model |= Add().connect(left="relu_0", right="tanh_1", output="sum")
+    model |= Add().connect(left="sum", right=3.0, output=IOKey("output"))
+    return model
+
+
+@pytest.mark.parametrize("backend", [ml.NumpyBackend(), ml.TorchBackend()])
+def test_planned_buffers_are_reused(backend):
+    model = _build_mlp()
+    reference = ml.compile(model, backend, shapes={"input": [4, 3]}, inference=True)
+    pm = ml.compile(
+        model,
+        backend,
+        shapes={"input": [4, 3]},
+        inference=True,
+        jit=False,
+        plan_memory=True,
+    )
+    plan = pm.memory_plan
+    assert plan is not None
+    assert len(plan.assignments) == 6
+    assert plan.naive_size == 6 * 4 * 8 * 4
+    assert plan.arena_size == 3 * 4 * 8 * 4
+    # Outputs are never written into buffers.
+    assert "output" not in plan.assignments
+
+    params = reference.randomize_params()
+    data = {"input": backend.ones(4, 3)}
+    ref_output = np.asarray(reference.evaluate(params, data)["output"])
+    output_1 = pm.evaluate(params, data)["output"]
+    output_2 = pm.evaluate(params, data)["output"]
+    np.testing.assert_allclose(np.asarray(output_1), ref_output, rtol=1e-6)
+    np.testing.assert_allclose(np.asarray(output_2), ref_output, rtol=1e-6)
+
+
+def _compile_view_model(consume_view: bool) -> ml.PhysicalModel:
+    model = Model()
+    model |= Add().connect(
+        left=IOKey("left", type=ml.Tensor[float]),
+        right=IOKey("right", type=ml.Tensor[float]),
+        output="sum",
+    )
+    if consume_view:
+        model |= Reshape(shape=(8,)).connect(input="sum", output="flat")
+        model |= Tanh().connect(input="flat", output="act")
+        model |= Add().connect(left="act", right="flat", output="result")
+        model |= Tanh().connect(input="result", output="scaled")
+        model |= Tanh().connect(input="scaled", output="last")
+        model |= Add().connect(left="last", right=1.0, output=IOKey("output"))
+    else:
+        model |= Reshape(shape=(8,)).connect(input="sum", output=IOKey("output"))
+    return ml.compile(
+        model,
+        ml.NumpyBackend(),
+        shapes={"left": [2, 4], "right": [2, 4]},
+        data_keys={"left", "right"},
+        inference=True,
+        jit=False,
+    )
+
+
+def test_views_keep_buffers_alive():
+    pm = _compile_view_model(consume_view=True)
+    spec_2d = BufferSpec((2, 4), "float32", 4)
+    spec_1d = BufferSpec((8,), "float32", 4)
+    plan = plan_memory(
+        pm.flat_graph, {"sum": spec_2d, "act": spec_1d, "result": spec_1d}
+    )
+    order = list(pm.flat_graph.topological_order)
+    # Reshape output may be a view of sum, so sum is alive until the last use
+    # of flat.
+    assert plan.lifetimes["sum"] == (order.index("sum"), order.index("result"))
+    assert plan.lifetimes["act"] == (order.index("act"), order.index("result"))
+    # Consumer of result is not planned, so it may return a view of result
+    # which escapes the evaluation.
+    assert "result" not in plan.assignments
+    assert plan.assignments == {"sum": 0, "act": 1}
+
+
+def test_escaping_views_are_not_planned():
+    pm = _compile_view_model(consume_view=False)
+    plan = plan_memory(pm.flat_graph, {"sum": BufferSpec((2, 4), "float32", 4)})
+    assert plan.assignments == {}
+    assert plan.arena_size == 0
+
+
+def test_buffers_are_shared_by_equal_specs():
+    pm = _compile_view_model(consume_view=True)
+    spec_2d = BufferSpec((2, 4), "float32", 4)
+    spec_1d = BufferSpec((8,), "float32", 4)
+    plan = plan_memory(
+        pm.flat_graph,
+        {
+            "sum": spec_2d,
+            "act": spec_1d,
+            "result": spec_1d,
+            "scaled": spec_1d,
+            "last": spec_1d,
+        },
+    )
+    # Inputs of result are still in use while it is written, whereas scaled
+    # reuses the buffer of act. Output of the model is not planned, so last
+    # escapes the evaluation.
+    assert plan.buffers == [spec_2d, spec_1d, spec_1d]
+    assert plan.assignments["scaled"] == plan.assignments["act"]
+    assert plan.assignments["result"] != plan.assignments["act"]
+    assert "last" not in plan.assignments
+    assert plan.naive_size == spec_2d.nbytes + 3 * spec_1d.nbytes
+
+
+def test_memory_planning_requires_inference():
+    with pytest.raises(ValueError) as err_info:
+        ml.compile(
+            _build_mlp(), ml.NumpyBackend(), shapes={"input": [4, 3]}, plan_memory=True
+        )
+    assert str(err_info.value) == "Memory planning is only supported in inference mode!"
@@ -0,0 +1,214 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F  # noqa: N812
+
+import mithril as ml
+from mithril.cores.python.numpy import attention
+from mithril.cores.python.numpy.attention import (
+    attention_backward,
+    attention_forward,
+)
+from mithril.cores.python.numpy.ops import scaled_dot_product_attention
+from mithril.cores.python.numpy.ops_grad import scaled_dot_product_attention_grad
+from mithril.framework.codegen.py_style_codegen.numpy_gen import NumpyCodeGen
+from mithril.models import IOKey, Model, ScaledDotProduct
+
+attention_cases = [
+    # (query shape, key shape, value shape, mask shape, mask dtype, is_causal)
+    ((2, 3, 37, 8), (2, 3, 45, 8), (2, 3, 45, 5), None, None, False),
+    ((2, 3, 45, 8), (2, 3, 45, 8), (2, 3, 45, 5), None, None, True),
+    ((3, 37, 8), (1, 45, 8), (1, 45, 8), (37, 45), np.float64, False),
+    ((2, 37, 8), (2, 45, 8), (2, 45, 8), (2, 1, 45), bool, False),
+    ((37, 8), (45, 8), (45, 4), (45,), bool, False),
+]
+
+
+def _reference(query, key, value, attn_mask, is_causal, scale, output_gradient):
+    tensors = [torch.tensor(arr, requires_grad=True) for arr in (query, key, value)]
+    output = F.scaled_dot_product_attention(
+        *tensors,
+        attn_mask=None if attn_mask is None else torch.tensor(attn_mask),
+        is_causal=is_causal,
+        scale=scale,
+    )
+    output.backward(torch.tensor(output_gradient))
+    return output.detach().numpy(), [t.grad.numpy() for t in tensors]  # type: ignore
+
+
+@pytest.mark.parametrize("case", attention_cases)
+def test_blockwise_attention_matches_torch(case, monkeypatch):
+    # Small blocks split every sequence into several uneven blocks.
+    monkeypatch.setattr(attention, "ATTENTION_QUERY_BLOCK_SIZE", 8)
+    monkeypatch.setattr(attention, "ATTENTION_KEY_BLOCK_SIZE", 16)
+    query_shape, key_shape, value_shape, mask_shape, mask_dtype, is_causal = case
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal(query_shape)
+    key = rng.standard_normal(key_shape)
+    value = rng.standard_normal(value_shape)
+    attn_mask = None
+    if mask_dtype is bool:
+        attn_mask = rng.random(mask_shape) > 0.3
+    elif mask_dtype is not None:
+        attn_mask = rng.standard_normal(mask_shape)
+    scale = 0.3
+
+    output, logsumexp = attention_forward(
+        query, key, value, scale, attn_mask, is_causal
+    )
+    assert logsumexp.shape == output.shape[:-1]
+    output_gradient = rng.standard_normal(output.shape)
+    grads = attention_backward(
+        output_gradient,
+        output,
+        logsumexp,
+        query,
+        key,
+        value,
+        scale,
+        attn_mask,
+        is_causal,
+    )
+    ref_output, ref_grads = _reference(
+        query, key, value, attn_mask, is_causal, scale, output_gradient
+    )
+
+    np.testing.assert_allclose(output, ref_output, rtol=1e-10, atol=1e-10)
+    for grad, ref_grad in zip(grads.values(), ref_grads, strict=True):
+        # Broadcasted batch dimensions are reduced by the backend.
+        grad = grad.sum(axis=tuple(range(grad.ndim - ref_grad.ndim)))
+        grad = grad.sum(
+            axis=tuple(
+                idx
+                for idx, (size, ref_size) in enumerate(
+                    zip(grad.shape, ref_grad.shape, strict=True)
+                )
+                if size != ref_size
+            ),
+            keepdims=True,
+        )
+        np.testing.assert_allclose(grad, ref_grad, rtol=1e-10, atol=1e-10)
+
+
+def test_attention_grads_are_not_kept_in_cache():
+    rng = np.random.default_rng(0)
+    query, key, value = (rng.standard_normal((2, 9, 4)) for _ in range(3))
+    cache: dict = {}
+    output = scaled_dot_product_attention(query, key, value, cache=cache)
+    cache.setdefault("output", output)
+    output_gradient = rng.standard_normal(output.shape)
+
+    grads = [
+        scaled_dot_product_attention_grad(
+            output_gradient, cache, idx, query, key, value, None
+        )
+        for idx in range(3)
+    ]
+    assert "input_grads" not in cache
+    ref_grads = attention_backward(
+        output_gradient,
+        output,
+        cache["logsumexp"],
+        query,
+        key,
+        value,
+        cache["scale_factor"],
+        None,
+        False,
+    )
+    for grad, ref_grad in zip(grads, ref_grads.values(), strict=True):
+        np.testing.assert_array_equal(grad, ref_grad)
+
+
+def test_attention_computes_only_requested_grads():
+    model = Model()
+    model |= ScaledDotProduct().connect(
+        query="query", key="key", value="value", output=IOKey("output")
+    )
+    model.set_differentiability(query=True)
+    shapes = {"query": [2, 5, 4], "key": [2, 6, 4], "value": [2, 6, 3]}
+    backend = ml.NumpyBackend(dtype=ml.float64)
+    pm = ml.compile(model, backend, shapes=shapes, jit=False)
+    rng = np.random.default_rng(0)
+    params = {"query": rng.standard_normal(shapes["query"])}
+    data = {key: rng.standard_normal(shapes[key]) for key in ("key", "value")}
+    output_gradient = rng.standard_normal((2, 5, 3))
+
+    _, grads = pm.evaluate(params, data, output_gradients={"output": output_gradient})
+    caches = [
+        value for value in pm.flat_graph.cached_data.values() if isinstance(value, dict)
+    ]
+    assert len(caches) == 1
+    (cache,) = caches
+    # Gradients of key and value are neither computed nor kept.
+    assert "input_grads" not in cache
+    ref_grads = attention_backward(
+        output_gradient,
+        cache["output"],
+        cache["logsumexp"],
+        params["query"],
+        data["key"],
+        data["value"],
+        cache["scale_factor"],
+        None,
+        True,
+    )
+    np.testing.assert_allclose(grads["query"], ref_grads[0])
+
+    codegen = NumpyCodeGen(pm)
+    codegen.generate_code()
+    assert "grad_idxs=(0,)" in codegen.code
+
+
+@pytest.mark.parametrize("is_causal", [True, False])
+def test_numpy_attention_matches_torch_backend(is_causal):
+    model = Model()
+    model |= ScaledDotProduct(is_causal=is_causal).connect(
+        query="query", key="key", value="value", output=IOKey("output")
+    )
+    model.set_differentiability(query=True, key=True, value=True)
+    shapes = {"query": [2, 300, 16], "key": [2, 600, 16], "value": [2, 600, 8]}
+
+    results = []
+    for backend in [
+        ml.NumpyBackend(dtype=ml.float64),
+        ml.TorchBackend(dtype=ml.float64),
+    ]:
+        pm = ml.compile(model, backend, shapes=shapes, jit=False)
+        rng = np.random.default_rng(0)
+        params = {
+            key: backend.array(rng.standard_normal(shape))
+            for key, shape in shapes.items()
+        }
+        output_gradients = {
+            "output": backend.array(rng.standard_normal((2, 300, 8)))  # type: ignore
+        }
+        for _ in range(2):
+            outputs, grads = pm.evaluate(params, output_gradients=output_gradients)
+            params = {key: value * 2 for key, value in params.items()}
+        results.append(
+            (
+                np.asarray(outputs["output"]),
+                {key: np.asarray(value) for key, value in grads.items()},
+            )
+        )
+
+    (output, grads), (ref_output, ref_grads) = results
+    np.testing.assert_allclose(output, ref_output, rtol=1e-10, atol=1e-10)
+    assert grads.keys() == ref_grads.keys()
+    for key, grad in grads.items():
+        np.testing.assert_allclose(grad, ref_grads[key], rtol=1e-10, atol=1e-10)
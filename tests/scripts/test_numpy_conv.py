@@ -0,0 +1,176 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from itertools import product
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F  # noqa: N812
+
+import mithril as ml
+from mithril.cores.python.numpy.conv import (
+    conv,
+    conv_input_grad,
+    conv_weight_grad,
+    select_conv_engine,
+    winograd_conv,
+)
+from mithril.models import Convolution1D, Convolution2D, IOKey, Model
+
+conv_cases = [
+    # (input shape, weight shape, stride, padding, dilation, groups)
+    ((2, 4, 17), (6, 4, 3), (1,), (1,), (1,), 1),
+    ((2, 4, 17), (6, 4, 3), (3,), (2,), (2,), 1),
+    ((2, 4, 200), (4, 4, 65), (1,), (4,), (2,), 1),
+    ((2, 4, 11, 9), (6, 2, 3, 2), (2, 1), (1, 0), (2, 1), 2),
+    ((2, 4, 11, 10), (6, 4, 3, 3), (1, 1), (1, 1), (1, 1), 1),
+    ((2, 4, 12, 12), (4, 1, 3, 3), (2, 2), (1, 1), (1, 1), 4),
+    ((2, 3, 20, 20), (4, 3, 9, 9), (1, 1), (4, 4), (1, 1), 1),
+    ((2, 3, 20, 20), (4, 3, 7, 7), (2, 2), (3, 3), (2, 2), 1),
+]
+
+
+def _reference(input, weight, stride, padding, dilation, groups, output_gradient):
+    fn = F.conv1d if input.ndim == 3 else F.conv2d
+    input_t = torch.tensor(input, requires_grad=True)
+    weight_t = torch.tensor(weight, requires_grad=True)
+    output = fn(
+        input_t,
+        weight_t,
+        stride=stride,
+        padding=padding,
+        dilation=dilation,
+        groups=groups,
+    )
+    output.backward(torch.tensor(output_gradient))
+    return (
+        output.detach().numpy(),
+        input_t.grad.numpy(),  # type: ignore
+        weight_t.grad.numpy(),  # type: ignore
+    )
+
+
+@pytest.mark.parametrize(
+    "engine, case", list(product([None, "im2col", "fft"], conv_cases))
+)
+def test_conv_engines(engine, case):
+    input_shape, weight_shape, stride, padding, dilation, groups = case
+    rng = np.random.default_rng(0)
+    input = rng.standard_normal(input_shape)
+    weight = rng.standard_normal(weight_shape)
+    _padding = tuple((p, p) for p in padding)
+
+    output = conv(input, weight, stride, _padding, dilation, groups, engine)
+    output_gradient = rng.standard_normal(output.shape)
+    ref_output, ref_input_grad, ref_weight_grad = _reference(
+        input, weight, stride, padding, dilation, groups, output_gradient
+    )
+    input_grad = conv_input_grad(
+        output_gradient, weight, input_shape, stride, _padding, dilation, groups
+    )
+    weight_grad = conv_weight_grad(
+        output_gradient, input, weight_shape, stride, _padding, dilation, groups
+    )
+
+    np.testing.assert_allclose(output, ref_output, rtol=1e-10, atol=1e-10)
+    np.testing.assert_allclose(input_grad, ref_input_grad, rtol=1e-10, atol=1e-10)
+    np.testing.assert_allclose(weight_grad, ref_weight_grad, rtol=1e-10, atol=1e-10)
+
+
+@pytest.mark.parametrize("spatial", [(8, 8), (9, 7), (5, 6)])
+def test_winograd_conv(spatial):
+    rng = np.random.default_rng(0)
+    input = rng.standard_normal((2, 16, *spatial))
+    weight = rng.standard_normal((5, 16, 3, 3))
+    output = conv(input, weight, (1, 1), ((1, 1), (1, 1)), (1, 1), engine="winograd")
+    ref_output, *_ = _reference(
+        input, weight, (1, 1), (1, 1), (1, 1), 1, np.ones((2, 5, *spatial))
+    )
+    np.testing.assert_allclose(output, ref_output, rtol=1e-10, atol=1e-10)
+
+    with pytest.raises(ValueError):
+        winograd_conv(input, weight, (2, 2), (1, 1), 1)
+
+
+def test_select_conv_engine():
+    assert select_conv_engine((8, 32, 66, 66), (32, 32, 3, 3), (1, 1), (1, 1), 1) == (
+        "winograd"
+    )
+    # Few channels, tiles, strided and grouped 3x3 convolutions use im2col.
+    assert select_conv_engine((8, 3, 66, 66), (32, 3, 3, 3), (1, 1), (1, 1), 1) == (
+        "im2col"
+    )
+    assert select_conv_engine((1, 32, 16, 16), (32, 32, 3, 3), (1, 1), (1, 1), 1) == (
+        "im2col"
+    )
+    assert select_conv_engine((8, 32, 66, 66), (32, 32, 3, 3), (2, 2), (1, 1), 1) == (
+        "im2col"
+    )
+    assert select_conv_engine((8, 32, 66, 66), (32, 16, 3, 3), (1, 1), (1, 1), 2) == (
+        "im2col"
+    )
+    # Large kernels of stride 1 use FFT.
+    assert select_conv_engine((2, 4, 128, 128), (4, 4, 9, 9), (1, 1), (1, 1), 1) == (
+        "fft"
+    )
+    assert select_conv_engine((2, 4, 512), (4, 4, 64), (1,), (2,), 1) == "fft"
+    assert select_conv_engine((2, 4, 128, 128), (4, 4, 9, 9), (2, 2), (1, 1), 1) == (
+        "im2col"
+    )
+
+
+@pytest.mark.parametrize(
+    "conv_model, input_shape",
+    [
+        (Convolution1D(5, 6, stride=2, padding=2, dilation=2), [2, 4, 30]),
+        (
+            Convolution2D(3, 8, stride=(2, 1), padding=1, dilation=2, groups=2),
+            [2, 4, 12, 11],
+        ),
+        (Convolution2D(3, 16, padding=1), [2, 16, 10, 10]),
+    ],
+)
+def test_numpy_conv_matches_torch_backend(conv_model, input_shape):
+    model = Model()
+    model |= conv_model.connect(input="input", output=IOKey("output"))
+
+    results = []
+    for backend in [
+        ml.NumpyBackend(dtype=ml.float64),
+        ml.TorchBackend(dtype=ml.float64),
+    ]:
+        pm = ml.compile(model, backend, shapes={"input": input_shape}, jit=False)
+        rng = np.random.default_rng(0)
+        params = {
+            key: backend.array(rng.standard_normal(value.shape))
+            for key, value in sorted(pm.randomize_params().items())
+        }
+        data = {"input": backend.array(rng.standard_normal(input_shape))}
+        output_shape = pm.shapes["output"]
+        output_gradients = {
+            "output": backend.array(rng.standard_normal(output_shape))  # type: ignore
+        }
+        outputs, grads = pm.evaluate(params, data, output_gradients=output_gradients)
+        results.append(
+            (
+                np.asarray(outputs["output"]),
+                {key: np.asarray(value) for key, value in grads.items()},
+            )
+        )
+
+    (output, grads), (ref_output, ref_grads) = results
+    np.testing.assert_allclose(output, ref_output, rtol=1e-10, atol=1e-10)
+    for key, grad in grads.items():
+        np.testing.assert_allclose(grad, ref_grads[key], rtol=1e-10, atol=1e-10)
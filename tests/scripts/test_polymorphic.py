@@ -0,0 +1,136 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+import mithril as ml
+from mithril.models import Linear, Mean, Model, Relu
+from mithril.utils.compile_cache import compile_memo
+from mithril.utils.polymorphic import bucket_size
+
+
+def _build_mlp() -> Model:
+    model = Model()
+    model |= Linear(8).connect(input="input", output="hidden")
+    model |= Relu().connect(input="hidden", output="output")
+    return model
+
+
+def test_bucket_size():
+    assert [bucket_size(size, "exact") for size in (1, 3, 8)] == [1, 3, 8]
+    assert [bucket_size(size, "pow2") for size in (1, 3, 4, 5, 9)] == [1, 4, 4, 8, 16]
+    assert bucket_size(5, lambda size: 10 * ((size + 9) // 10)) == 10
+    with pytest.raises(ValueError):
+        bucket_size(5, lambda size: size - 1)
+
+
+def test_exact_specializations():
+    compile_memo.clear()
+    backend = ml.NumpyBackend()
+    model = _build_mlp()
+    pm = ml.compile_polymorphic(
+        model, backend, dynamic_axes={"input": [0]}, shapes={"input": [1, 3]}
+    )
+    params = pm.pm.randomize_params()
+    for batch in (2, 5, 2):
+        data = {"input": backend.randn(batch, 3)}
+        reference = ml.compile(_build_mlp(), backend, shapes={"input": [batch, 3]})
+        np.testing.assert_allclose(
+            pm.evaluate(params, data)["output"],  # type: ignore
+            reference.evaluate(params, data)["output"],
+        )
+    assert pm.specializations == [(5,), (2,)]
+    compile_memo.clear()
+
+
+def test_pow2_bucketing_pads_and_slices():
+    compile_memo.clear()
+    backend = ml.NumpyBackend()
+    pm = ml.compile_polymorphic(
+        _build_mlp(),
+        backend,
+        dynamic_axes={"input": [0]},
+        shapes={"input": [1, 3]},
+        bucketing="pow2",
+    )
+    params = pm.pm.randomize_params()
+    for batch in (3, 4, 5):
+        data = {"input": backend.randn(batch, 3)}
+        output_gradients = {"output": backend.randn(batch, 8)}
+        reference = ml.compile(_build_mlp(), backend, shapes={"input": [batch, 3]})
+        out, grads = pm.evaluate(params, data, output_gradients=output_gradients)
+        ref_out, ref_grads = reference.evaluate(
+            params, data, output_gradients=output_gradients
+        )
+        assert out["output"].shape == (batch, 8)  # type: ignore
+        np.testing.assert_allclose(out["output"], ref_out["output"])  # type: ignore
+        for key in ref_grads:
+            np.testing.assert_allclose(grads[key], ref_grads[key])  # type: ignore
+    assert pm.specializations == [(4,), (8,)]
+    compile_memo.clear()
+
+
+def test_specializations_are_bounded():
+    compile_memo.clear()
+    backend = ml.NumpyBackend()
+    pm = ml.compile_polymorphic(
+        _build_mlp(),
+        backend,
+        dynamic_axes={"input": [0]},
+        shapes={"input": [1, 3]},
+        max_specializations=2,
+    )
+    params = pm.pm.randomize_params()
+    for batch in (1, 2, 3):
+        pm.evaluate(params, {"input": backend.ones(batch, 3)})
+    assert pm.specializations == [(2,), (3,)]
+    # Compiled specializations are only kept by the polymorphic model.
+    assert len(compile_memo) == 0
+    compile_memo.clear()
+
+
+def test_padding_reduction_over_dynamic_axis_raises():
+    compile_memo.clear()
+    backend = ml.NumpyBackend()
+    model = Model()
+    model |= Linear(8).connect(input="input", output="hidden")
+    model |= Mean(axis=0).connect(input="hidden", output="output")
+    pm = ml.compile_polymorphic(
+        model,
+        backend,
+        dynamic_axes={"input": [0]},
+        shapes={"input": [1, 3]},
+        bucketing="pow2",
+    )
+    params = pm.pm.randomize_params()
+    # Sizes equal to bucket sizes are not padded.
+    pm.evaluate(params, {"input": backend.randn(4, 3)})
+    with pytest.raises(ValueError):
+        pm.evaluate(params, {"input": backend.randn(5, 3)})
+    compile_memo.clear()
+
+
+def test_missing_dynamic_input():
+    backend = ml.NumpyBackend()
+    with pytest.raises(KeyError):
+        ml.compile_polymorphic(
+            _build_mlp(), backend, dynamic_axes={"input": [0]}, shapes={}
+        )
+    pm = ml.compile_polymorphic(
+        _build_mlp(), backend, dynamic_axes={"input": [0]}, shapes={"input": [1, 3]}
+    )
+    with pytest.raises(KeyError):
+        pm.evaluate(pm.pm.randomize_params(), {})
+    compile_memo.clear()
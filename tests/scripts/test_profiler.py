@@ -0,0 +1,71 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+import mithril as ml
+from mithril.framework.common import Constraint
+from mithril.framework.physical.model import PhysicalModel
+from mithril.models import Linear, Model, Relu
+from mithril.utils.profiler import CompileProfiler
+
+
+def _build_mlp() -> Model:
+    model = Model()
+    model |= Linear(8).connect(input="input", output="hidden")
+    model |= Relu().connect(input="hidden", output="output")
+    return model
+
+
+def test_profiler_records_phases_and_constraints():
+    profiler = CompileProfiler()
+    ml.compile(
+        _build_mlp(), ml.NumpyBackend(), shapes={"input": [4, 3]}, profile=profiler
+    )
+    records = profiler.records
+    assert records["PhysicalModel.__init__"].calls == 1
+    assert records["PhysicalModel._pre_compile"].calls == 1
+    assert records["NumpyCodeGen.compile_code"].calls == 1
+    assert records["bcast_matrix_mult"].category == "constraint"
+    assert records["bcast_matrix_mult"].calls >= 1
+
+    for record in records.values():
+        assert 0 <= record.self_time <= record.total_time + 1e-9
+    init_time = records["PhysicalModel.__init__"].total_time
+    assert init_time <= profiler.total_time
+
+    top = profiler.top(3)
+    assert len(top) == 3
+    assert top[0].self_time >= top[1].self_time >= top[2].self_time
+    assert all(record.category == "phase" for record in profiler.top(category="phase"))
+
+
+def test_profiler_restores_methods():
+    init = PhysicalModel.__init__
+    call = Constraint.__call__
+    with CompileProfiler():
+        assert PhysicalModel.__init__ is not init
+        assert Constraint.__call__ is not call
+    assert PhysicalModel.__init__ is init
+    assert Constraint.__call__ is call
+
+
+def test_profiler_can_not_be_nested():
+    with CompileProfiler(), pytest.raises(RuntimeError), CompileProfiler():
+        pass
+
+
+def test_profile_display(capsys):
+    ml.compile(_build_mlp(), ml.NumpyBackend(), shapes={"input": [4, 3]}, profile=True)
+    assert "Compile Profile" in capsys.readouterr().out
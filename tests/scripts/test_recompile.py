@@ -0,0 +1,120 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+import mithril as ml
+from mithril.models import Add, Linear, Model, Relu
+
+
+def _build_mlp() -> Model:
+    model = Model()
+    model |= Linear(8).connect(input="input", weight="weight", output="hidden")
+    model |= Relu().connect(input="hidden", output="output")
+    return model
+
+
+def _build_add() -> Model:
+    model = Model()
+    model |= Add().connect(left="left", right="right", output="output")
+    return model
+
+
+def test_recompile_with_new_shapes():
+    backend = ml.NumpyBackend()
+    pm = ml.compile(_build_mlp(), backend, shapes={"input": [4, 3]}, recompilable=True)
+    with patch.object(ml.PhysicalModel, "__init__") as init:
+        new_pm = pm.recompile(shapes={"input": [6, 3]})
+    assert init.call_count == 0
+    assert pm.shapes["output"] == [4, 8]
+    assert new_pm.shapes["output"] == [6, 8]
+
+    reference = ml.compile(_build_mlp(), backend, shapes={"input": [6, 3]})
+    params = reference.randomize_params()
+    data = {"input": backend.randn(6, 3)}
+    output_gradients = {"output": backend.randn(6, 8)}
+    out, grads = new_pm.evaluate(params, data, output_gradients=output_gradients)
+    ref_out, ref_grads = reference.evaluate(
+        params, data, output_gradients=output_gradients
+    )
+    np.testing.assert_allclose(out["output"], ref_out["output"])  # type: ignore
+    for key in ref_grads:
+        np.testing.assert_allclose(grads[key], ref_grads[key])  # type: ignore
+
+
+def test_recompile_with_new_constant_values():
+    backend = ml.NumpyBackend()
+    pm = ml.compile(
+        _build_add(),
+        backend,
+        constant_keys={"right": backend.ones(3)},
+        inference=True,
+        recompilable=True,
+    )
+    new_pm = pm.recompile(constant_keys={"right": backend.zeros(3)})
+    data = {"left": backend.ones(3)}
+    np.testing.assert_allclose(pm.evaluate({}, data)["output"], 2 * np.ones(3))
+    np.testing.assert_allclose(new_pm.evaluate({}, data)["output"], np.ones(3))
+
+    # Recompiled models can be recompiled again.
+    newer_pm = new_pm.recompile(constant_keys={"right": 3 * backend.ones(3)})
+    np.testing.assert_allclose(newer_pm.evaluate({}, data)["output"], 4 * np.ones(3))
+
+
+def test_recompile_keeps_unchanged_request():
+    backend = ml.NumpyBackend()
+    weight = backend.randn(8, 3)
+    pm = ml.compile(
+        _build_mlp(),
+        backend,
+        constant_keys={"weight": weight},
+        shapes={"input": [2, 3]},
+        recompilable=True,
+    )
+    new_pm = pm.recompile(shapes={"input": [5, 3]})
+    reference = ml.compile(
+        _build_mlp(),
+        backend,
+        constant_keys={"weight": weight},
+        shapes={"input": [5, 3]},
+    )
+    params = reference.randomize_params()
+    data = {"input": backend.randn(5, 3)}
+    np.testing.assert_allclose(
+        new_pm.evaluate(params, data)["output"],  # type: ignore
+        reference.evaluate(params, data)["output"],
+    )
+
+
+def test_recompile_non_constant_key():
+    backend = ml.NumpyBackend()
+    pm = ml.compile(
+        _build_add(),
+        backend,
+        constant_keys={"right": backend.ones(3)},
+        inference=True,
+        recompilable=True,
+    )
+    with pytest.raises(KeyError):
+        pm.recompile(constant_keys={"left": backend.ones(3)})
+
+
+def test_recompile_requires_recompilable():
+    backend = ml.NumpyBackend()
+    pm = ml.compile(_build_mlp(), backend, shapes={"input": [4, 3]})
+    with pytest.raises(ValueError):
+        pm.recompile(shapes={"input": [6, 3]})
@@ -0,0 +1,187 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+import mithril as ml
+from mithril.framework.physical.rewrites import RewriteRule, rewrite_graph
+from mithril.models import (
+    Add,
+    IOKey,
+    Log,
+    MatrixMultiply,
+    Model,
+    Multiply,
+    Relu,
+    Reshape,
+    Transpose,
+)
+from mithril.models.primitives import Exponential
+
+from .test_utils import assert_connections
+
+
+def _compile(model: Model, backend=None, **kwargs) -> ml.PhysicalModel:
+    return ml.compile(
+        model,
+        ml.NumpyBackend() if backend is None else backend,
+        shapes={"input": [2, 3]},
+        jit=False,
+        **kwargs,
+    )
+
+
+def test_transpose_of_transpose():
+    model = Model()
+    model |= Transpose().connect(
+        input=IOKey("input", type=ml.Tensor[float]), output="t_1"
+    )
+    model |= Transpose(axes=(1, 0)).connect(input="t_1", output="t_2")
+    model |= Relu().connect(input="t_2", output=IOKey("output"))
+    pm = _compile(model, inference=True)
+
+    assert_connections(pm, {"output": ["relu", {"input", "output_cache"}]})
+
+
+def test_rewrites_can_be_disabled():
+    model = Model()
+    model |= Transpose().connect(
+        input=IOKey("input", type=ml.Tensor[float]), output="t_1"
+    )
+    model |= Transpose(axes=(1, 0)).connect(input="t_1", output="t_2")
+    model |= Relu().connect(input="t_2", output=IOKey("output"))
+    pm = _compile(model, inference=True, rewrite=False)
+
+    assert pm.flat_graph.connections["t_1"].op is not None
+    assert pm.flat_graph.connections["t_2"].op is not None
+
+
+def test_permutations_not_cancelling_are_kept():
+    model = Model()
+    model |= Transpose(axes=(1, 2, 0)).connect(
+        input=IOKey("input", type=ml.Tensor[float]), output="t_1"
+    )
+    model |= Transpose(axes=(1, 2, 0)).connect(input="t_1", output="t_2")
+    model |= Relu().connect(input="t_2", output=IOKey("output"))
+    pm = ml.compile(
+        model, ml.NumpyBackend(), shapes={"input": [2, 3, 4]}, inference=True
+    )
+
+    assert pm.flat_graph.connections["t_2"].op is not None
+
+
+def test_reshape_of_reshape():
+    model = Model()
+    model |= Reshape(shape=(6,)).connect(input="input", output="r_1")
+    model |= Reshape(shape=(3, 2)).connect(input="r_1", output=IOKey("output"))
+    pm = _compile(model, inference=True)
+
+    assert_connections(
+        pm, {"output": ["reshape", {"input", "shape_1", "output_cache"}]}
+    )
+    data = {"input": np.arange(6, dtype=np.float32).reshape(2, 3)}
+    np.testing.assert_array_equal(
+        pm.evaluate({}, data)["output"], data["input"].reshape(3, 2)
+    )
+
+
+def test_identity_arithmetic():
+    model = Model()
+    model |= Add().connect(
+        left=IOKey("input", type=ml.Tensor[float]), right=0.0, output="sum"
+    )
+    model |= Multiply().connect(left=1.0, right="sum", output="product")
+    model |= Exponential().connect(input="product", output="exp")
+    model |= Log().connect(input="exp", output="log")
+    model |= Relu().connect(input="log", output=IOKey("output"))
+    pm = _compile(model, inference=True)
+
+    assert_connections(pm, {"output": ["relu", {"input", "output_cache"}]})
+
+
+def test_outputs_are_not_bypassed():
+    model = Model()
+    model |= Multiply().connect(
+        left=IOKey("input", type=ml.Tensor[float]), right=1.0, output="product"
+    )
+    model |= Relu().connect(input="product", output=IOKey("output"))
+    model.expose_keys("product")
+    pm = _compile(model, inference=True)
+
+    assert pm.flat_graph.output_dict["product"] == "product"
+
+
+def test_type_changing_identities_are_kept():
+    model = Model()
+    model |= Add().connect(
+        left=IOKey("input", type=ml.Tensor[int]), right=0.0, output="sum"
+    )
+    model |= Relu().connect(input="sum", output=IOKey("output"))
+    pm = _compile(model, inference=True)
+
+    assert pm.flat_graph.connections["sum"].op is not None
+
+
+@pytest.mark.parametrize("inference", [True, False])
+def test_linear_bias_fusion(inference):
+    model = Model()
+    model |= MatrixMultiply().connect(
+        left=IOKey("input", type=ml.Tensor[float]),
+        right=IOKey("weight", type=ml.Tensor[float], differentiable=True).transpose(),
+        output="product",
+    )
+    model |= Add().connect(
+        left="product",
+        right=IOKey("bias", type=ml.Tensor[float], differentiable=True),
+        output=IOKey("output"),
+    )
+    backend = ml.JaxBackend()
+    pm = _compile(model, backend, inference=inference)
+    assert_connections(pm, {"output": ["linear_bias", {"input", "weight", "bias"}]})
+
+    params = {"weight": backend.ones(4, 3), "bias": backend.ones(4)}
+    data = {"input": backend.ones(2, 3)}
+    np.testing.assert_allclose(
+        np.asarray(pm.evaluate(params, data)["output"]), np.full((2, 4), 4.0)
+    )
+    if not inference:
+        _, grads = pm.evaluate(
+            params, data, output_gradients={"output": backend.ones(2, 4)}
+        )
+        np.testing.assert_allclose(np.asarray(grads["bias"]), np.full(4, 2.0))
+        np.testing.assert_allclose(np.asarray(grads["weight"]), np.full((4, 3), 2.0))
+
+    # Numpy does not provide linear_bias.
+    pm = _compile(model, inference=inference)
+    assert pm.flat_graph.connections["output"].op.formula_key == "add"  # type: ignore
+
+
+def test_custom_rules():
+    model = Model()
+    model |= Relu().connect(input="input", output="relu_1")
+    model |= Relu().connect(input="relu_1", output=IOKey("output"))
+    pm = _compile(model, inference=True)
+
+    def relu_of_relu(flat_graph, key):
+        source_key = flat_graph.get_source_keys(key)[0]
+        conn = flat_graph.get_connection(source_key)
+        if conn.op is None or conn.op.formula_key != "relu":
+            return False
+        flat_graph.replace_source_key(key, source_key, conn.source_keys[0])
+        return True
+
+    rules = {"relu": [RewriteRule("relu_of_relu", "relu", relu_of_relu)]}
+    assert rewrite_graph(pm.flat_graph, rules) == {"relu_of_relu": 1}
+    assert pm.flat_graph.get_source_keys("output")[0] == "input"
@@ -2557,6 +2557,45 @@ def test_prune_15():
     assert expected_output_dict == compiled_model.flat_graph.output_dict
 
 
+def test_prune_commutative():
+    m = Model()
+    m |= Add().connect(left="input", right="input2", output="out_1")
+    m |= Add().connect(left="input2", right="input", output="out_2")  # Duplicate
+    m |= Multiply().connect(left="out_1", right="input3", output="out_3")
+    m |= Multiply().connect(left="input3", right="out_2", output="out_4")  # Duplicate
+    m.expose_keys("out_3", "out_4")
+
+    compiled_model = compile(m, NumpyBackend(), inference=True)
+    expected_connections: dict[str, list[str | set[str]]] = {
+        "out_1": ["add", {"input", "input2", "out_1_cache"}],
+        "out_3": ["multiplication", {"out_1", "input3", "out_3_cache"}],
+    }
+    expected_output_dict = {"out_3": "out_3", "out_4": "out_3"}
+
+    assert_connections(compiled_model, expected_connections)
+    assert expected_output_dict == compiled_model.flat_graph.output_dict
+    assert compiled_model.flat_graph.n_pruned_duplicates == 2
+
+
+def test_prune_shape_ops_of_equal_shapes():
+    m = Model()
+    m |= Relu().connect(input="input", output="out_1")
+    m |= Tanh().connect(input="input", output="out_2")
+    m |= Size().connect(input="out_1", output="size_1")
+    m |= Size().connect(input="out_2", output="size_2")  # Duplicate
+    m.expose_keys("out_1", "out_2", "size_1", "size_2")
+
+    compiled_model = compile(m, NumpyBackend(), inference=True)
+    expected_connections: dict[str, list[str | set[str]]] = {
+        "out_1": ["relu", {"input", "out_1_cache"}],
+        "out_2": ["tanh", {"input", "out_2_cache"}],
+        "size_1": ["size", {"out_1", "dim_0", "size_1_cache"}],
+    }
+
+    assert_connections(compiled_model, expected_connections)
+    assert compiled_model.flat_graph.output_dict["size_2"] == "size_1"
+
+
 def test_prune_valued_tensor_1():
     # Values different do not prune!
     model = Model()
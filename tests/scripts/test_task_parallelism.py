@@ -0,0 +1,119 @@
+# Copyright 2022 Synnada, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+import mithril as ml
+from mithril.cores.python.numpy.utils import get_executor
+from mithril.models import Add, IOKey, Linear, Model, PrimitiveRandn, Relu, Tanh
+
+
+def _build_branches() -> Model:
+    model = Model()
+    model |= Linear(16).connect(input="input", output="h1")
+    model |= Linear(16).connect(input="input", output="h2")
+    model |= Relu().connect(input="h1", output="r1")
+    model |= Tanh().connect(input="h2", output="r2")
+    model |= Add().connect(left="r1", right="r2", output=IOKey("output"))
+    return model
+
+
+def _evaluate(n_threads: int, inference: bool, **kwargs):
+    pm = ml.compile(
+        _build_branches(),
+        ml.NumpyBackend(n_threads=n_threads),
+        shapes={"input": [8, 4]},
+        inference=inference,
+        jit=False,
+        **kwargs,
+    )
+    rng = np.random.default_rng(0)
+    params = {
+        key: rng.standard_normal(value.shape).astype(np.float32)
+        for key, value in sorted(pm.randomize_params().items())
+    }
+    data = {"input": rng.random((8, 4), dtype=np.float32)}
+    if inference:
+        return pm, pm.evaluate(params, data), {}
+    output_gradients = {"output": rng.random((8, 16), dtype=np.float32)}
+    outputs, grads = pm.evaluate(params, data, output_gradients=output_gradients)
+    return pm, outputs, grads
+
+
+@pytest.mark.parametrize("inference", [True, False])
+def test_threaded_evaluate_matches_serial(inference):
+    _, serial_outputs, serial_grads = _evaluate(1, inference)
+    for _ in range(3):
+        _, outputs, grads = _evaluate(4, inference)
+        np.testing.assert_array_equal(outputs["output"], serial_outputs["output"])
+        assert grads.keys() == serial_grads.keys()
+        for key, grad in serial_grads.items():
+            np.testing.assert_array_equal(grads[key], grad)
+
+
+def test_threaded_evaluate_dispatches_independent_branches(tmp_path):
+    file_path = str(tmp_path / "threaded.py")
+    pm, _, _ = _evaluate(4, True, file_path=file_path)
+    with open(file_path) as f:
+        code = f.read()
+
+    assert "_executor = get_executor(3)" in code
+    # Both linear branches are evaluated at the same levels.
+    assert code.count("_executor.submit(") == 4
+    # Buffers are not shared by the operations evaluated concurrently.
+    assert pm.memory_plan is not None
+    assert pm.memory_plan.buffers == []
+
+    file_path = str(tmp_path / "serial.py")
+    _evaluate(1, True, file_path=file_path)
+    with open(file_path) as f:
+        assert "_executor" not in f.read()
+
+
+def test_threaded_evaluate_keeps_random_primitives_serial(tmp_path):
+    model = Model()
+    model |= PrimitiveRandn(shape=(3, 4)).connect(key="key1", output="left")
+    model |= PrimitiveRandn(shape=(3, 4)).connect(key="key2", output="right")
+    model |= Add().connect(left="left", right="right", output=IOKey("output"))
+
+    outputs = []
+    for n_threads in [1, 2]:
+        file_path = str(tmp_path / f"random_{n_threads}.py")
+        pm = ml.compile(
+            model,
+            ml.NumpyBackend(n_threads=n_threads),
+            data_keys={"key1", "key2"},
+            inference=True,
+            jit=False,
+            file_path=file_path,
+        )
+        outputs.append(pm.evaluate(data={"key1": 1, "key2": 2})["output"])
+        with open(file_path) as f:
+            assert "_executor" not in f.read()
+
+    np.testing.assert_array_equal(*outputs)
+
+
+def test_numpy_backend_n_threads():
+    assert ml.NumpyBackend().n_threads == 1
+    assert ml.NumpyBackend(n_threads=3).n_threads == 3
+    with pytest.raises(ValueError):
+        ml.NumpyBackend(n_threads=0)
+
+
+def test_executors_are_shared_by_number_of_workers():
+    assert get_executor(2) is get_executor(2)
+    assert get_executor(2) is not get_executor(3)
+    assert get_executor(3)._max_workers == 3